@@ -59,8 +59,8 @@ def main():
             return
 
         # DB-backed heartbeat: `runtime.call()` UPSERTs on every browser
-        # tool call. Reading from here gives true idle time across all
-        # RESTai instances. Orphans (created before this table existed,
+        # tool call (buffered, flushed every RUNTIME_ACTIVITY_FLUSH_SECONDS).
+        # Reading from here gives true idle time across all RESTai instances. Orphans (created before this table existed,
         # or by some other RESTai version) fall back to container age.
         from datetime import timezone
         from restai.models.databasemodels import BrowserChatActivityDatabase
@@ -69,6 +69,9 @@ def main():
         try:
             rows = db.db.query(BrowserChatActivityDatabase).all()
             activity_by_chat = {r.chat_id: r.last_activity for r in rows}
+            # Containers claimed from a worker's warm pool carry no chat
+            # label (labels are fixed at creation); their row names them by id.
+            activity_by_container = {r.container_id: r.last_activity for r in rows if r.container_id}
         finally:
             db.db.close()
 
@@ -104,7 +107,7 @@ def main():
             if cont_iid and cont_iid != my_instance:
                 continue
 
-            last_activity = activity_by_chat.get(chat_id)
+            last_activity = activity_by_container.get(c.id) or activity_by_chat.get(chat_id)
             if last_activity is not None:
                 if last_activity.tzinfo is None:
                     last_activity = last_activity.replace(tzinfo=timezone.utc)
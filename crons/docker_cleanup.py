@@ -59,9 +59,10 @@ def main():
         cron.finish()
         return
 
-    # DB-backed heartbeat: DockerManager.exec_command UPSERTs
-    # `docker_chat_activity` on every terminal/run/upload call across
-    # all RESTai instances sharing this DB. Using the row's
+    # DB-backed heartbeat: restai/docker.py UPSERTs `docker_chat_activity`
+    # for terminal/run/upload calls (buffered, flushed every
+    # RUNTIME_ACTIVITY_FLUSH_SECONDS) across all RESTai instances sharing
+    # this DB. Using the row's
     # `last_activity` here gives us TRUE idle time. Containers without
     # a row (orphans, pre-migration) fall back to the old label-based
     # creation-age check so the rollout is gradual.
@@ -72,6 +73,9 @@ def main():
     try:
         rows = db.db.query(DockerChatActivityDatabase).all()
         activity_by_chat = {r.chat_id: r.last_activity for r in rows}
+        # Containers claimed from a worker's warm pool carry no chat label
+        # (labels are fixed at creation); their row names them by id.
+        activity_by_container = {r.container_id: r.last_activity for r in rows if r.container_id}
     finally:
         db.db.close()
 
@@ -131,7 +135,7 @@ def main():
         if cont_iid and cont_iid != my_instance:
             continue
 
-        last_activity = activity_by_chat.get(chat_id)
+        last_activity = activity_by_container.get(container.id) or activity_by_chat.get(chat_id)
         if last_activity is not None:
             # Treat naive timestamps as UTC — UPSERTs use datetime.now(tz=utc)
             # but SQLite returns them naive on read.
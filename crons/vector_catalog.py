@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Vector Catalog Reconcile — cron-friendly script.
+
+Rebuilds the source catalog (`restai/vectordb/catalog.py`) of RAG projects
+from a full scan of their vector store, healing the drift a failed catalog
+write leaves behind. Listings never rescan on a count mismatch — mid-ingest
+the catalog legitimately trails the store — so this is where drift heals.
+
+Each project is due once per RECONCILE_INTERVAL_MINUTES, in a slot picked
+by its id, so the scans are spread over the interval instead of all landing
+on one tick. On a due tick, exact-count backends are only rescanned when
+their chunk totals disagree; backends whose count lags writes (Pinecone)
+are always rescanned.
+
+Usage:
+    uv run python crons/vector_catalog.py                # due projects
+    uv run python crons/vector_catalog.py 12 34          # these projects, now
+"""
+
+import logging
+import sys
+import time
+import traceback
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger("restai.vector_catalog_cron")
+
+from restai import config  # noqa: F401  — side effect: env loaded
+from restai.settings import ensure_settings_table
+from restai.database import open_db_wrapper, engine as db_engine
+from restai.brain import Brain
+from restai.observability.cron_log import CronLogger
+from restai.models.databasemodels import ProjectDatabase
+
+
+RECONCILE_INTERVAL_MINUTES = 24 * 60
+
+
+def _is_due(project_id: int, now: float) -> bool:
+    minute = int(now // 60)
+    return project_id % RECONCILE_INTERVAL_MINUTES == minute % RECONCILE_INTERVAL_MINUTES
+
+
+def _reconcile_project(brain: Brain, project_id: int, force: bool) -> bool:
+    """Reconcile one project's catalog. Returns whether it was rebuilt."""
+    db = open_db_wrapper()
+    try:
+        project = brain.find_project(project_id, db)
+    finally:
+        db.db.close()
+    if project is None or project.vector is None:
+        return False
+    vector = project.vector
+    if not force and vector.exact_count and not vector.catalog_drifted():
+        return False
+    vector.reconcile_catalog()
+    return True
+
+
+def _run(project_ids: list[int]):
+    ensure_settings_table(db_engine)
+
+    cron = CronLogger("vector_catalog")
+    brain = Brain(lightweight=True)
+    force = bool(project_ids)
+
+    try:
+        if not force:
+            db = open_db_wrapper()
+            try:
+                rows = db.db.query(ProjectDatabase.id).filter(ProjectDatabase.type == "rag").all()
+            finally:
+                db.db.close()
+            now = time.time()
+            project_ids = [row.id for row in rows if _is_due(row.id, now)]
+
+        rebuilt = 0
+        for project_id in project_ids:
+            t0 = time.monotonic()
+            try:
+                if _reconcile_project(brain, project_id, force):
+                    rebuilt += 1
+                    logger.info(
+                        "vector_catalog: project=%s — catalog rebuilt in %.1fs",
+                        project_id, time.monotonic() - t0,
+                    )
+            except Exception as e:
+                logger.warning("vector_catalog: project=%s reconcile crashed: %s", project_id, e)
+
+        if project_ids:
+            cron.info(f"Rebuilt {rebuilt} of {len(project_ids)} due catalog(s).")
+        cron.finish(items_processed=rebuilt)
+    except Exception as e:
+        cron.error(f"Vector catalog reconcile crashed: {e}", details=traceback.format_exc())
+        cron.finish()
+
+
+def main():
+    _run([int(arg) for arg in sys.argv[1:]])
+
+
+if __name__ == "__main__":
+    main()
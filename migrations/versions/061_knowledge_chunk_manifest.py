@@ -0,0 +1,42 @@
+"""Chunk manifest for incremental knowledge sync.
+
+One row per chunk a sync source wrote to a project's vector store, keyed by
+(project_id, source) with the chunk's content hash and vector id, so a re-sync
+embeds only changed chunks and deletes only removed ones. A brand-new table,
+so the FK is inline in CREATE TABLE. Guarded with has_table for idempotency.
+"""
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = "061"
+down_revision = "060"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    if not insp.has_table("knowledge_chunk_manifest"):
+        op.create_table(
+            "knowledge_chunk_manifest",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("source", sa.String(500), nullable=False),
+            sa.Column("content_hash", sa.String(64), nullable=False),
+            sa.Column("vector_id", sa.String(255), nullable=False),
+            sa.Column("embedding", sa.String(255), nullable=True),
+            sa.Column("fingerprint", sa.String(255), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_knowledge_chunk_manifest_id", "knowledge_chunk_manifest", ["id"])
+        op.create_index("ix_knowledge_chunk_manifest_project_id", "knowledge_chunk_manifest", ["project_id"])
+        op.create_index("ix_knowledge_chunk_manifest_source", "knowledge_chunk_manifest", ["source"])
+
+
+def downgrade():
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    if insp.has_table("knowledge_chunk_manifest"):
+        op.drop_table("knowledge_chunk_manifest")
@@ -0,0 +1,107 @@
+"""Unique keys on the knowledge-graph tables.
+
+Migration 026 declared uq_kg_entities_project_norm_type,
+uq_kg_mentions_entity_source and uq_kg_rel_project_from_to, but the ORM
+models didn't, so databases created through `create_all` never got them.
+Extraction now upserts against these keys. For each table still missing
+its key, duplicate rows are first folded into the lowest id (counts and
+weights summed, references repointed), then the key is added as a unique
+index. Edges are stored as from < to, so before theirs are folded,
+self-edges (left behind when both ends folded into one entity) are dropped
+and reversed ones are flipped. Guarded by the inspector, so installs that already have it are left
+alone.
+"""
+from collections import defaultdict
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = "062"
+down_revision = "061"
+branch_labels = None
+depends_on = None
+
+KEYS = (
+    ("kg_entities", "uq_kg_entities_project_norm_type", ("project_id", "normalized", "entity_type"), "mention_count"),
+    ("kg_entity_mentions", "uq_kg_mentions_entity_source", ("entity_id", "source"), "mention_count"),
+    ("kg_entity_relationships", "uq_kg_rel_project_from_to", ("project_id", "from_entity_id", "to_entity_id"), "weight"),
+)
+
+
+def _has_key(insp, table, columns):
+    keys = [c["column_names"] for c in insp.get_unique_constraints(table)]
+    keys += [i["column_names"] for i in insp.get_indexes(table) if i.get("unique")]
+    return any(sorted(k) == sorted(columns) for k in keys)
+
+
+def _duplicates(bind, table, columns, counter):
+    """{kept id: [duplicate ids]} plus the summed counter per kept id."""
+    t = sa.table(table, sa.column("id"), sa.column(counter), *(sa.column(c) for c in columns))
+    groups = defaultdict(list)
+    for row in bind.execute(sa.select(t.c.id, t.c[counter], *(t.c[c] for c in columns)).order_by(t.c.id)):
+        groups[tuple(row[2:])].append((row[0], row[1] or 0))
+    dupes, totals = {}, {}
+    for rows in groups.values():
+        if len(rows) > 1:
+            dupes[rows[0][0]] = [r[0] for r in rows[1:]]
+            totals[rows[0][0]] = sum(r[1] for r in rows)
+    return t, dupes, totals
+
+
+def _normalize_edges(bind):
+    """Drop self-edges and flip reversed ones to from < to, so the fold
+    sees every copy of an undirected edge as the same key."""
+    t = sa.table("kg_entity_relationships", sa.column("id"), sa.column("from_entity_id"), sa.column("to_entity_id"))
+    bind.execute(t.delete().where(t.c.from_entity_id == t.c.to_entity_id))
+    reversed_ = bind.execute(
+        sa.select(t.c.id, t.c.from_entity_id, t.c.to_entity_id).where(t.c.from_entity_id > t.c.to_entity_id)
+    ).all()
+    if reversed_:
+        # Explicit values, not `SET from = to, to = from`: MySQL applies
+        # the assignments in order and would write the same id twice.
+        bind.execute(
+            t.update().where(t.c.id == sa.bindparam("_id")).values(
+                from_entity_id=sa.bindparam("_from"), to_entity_id=sa.bindparam("_to"),
+            ),
+            [{"_id": row_id, "_from": b, "_to": a} for row_id, a, b in reversed_],
+        )
+
+
+def _fold(bind, table, columns, counter):
+    if table == "kg_entity_relationships":
+        _normalize_edges(bind)
+    t, dupes, totals = _duplicates(bind, table, columns, counter)
+    if not dupes:
+        return
+    if table == "kg_entities":
+        # Point mentions and edges at the kept entity first; the mention and
+        # edge passes that follow fold the duplicates this creates.
+        mentions = sa.table("kg_entity_mentions", sa.column("entity_id"))
+        edges = sa.table("kg_entity_relationships", sa.column("from_entity_id"), sa.column("to_entity_id"))
+        for keep, drop in dupes.items():
+            bind.execute(mentions.update().where(mentions.c.entity_id.in_(drop)).values(entity_id=keep))
+            bind.execute(edges.update().where(edges.c.from_entity_id.in_(drop)).values(from_entity_id=keep))
+            bind.execute(edges.update().where(edges.c.to_entity_id.in_(drop)).values(to_entity_id=keep))
+    for keep, drop in dupes.items():
+        bind.execute(t.update().where(t.c.id == keep).values({counter: totals[keep]}))
+        bind.execute(t.delete().where(t.c.id.in_(drop)))
+
+
+def upgrade():
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    # Entities first: folding them can duplicate mentions and edges.
+    for table, name, columns, counter in KEYS:
+        if not insp.has_table(table) or _has_key(insp, table, columns):
+            continue
+        _fold(bind, table, columns, counter)
+        op.create_index(name, table, list(columns), unique=True)
+
+
+def downgrade():
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    for table, name, _, _ in KEYS:
+        if insp.has_table(table) and name in {i["name"] for i in insp.get_indexes(table)}:
+            op.drop_index(name, table_name=table)
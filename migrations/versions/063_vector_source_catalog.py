@@ -0,0 +1,55 @@
+"""Source catalog for project vector stores.
+
+`vector_catalog_sources` keeps one row per (project_id, source) with its
+chunk count and first/last ingest time; `vector_catalog_chunks` keeps the
+vector id and source of every chunk. Source listings and per-source counts
+read these instead of scanning the vector store. Both tables start empty —
+each project's catalog is backfilled from its vector store the first time
+it is listed. Brand-new tables, guarded with has_table for idempotency.
+"""
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = "063"
+down_revision = "062"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    if not insp.has_table("vector_catalog_sources"):
+        op.create_table(
+            "vector_catalog_sources",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("source", sa.String(500), nullable=False),
+            sa.Column("chunk_count", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+            sa.UniqueConstraint("project_id", "source", name="uq_vector_catalog_sources_project_source"),
+        )
+        op.create_index("ix_vector_catalog_sources_id", "vector_catalog_sources", ["id"])
+        op.create_index("ix_vector_catalog_sources_project_id", "vector_catalog_sources", ["project_id"])
+    if not insp.has_table("vector_catalog_chunks"):
+        op.create_table(
+            "vector_catalog_chunks",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("project_id", sa.Integer(), sa.ForeignKey("projects.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("vector_id", sa.String(255), nullable=False),
+            sa.Column("source", sa.String(500), nullable=False),
+            sa.UniqueConstraint("project_id", "vector_id", name="uq_vector_catalog_chunks_project_vector"),
+        )
+        op.create_index("ix_vector_catalog_chunks_id", "vector_catalog_chunks", ["id"])
+        op.create_index("ix_vector_catalog_chunks_project_source", "vector_catalog_chunks", ["project_id", "source"])
+
+
+def downgrade():
+    bind = op.get_bind()
+    insp = sa.inspect(bind)
+    if insp.has_table("vector_catalog_chunks"):
+        op.drop_table("vector_catalog_chunks")
+    if insp.has_table("vector_catalog_sources"):
+        op.drop_table("vector_catalog_sources")
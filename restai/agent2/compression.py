@@ -77,6 +77,11 @@ PER_IMAGE_BLOCK_TOKENS = 1024  # conservative — providers vary widely
 
 
 def _count_message_tokens(msg: Message) -> int:
+    """Token estimate of one message, computed once and memoized on
+    `msg.tokens` (which also survives session serialization), so the
+    pre-turn budget check only tokenizes messages it hasn't seen."""
+    if msg.tokens is not None:
+        return msg.tokens
     total = PER_MESSAGE_OVERHEAD_TOKENS
     for block in msg.content:
         if isinstance(block, TextBlock):
@@ -94,6 +99,7 @@ def _count_message_tokens(msg: Message) -> int:
         elif isinstance(block, ToolResultBlock):
             total += PER_TOOL_RESULT_OVERHEAD_TOKENS
             total += _encode_len(block.content or "")
+    msg.tokens = total
     return total
 
 
@@ -102,6 +108,15 @@ def count_session_tokens(messages: Sequence[Message]) -> int:
     return sum(_count_message_tokens(m) for m in messages)
 
 
+def _suffix_tokens(messages: Sequence[Message]) -> list[int]:
+    """`out[i]` = tokens of `messages[i:]`; one pass instead of re-summing
+    every candidate suffix."""
+    out = [0] * (len(messages) + 1)
+    for i in range(len(messages) - 1, -1, -1):
+        out[i] = out[i + 1] + _count_message_tokens(messages[i])
+    return out
+
+
 def _is_pure_user_message(msg: Message) -> bool:
     """Turn-starting message: user role with only TextBlocks (no ToolResultBlocks).
 
@@ -154,9 +169,10 @@ def split_for_compression(
         safe = find_safe_split_points(messages)
         if not safe:
             return [], list(messages)
+        suffix = _suffix_tokens(messages)
         # Walk oldest-first so the FIRST suffix that fits is the LARGEST.
         for keep_start in safe:
-            if count_session_tokens(list(messages[keep_start:])) <= target_tokens:
+            if suffix[keep_start] <= target_tokens:
                 if keep_start == 0:
                     return [], list(messages)
                 return list(messages[:keep_start]), list(messages[keep_start:])
@@ -295,10 +311,10 @@ def hard_truncate(
     if not boundaries:
         return list(messages)
 
+    suffix = _suffix_tokens(messages)
     for keep_start in boundaries:
-        candidate = list(messages[keep_start:])
-        if count_session_tokens(candidate) <= target_tokens:
-            return candidate
+        if suffix[keep_start] <= target_tokens:
+            return list(messages[keep_start:])
 
     # Every suffix over budget — return the smallest. Provider will surface
     # a clear error and the user can shrink input.
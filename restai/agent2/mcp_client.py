@@ -1,4 +1,5 @@
-"""MCP integration for agent2 via raw `mcp` SDK; sessions kept alive via AsyncExitStack."""
+"""MCP integration for agent2 via raw `mcp` SDK; sessions kept alive via AsyncExitStack,
+or leased from the per-worker `mcp_connections` pool when the caller names a project."""
 from __future__ import annotations
 
 import contextlib
@@ -31,18 +32,81 @@ def _parse_allowed_tools(csv: Optional[str]) -> Optional[set[str]]:
     return parts or None
 
 
+async def _enter_http_session(stack: contextlib.AsyncExitStack, url: str, headers: Optional[dict],
+                              message_handler=None):
+    """Try streamable HTTP first (newer transport), fall back to SSE."""
+    from mcp.client.session import ClientSession
+
+    session_kwargs = {"message_handler": message_handler} if message_handler else {}
+    try:
+        from mcp.client.streamable_http import streamablehttp_client
+
+        ctx = streamablehttp_client(url, headers=headers or None)
+        transport = await stack.enter_async_context(ctx)
+        # streamablehttp_client yields (read, write) or (read, write, get_session_id)
+        read, write = transport[0], transport[1]
+        session = await stack.enter_async_context(ClientSession(read, write, **session_kwargs))
+        await session.initialize()
+        return session
+    except Exception as http_err:
+        logger.debug("streamable HTTP failed for %s, trying SSE: %s", url, http_err)
+
+    from mcp.client.sse import sse_client
+
+    ctx = sse_client(url, headers=headers or None)
+    read, write = await stack.enter_async_context(ctx)
+    session = await stack.enter_async_context(ClientSession(read, write, **session_kwargs))
+    await session.initialize()
+    return session
+
+
+async def _enter_stdio_session(stack: contextlib.AsyncExitStack, command: str, args: list,
+                               env: Optional[dict], message_handler=None):
+    from mcp.client.session import ClientSession
+    from mcp.client.stdio import StdioServerParameters, stdio_client
+
+    session_kwargs = {"message_handler": message_handler} if message_handler else {}
+    params = StdioServerParameters(command=command, args=list(args or []), env=env)
+    ctx = stdio_client(params)
+    read, write = await stack.enter_async_context(ctx)
+    session = await stack.enter_async_context(ClientSession(read, write, **session_kwargs))
+    await session.initialize()
+    return session
+
+
+async def open_session(stack: contextlib.AsyncExitStack, spec: dict, message_handler=None):
+    """Open the session described by a `server_spec` on `stack`. The caller
+    has already vetted the host (SSRF) and the stdio arguments."""
+    host = spec["host"]
+    if _is_http_host(host):
+        return await _enter_http_session(stack, host, spec.get("headers"), message_handler)
+    return await _enter_stdio_session(stack, host, spec.get("args"), spec.get("env"), message_handler)
+
+
 class MCPSessionPool:
-    """Async context manager holding MCP sessions open for one agent2 run."""
+    """Async context manager holding MCP sessions open for one agent2 run.
+
+    With a `project_id`, sessions are leased from the shared `mcp_connections`
+    pool (`restai/agent2/mcp_connections.py`) and stay open after the run;
+    servers the pool can't take are opened for this run only, as without one.
+    """
 
-    def __init__(self) -> None:
+    def __init__(self, project_id: Optional[int] = None) -> None:
         self._stack = contextlib.AsyncExitStack()
         self._sessions: list = []
+        self._project_id = project_id
+        self._leases: list = []
 
     async def __aenter__(self) -> "MCPSessionPool":
         await self._stack.__aenter__()
         return self
 
     async def __aexit__(self, exc_type, exc, tb) -> None:
+        if self._leases:
+            from restai.agent2.mcp_connections import mcp_connections
+            for conn in self._leases:
+                mcp_connections.release(conn)
+            self._leases = []
         try:
             await self._stack.__aexit__(exc_type, exc, tb)
         except Exception as e:
@@ -50,6 +114,11 @@ class MCPSessionPool:
 
     async def connect_servers(self, servers: Iterable[Any]) -> list[AdaptedTool]:
         """Connect to MCP servers; individual failures logged but never abort the run."""
+        shared = None
+        if self._project_id is not None:
+            from restai.agent2.mcp_connections import mcp_connections
+            shared = mcp_connections if mcp_connections.enabled else None
+
         adapted: list[AdaptedTool] = []
         for srv in servers or []:
             host = getattr(srv, "host", None)
@@ -68,9 +137,18 @@ class MCPSessionPool:
                     if is_blocked_network_host(host):
                         logger.warning("Blocked MCP host '%s' resolving to a private/internal address (SSRF)", host)
                         continue
-                    session = await self._open_http_session(host, headers)
                 else:
                     _validate_stdio_args(args)
+                conn = None
+                if shared is not None:
+                    from restai.agent2.mcp_connections import server_spec
+                    conn = await shared.lease(server_spec(srv), self._project_id)
+                if conn is not None:
+                    self._leases.append(conn)
+                    session = conn
+                elif _is_http_host(host):
+                    session = await self._open_http_session(host, headers)
+                else:
                     session = await self._open_stdio_session(host, args, env)
             except Exception as e:
                 logger.warning("Failed to open MCP session for '%s': %s", host, e)
@@ -87,41 +165,12 @@ class MCPSessionPool:
         return adapted
 
     async def _open_http_session(self, url: str, headers: Optional[dict]):
-        """Try streamable HTTP first (newer transport), fall back to SSE."""
-        from mcp.client.session import ClientSession
-
-        try:
-            from mcp.client.streamable_http import streamablehttp_client
-
-            ctx = streamablehttp_client(url, headers=headers or None)
-            transport = await self._stack.enter_async_context(ctx)
-            # streamablehttp_client yields (read, write) or (read, write, get_session_id)
-            read, write = transport[0], transport[1]
-            session = await self._stack.enter_async_context(ClientSession(read, write))
-            await session.initialize()
-            self._sessions.append(session)
-            return session
-        except Exception as http_err:
-            logger.debug("streamable HTTP failed for %s, trying SSE: %s", url, http_err)
-
-        from mcp.client.sse import sse_client
-
-        ctx = sse_client(url, headers=headers or None)
-        read, write = await self._stack.enter_async_context(ctx)
-        session = await self._stack.enter_async_context(ClientSession(read, write))
-        await session.initialize()
+        session = await _enter_http_session(self._stack, url, headers)
         self._sessions.append(session)
         return session
 
     async def _open_stdio_session(self, command: str, args: list, env: Optional[dict]):
-        from mcp.client.session import ClientSession
-        from mcp.client.stdio import StdioServerParameters, stdio_client
-
-        params = StdioServerParameters(command=command, args=list(args or []), env=env)
-        ctx = stdio_client(params)
-        read, write = await self._stack.enter_async_context(ctx)
-        session = await self._stack.enter_async_context(ClientSession(read, write))
-        await session.initialize()
+        session = await _enter_stdio_session(self._stack, command, args, env)
         self._sessions.append(session)
         return session
 
@@ -0,0 +1,321 @@
+"""Long-lived MCP sessions shared across agent turns.
+
+`MCPSessionPool` used to spawn every stdio server / open every HTTP session
+and re-run `list_tools` at the start of each turn, then tear it all down at
+the end — hundreds of ms to seconds per message for an agent wired to a few
+servers. `mcp_connections.lease(spec, project_id)` instead hands out one
+session per (server config hash, project) and event loop, kept open between
+turns:
+
+- each session lives in its own owner task, so the transport's cancel
+  scopes are entered and exited in the same task no matter which request
+  opened it;
+- a session idle for `MCP_HEALTH_CHECK_SECONDS` is pinged before reuse and
+  reopened if it doesn't answer; one idle for `MCP_SESSION_IDLE_TTL` is
+  closed on the next lease;
+- a server that fails to connect is skipped for an exponentially growing
+  backoff (capped at `MCP_RECONNECT_BACKOFF_MAX`) instead of stalling every
+  turn;
+- the tool listing is cached per session and re-fetched after the server
+  sends `notifications/tools/list_changed`;
+- at most `MCP_POOL_MAX_SESSIONS` sessions stay open per worker; past that
+  the least recently used idle one is closed, and when none is idle `lease`
+  returns None and the caller opens a per-turn session as before.
+
+Sessions are per event loop, like `restai/utils/upstream_pool.py`: an MCP
+session can't be used from another loop. When a loop ends (`asyncio.run` in
+a thread) its owner tasks are cancelled and close their sessions. `stats()`
+is served at `GET /statistics/mcp`.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Optional
+
+from restai import config
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a session to open, answer a health ping, or close.
+_CONNECT_TIMEOUT = 30.0
+_PING_TIMEOUT = 5.0
+_CLOSE_TIMEOUT = 5.0
+# First reconnect backoff; doubles per consecutive failure.
+_BACKOFF_BASE = 1.0
+
+
+def config_key(spec: dict, project_id: Optional[int]) -> str:
+    """Stable key of a server config for one project. Hashed, so env and
+    header secrets never end up in logs or stats."""
+    raw = json.dumps(spec, sort_keys=True, default=str)
+    return f"{project_id}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]}"
+
+
+class MCPBackoff(RuntimeError):
+    """The server failed recently and is skipped until its backoff ends."""
+
+
+class _Connection:
+    """One MCP session, held open by an owner task until `close()`."""
+
+    def __init__(self, key: str, spec: dict):
+        self.key = key
+        self.spec = spec
+        self.session = None
+        self.tools = None  # cached `list_tools` result; None = (re)fetch
+        self.leases = 0
+        self.last_used = time.monotonic()
+        self.last_checked = self.last_used
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._error: Optional[BaseException] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def closed(self) -> bool:
+        return self._task is None or self._task.done() or self.session is None
+
+    async def open(self) -> None:
+        self._task = asyncio.create_task(self._own(), name=f"mcp-{self.key}")
+        try:
+            await asyncio.wait_for(self._ready.wait(), _CONNECT_TIMEOUT)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise RuntimeError(f"MCP session did not open within {_CONNECT_TIMEOUT:.0f}s")
+        if self._error is not None:
+            raise self._error
+
+    async def _own(self) -> None:
+        from restai.agent2.mcp_client import open_session
+
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                self.session = await open_session(stack, self.spec, message_handler=self._on_message)
+                self._ready.set()
+                await self._closing.wait()
+        except BaseException as e:
+            if not self._ready.is_set():
+                self._error = e if isinstance(e, Exception) else RuntimeError(str(e) or type(e).__name__)
+            elif not self._closing.is_set():
+                logger.info("MCP session %s ended: %s", self.key, e)
+            if isinstance(e, asyncio.CancelledError) and not self._closing.is_set():
+                raise
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def _on_message(self, message) -> None:
+        method = getattr(getattr(message, "root", None), "method", None)
+        if method == "notifications/tools/list_changed":
+            self.tools = None
+            mcp_connections._count("tool_list_refreshes")
+
+    async def list_tools(self):
+        if self.tools is None:
+            self.tools = await self.session.list_tools()
+        return self.tools
+
+    async def call_tool(self, name: str, arguments: dict):
+        session = self.session
+        if session is None:
+            raise RuntimeError("MCP session closed; it is reopened on the next message")
+        self.last_used = time.monotonic()
+        return await session.call_tool(name, arguments)
+
+    async def ping(self) -> bool:
+        try:
+            await asyncio.wait_for(self.session.send_ping(), _PING_TIMEOUT)
+        except Exception:
+            return False
+        self.last_checked = time.monotonic()
+        return True
+
+    async def close(self) -> None:
+        self._closing.set()
+        task = self._task
+        if task is None or task.done() or task is asyncio.current_task():
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(task), _CLOSE_TIMEOUT)
+        except Exception:
+            task.cancel()
+
+
+class MCPConnectionManager:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (key, loop) -> _Connection
+        self._conns: dict = {}
+        # (key, loop) -> asyncio.Lock serialising opens of one server
+        self._opening: dict = {}
+        # key -> (consecutive failures, monotonic time of the next attempt)
+        self._backoff: dict[str, tuple[int, float]] = {}
+        self._counters = {
+            "connects": 0, "reuses": 0, "reconnects": 0, "connect_failures": 0, "backoff_skips": 0,
+            "health_failures": 0, "idle_closed": 0, "evicted": 0, "overflow": 0, "tool_list_refreshes": 0,
+        }
+        self._connect_ms = deque(maxlen=200)
+
+    @property
+    def enabled(self) -> bool:
+        return config.MCP_POOL_MAX_SESSIONS > 0
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += n
+
+    async def lease(self, spec: dict, project_id: Optional[int]) -> Optional[_Connection]:
+        """A live session for `spec` on the running loop, opened if needed.
+        Returns None when the pool is full of sessions in use; raises
+        `MCPBackoff` while the server is backing off and the connect error
+        when opening fails. Pair with `release()`."""
+        loop = asyncio.get_running_loop()
+        key = config_key(spec, project_id)
+        await self._sweep(loop)
+        with self._lock:
+            opening = self._opening.get((key, loop))
+            if opening is None:
+                opening = self._opening[(key, loop)] = asyncio.Lock()
+        async with opening:
+            conn = self._conns.get((key, loop))
+            if conn is not None and not await self._healthy(conn):
+                self._count("health_failures")
+                await self._drop((key, loop))
+                conn = None
+            if conn is None:
+                conn = await self._connect(key, loop, spec, reconnect=key in self._backoff)
+                if conn is None:
+                    return None
+            else:
+                self._count("reuses")
+            conn.leases += 1
+            conn.last_used = time.monotonic()
+            return conn
+
+    def release(self, conn: _Connection) -> None:
+        conn.leases = max(0, conn.leases - 1)
+        conn.last_used = time.monotonic()
+
+    async def _healthy(self, conn: _Connection) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.last_checked < config.MCP_HEALTH_CHECK_SECONDS:
+            return True
+        return await conn.ping()
+
+    async def _connect(self, key: str, loop, spec: dict, reconnect: bool) -> Optional[_Connection]:
+        failures, retry_at = self._backoff.get(key, (0, 0.0))
+        if time.monotonic() < retry_at:
+            self._count("backoff_skips")
+            raise MCPBackoff(f"retrying in {retry_at - time.monotonic():.0f}s after {failures} failure(s)")
+        if not await self._make_room(loop):
+            self._count("overflow")
+            return None
+        conn = _Connection(key, spec)
+        started = time.perf_counter()
+        try:
+            await conn.open()
+        except Exception:
+            delay = min(config.MCP_RECONNECT_BACKOFF_MAX, _BACKOFF_BASE * 2 ** failures)
+            self._backoff[key] = (failures + 1, time.monotonic() + delay)
+            self._count("connect_failures")
+            raise
+        with self._lock:
+            self._backoff.pop(key, None)
+            self._conns[(key, loop)] = conn
+            self._counters["connects"] += 1
+            if reconnect:
+                self._counters["reconnects"] += 1
+            self._connect_ms.append((time.perf_counter() - started) * 1000)
+        return conn
+
+    async def _make_room(self, loop) -> bool:
+        """Close the least recently used idle session of this loop when the
+        pool is full. False when there is none to close."""
+        with self._lock:
+            if len(self._conns) < config.MCP_POOL_MAX_SESSIONS:
+                return True
+            idle = [(c.last_used, k) for k, c in self._conns.items() if c.leases == 0 and k[1] is loop]
+            if not idle:
+                return False
+            victim = min(idle)[1]
+            conn = self._conns.pop(victim)
+            self._counters["evicted"] += 1
+        await conn.close()
+        return True
+
+    async def _drop(self, conn_key) -> None:
+        with self._lock:
+            conn = self._conns.pop(conn_key, None)
+        if conn is not None:
+            # Reopening it right away counts as a reconnect.
+            self._backoff.setdefault(conn_key[0], (0, 0.0))
+            await conn.close()
+
+    async def _sweep(self, loop) -> None:
+        """Forget sessions of finished loops and close this loop's idle
+        ones."""
+        now = time.monotonic()
+        stale = []
+        with self._lock:
+            for conn_key, conn in list(self._conns.items()):
+                if conn_key[1].is_closed():
+                    del self._conns[conn_key]
+                    self._opening.pop(conn_key, None)
+                elif conn_key[1] is loop and conn.leases == 0 and (
+                    conn.closed or now - conn.last_used > config.MCP_SESSION_IDLE_TTL
+                ):
+                    stale.append(self._conns.pop(conn_key))
+                    self._counters["idle_closed"] += 1
+        for conn in stale:
+            await conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            connects = sorted(self._connect_ms)
+            leases = self._counters["connects"] + self._counters["reuses"]
+            return {
+                "enabled": self.enabled,
+                "open_sessions": len(self._conns),
+                "in_use": sum(1 for c in self._conns.values() if c.leases),
+                "max_sessions": config.MCP_POOL_MAX_SESSIONS,
+                "backing_off": sum(1 for _, at in self._backoff.values() if at > time.monotonic()),
+                "reuse_rate": round(self._counters["reuses"] / leases, 3) if leases else None,
+                "connect_ms_p50": round(connects[len(connects) // 2], 1) if connects else None,
+                "connect_ms_max": round(connects[-1], 1) if connects else None,
+                **self._counters,
+            }
+
+    async def aclose(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """Close the sessions bound to `loop` (default: the running one)."""
+        loop = loop or asyncio.get_running_loop()
+        with self._lock:
+            mine = [k for k in self._conns if k[1] is loop]
+            conns = [self._conns.pop(k) for k in mine]
+            for k in mine:
+                self._opening.pop(k, None)
+        for conn in conns:
+            try:
+                await conn.close()
+            except Exception as e:
+                logger.debug("MCP pool: close failed: %s", e)
+
+
+mcp_connections = MCPConnectionManager()
+
+
+def server_spec(srv: Any) -> dict:
+    """The connection-relevant part of an MCP server config."""
+    return {
+        "host": getattr(srv, "host", None),
+        "args": list(getattr(srv, "args", None) or []),
+        "env": getattr(srv, "env", None) or None,
+        "headers": getattr(srv, "headers", None) or None,
+    }
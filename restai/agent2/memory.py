@@ -1,15 +1,44 @@
-"""Session store for agent2 — Redis when configured, in-memory LRU otherwise."""
+"""Session store for agent2 — Redis when configured, in-memory LRU otherwise.
+
+Sessions only grow between compressions, so they are stored append-only:
+
+- in Redis, each chat has a list of JSON-encoded messages under a
+  *generation* (`agent2_session:{chat}:log:{gen}`) and a pointer to the
+  current one (`agent2_session:{chat}:gen`). A save RPUSHes just the
+  messages added since the session was loaded or last saved; when the
+  already-stored prefix changed (`compress_session` replaced the history, or
+  another worker wrote the same chat concurrently) the whole session is
+  written under a fresh generation and the pointer swapped in one
+  transaction. The generation is the compaction marker: a reader never sees
+  a half-rewritten log, and the previous one lingers for
+  `_OLD_LOG_GRACE_SECONDS` so in-flight readers can finish;
+- image payloads of more than `_INLINE_IMAGE_MAX` characters are stored once
+  per content hash (`agent2_image:{sha256}`) and referenced from the log, so
+  a screenshot isn't re-sent every turn;
+- each worker keeps the decoded messages of recently used chats
+  (`DECODED_CACHE_CAP`). When the generation is unchanged, `get_session`
+  only fetches and decodes the log entries past the cached prefix.
+
+Prefix tracking relies on messages never being edited in place once in a
+session — the runtime appends, and compression builds new `Message`s. The
+single-key JSON blob written by older versions is still read, and replaced
+by the list layout on the next save.
+"""
 from __future__ import annotations
 
+import hashlib
 import json
 import logging
 import os
+import uuid
 from collections import OrderedDict
+from dataclasses import dataclass, field
 from typing import Any, Optional
 
 from restai import config
 
-from .types import AgentSession, message_from_dict, message_to_dict
+from .compression import count_session_tokens
+from .types import AgentSession, Message, message_from_dict, message_to_dict
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +49,33 @@ DEFAULT_SESSION_TTL_SECONDS = int(
 # Cap in-memory fallback to bound chat_id cardinality leaks without Redis.
 LOCAL_SESSION_CAP = int(os.environ.get("AGENT2_LOCAL_SESSION_CAP") or 500)
 
+# Chats whose decoded messages each worker keeps to skip re-reading them.
+DECODED_CACHE_CAP = int(os.environ.get("AGENT2_DECODED_CACHE_CAP") or 200)
+
 REDIS_KEY_PREFIX = "agent2_session:"
+REDIS_IMAGE_PREFIX = "agent2_image:"
+
+# Base64 image payloads longer than this go to their own key.
+_INLINE_IMAGE_MAX = 4096
+# How long a replaced generation stays readable.
+_OLD_LOG_GRACE_SECONDS = 60
+# Generation of sessions held by the in-memory fallback.
+_LOCAL = "local"
+_MISSING_IMAGE = {"type": "text", "text": "[image no longer available]"}
+
+
+@dataclass
+class _Persisted:
+    """What the store holds for a session: `messages` (the same objects) are
+    stored under `generation`, referencing the `images` hashes."""
+
+    generation: str
+    messages: tuple
+    images: frozenset = field(default_factory=frozenset)
+
+    def prefix_of(self, messages: list) -> bool:
+        n = len(self.messages)
+        return len(messages) >= n and all(a is b for a, b in zip(messages, self.messages))
 
 
 def _ensure_local_store(brain: Any) -> "OrderedDict[str, list[dict]]":
@@ -48,6 +103,25 @@ def _local_set(store: OrderedDict, chat_id: str, value: list) -> None:
         store.popitem(last=False)
 
 
+def _decoded_cache(brain: Any) -> "OrderedDict[str, _Persisted]":
+    cache = getattr(brain, "_agent2_decoded", None)
+    if not isinstance(cache, OrderedDict):
+        cache = OrderedDict()
+        try:
+            setattr(brain, "_agent2_decoded", cache)
+        except Exception:
+            pass
+    return cache
+
+
+def _remember(brain: Any, chat_id: str, persisted: _Persisted) -> None:
+    cache = _decoded_cache(brain)
+    cache[chat_id] = persisted
+    cache.move_to_end(chat_id)
+    while len(cache) > DECODED_CACHE_CAP:
+        cache.popitem(last=False)
+
+
 def _get_redis_client(brain: Any):
     """Lazy/cached async Redis client; self-heals when config URL changes."""
     url = config.build_redis_url()
@@ -86,9 +160,135 @@ def _get_redis_client(brain: Any):
 
 
 def _redis_key(chat_id: str) -> str:
+    """The single-key JSON blob of older versions."""
     return f"{REDIS_KEY_PREFIX}{chat_id}"
 
 
+def _gen_key(chat_id: str) -> str:
+    return f"{REDIS_KEY_PREFIX}{chat_id}:gen"
+
+
+def _log_key(chat_id: str, generation: str) -> str:
+    return f"{REDIS_KEY_PREFIX}{chat_id}:log:{generation}"
+
+
+def _image_key(digest: str) -> str:
+    return f"{REDIS_IMAGE_PREFIX}{digest}"
+
+
+def _encode(message: Message, blobs: dict) -> str:
+    """JSON for one log entry; large image payloads are moved into `blobs`
+    (hash -> data) and replaced by a `ref`."""
+    d = message_to_dict(message)
+    for block in d["content"]:
+        if block["type"] == "image" and len(block.get("data") or "") > _INLINE_IMAGE_MAX:
+            digest = hashlib.sha256(block["data"].encode("utf-8")).hexdigest()
+            blobs[digest] = block.pop("data")
+            block["ref"] = digest
+    return json.dumps(d)
+
+
+async def _decode(client, entries: list) -> tuple[list, set]:
+    """Messages of raw log entries, with image refs resolved in one MGET.
+    Also returns the referenced hashes."""
+    dicts = [json.loads(e) for e in entries]
+    refs = sorted({
+        b["ref"] for d in dicts for b in d.get("content", []) if b.get("type") == "image" and "ref" in b
+    })
+    data = dict(zip(refs, await client.mget([_image_key(r) for r in refs]))) if refs else {}
+    for d in dicts:
+        content = d.get("content", [])
+        for i, block in enumerate(content):
+            if block.get("type") == "image" and "ref" in block:
+                if data.get(block["ref"]):
+                    content[i] = {**block, "data": data[block["ref"]]}
+                else:
+                    content[i] = _MISSING_IMAGE
+    return [message_from_dict(d) for d in dicts], set(refs)
+
+
+async def _redis_load(brain: Any, client, chat_id: str) -> Optional[AgentSession]:
+    """The stored session, or None when Redis has nothing for the chat."""
+    cached = _decoded_cache(brain).get(chat_id)
+    if cached is not None:
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.get(_gen_key(chat_id))
+            pipe.llen(_log_key(chat_id, cached.generation))
+            generation, length = await pipe.execute()
+        if generation == cached.generation and length >= len(cached.messages):
+            persisted = cached
+            if length > len(cached.messages):
+                tail, refs = await _decode(client, await client.lrange(
+                    _log_key(chat_id, generation), len(cached.messages), -1
+                ))
+                persisted = _Persisted(generation, cached.messages + tuple(tail), cached.images | refs)
+            _remember(brain, chat_id, persisted)
+            return AgentSession(messages=list(persisted.messages), persisted=persisted)
+    else:
+        generation = await client.get(_gen_key(chat_id))
+
+    if generation:
+        messages, refs = await _decode(client, await client.lrange(_log_key(chat_id, generation), 0, -1))
+        persisted = _Persisted(generation, tuple(messages), frozenset(refs))
+        _remember(brain, chat_id, persisted)
+        return AgentSession(messages=messages, persisted=persisted)
+
+    raw = await client.get(_redis_key(chat_id))
+    if raw:
+        # Saved by an older version; rewritten as a log on the next save.
+        return AgentSession(messages=[message_from_dict(d) for d in json.loads(raw)])
+    return None
+
+
+async def _redis_append(client, chat_id: str, persisted: _Persisted, messages: list) -> Optional[_Persisted]:
+    """RPUSH the messages past `persisted`. None when the stored log moved
+    on underneath us; the caller then rewrites it."""
+    new = messages[len(persisted.messages):]
+    blobs: dict = {}
+    entries = [_encode(m, blobs) for m in new]
+    images = persisted.images | set(blobs)
+    log_key = _log_key(chat_id, persisted.generation)
+    async with client.pipeline(transaction=True) as pipe:
+        pipe.get(_gen_key(chat_id))
+        if entries:
+            pipe.rpush(log_key, *entries)
+        else:
+            pipe.llen(log_key)
+        for digest, data in blobs.items():
+            if digest not in persisted.images:
+                pipe.set(_image_key(digest), data, ex=DEFAULT_SESSION_TTL_SECONDS, nx=True)
+        for digest in images:
+            pipe.expire(_image_key(digest), DEFAULT_SESSION_TTL_SECONDS)
+        pipe.expire(log_key, DEFAULT_SESSION_TTL_SECONDS)
+        pipe.expire(_gen_key(chat_id), DEFAULT_SESSION_TTL_SECONDS)
+        generation, length = (await pipe.execute())[:2]
+    if generation != persisted.generation or length != len(messages):
+        return None
+    return _Persisted(persisted.generation, tuple(messages), frozenset(images))
+
+
+async def _redis_rewrite(client, chat_id: str, messages: list, stale: Optional[str] = None) -> _Persisted:
+    """Write the whole session under a new generation and point at it. The
+    replaced generation, and `stale` (the one this session was loaded from),
+    expire after the grace period."""
+    generation = uuid.uuid4().hex[:16]
+    blobs: dict = {}
+    entries = [_encode(m, blobs) for m in messages]
+    log_key = _log_key(chat_id, generation)
+    async with client.pipeline(transaction=True) as pipe:
+        if entries:
+            pipe.rpush(log_key, *entries)
+            pipe.expire(log_key, DEFAULT_SESSION_TTL_SECONDS)
+        for digest, data in blobs.items():
+            pipe.set(_image_key(digest), data, ex=DEFAULT_SESSION_TTL_SECONDS)
+        pipe.set(_gen_key(chat_id), generation, ex=DEFAULT_SESSION_TTL_SECONDS, get=True)
+        pipe.delete(_redis_key(chat_id))
+        previous = (await pipe.execute())[-2]
+    for old in {previous, stale} - {None, generation}:
+        await client.expire(_log_key(chat_id, old), _OLD_LOG_GRACE_SECONDS)
+    return _Persisted(generation, tuple(messages), frozenset(blobs))
+
+
 async def get_session(brain: Any, chat_id: str) -> AgentSession:
     """Load a session by chat_id, preferring Redis when available."""
     if not chat_id:
@@ -97,11 +297,9 @@ async def get_session(brain: Any, chat_id: str) -> AgentSession:
     client = _get_redis_client(brain)
     if client is not None:
         try:
-            raw = await client.get(_redis_key(chat_id))
-            if raw:
-                payload = json.loads(raw)
-                messages = [message_from_dict(d) for d in payload]
-                return AgentSession(messages=messages)
+            session = await _redis_load(brain, client, chat_id)
+            if session is not None:
+                return session
             # Fall through to local store as safety net if a previous turn
             # was saved before Redis became reachable.
         except Exception as e:
@@ -115,7 +313,7 @@ async def get_session(brain: Any, chat_id: str) -> AgentSession:
         messages = [message_from_dict(d) for d in raw]
     except Exception:
         return AgentSession()
-    return AgentSession(messages=messages)
+    return AgentSession(messages=messages, persisted=_Persisted(_LOCAL, tuple(messages)))
 
 
 async def save_session(brain: Any, chat_id: str, session: AgentSession) -> None:
@@ -123,22 +321,39 @@ async def save_session(brain: Any, chat_id: str, session: AgentSession) -> None:
     if not chat_id:
         return
 
-    serialized = [message_to_dict(m) for m in session.messages]
+    messages = list(session.messages)
+    # Memoize token counts of the new messages so they're stored with them.
+    count_session_tokens(messages)
+    persisted = session.persisted if isinstance(session.persisted, _Persisted) else None
+    if persisted is not None and not persisted.prefix_of(messages):
+        persisted = None
 
     client = _get_redis_client(brain)
     if client is not None:
         try:
-            await client.set(
-                _redis_key(chat_id),
-                json.dumps(serialized),
-                ex=DEFAULT_SESSION_TTL_SECONDS,
-            )
+            saved, stale = None, None
+            if persisted is not None and persisted.generation != _LOCAL:
+                saved = await _redis_append(client, chat_id, persisted, messages)
+                stale = persisted.generation
+            if saved is None:
+                saved = await _redis_rewrite(client, chat_id, messages, stale)
+            session.persisted = saved
+            _remember(brain, chat_id, saved)
             return
         except Exception as e:
             logger.warning("agent2: Redis save_session failed (%s); using in-memory fallback", e)
 
     store = _ensure_local_store(brain)
-    _local_set(store, chat_id, serialized)
+    stored = store.get(chat_id)
+    if (
+        persisted is not None and persisted.generation == _LOCAL
+        and stored is not None and len(stored) == len(persisted.messages)
+    ):
+        stored.extend(message_to_dict(m) for m in messages[len(stored):])
+        _local_set(store, chat_id, stored)
+    else:
+        _local_set(store, chat_id, [message_to_dict(m) for m in messages])
+    session.persisted = _Persisted(_LOCAL, tuple(messages))
 
 
 async def clear_session(brain: Any, chat_id: str) -> None:
@@ -149,10 +364,18 @@ async def clear_session(brain: Any, chat_id: str) -> None:
     client = _get_redis_client(brain)
     if client is not None:
         try:
-            await client.delete(_redis_key(chat_id))
+            generation = await client.get(_gen_key(chat_id))
+            keys = [_redis_key(chat_id), _gen_key(chat_id)]
+            if generation:
+                keys.append(_log_key(chat_id, generation))
+            await client.delete(*keys)
         except Exception as e:
             logger.warning("agent2: Redis clear_session failed (%s)", e)
 
+    decoded = getattr(brain, "_agent2_decoded", None)
+    if decoded and chat_id in decoded:
+        decoded.pop(chat_id, None)
+
     store = getattr(brain, "_agent2_sessions", None)
     if store and chat_id in store:
         try:
@@ -4,7 +4,7 @@ from __future__ import annotations
 
 import base64
 from dataclasses import dataclass, field
-from typing import Literal, Union
+from typing import Literal, Optional, Union
 
 MessageRole = Literal["user", "assistant"]
 
@@ -71,6 +71,9 @@ ContentBlock = Union[TextBlock, ToolUseBlock, ToolResultBlock, ImageBlock]
 class Message:
     role: MessageRole
     content: list
+    # Token estimate memoized by compression._count_message_tokens; a message's
+    # content isn't edited once it is in a session.
+    tokens: Optional[int] = field(default=None, repr=False, compare=False)
 
     def text_content(self) -> str:
         return "\n".join(
@@ -83,6 +86,10 @@ class AgentSession:
     messages: list = field(default_factory=list)
     turn_count: int = 0
     state: dict = field(default_factory=dict)
+    # What the session store already holds for this session, set by
+    # memory.get_session / save_session so the next save appends only the
+    # new messages. Not part of the conversation.
+    persisted: object = field(default=None, repr=False, compare=False)
 
 
 @dataclass
@@ -132,11 +139,15 @@ def block_from_dict(d: dict) -> ContentBlock:
 
 
 def message_to_dict(msg: Message) -> dict:
-    return {"role": msg.role, "content": [block_to_dict(b) for b in msg.content]}
+    d = {"role": msg.role, "content": [block_to_dict(b) for b in msg.content]}
+    if msg.tokens is not None:
+        d["tokens"] = msg.tokens
+    return d
 
 
 def message_from_dict(d: dict) -> Message:
     return Message(
         role=d["role"],
         content=[block_from_dict(b) for b in d.get("content", [])],
+        tokens=d.get("tokens"),
     )
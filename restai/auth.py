@@ -10,6 +10,7 @@ from restai.constants import ERROR_MESSAGES
 from restai.database import get_db_wrapper, verify_password, DBWrapper
 from restai.models.databasemodels import ProjectDatabase
 from restai.models.models import User
+from restai.principal_cache import NEGATIVE, Principal, principal_cache
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -52,11 +53,35 @@ def _resolve_jwt_cookie(
     return validated
 
 
+def _lookup_api_key(token: str, db_wrapper: DBWrapper):
+    """`get_user_by_apikey` behind restai/principal_cache.py: a token seen
+    before is re-read by primary key instead of re-hashed, and one that
+    matched nothing recently is refused outright."""
+    digest = principal_cache.digest(token)
+    cached = principal_cache.get(digest)
+    if cached is NEGATIVE:
+        return None, None
+    if cached is not None:
+        user_db, api_key_row = db_wrapper.get_user_by_principal(cached)
+        if user_db is not None:
+            return user_db, api_key_row
+        principal_cache.discard(digest)
+
+    user_db, api_key_row = db_wrapper.get_user_by_apikey(token)
+    if user_db is None:
+        principal_cache.put_negative(digest)
+    elif api_key_row is not None:
+        principal_cache.put(digest, Principal(user_db.id, api_key_id=api_key_row.id))
+    else:
+        principal_cache.put(digest, Principal(user_db.id, legacy_secret=user_db.api_key))
+    return user_db, api_key_row
+
+
 def _resolve_bearer_token(
     request: Request, token: str, db_wrapper: DBWrapper
 ) -> User:
     """Bearer API key → User, with API-key scope metadata attached."""
-    user_db, api_key_row = db_wrapper.get_user_by_apikey(token)
+    user_db, api_key_row = _lookup_api_key(token, db_wrapper)
     if user_db is None:
         raise HTTPException(status_code=401, detail=ERROR_MESSAGES.INVALID_CRED)
     user = User.model_validate(user_db)
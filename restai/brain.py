@@ -1,3 +1,4 @@
+import builtins
 import json
 import logging
 import traceback
@@ -17,8 +18,8 @@ from llama_index.storage.chat_store.redis import RedisChatStore
 from llama_index.core.storage.chat_store import SimpleChatStore
 from llama_index.core.storage.chat_store.base import BaseChatStore
 import tiktoken
-from llama_index.core import Settings
-from llama_index.core.callbacks import CallbackManager, TokenCountingHandler
+from restai.limits.accounting import TokenUsage, install_token_usage_handler
+from restai.object_cache import object_cache
 import re
 
 
@@ -28,10 +29,9 @@ class Brain:
         self.defaultSystem: str = ""
 
         self.tokenizer = tiktoken.get_encoding("cl100k_base").encode
-        self.token_counter = TokenCountingHandler(tokenizer=self.tokenizer)
-        Settings.callback_manager = CallbackManager([self.token_counter])
+        # Per-request token counts: see restai/limits/accounting.py.
+        install_token_usage_handler(tokenizer=self.tokenizer)
 
-        self.embeddings_cache = {}
         self._classifier_cache = {}
         self._ner_cache = {}
         self._agent2_sessions: dict[str, list[dict]] = {}
@@ -240,14 +240,22 @@ class Brain:
         self._agent2_redis_url = None
 
     def get_llm(self, llmName: str, db: DBWrapper) -> Optional[LLM]:
-        llm: Optional[LLM] = self.load_llm(llmName, db)
-
-        if llm is None:
+        """The row (costs, context window) is read fresh on every call; the
+        client built from it is shared through restai/object_cache.py until
+        its class or options change, so callers must not mutate `llm.llm`."""
+        llm_db = db.get_llm_by_name(llmName)
+        if llm_db is None:
             return None
+        llm_model = LLMModel.model_validate(llm_db)
+
+        def build():
+            client = self._build_llm_client(llm_model)
+            if hasattr(client, "system_prompt"):
+                client.system_prompt = None
+            return client
 
-        if hasattr(llm.llm, "system_prompt"):
-            llm.llm.system_prompt = None
-        return llm
+        fingerprint = (llm_model.class_name, json.dumps(llm_model.options, sort_keys=True, default=str))
+        return LLM(llmName, llm_model, object_cache.get(db, ("llm", llmName), fingerprint, build))
 
     def get_system_llm(self, db: DBWrapper) -> Optional[LLM]:
         """Return the configured internal/housekeeping LLM, or None if not configured.
@@ -293,26 +301,13 @@ class Brain:
             output["reasoning"] = {"output": joined, "steps": thought_steps}
         return output
 
-    def post_processing_counting(self, output):
-        counting_event_found = None
-
-        for i in range(len(self.token_counter.llm_token_counts) - 1, -1, -1):
-            counting_event = self.token_counter.llm_token_counts[i]
-            if (
-                hasattr(counting_event, "prompt")
-                and counting_event.prompt
-                and counting_event.prompt.endswith(output["question"])
-            ):
-                counting_event_found = counting_event
-                break
-
-        if counting_event_found is not None:
-            self.token_counter.llm_token_counts = self.token_counter.llm_token_counts[i+1:]
-            output["tokens"] = {
-                "input": counting_event_found.prompt_token_count,
-                "output": counting_event_found.completion_token_count,
-                "accuracy": "medium",
-            }
+    def post_processing_counting(self, output, usage: Optional[TokenUsage] = None):
+        """Set `output["tokens"]`: the exact counts of the request's LLM calls
+        when its `TokenUsage` counted any, else a tiktoken estimate of the
+        question and answer (paths that made no counted LLM call, e.g. an
+        input-guard block or an LLM outside the callback manager)."""
+        if usage is not None and usage.calls:
+            output["tokens"] = {**usage.as_tokens(), "accuracy": "high"}
         else:
             output["tokens"] = {
                 "input": tools.tokens_from_string(output["question"]),
@@ -326,35 +321,52 @@ class Brain:
 
         if llm_db is not None:
             llm_model = LLMModel.model_validate(llm_db)
-
-            llm_class, llm_default_params = tools.get_llm_class(llm_model.class_name)
-            llm_params = {**(llm_default_params or {}), **llm_model.options}
-            llm = llm_class(**llm_params)
-
-            return LLM(llmName, llm_model, llm)
+            return LLM(llmName, llm_model, Brain._build_llm_client(llm_model))
         else:
             return None
 
+    @staticmethod
+    def _build_llm_client(llm_model: LLMModel):
+        llm_class, llm_default_params = tools.get_llm_class(llm_model.class_name)
+        llm_params = {**(llm_default_params or {}), **llm_model.options}
+        return llm_class(**llm_params)
+
+    @staticmethod
+    def _cached_embedding(name: str, embedding_model: EmbeddingModel, embedding):
+        """Put the vector cache (restai/embedding_cache.py) in front of the
+        provider model, unless it's disabled or the model can't be adapted
+        to a LlamaIndex embedding."""
+        if config.EMBEDDING_CACHE_MB <= 0 and not config.EMBEDDING_CACHE_BACKEND:
+            return embedding
+        try:
+            from llama_index.core.embeddings.utils import resolve_embed_model
+            from restai.embedding_cache import CachedEmbedding, options_hash
+
+            namespace = f"{name}:{options_hash(embedding_model.class_name, embedding_model.options)}"
+            return CachedEmbedding(resolve_embed_model(embedding), namespace)
+        except Exception as e:
+            logging.warning("embedding cache disabled for '%s': %s", name, e)
+            return embedding
+
     def get_embedding(self, embeddingName: str, db: DBWrapper) -> Optional[Embedding]:
         embedding_db = db.get_embedding_by_name(embeddingName)
+        if embedding_db is None:
+            return None
+        embedding_model = EmbeddingModel.model_validate(embedding_db)
 
-        if self.embeddings_cache.get(embeddingName):
-            return self.embeddings_cache[embeddingName]
-        else:
-            if embedding_db is not None:
-                embedding_model = EmbeddingModel.model_validate(embedding_db)
-
-                embedding_class, embedding_default_params = tools.get_embedding_class(
-                    embedding_model.class_name
-                )
-                llm_params = json.loads(embedding_model.options)
-                if embedding_default_params is not None:
-                    llm_params.update(embedding_default_params)
-                embedding = embedding_class(**llm_params)
+        def build():
+            embedding_class, embedding_default_params = tools.get_embedding_class(
+                embedding_model.class_name
+            )
+            llm_params = json.loads(embedding_model.options)
+            if embedding_default_params is not None:
+                llm_params.update(embedding_default_params)
+            embedding = embedding_class(**llm_params)
+            embedding = self._cached_embedding(embeddingName, embedding_model, embedding)
+            return Embedding(embeddingName, embedding_model, embedding)
 
-                embedding_final = Embedding(embeddingName, embedding_model, embedding)
-                self.embeddings_cache[embeddingName] = embedding_final
-                return embedding_final
+        fingerprint = (embedding_model.class_name, embedding_model.options, embedding_model.dimension)
+        return object_cache.get(db, ("embedding", embeddingName), fingerprint, build)
 
     def find_project(self, id: int, db: DBWrapper) -> Optional[Project]:
         p: Optional[ProjectDatabase] = db.get_project_by_id(id)
@@ -370,9 +382,18 @@ class Brain:
         project.props = proj
         if project.props.type == "rag":
             try:
-                project.vector = vector_tools.find_vector_db(project)(
-                    self, project, self.get_embedding(project.props.embeddings, db)
+                embedding = self.get_embedding(project.props.embeddings, db)
+                # Opening the store (collection lookup, index wrapper, pool
+                # checkout) is the expensive part; reuse it until the project's
+                # store or embedding model changes, or the store is reset.
+                # Identity, not ==: Embedding compares by name only, and a
+                # rebuilt model must get a new wrapper. (`id` is shadowed.)
+                fingerprint = (proj.vectorstore, proj.embeddings, builtins.id(embedding))
+                project.vector = object_cache.get(
+                    db, ("vector", proj.id), fingerprint,
+                    lambda: vector_tools.find_vector_db(project)(self, project, embedding),
                 )
+                project.vector.project = project
             except Exception as e:
                 logging.error(e)
                 traceback.print_tb(e.__traceback__)
@@ -1,13 +1,24 @@
 """Stateless per-chat agentic-browser runtime.
 
 Docker daemon is the source of truth for "does this chat have a browser
-container" — looked up by the ``restai.browser_chat_id`` label per call.
-Prior in-memory state drifted between uvicorn workers and made the
-settings-reinit path racy.
+container": a chat's container is named after it (``_container_name``), so
+any worker finds it with one inspect call, and each worker caches the
+chat → (container, port) handle it found. Containers from before the naming
+are still found by their ``restai.browser_chat_id`` label. Prior in-memory
+state drifted between uvicorn workers and made the settings-reinit path
+racy; the handle cache is only a hint, dropped whenever the container stops
+answering.
+
+New chats are served from a per-worker pool of containers that already run
+a health-checked micro-server with its token (``restai/sandbox_pool.py``),
+renamed for the chat on claim exactly like the terminal sandboxes. Calls to
+the micro-server go through one keep-alive ``requests.Session`` per
+container, and activity heartbeats are buffered and flushed periodically.
 """
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import io
 import json
 import logging
@@ -16,12 +27,16 @@ import secrets
 import tarfile
 import threading
 import time
+import uuid
+from collections import OrderedDict
 from typing import Optional
 
 import docker as _docker_sdk
+import docker.errors as _derrors
 import requests
 
 from restai import config as _cfg
+from restai.sandbox_pool import ActivityBuffer, WarmPool
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +53,17 @@ _client: Optional[_docker_sdk.DockerClient] = None
 _client_url: str = ""
 _client_lock = threading.Lock()
 
+# chat_id -> (client, container, host port) this worker last used for the
+# chat, most recently used last. Only trusted while `client` is still the
+# live client.
+_handles: "OrderedDict[str, tuple]" = OrderedDict()
+# container id -> keep-alive session to its micro-server, token header set.
+_sessions: "OrderedDict[str, requests.Session]" = OrderedDict()
+_handles_lock = threading.Lock()
+# Chats whose container the cleanup cron reaps never come back to drop
+# their entries, so past this many the least recently used are evicted.
+_MAX_HANDLES = 1024
+
 _storage_local: dict[str, dict] = {}
 _storage_redis_client = None
 _storage_redis_url: Optional[str] = None
@@ -122,10 +148,84 @@ def save_storage_state(project_id: int, domain: str, state: dict) -> None:
     _storage_local[key] = state
 
 
+def _container_name(chat_id: str) -> str:
+    """Name of a chat's browser container, unique per install sharing a daemon."""
+    from restai.observability.instance import get_instance_id
+    digest = hashlib.sha1(f"{get_instance_id()}:{chat_id}".encode("utf-8")).hexdigest()[:24]
+    return f"restai-browser-{digest}"
+
+
+def _remember(chat_id: str, container, port: int) -> None:
+    with _handles_lock:
+        _handles[chat_id] = (_client, container, port)
+        _handles.move_to_end(chat_id)
+        evicted = [_handles.popitem(last=False)[1] for _ in range(len(_handles) - _MAX_HANDLES)]
+    for _, old, _ in evicted:
+        _close_session(old)
+
+
+def _cached_handle(chat_id: str, client):
+    """The chat's cached (client, container, port), if made by `client`."""
+    with _handles_lock:
+        cached = _handles.get(chat_id)
+        if cached is None or client is None or cached[0] is not client:
+            return None
+        _handles.move_to_end(chat_id)
+        return cached
+
+
+def _forget(chat_id: str) -> None:
+    """Drop the cached handle of a chat and close its container's session."""
+    with _handles_lock:
+        cached = _handles.pop(chat_id, None)
+    if cached is not None:
+        _close_session(cached[1])
+
+
+def _session(container) -> requests.Session:
+    """Keep-alive session to the container's micro-server, created on first
+    use with the container's bearer token."""
+    with _handles_lock:
+        session = _sessions.get(container.id)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(_auth_headers(container))
+            _sessions[container.id] = session
+        _sessions.move_to_end(container.id)
+        evicted = [_sessions.popitem(last=False)[1] for _ in range(len(_sessions) - _MAX_HANDLES)]
+    for old in evicted:
+        _close(old)
+    return session
+
+
+def _close(session: requests.Session) -> None:
+    try:
+        session.close()
+    except Exception:
+        pass
+
+
+def _close_session(container) -> None:
+    with _handles_lock:
+        session = _sessions.pop(getattr(container, "id", None), None)
+    if session is not None:
+        _close(session)
+
+
 def _resolve_container(chat_id: str):
+    """By name, else by the legacy `restai.browser_chat_id` label."""
     c = _get_client()
     if c is None or not chat_id:
         return None
+    container = None
+    try:
+        container = c.containers.get(_container_name(chat_id))
+    except _derrors.NotFound:
+        pass
+    except Exception as e:
+        logger.debug("Browser container lookup by name failed for chat_id=%s: %s", chat_id, e)
+    if container is not None and container.status == "running":
+        return container
     try:
         matches = c.containers.list(
             filters={"label": [f"restai.browser_chat_id={chat_id}", "restai.browser_managed=true"]},
@@ -231,13 +331,24 @@ def _wait_healthy(host_port: int) -> None:
     raise RuntimeError(f"Browser: micro-server health check timed out ({last_err})")
 
 
-def _create_container(chat_id: str):
+def _browser_spec() -> str:
+    """Settings a container is started with. Warm containers started under
+    different ones are recycled instead of handed out."""
+    return "|".join((
+        getattr(_cfg, "DOCKER_URL", "") or "",
+        getattr(_cfg, "BROWSER_IMAGE", _DEFAULT_IMAGE) or _DEFAULT_IMAGE,
+        getattr(_cfg, "BROWSER_NETWORK", "bridge") or "bridge",
+    ))
+
+
+def _run_container(name: str, labels: dict):
+    """Start a browser container with the micro-server installed, running
+    and answering /health. Returns (container, host port)."""
     c = _get_client()
     if c is None:
         raise RuntimeError("Browser runtime is not configured")
     image = (getattr(_cfg, "BROWSER_IMAGE", _DEFAULT_IMAGE) or _DEFAULT_IMAGE)
     network = (getattr(_cfg, "BROWSER_NETWORK", "bridge") or "bridge")
-    logger.info("Browser: creating container for chat_id=%s", chat_id)
     from restai.observability.instance import get_instance_id
 
     # Per-container shared secret for the micro-server. Stored as a label so a
@@ -249,13 +360,14 @@ def _create_container(chat_id: str):
         image,
         command=["sleep", "infinity"],
         detach=True,
+        name=name,
         environment={"BROWSER_SERVER_TOKEN": token},
         labels={
             "restai.browser_managed": "true",
-            "restai.browser_chat_id": chat_id,
             "restai.created_at": str(int(time.time())),
             "restai.browser_token": token,
             "restai.observability.instance_id": get_instance_id(),
+            **labels,
         },
         mem_limit="1g",
         cpu_period=100000,
@@ -274,20 +386,97 @@ def _create_container(chat_id: str):
         except Exception:
             pass
         raise RuntimeError("Browser: Docker did not publish a host port")
-    _install_micro_server(container)
-    _ensure_playwright_pkg(container, image)
-    _start_micro_server(container)
-    _wait_healthy(port)
+    try:
+        _install_micro_server(container)
+        _ensure_playwright_pkg(container, image)
+        _start_micro_server(container)
+        _wait_healthy(port)
+    except Exception:
+        try:
+            container.stop(timeout=3)
+        except Exception:
+            pass
+        raise
     return container, port
 
 
+def _create_container(chat_id: str):
+    logger.info("Browser: creating container for chat_id=%s", chat_id)
+    try:
+        return _run_container(_container_name(chat_id), {"restai.browser_chat_id": chat_id})
+    except _derrors.APIError as e:
+        # 409: another worker created this chat's container first.
+        existing = _resolve_container(chat_id) if getattr(e, "status_code", None) == 409 else None
+        port = _discover_port(existing) if existing is not None else None
+        if port is None:
+            raise
+        return existing, port
+
+
+def _create_warm_container():
+    """An unclaimed pool container, micro-server already healthy;
+    `_claim_warm` names it for a chat."""
+    container, _ = _run_container(f"restai-browser-warm-{uuid.uuid4().hex[:16]}",
+                                  {"restai.browser_pool": "warm"})
+    return container
+
+
+def _discard_container(container) -> None:
+    _close_session(container)
+    container.stop(timeout=3)
+
+
+def _is_healthy(container, port: int) -> bool:
+    try:
+        return _session(container).get(f"http://127.0.0.1:{port}/health", timeout=2).status_code == 200
+    except Exception:
+        return False
+
+
+def _claim_warm(chat_id: str):
+    """Bind a ready pool container to `chat_id`: (container, port), or None
+    when the pool has no healthy one."""
+    while True:
+        container = _pool.claim()
+        if container is None:
+            return None
+        port = _discover_port(container)
+        # One /health round trip on the pooled session: the micro-server may
+        # have died while the container sat in the pool.
+        if port is None or not _is_healthy(container, port):
+            _pool.discard(container)
+            continue
+        try:
+            container.rename(_container_name(chat_id))
+        except _derrors.NotFound:
+            continue
+        except _derrors.APIError as e:
+            if getattr(e, "status_code", None) == 409:
+                # Another worker bound this chat meanwhile; use theirs.
+                _pool.release(container)
+                existing = _resolve_container(chat_id)
+                port = _discover_port(existing) if existing is not None else None
+                return (existing, port) if port is not None else None
+            logger.warning("Browser: could not claim warm container for chat_id=%s: %s", chat_id, e)
+            _pool.discard(container)
+            return None
+        # Written now, not buffered: until the row exists the cleanup cron
+        # judges the container by its (pool) creation time.
+        _touch_db_activity(chat_id, container.id)
+        logger.info("Browser: claimed warm container for chat_id=%s", chat_id)
+        return container, port
+
+
 def _get_or_create(chat_id: str):
+    cached = _cached_handle(chat_id, _get_client())
+    if cached is not None:
+        return cached[1], cached[2]
     container = _resolve_container(chat_id)
-    if container is not None:
-        port = _discover_port(container)
-        if port is not None:
-            return container, port
-    return _create_container(chat_id)
+    port = _discover_port(container) if container is not None else None
+    if port is None:
+        container, port = _claim_warm(chat_id) or _create_container(chat_id)
+    _remember(chat_id, container, port)
+    return container, port
 
 
 def _chat_lock(chat_id: str) -> asyncio.Lock:
@@ -301,6 +490,10 @@ def _chat_lock(chat_id: str) -> asyncio.Lock:
 def remove_container(chat_id: str) -> None:
     """Stop the per-chat container if it exists. Idempotent."""
     container = _resolve_container(chat_id)
+    _forget(chat_id)
+    if container is not None:
+        _close_session(container)
+    _activity.discard(chat_id)
     _drop_db_activity(chat_id)
     if container is None:
         return
@@ -325,6 +518,22 @@ def _touch_db_activity(chat_id: str, container_id: Optional[str]) -> None:
         logger.debug("browser_chat_activity upsert failed for %s: %s", chat_id, e)
 
 
+def _write_db_activity(batch: dict) -> None:
+    """Flush of the heartbeat buffer: {chat_id: (container_id, when)} in
+    one transaction."""
+    from restai.database import open_db_wrapper
+    db = open_db_wrapper()
+    try:
+        for chat_id, (container_id, when) in batch.items():
+            db.upsert_browser_activity(chat_id, container_id, when=when, commit=False)
+        db.db.commit()
+    except Exception:
+        db.db.rollback()
+        raise
+    finally:
+        db.db.close()
+
+
 def _drop_db_activity(chat_id: str) -> None:
     if not chat_id:
         return
@@ -345,10 +554,9 @@ def call(chat_id: str, path: str, payload: Optional[dict] = None) -> dict:
         chat_id = "ephemeral"
     def _attempt():
         container, port = _get_or_create(chat_id)
-        _touch_db_activity(chat_id, container.id)
-        resp = requests.post(
-            f"http://127.0.0.1:{port}{path}",
-            json=payload or {}, timeout=90, headers=_auth_headers(container),
+        _activity.touch(chat_id, container.id)
+        resp = _session(container).post(
+            f"http://127.0.0.1:{port}{path}", json=payload or {}, timeout=90,
         )
         return container, resp
 
@@ -370,7 +578,7 @@ def call(chat_id: str, path: str, payload: Optional[dict] = None) -> dict:
     # Re-touch after request returns so a long browser call (e.g.
     # navigation that takes >timeout) doesn't leave a stale heartbeat
     # that the next cron tick would evict on.
-    _touch_db_activity(chat_id, container.id)
+    _activity.touch(chat_id, container.id)
 
     if resp.status_code >= 400:
         try:
@@ -379,3 +587,39 @@ def call(chat_id: str, path: str, payload: Optional[dict] = None) -> dict:
             detail = resp.text
         raise RuntimeError(f"browser {path}: {detail}")
     return resp.json()
+
+
+_pool = WarmPool(
+    "browser",
+    create=_create_warm_container,
+    discard=_discard_container,
+    size=lambda: _cfg.BROWSER_POOL_SIZE if is_enabled() else 0,
+    spec=_browser_spec,
+    # The cleanup cron stops unclaimed containers at `browser_timeout`.
+    max_age=lambda: int(getattr(_cfg, "BROWSER_TIMEOUT", 900)) / 2,
+)
+_activity = ActivityBuffer("browser", _touch_db_activity, _write_db_activity)
+
+
+def start() -> None:
+    """Start this worker's warm pool and heartbeat flusher (API process
+    only; see `restai/sandbox_pool.py`)."""
+    if _cfg.BROWSER_POOL_SIZE > 0:
+        _pool.start()
+    _activity.start()
+
+
+def stop() -> None:
+    """Discard unclaimed pool containers and flush pending heartbeats.
+    Claimed containers are left to the cleanup cron."""
+    _pool.stop()
+    _activity.stop()
+    with _handles_lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for session in sessions:
+        _close(session)
+
+
+def stats() -> dict:
+    return {"pool": _pool.stats(), "activity": _activity.stats(), "sessions": len(_sessions)}
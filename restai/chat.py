@@ -1,12 +1,29 @@
 from datetime import datetime
 from uuid import uuid4
 from llama_index.core.memory import ChatSummaryMemoryBuffer
-from llama_index.core.storage.chat_store import BaseChatStore
+from llama_index.core.storage.chat_store import BaseChatStore, SimpleChatStore
+from pydantic import PrivateAttr
 from restai.models.models import ChatModel
 
 CONTEXT_WINDOW_RATIO = 0.75  # Reserve 25% of context window for response
 
 
+class TurnChatStore(SimpleChatStore):
+    """In-memory store behind `Chat.scratch_memory`. Records the messages
+    added on top of the seeded history (the turn's question and answer) so
+    `Chat.commit` can append just those."""
+
+    _added: list = PrivateAttr(default_factory=list)
+
+    def add_message(self, key, message, idx=None):
+        super().add_message(key, message, idx)
+        self._added.append(message)
+
+    @property
+    def added(self) -> list:
+        return list(self._added)
+
+
 class Chat:
     def __init__(self, model: ChatModel, chat_store: BaseChatStore, token_limit: int = 3900,
                  llm=None, *, project_id: int, user_id: int):
@@ -36,6 +53,25 @@ class Chat:
 
         self.created: datetime = datetime.now()
 
+    def scratch_memory(self) -> ChatSummaryMemoryBuffer:
+        """A memory seeded from this chat's history whose writes stay out of
+        the chat store until `commit`. For a turn that may still be thrown
+        away (a speculative input guard): until then, other turns of the
+        chat never see it."""
+        return ChatSummaryMemoryBuffer.from_defaults(
+            chat_history=list(self.memory.get_all()),
+            token_limit=self.memory.token_limit,
+            llm=self.memory.llm,
+            chat_store=TurnChatStore(),
+            chat_store_key=self.memory.chat_store_key,
+        )
+
+    def commit(self, scratch: ChatSummaryMemoryBuffer):
+        """Append the messages a turn wrote to `scratch` to the chat store,
+        after whatever other turns wrote meanwhile."""
+        for message in scratch.chat_store.added:
+            self.memory.put(message)
+
     def clear_history(self):
         self.memory.reset()
 
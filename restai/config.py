@@ -9,14 +9,18 @@ Two kinds of config live here:
 2. **GUI-managed settings** (DOCKER_*, BROWSER_*, REDIS_*, OAuth, GPU,
    MCP, system LLM, retention, 2FA, branding, etc.) live in the `settings` DB
    table. They are NOT bound as module attributes. Instead, `__getattr__` at
-   the bottom of this file reads them from the DB on every access.
-
-   This is the only multi-worker-safe approach. Earlier versions mirrored the
-   DB onto module-level attributes via `setattr(config, ...)` after each
-   PATCH /settings; that mutation only landed in the worker that handled the
-   request, so other workers acted on stale (or missing) values. Read-through
-   on every access is a few hundred microseconds at most against the
-   connection pool — cheap compared to the bug it prevents.
+   the bottom of this file serves them from a per-worker snapshot of the
+   table that is revalidated against the DB.
+
+   Earlier versions mirrored the DB onto module-level attributes via
+   `setattr(config, ...)` after each PATCH /settings; that mutation only
+   landed in the worker that handled the request, so other workers acted on
+   stale (or missing) values. The snapshot avoids that: every write through
+   `upsert_setting` bumps a `settings_version` row, and each worker re-reads
+   that single row at most once per `SETTINGS_CACHE_TTL` seconds, reloading
+   the whole snapshot when it moved. Staleness in other workers is therefore
+   bounded by the TTL; the worker that handled the PATCH drops its snapshot
+   immediately. `SETTINGS_CACHE_TTL=0` restores read-through on every access.
 
    Env-var support for GUI keys was dropped at the same time. Admins set these
    in the platform Settings page; existing deployments already have the
@@ -24,6 +28,8 @@ Two kinds of config live here:
 """
 import os
 import secrets
+import threading
+import time
 
 from dotenv import load_dotenv
 
@@ -148,9 +154,9 @@ def build_redis_url():
     """Construct a redis:// URL from the live REDIS_* settings.
 
     Returns None when REDIS_HOST is unset. Goes through `_cfg.X` attribute
-    access so this module's `__getattr__` resolves each value from the DB on
-    every call — admin Settings changes are picked up immediately by every
-    worker without any process-local mirror. (Bare-name lookups like
+    access so this module's `__getattr__` resolves each value from the
+    versioned settings snapshot on every call — admin Settings changes reach
+    every worker within `SETTINGS_CACHE_TTL`. (Bare-name lookups like
     `REDIS_HOST` would NOT trigger `__getattr__` — Python looks bare names up
     in module globals, not via descriptor.)
     """
@@ -250,6 +256,122 @@ DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE") or 50)
 DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW") or 100)
 DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE") or 100)
 
+# Shared engines for external databases (pgvector, NL→SQL connections), see
+# restai/sql_engines.py: per-engine pool bounds, idle seconds before an
+# engine is disposed, max engines kept open, and how long a reflected NL→SQL
+# schema is reused.
+SQL_ENGINE_POOL_SIZE = int(os.environ.get("SQL_ENGINE_POOL_SIZE") or 5)
+SQL_ENGINE_MAX_OVERFLOW = int(os.environ.get("SQL_ENGINE_MAX_OVERFLOW") or 5)
+SQL_ENGINE_IDLE_TTL = float(os.environ.get("SQL_ENGINE_IDLE_TTL") or 600)
+SQL_ENGINE_MAX_ENGINES = int(os.environ.get("SQL_ENGINE_MAX_ENGINES") or 32)
+SQL_SCHEMA_CACHE_TTL = float(os.environ.get("SQL_SCHEMA_CACHE_TTL") or 300)
+
+# Knowledge ingestion: chunks embedded + written per vector-store call, and
+# how many embedding batches may be in flight at once for remote providers.
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE") or 64)
+INGEST_EMBED_CONCURRENCY = int(os.environ.get("INGEST_EMBED_CONCURRENCY") or 4)
+
+# Embedding vector cache (see restai/embedding_cache.py): per-worker LRU
+# budget in MB (0 disables it), plus an optional shared tier — "redis" (the
+# Settings-configured Redis, entries expire after EMBEDDING_CACHE_TTL seconds)
+# or "disk" (files under EMBEDDING_CACHE_DIR).
+EMBEDDING_CACHE_MB = float(os.environ.get("EMBEDDING_CACHE_MB") or 64)
+EMBEDDING_CACHE_BACKEND = (os.environ.get("EMBEDDING_CACHE_BACKEND") or "").strip().lower()
+EMBEDDING_CACHE_TTL = int(os.environ.get("EMBEDDING_CACHE_TTL") or 7 * 24 * 3600)
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR") or os.path.join(EMBEDDINGS_PATH or "./embeddings/", "_vector_cache")
+
+# Budget/rate-limit ledger (restai/limits/ledger.py): seconds a spend or
+# request counter is trusted before it is reseeded from the inference log.
+# 0 queries the table on every check.
+LEDGER_RECONCILE_SECONDS = float(os.environ.get("LEDGER_RECONCILE_SECONDS") or 60)
+
+# Threads that run a RAG chat's blocking LlamaIndex work (retrieval, rerank,
+# NL→SQL, the LLM call and the token stream) off the event loop. Chats beyond
+# this many wait for a free thread instead of stalling the worker.
+RAG_EXECUTOR_WORKERS = int(os.environ.get("RAG_EXECUTOR_WORKERS") or 32)
+
+# Threads for /v1 translated-path calls to LLMs without a native async client
+# (restai/routers/direct.py); requests beyond this wait for a free thread.
+DIRECT_EXECUTOR_WORKERS = int(os.environ.get("DIRECT_EXECUTOR_WORKERS") or 32)
+
+# /v1/embeddings splits large inputs into sub-batches of the provider's
+# `embed_batch_size` (this size when it has none), embedding up to
+# EMBEDDING_SUB_BATCH_CONCURRENCY of them at once per request.
+EMBEDDING_SUB_BATCH_SIZE = int(os.environ.get("EMBEDDING_SUB_BATCH_SIZE") or 64)
+EMBEDDING_SUB_BATCH_CONCURRENCY = int(os.environ.get("EMBEDDING_SUB_BATCH_CONCURRENCY") or 4)
+
+# Inference log write-behind (restai/observability/inference_writer.py):
+# `output` / retrieval rows and their billing are queued and written by a
+# background thread every INFERENCE_LOG_FLUSH_SECONDS (0 writes inline on the
+# request path), at most INFERENCE_LOG_BATCH_SIZE rows per transaction. Past
+# INFERENCE_LOG_QUEUE_MAX queued rows the request flushes a batch itself.
+# Rows that can't be written are spilled to INFERENCE_LOG_SPILL_DIR and
+# replayed every INFERENCE_LOG_SPILL_REPLAY_SECONDS, and on the next start.
+INFERENCE_LOG_FLUSH_SECONDS = float(os.environ.get("INFERENCE_LOG_FLUSH_SECONDS") or 1)
+INFERENCE_LOG_BATCH_SIZE = int(os.environ.get("INFERENCE_LOG_BATCH_SIZE") or 500)
+INFERENCE_LOG_QUEUE_MAX = int(os.environ.get("INFERENCE_LOG_QUEUE_MAX") or 10000)
+INFERENCE_LOG_SPILL_DIR = os.environ.get("INFERENCE_LOG_SPILL_DIR") or os.path.join(EMBEDDINGS_PATH or "./embeddings/", "_inference_spill")
+INFERENCE_LOG_SPILL_REPLAY_SECONDS = float(os.environ.get("INFERENCE_LOG_SPILL_REPLAY_SECONDS") or 60)
+
+# Per-chat sandboxes (restai/docker.py, restai/browser/runtime.py,
+# restai/sandbox_pool.py): each API worker keeps DOCKER_POOL_SIZE pre-started
+# terminal containers and BROWSER_POOL_SIZE browser containers with a healthy
+# micro-server to hand to new chats (0 creates one on demand, as before).
+# Browser containers reserve 1 GB each. `*_chat_activity` heartbeats are
+# buffered in memory and written every RUNTIME_ACTIVITY_FLUSH_SECONDS (0
+# writes them inline); keep it well below docker_timeout / browser_timeout.
+DOCKER_POOL_SIZE = int(os.environ.get("DOCKER_POOL_SIZE") or 2)
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE") or 1)
+RUNTIME_ACTIVITY_FLUSH_SECONDS = float(os.environ.get("RUNTIME_ACTIVITY_FLUSH_SECONDS") or 30)
+
+# Max seconds another worker may serve a GUI setting after a PATCH /settings
+# before re-checking the `settings_version` row. 0 disables the snapshot.
+SETTINGS_CACHE_TTL = float(os.environ.get("SETTINGS_CACHE_TTL") or 2)
+
+# Keep-alive client pool for the /v1 OpenAI-compatible passthrough
+# (restai/utils/upstream_pool.py): one client per upstream origin with these
+# connection limits. Idle sockets close after KEEPALIVE_EXPIRY seconds; a
+# client unused for IDLE_SECONDS is closed. UPSTREAM_HTTP2 needs `h2`.
+UPSTREAM_HTTP_MAX_CONNECTIONS = int(os.environ.get("UPSTREAM_HTTP_MAX_CONNECTIONS") or 100)
+UPSTREAM_HTTP_MAX_KEEPALIVE = int(os.environ.get("UPSTREAM_HTTP_MAX_KEEPALIVE") or 20)
+UPSTREAM_HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("UPSTREAM_HTTP_KEEPALIVE_EXPIRY") or 30)
+UPSTREAM_HTTP_IDLE_SECONDS = float(os.environ.get("UPSTREAM_HTTP_IDLE_SECONDS") or 600)
+UPSTREAM_HTTP2 = (os.environ.get("UPSTREAM_HTTP2") or "true").lower() in ("1", "true", "yes")
+
+# Agent MCP servers (restai/agent2/mcp_connections.py): sessions stay open
+# across turns, at most MCP_POOL_MAX_SESSIONS per worker (0 opens them per
+# turn, as before). A session idle longer than MCP_HEALTH_CHECK_SECONDS is
+# pinged before reuse and one idle for MCP_SESSION_IDLE_TTL is closed; a
+# server that fails to connect is retried after a backoff of up to
+# MCP_RECONNECT_BACKOFF_MAX seconds.
+MCP_POOL_MAX_SESSIONS = int(os.environ.get("MCP_POOL_MAX_SESSIONS") or 32)
+MCP_SESSION_IDLE_TTL = float(os.environ.get("MCP_SESSION_IDLE_TTL") or 600)
+MCP_HEALTH_CHECK_SECONDS = float(os.environ.get("MCP_HEALTH_CHECK_SECONDS") or 30)
+MCP_RECONNECT_BACKOFF_MAX = float(os.environ.get("MCP_RECONNECT_BACKOFF_MAX") or 60)
+
+# Bearer API keys resolved to their user / key row (restai/principal_cache.py)
+# skip the PBKDF2 + legacy-key scan for this many seconds; tokens that matched
+# nothing are refused without a lookup for AUTH_NEGATIVE_CACHE_TTL seconds.
+# AUTH_CACHE_TTL=0 disables both.
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL") or 300)
+AUTH_NEGATIVE_CACHE_TTL = float(os.environ.get("AUTH_NEGATIVE_CACHE_TTL") or 30)
+
+# Texts longer than this are truncated before moderate_content /
+# /v1/moderations scan them (restai/utils/moderation.py).
+MODERATION_MAX_CHARS = int(os.environ.get("MODERATION_MAX_CHARS") or 1_000_000)
+
+# Guard verdicts (restai/limits/guard_cache.py) are reused for this many
+# seconds when the same guard project sees the same normalized text again;
+# 0 disables. GUARD_VERDICT_CACHE_SIZE bounds the per-worker LRU.
+GUARD_VERDICT_CACHE_TTL = float(os.environ.get("GUARD_VERDICT_CACHE_TTL") or 600)
+GUARD_VERDICT_CACHE_SIZE = int(os.environ.get("GUARD_VERDICT_CACHE_SIZE") or 10000)
+
+# Max seconds a worker keeps serving cached vector-store wrappers, LLM clients
+# and embedding models (restai/object_cache.py) after another worker reset a
+# collection or deleted a project/LLM, before re-checking the
+# `object_cache_version` row. 0 disables the cache.
+OBJECT_CACHE_TTL = float(os.environ.get("OBJECT_CACHE_TTL") or 2)
+
 
 MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE_MB") or 100) * 1024 * 1024  # Default 100MB
 
@@ -262,7 +384,7 @@ SESSION_COOKIE_SECURE = (
 SSO_SECRET_KEY = os.environ.get("SSO_SECRET_KEY", os.environ.get("SECRET_KEY"))
 
 
-# GUI-managed settings — DB-backed, read on every access via __getattr__
+# GUI-managed settings — DB-backed, resolved on every access via __getattr__
 #
 # Mapping shape: <module attr name> -> (db_key, type_, default).
 # type_ is one of: str, bool, int, "csv-list".
@@ -386,23 +508,89 @@ def _coerce_setting(raw: str, type_, default):
     return raw
 
 
+# Per-worker snapshot of the `settings` table (key -> decrypted value).
+# `_settings_version` is the `settings_version` row the snapshot was loaded
+# at; `_settings_checked_at` is the monotonic time it was last confirmed.
+_settings_lock = threading.Lock()
+_settings_snapshot = None
+_settings_version = None
+_settings_checked_at = 0.0
+
+_settings_cache_stats = {"hits": 0, "misses": 0, "version_checks": 0}
+
+
+def settings_cache_stats() -> dict:
+    """Counters for the GUI-settings snapshot (per worker, since boot)."""
+    return dict(_settings_cache_stats)
+
+
+def invalidate_settings_cache():
+    """Drop this worker's snapshot so the next access reloads it. Called by
+    `upsert_setting`; other workers notice via the version row."""
+    global _settings_snapshot, _settings_version
+    with _settings_lock:
+        _settings_snapshot = None
+        _settings_version = None
+
+
+def _load_settings_snapshot():
+    """Returns (version, {key: value}). Raises on DB failure."""
+    from restai.database import DBWrapper
+    wrapper = DBWrapper()
+    try:
+        version = wrapper.get_settings_version()
+        rows = {r.key: r.value or "" for r in wrapper.get_settings()}
+        return version, rows
+    finally:
+        wrapper.db.close()
+
+
+def _read_settings_version():
+    from restai.database import DBWrapper
+    wrapper = DBWrapper()
+    try:
+        return wrapper.get_settings_version()
+    finally:
+        wrapper.db.close()
+
+
 def _read_setting(db_key: str) -> str:
     """Returns "" on any failure (early bootstrap before schema)."""
-    try:
-        from restai.database import DBWrapper
-        wrapper = DBWrapper()
+    global _settings_snapshot, _settings_version, _settings_checked_at
+
+    snapshot = _settings_snapshot
+    if snapshot is not None and time.monotonic() - _settings_checked_at < SETTINGS_CACHE_TTL:
+        _settings_cache_stats["hits"] += 1
+        return snapshot.get(db_key, "")
+
+    with _settings_lock:
+        # Another thread may have refreshed while we waited for the lock.
+        snapshot = _settings_snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - _settings_checked_at < SETTINGS_CACHE_TTL:
+            _settings_cache_stats["hits"] += 1
+            return snapshot.get(db_key, "")
         try:
-            return wrapper.get_setting_value(db_key, "")
-        finally:
-            wrapper.db.close()
-    except Exception:
-        return ""
+            if snapshot is not None:
+                _settings_cache_stats["version_checks"] += 1
+                if _read_settings_version() == _settings_version:
+                    _settings_checked_at = now
+                    _settings_cache_stats["hits"] += 1
+                    return snapshot.get(db_key, "")
+            _settings_cache_stats["misses"] += 1
+            version, snapshot = _load_settings_snapshot()
+        except Exception:
+            return ""
+        _settings_snapshot = snapshot
+        _settings_version = version
+        _settings_checked_at = time.monotonic()
+        return snapshot.get(db_key, "")
 
 
 def __getattr__(name):
-    """Resolve GUI-managed settings from the DB per-access. Multi-worker
-    safe — no in-process mirror. Boot-only env vars (defined as module
-    constants above) bypass this. RESTAI_GPU falls back to detect_gpu()."""
+    """Resolve GUI-managed settings from the versioned per-worker snapshot
+    (see `_read_setting`). Boot-only env vars (defined as module constants
+    above) bypass this. RESTAI_GPU falls back to detect_gpu()."""
     # Derived from gpu_worker_devices (first index → "cuda:N").
     if name == "RESTAI_DEFAULT_DEVICE":
         devices = _coerce_setting(_read_setting("gpu_worker_devices"), "csv-list", [])
@@ -161,6 +161,7 @@ class LLMEmbeddingMixin:
             llm.context_window = llmUpdate.context_window
 
         self.db.commit()
+        self.bump_object_cache_version()
         return True
 
     def update_embedding(
@@ -267,16 +268,19 @@ class LLMEmbeddingMixin:
                 changed += 1
         if changed:
             self.db.commit()
+            self.bump_object_cache_version()
         return changed
 
     def delete_llm(self, llm: LLMDatabase) -> bool:
         self.db.delete(llm)
         self.db.commit()
+        self.bump_object_cache_version()
         return True
 
     def delete_embedding(self, embedding: EmbeddingDatabase) -> bool:
         self.db.delete(embedding)
         self.db.commit()
+        self.bump_object_cache_version()
         return True
 
     def get_image_generators(self) -> list[ImageGeneratorDatabase]:
@@ -129,6 +129,8 @@ class ProjectMixin:
             "project_tools", "project_routines",
             "project_memory_bank_entries", "bulk_ingest_jobs",
             "project_secrets", "routine_execution_log",
+            "knowledge_chunk_manifest", "vector_catalog_chunks",
+            "vector_catalog_sources",
         ]
         for tbl in _CHILDREN_CASCADE:
             try:
@@ -157,6 +159,7 @@ class ProjectMixin:
 
         self.db.delete(project)
         self.db.commit()
+        self.bump_object_cache_version()
         try:
             from restai.memory import search as memory_search
             memory_search.delete_project(project_id)
@@ -371,11 +374,27 @@ class ProjectMixin:
             if current_options != new_options:
                 proj_db.options = json.dumps(new_options)
                 changed = True
+                self._invalidate_sql_schema(current_options, projectModel.options)
 
         if changed:
             self.db.commit()
+            self.bump_object_cache_version()
         return True
 
+    @staticmethod
+    def _invalidate_sql_schema(current_options: dict, new_options) -> None:
+        """Drop the shared NL→SQL engine + reflected schema when a project's
+        connection or table allowlist changes (restai/sql_engines.py)."""
+        from restai.utils.crypto import decrypt_field
+        old_conn = decrypt_field(current_options.get("connection") or "")
+        if not old_conn:
+            return
+        from restai.sql_engines import dispose_engine, invalidate_sql_schema
+        if old_conn != new_options.connection:
+            dispose_engine(old_conn)
+        elif current_options.get("tables") != new_options.tables:
+            invalidate_sql_schema(old_conn)
+
     def _create_prompt_version(self, project_id: int, system_prompt: str, user_id: int = None):
         from restai.models.databasemodels import PromptVersionDatabase
 
@@ -38,14 +38,17 @@ class RuntimeActivityMixin:
             query = query.filter(CronLogDatabase.status == status)
         return query.offset(start).limit(end - start).all()
 
-    def upsert_docker_activity(self, chat_id: str, container_id: str | None = None) -> None:
-        """Bump `last_activity` for a chat's Docker container. Called on
-        every `DockerManager.exec_command`. Multi-server safe — the
-        cleanup cron reads from this table instead of in-memory state."""
+    def upsert_docker_activity(self, chat_id: str, container_id: str | None = None,
+                               when: datetime | None = None, commit: bool = True) -> None:
+        """Bump `last_activity` for a chat's Docker container. Written by
+        the sandbox's heartbeat buffer (`restai/sandbox_pool.py`), with
+        `when` the time of the last call and `commit=False` to batch a
+        flush. Multi-server safe — the cleanup cron reads from this table
+        instead of in-memory state."""
         from restai.models.databasemodels import DockerChatActivityDatabase
         if not chat_id:
             return
-        now = datetime.now(timezone.utc)
+        now = when or datetime.now(timezone.utc)
         row = (
             self.db.query(DockerChatActivityDatabase)
             .filter(DockerChatActivityDatabase.chat_id == chat_id)
@@ -64,7 +67,8 @@ class RuntimeActivityMixin:
             if container_id:
                 row.container_id = container_id
             row.updated_at = now
-        self.db.commit()
+        if commit:
+            self.db.commit()
 
     def delete_docker_activity(self, chat_id: str) -> None:
         from restai.models.databasemodels import DockerChatActivityDatabase
@@ -87,14 +91,16 @@ class RuntimeActivityMixin:
             .first()
         )
 
-    def upsert_browser_activity(self, chat_id: str, container_id: str | None = None) -> None:
-        """Bump `last_activity` for a chat's browser container. Called
-        on every `browser.runtime.call()`. Cleanup cron reads from this
-        table so eviction reflects real idle time, not container age."""
+    def upsert_browser_activity(self, chat_id: str, container_id: str | None = None,
+                                when: datetime | None = None, commit: bool = True) -> None:
+        """Bump `last_activity` for a chat's browser container. Written by
+        the heartbeat buffer of `browser.runtime.call()`, batched like
+        `upsert_docker_activity`. Cleanup cron reads from this table so
+        eviction reflects real idle time, not container age."""
         from restai.models.databasemodels import BrowserChatActivityDatabase
         if not chat_id:
             return
-        now = datetime.now(timezone.utc)
+        now = when or datetime.now(timezone.utc)
         row = (
             self.db.query(BrowserChatActivityDatabase)
             .filter(BrowserChatActivityDatabase.chat_id == chat_id)
@@ -113,7 +119,8 @@ class RuntimeActivityMixin:
             if container_id:
                 row.container_id = container_id
             row.updated_at = now
-        self.db.commit()
+        if commit:
+            self.db.commit()
 
     def delete_browser_activity(self, chat_id: str) -> None:
         from restai.models.databasemodels import BrowserChatActivityDatabase
@@ -7,11 +7,19 @@ composes these mixins, so the public API is unchanged.
 
 from typing import Optional
 
+from sqlalchemy import Integer, String, cast, update
 
 from restai.models.databasemodels import (
     SettingDatabase,
 )
 
+# Bumped on every upsert_setting so other workers can tell their
+# restai.config settings snapshot is stale with a single-row read.
+SETTINGS_VERSION_KEY = "settings_version"
+# Bumped when cached vector-store wrappers / LLM clients built from DB rows
+# (restai/object_cache.py) must be rebuilt in every worker.
+OBJECT_CACHE_VERSION_KEY = "object_cache_version"
+
 
 class SettingMixin:
     __slots__ = ()
@@ -49,3 +57,59 @@ class SettingMixin:
             self.db.commit()
         except Exception:
             self.db.rollback()
+        self.bump_settings_version()
+
+    def get_settings_version(self) -> Optional[str]:
+        row = (
+            self.db.query(SettingDatabase.value)
+            .filter(SettingDatabase.key == SETTINGS_VERSION_KEY)
+            .first()
+        )
+        return row[0] if row else None
+
+    def bump_settings_version(self) -> None:
+        """Atomically increment the settings version row (created at 1) and
+        drop this worker's snapshot. The increment is a single UPDATE so two
+        concurrent PATCHes can never publish the same version."""
+        from restai.config import invalidate_settings_cache
+        try:
+            result = self.db.execute(
+                update(SettingDatabase)
+                .where(SettingDatabase.key == SETTINGS_VERSION_KEY)
+                .values(value=cast(cast(SettingDatabase.value, Integer) + 1, String(255)))
+            )
+            if result.rowcount == 0:
+                self.db.add(SettingDatabase(key=SETTINGS_VERSION_KEY, value="1"))
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+        invalidate_settings_cache()
+
+    def get_object_cache_version(self) -> tuple:
+        """(object_cache_version, settings_version) in one query. Vector-store
+        credentials live in settings, so a settings change also stales the
+        object cache."""
+        rows = (
+            self.db.query(SettingDatabase.key, SettingDatabase.value)
+            .filter(SettingDatabase.key.in_((OBJECT_CACHE_VERSION_KEY, SETTINGS_VERSION_KEY)))
+            .all()
+        )
+        values = dict(rows)
+        return values.get(OBJECT_CACHE_VERSION_KEY), values.get(SETTINGS_VERSION_KEY)
+
+    def bump_object_cache_version(self) -> None:
+        """Same atomic increment as `bump_settings_version`, for the object
+        cache; drops this worker's cached objects immediately."""
+        from restai.object_cache import invalidate_object_cache
+        try:
+            result = self.db.execute(
+                update(SettingDatabase)
+                .where(SettingDatabase.key == OBJECT_CACHE_VERSION_KEY)
+                .values(value=cast(cast(SettingDatabase.value, Integer) + 1, String(255)))
+            )
+            if result.rowcount == 0:
+                self.db.add(SettingDatabase(key=OBJECT_CACHE_VERSION_KEY, value="1"))
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+        invalidate_object_cache()
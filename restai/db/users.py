@@ -18,6 +18,7 @@ from restai.models.models import (
 )
 from restai.utils.crypto import decrypt_api_key, verify_api_key_hash
 from restai.db.passwords import hash_password
+from restai.principal_cache import principal_cache
 
 
 class UserMixin:
@@ -80,6 +81,24 @@ class UserMixin:
                 continue
         return None, None
 
+    def get_user_by_principal(self, principal):
+        """`get_user_by_apikey` for a token already resolved to `principal`
+        (restai/principal_cache.py): primary-key reads, no hashing. Returns
+        (None, None) once the key is deleted or the legacy key changed."""
+        if principal.api_key_id is not None:
+            api_key_row = (
+                self.db.query(ApiKeyDatabase)
+                .filter(ApiKeyDatabase.id == principal.api_key_id)
+                .first()
+            )
+            if api_key_row is None or api_key_row.user_id != principal.user_id:
+                return None, None
+            return api_key_row.user, api_key_row
+        user = self.get_user_by_id(principal.user_id)
+        if user is None or not user.api_key or user.api_key != principal.legacy_secret:
+            return None, None
+        return user, None
+
     def get_user_by_username(self, username: str) -> Optional[UserDatabase]:
         user: Optional[UserDatabase] = (
             self.db.query(UserDatabase)
@@ -122,11 +141,14 @@ class UserMixin:
                 user.options = json.dumps(user_update.options.model_dump())
 
         self.db.commit()
+        principal_cache.invalidate(user.id)
         return True
 
     def delete_user(self, user: UserDatabase) -> bool:
+        user_id = user.id
         self.db.delete(user)
         self.db.commit()
+        principal_cache.invalidate(user_id)
         return True
 
     def create_api_key(self, user_id: int, encrypted_key: str, key_hash: str, key_prefix: str, description: str, allowed_projects: str = None, read_only: bool = False, team_id: int = None) -> ApiKeyDatabase:
@@ -164,4 +186,5 @@ class UserMixin:
             return False
         self.db.delete(api_key)
         self.db.commit()
+        principal_cache.invalidate(user_id)
         return True
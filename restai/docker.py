@@ -9,10 +9,20 @@ same chat, `init_docker_manager` from a settings change nukes in-flight
 chats, etc.).
 
 Now: a flat module of functions. The Docker daemon is the source of
-truth for "does this chat have a container" — we look it up by the
-`restai.chat_id` label per call (~5ms). The Docker client connection
-is cached as a module-level lazy singleton (one TCP keepalive per
-worker, same as before).
+truth for "does this chat have a container": a chat's container is named
+after it (`_container_name`), so any worker finds it with one inspect
+call, and each worker caches the chat → container handle it found. The
+handle is validated lazily — an exec that finds the container gone drops
+it and retries once on a fresh one. Containers from before the naming
+are still found by their `restai.chat_id` label. The Docker client
+connection is cached as a module-level lazy singleton (one TCP keepalive
+per worker, same as before).
+
+New chats are served from a per-worker pool of pre-started containers
+(`restai/sandbox_pool.py`): the claimed container is renamed for the chat
+— labels can't change after creation — and its activity row is written
+straight away so the cleanup cron treats it as the chat's. Heartbeats on
+later calls are buffered in memory and flushed periodically.
 
 Settings are read live via `restai.config` on every call, so admin
 changes to `docker_image` / `docker_network` / `docker_read_only` /
@@ -23,14 +33,19 @@ on idle.
 from __future__ import annotations
 
 import base64 as _b64
+import hashlib
 import logging
+import threading
 import time
+import uuid
+from collections import OrderedDict
 from typing import Optional
 
 import docker as _docker_sdk
 import docker.errors as _derrors
 
 from restai import config as _cfg
+from restai.sandbox_pool import ActivityBuffer, WarmPool
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +59,15 @@ PUT_FILES_CHUNK = 64 * 1024  # tar chunk for upload, < MAX_ARG_STRLEN
 _client: Optional[_docker_sdk.DockerClient] = None
 _client_url: str = ""
 
+# chat_id -> (client, container) this worker last used for the chat, most
+# recently used last. Only trusted while `client` is still the live client
+# (a settings change rebuilds it).
+_handles: "OrderedDict[str, tuple]" = OrderedDict()
+_handles_lock = threading.Lock()
+# Chats whose container the cleanup cron reaps never come back to drop
+# their handle, so past this many the least recently used are evicted.
+_MAX_HANDLES = 1024
+
 
 def _get_client() -> Optional[_docker_sdk.DockerClient]:
     """Cached per-process DockerClient; rebuilt on `docker_url` change."""
@@ -77,22 +101,64 @@ def client_info() -> dict:
     return c.info()
 
 
+def _container_name(chat_id: str) -> str:
+    """Name of a chat's container, unique per install sharing a daemon."""
+    from restai.observability.instance import get_instance_id
+    digest = hashlib.sha1(f"{get_instance_id()}:{chat_id}".encode("utf-8")).hexdigest()[:24]
+    return f"restai-chat-{digest}"
+
+
+def _remember(chat_id: str, container) -> None:
+    with _handles_lock:
+        _handles[chat_id] = (_client, container)
+        _handles.move_to_end(chat_id)
+        while len(_handles) > _MAX_HANDLES:
+            _handles.popitem(last=False)
+
+
+def _forget(chat_id: str) -> None:
+    with _handles_lock:
+        _handles.pop(chat_id, None)
+
+
+def _is_gone(e: Exception) -> bool:
+    """True when an API error means the container itself is gone or
+    stopped (404, or 409 "is not running") rather than the call failing."""
+    if isinstance(e, _derrors.NotFound):
+        return True
+    return isinstance(e, _derrors.APIError) and getattr(e, "status_code", None) == 409
+
+
 def _resolve_container(chat_id: str):
-    """Looked up by `restai.chat_id=<id>` label every call — daemon is source of truth."""
+    """Cached handle, else by name, else by the legacy `restai.chat_id` label."""
     c = _get_client()
     if c is None or not chat_id:
         return None
+    with _handles_lock:
+        cached = _handles.get(chat_id)
+        if cached is not None and cached[0] is c:
+            _handles.move_to_end(chat_id)
+            return cached[1]
+    container = None
     try:
-        matches = c.containers.list(
-            filters={"label": [f"restai.chat_id={chat_id}", "restai.managed=true"]},
-            limit=1,
-        )
+        container = c.containers.get(_container_name(chat_id))
+    except _derrors.NotFound:
+        pass
     except Exception as e:
-        logger.warning("Docker container list failed for chat_id=%s: %s", chat_id, e)
-        return None
-    if matches and matches[0].status == "running":
-        return matches[0]
-    return None
+        logger.debug("Docker container lookup by name failed for chat_id=%s: %s", chat_id, e)
+    if container is None or container.status != "running":
+        try:
+            matches = c.containers.list(
+                filters={"label": [f"restai.chat_id={chat_id}", "restai.managed=true"]},
+                limit=1,
+            )
+        except Exception as e:
+            logger.warning("Docker container list failed for chat_id=%s: %s", chat_id, e)
+            return None
+        container = matches[0] if matches and matches[0].status == "running" else None
+    if container is not None:
+        _remember(chat_id, container)
+    return container
 
 
 def chat_workspace_dir(chat_id: str) -> str:
@@ -115,7 +181,18 @@ def _ensure_chat_workspace(chat_id: str) -> str:
     return path
 
 
-def _create_container(chat_id: str):
+def _sandbox_spec() -> str:
+    """Settings a container is started with. Warm containers started under
+    different ones are recycled instead of handed out."""
+    return "|".join(str(v) for v in (
+        getattr(_cfg, "DOCKER_URL", ""),
+        getattr(_cfg, "DOCKER_IMAGE", "python:3.12-slim") or "python:3.12-slim",
+        getattr(_cfg, "DOCKER_NETWORK", "none") or "none",
+        bool(getattr(_cfg, "DOCKER_READ_ONLY", True)),
+    ))
+
+
+def _run_container(name: str, labels: dict):
     c = _get_client()
     if c is None:
         raise RuntimeError("Docker is not configured")
@@ -124,15 +201,16 @@ def _create_container(chat_id: str):
     read_only = bool(getattr(_cfg, "DOCKER_READ_ONLY", True))
     from restai.observability.instance import get_instance_id
 
-    container = c.containers.run(
+    return c.containers.run(
         image,
         command="tail -f /dev/null",
         detach=True,
+        name=name,
         labels={
             "restai.managed": "true",
-            "restai.chat_id": chat_id,
             "restai.created_at": str(int(time.time())),
             "restai.observability.instance_id": get_instance_id(),
+            **labels,
         },
         mem_limit="512m",
         cpu_period=100000,
@@ -147,15 +225,64 @@ def _create_container(chat_id: str):
         read_only=read_only,
         remove=True,
     )
+
+
+def _create_container(chat_id: str):
+    try:
+        container = _run_container(_container_name(chat_id), {"restai.chat_id": chat_id})
+    except _derrors.APIError as e:
+        # 409: another worker created this chat's container first.
+        existing = _resolve_container(chat_id) if getattr(e, "status_code", None) == 409 else None
+        if existing is None:
+            raise
+        return existing
     logger.info("Created container %s for chat_id=%s", container.short_id, chat_id)
     return container
 
 
+def _create_warm_container():
+    """An unclaimed pool container; `_claim_warm` names it for a chat."""
+    return _run_container(f"restai-warm-{uuid.uuid4().hex[:16]}", {"restai.pool": "warm"})
+
+
+def _discard_container(container) -> None:
+    container.stop(timeout=5)
+
+
+def _claim_warm(chat_id: str):
+    """Bind a ready pool container to `chat_id`, or None when the pool is
+    empty."""
+    while True:
+        container = _pool.claim()
+        if container is None:
+            return None
+        try:
+            container.rename(_container_name(chat_id))
+        except _derrors.NotFound:
+            continue  # stopped while it sat in the pool
+        except _derrors.APIError as e:
+            if getattr(e, "status_code", None) == 409:
+                # Another worker bound this chat meanwhile; use theirs.
+                _pool.release(container)
+                return _resolve_container(chat_id)
+            logger.warning("Could not claim warm container %s for chat_id=%s: %s",
+                           container.short_id, chat_id, e)
+            _pool.discard(container)
+            return None
+        # Written now, not buffered: until the row exists the cleanup cron
+        # judges the container by its (pool) creation time.
+        _touch_db_activity(chat_id, container.id)
+        logger.info("Claimed warm container %s for chat_id=%s", container.short_id, chat_id)
+        return container
+
+
 def _get_or_create(chat_id: str):
     container = _resolve_container(chat_id)
     if container is not None:
         return container
-    return _create_container(chat_id)
+    container = _claim_warm(chat_id) or _create_container(chat_id)
+    _remember(chat_id, container)
+    return container
 
 
 def _rm_chat_workspace(chat_id: str) -> None:
@@ -172,6 +299,8 @@ def _rm_chat_workspace(chat_id: str) -> None:
 
 def remove_container(chat_id: str) -> None:
     container = _resolve_container(chat_id)
+    _forget(chat_id)
+    _activity.discard(chat_id)
     if container is None:
         _drop_db_activity(chat_id)
         _rm_chat_workspace(chat_id)
@@ -199,6 +328,22 @@ def _touch_db_activity(chat_id: str, container_id: Optional[str]) -> None:
         logger.debug("docker_chat_activity upsert failed for %s: %s", chat_id, e)
 
 
+def _write_db_activity(batch: dict) -> None:
+    """Flush of the heartbeat buffer: {chat_id: (container_id, when)} in
+    one transaction."""
+    from restai.database import open_db_wrapper
+    db = open_db_wrapper()
+    try:
+        for chat_id, (container_id, when) in batch.items():
+            db.upsert_docker_activity(chat_id, container_id, when=when, commit=False)
+        db.db.commit()
+    except Exception:
+        db.db.rollback()
+        raise
+    finally:
+        db.db.close()
+
+
 def _drop_db_activity(chat_id: str) -> None:
     if not chat_id:
         return
@@ -242,6 +387,22 @@ def _exec_with_retry(chat_id: str, container, command_argv, **exec_kwargs):
     raise last_err
 
 
+def _exec_in_chat(chat_id: str, command_argv, **exec_kwargs):
+    """(container, result) of running `command_argv` in the chat's sandbox,
+    heartbeating first. If the cached container turns out to be gone, the
+    handle is dropped and the command runs once more on a fresh one."""
+    for attempt in range(2):
+        container = _get_or_create(chat_id)
+        _activity.touch(chat_id, container.id)
+        try:
+            return container, _exec_with_retry(chat_id, container, command_argv, **exec_kwargs)
+        except Exception as e:
+            if attempt or not _is_gone(e):
+                raise
+            logger.info("Container %s for chat_id=%s is gone; replacing it", container.short_id, chat_id)
+            _forget(chat_id)
+
+
 def exec_command(chat_id: str, command: str, env: Optional[dict] = None) -> str:
     """Run a shell command in the per-chat sandbox container.
 
@@ -259,9 +420,7 @@ def exec_command(chat_id: str, command: str, env: Optional[dict] = None) -> str:
         # Container creation is inside the guard: on a contended daemon it can
         # exceed the SDK read timeout, and that must degrade to a soft ERROR
         # the model handles — never propagate and 500 the whole agent turn.
-        container = _get_or_create(chat_id)
-        _touch_db_activity(chat_id, container.id)
-        result = _exec_with_retry(chat_id, container, ["sh", "-c", command], **exec_kwargs)
+        container, result = _exec_in_chat(chat_id, ["sh", "-c", command], **exec_kwargs)
         stdout = (result.output[0] or b"").decode("utf-8", errors="replace")
         stderr = (result.output[1] or b"").decode("utf-8", errors="replace")
         output = stdout + stderr
@@ -271,7 +430,7 @@ def exec_command(chat_id: str, command: str, env: Optional[dict] = None) -> str:
         # `docker_timeout` the start-of-call heartbeat is already stale
         # by the time we land here, and the next cron tick would evict
         # a freshly-finished container.
-        _touch_db_activity(chat_id, container.id)
+        _activity.touch(chat_id, container.id)
         return output if output else "(no output)"
     except Exception as e:
         logger.exception("Docker exec failed for chat_id=%s: %s", chat_id, e)
@@ -279,9 +438,8 @@ def exec_command(chat_id: str, command: str, env: Optional[dict] = None) -> str:
         # decide that, but it flips True on transient states
         # (restarting/removing/paused) and we'd wipe a fine container's
         # tmpfs over a single exec hiccup. The next call's
-        # `_resolve_container` will see status!="running" if the
-        # container is genuinely dead and create a fresh one; if it's
-        # alive, we keep the agent's state.
+        # `_exec_in_chat` replaces a container that is genuinely gone;
+        # if it's alive, we keep the agent's state.
         return f"ERROR: Command execution failed: {e}"
 
 
@@ -294,28 +452,25 @@ def run_script(chat_id: str, script: str, stdin_data: str = "") -> str:
     try:
         # See exec_command: container creation is guarded so a slow/contended
         # daemon returns a soft ERROR instead of crashing the agent turn.
-        container = _get_or_create(chat_id)
-        _touch_db_activity(chat_id, container.id)
         b64_script = _b64.b64encode(script.encode("utf-8")).decode("ascii")
         b64_stdin = _b64.b64encode(stdin_data.encode("utf-8")).decode("ascii") if stdin_data else ""
         if b64_stdin:
             cmd = f'echo "{b64_stdin}" | base64 -d | python3 -c "$(echo {b64_script} | base64 -d)"'
         else:
             cmd = f'python3 -c "$(echo {b64_script} | base64 -d)"'
-        result = _exec_with_retry(
-            chat_id, container, ["sh", "-c", cmd],
+        container, result = _exec_in_chat(
+            chat_id, ["sh", "-c", cmd],
             demux=True, workdir="/home/user",
         )
         stdout = (result.output[0] or b"").decode("utf-8", errors="replace")
         stderr = (result.output[1] or b"").decode("utf-8", errors="replace")
-        _touch_db_activity(chat_id, container.id)
+        _activity.touch(chat_id, container.id)
         if stderr.strip():
             return stdout + "\nSTDERR: " + stderr if stdout else "ERROR: " + stderr
         return stdout.strip() if stdout.strip() else "(no output)"
     except Exception as e:
         logger.exception("Docker run_script failed for chat_id=%s: %s", chat_id, e)
-        # See `exec_command` — never self-remove on exec failure. The
-        # next call's `_resolve_container` is the authoritative check.
+        # See `exec_command` — never self-remove on exec failure.
         return f"ERROR: Script execution failed: {e}"
 
 
@@ -331,7 +486,6 @@ def put_files(chat_id: str, files: list[tuple[str, bytes]],
     if not files:
         return []
 
-    container = _get_or_create(chat_id)
     target_dir = f"{extract_to}/{subdir}"
     manifest: list[dict] = []
 
@@ -347,8 +501,7 @@ def put_files(chat_id: str, files: list[tuple[str, bytes]],
 
     tmp_path = f"{extract_to}/_restai_upload.tar"
     try:
-        res = _exec_with_retry(chat_id, container,
-                               ["sh", "-c", f"mkdir -p {target_dir} && : > {tmp_path}"])
+        container, res = _exec_in_chat(chat_id, ["sh", "-c", f"mkdir -p {target_dir} && : > {tmp_path}"])
         if res.exit_code != 0:
             raise RuntimeError(f"tar staging failed (exit {res.exit_code})")
 
@@ -382,7 +535,7 @@ def put_files(chat_id: str, files: list[tuple[str, bytes]],
     if missing:
         raise RuntimeError(f"Files not present after upload: {', '.join(missing)}")
 
-    _touch_db_activity(chat_id, container.id)
+    _activity.touch(chat_id, container.id)
     logger.info("Uploaded %d file(s) to chat_id=%s at %s", len(manifest), chat_id, target_dir)
     return manifest
 
@@ -398,10 +551,16 @@ def collect_new_artifacts(chat_id: str) -> list[dict]:
     if container is None:
         return []
 
-    container.exec_run(
-        ["sh", "-c", f"mkdir -p {ARTIFACTS_DIR} && chmod 0777 {ARTIFACTS_DIR} 2>/dev/null; true"],
-        workdir="/home/user",
-    )
+    try:
+        container.exec_run(
+            ["sh", "-c", f"mkdir -p {ARTIFACTS_DIR} && chmod 0777 {ARTIFACTS_DIR} 2>/dev/null; true"],
+            workdir="/home/user",
+        )
+    except Exception as e:
+        if not _is_gone(e):
+            raise
+        _forget(chat_id)
+        return []
 
     # Read prior-seen identifiers from marker file inside the container.
     seen_res = container.exec_run(
@@ -482,3 +641,34 @@ def collect_new_artifacts(chat_id: str) -> list[dict]:
             workdir="/home/user",
         )
     return artifacts
+
+
+_pool = WarmPool(
+    "docker",
+    create=_create_warm_container,
+    discard=_discard_container,
+    size=lambda: _cfg.DOCKER_POOL_SIZE if is_enabled() else 0,
+    spec=_sandbox_spec,
+    # The cleanup cron stops unclaimed containers at `docker_timeout`.
+    max_age=lambda: int(getattr(_cfg, "DOCKER_TIMEOUT", 900)) / 2,
+)
+_activity = ActivityBuffer("docker", _touch_db_activity, _write_db_activity)
+
+
+def start() -> None:
+    """Start this worker's warm pool and heartbeat flusher (API process
+    only; see `restai/sandbox_pool.py`)."""
+    if _cfg.DOCKER_POOL_SIZE > 0:
+        _pool.start()
+    _activity.start()
+
+
+def stop() -> None:
+    """Discard unclaimed pool containers and flush pending heartbeats.
+    Claimed containers are left to the cleanup cron."""
+    _pool.stop()
+    _activity.stop()
+
+
+def stats() -> dict:
+    return {"pool": _pool.stats(), "activity": _activity.stats()}
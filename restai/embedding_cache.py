@@ -0,0 +1,351 @@
+"""Vector cache in front of every embedding model.
+
+The same text gets embedded over and over: a RAG question is embedded by
+chat, by /embeddings/search and by the search_knowledge tool, and re-ingesting
+a file re-embeds chunks that haven't changed. `CachedEmbedding` wraps the
+model `Brain.get_embedding` builds and serves repeats from:
+
+1. an in-process LRU bounded by `EMBEDDING_CACHE_MB` (per worker), then
+2. an optional shared tier picked by `EMBEDDING_CACHE_BACKEND`:
+   ``redis`` (the Redis configured in Settings, entries expire after
+   `EMBEDDING_CACHE_TTL` seconds) or ``disk`` (one file per vector under
+   `EMBEDDING_CACHE_DIR`, shared by every worker on the host).
+
+Keys are ``<embedding name>:<options hash>:<q|t>:<text hash>`` — editing an
+embedding's options changes the hash, so stale vectors are never served,
+and query/document embeddings are kept apart for models that treat them
+differently. Vectors are stored as float32.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from pydantic import PrivateAttr
+
+from restai import config
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "embcache:"
+
+
+def _pack(vector) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(raw: bytes) -> List[float]:
+    vec = array("f")
+    vec.frombytes(raw)
+    return vec.tolist()
+
+
+def _text_hash(text: str) -> str:
+    normalized = unicodedata.normalize("NFC", text).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def options_hash(class_name: str, options: Optional[str]) -> str:
+    """Short digest of what determines an embedding's output."""
+    try:
+        canonical = json.dumps(json.loads(options or "{}"), sort_keys=True)
+    except (TypeError, ValueError):
+        canonical = options or ""
+    return hashlib.sha256(f"{class_name}\x00{canonical}".encode("utf-8")).hexdigest()[:16]
+
+
+class _LRU:
+    """Thread-safe LRU of packed vectors, bounded by total bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            raw = self._data.get(key)
+            if raw is not None:
+                self._data.move_to_end(key)
+            return raw
+
+    def put(self, key: str, raw: bytes) -> None:
+        if len(raw) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self._data[key] = raw
+            self.bytes += len(raw)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.bytes -= len(evicted)
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+
+class _RedisTier:
+    """Shared tier on the Settings-configured Redis. Self-healing like the
+    image cache: rebuilt when the URL changes, skipped while unset."""
+
+    name = "redis"
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._client = None
+        self._url = None
+
+    def _redis(self):
+        url = config.build_redis_url()
+        if not url:
+            self._client = self._url = None
+            return None
+        if self._client is not None and self._url == url:
+            return self._client
+        try:
+            import redis
+            self._client = redis.Redis.from_url(url)
+            self._url = url
+        except Exception as e:
+            logger.warning("embedding cache: failed to build Redis client (%s)", e)
+            return None
+        return self._client
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        client = self._redis()
+        if client is None:
+            return [None] * len(keys)
+        return client.mget([_KEY_PREFIX + k for k in keys])
+
+    def put_many(self, items: dict) -> None:
+        client = self._redis()
+        if client is None:
+            return
+        pipe = client.pipeline(transaction=False)
+        for key, raw in items.items():
+            pipe.set(_KEY_PREFIX + key, raw, ex=self.ttl)
+        pipe.execute()
+
+
+class _DiskTier:
+    """One float32 file per vector, sharded by key hash. Writes go through a
+    temp file + rename so concurrent workers never see a partial vector."""
+
+    name = "disk"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], digest)
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        out = []
+        for key in keys:
+            try:
+                with open(self._path(key), "rb") as f:
+                    out.append(f.read())
+            except FileNotFoundError:
+                out.append(None)
+        return out
+
+    def put_many(self, items: dict) -> None:
+        for key, raw in items.items():
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(raw)
+                os.replace(tmp, path)
+            except Exception:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+
+
+class EmbeddingVectorCache:
+    """Two-tier vector store keyed by cache key. Shared-tier errors are
+    logged and treated as misses — the cache never fails an embedding."""
+
+    def __init__(self, max_bytes: int, backend: str = "", ttl: int = 0, root: str = ""):
+        self.memory = _LRU(max_bytes)
+        self.shared = None
+        if backend == "redis":
+            self.shared = _RedisTier(ttl)
+        elif backend == "disk":
+            self.shared = _DiskTier(root)
+        elif backend:
+            logger.warning("embedding cache: unknown EMBEDDING_CACHE_BACKEND '%s', using memory only", backend)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "shared_hits": 0, "misses": 0, "errors": 0}
+
+    def _count(self, field: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[field] += n
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        found: List[Optional[bytes]] = [self.memory.get(k) for k in keys]
+        self._count("hits", sum(1 for raw in found if raw is not None))
+
+        missing = [i for i, raw in enumerate(found) if raw is None]
+        if missing and self.shared is not None:
+            try:
+                shared = self.shared.get_many([keys[i] for i in missing])
+            except Exception as e:
+                logger.warning("embedding cache: %s read failed (%s)", self.shared.name, e)
+                self._count("errors")
+                shared = [None] * len(missing)
+            for i, raw in zip(missing, shared):
+                if raw is not None:
+                    found[i] = raw
+                    self.memory.put(keys[i], raw)
+                    self._count("shared_hits")
+
+        self._count("misses", sum(1 for raw in found if raw is None))
+        return [None if raw is None else _unpack(raw) for raw in found]
+
+    def put_many(self, items: dict) -> None:
+        packed = {k: _pack(v) for k, v in items.items()}
+        for key, raw in packed.items():
+            self.memory.put(key, raw)
+        if self.shared is not None and packed:
+            try:
+                self.shared.put_many(packed)
+            except Exception as e:
+                logger.warning("embedding cache: %s write failed (%s)", self.shared.name, e)
+                self._count("errors")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        stats["entries"] = len(self.memory)
+        stats["bytes"] = self.memory.bytes
+        stats["max_bytes"] = self.memory.max_bytes
+        stats["backend"] = self.shared.name if self.shared is not None else "memory"
+        return stats
+
+    def clear(self) -> None:
+        self.memory.clear()
+        with self._lock:
+            for field in self._stats:
+                self._stats[field] = 0
+
+
+_cache: Optional[EmbeddingVectorCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_vector_cache() -> EmbeddingVectorCache:
+    """The per-worker cache, built on first use from the EMBEDDING_CACHE_* env."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingVectorCache(
+                    int(config.EMBEDDING_CACHE_MB * 1024 * 1024),
+                    config.EMBEDDING_CACHE_BACKEND,
+                    config.EMBEDDING_CACHE_TTL,
+                    config.EMBEDDING_CACHE_DIR,
+                )
+    return _cache
+
+
+def embedding_cache_stats() -> dict:
+    return get_vector_cache().stats()
+
+
+class CachedEmbedding(BaseEmbedding):
+    """LlamaIndex embedding that answers from the vector cache and only sends
+    misses to the wrapped model, batch-wise."""
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _namespace: str = PrivateAttr()
+    _cache: EmbeddingVectorCache = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, namespace: str, cache: Optional[EmbeddingVectorCache] = None, **kwargs: Any):
+        super().__init__(
+            model_name=inner.model_name,
+            embed_batch_size=inner.embed_batch_size,
+            num_workers=inner.num_workers,
+            **kwargs,
+        )
+        self._inner = inner
+        self._namespace = namespace
+        self._cache = cache if cache is not None else get_vector_cache()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def inner(self) -> BaseEmbedding:
+        return self._inner
+
+    def _keys(self, kind: str, texts: List[str]) -> List[str]:
+        return [f"{self._namespace}:{kind}:{_text_hash(t)}" for t in texts]
+
+    def _lookup(self, kind: str, texts: List[str]):
+        keys = self._keys(kind, texts)
+        vectors = self._cache.get_many(keys)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        return keys, vectors, missing
+
+    def _store(self, keys, vectors, missing, computed) -> List[List[float]]:
+        fresh = {}
+        for i, vector in zip(missing, computed):
+            vectors[i] = vector
+            fresh[keys[i]] = vector
+        self._cache.put_many(fresh)
+        return vectors
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        keys, vectors, missing = self._lookup("q", [query])
+        if not missing:
+            return vectors[0]
+        return self._store(keys, vectors, missing, [self._inner._get_query_embedding(query)])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        keys, vectors, missing = self._lookup("q", [query])
+        if not missing:
+            return vectors[0]
+        return self._store(keys, vectors, missing, [await self._inner._aget_query_embedding(query)])[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = self._lookup("t", texts)
+        if not missing:
+            return vectors
+        computed = self._inner._get_text_embeddings([texts[i] for i in missing])
+        return self._store(keys, vectors, missing, computed)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = self._lookup("t", texts)
+        if not missing:
+            return vectors
+        computed = await self._inner._aget_text_embeddings([texts[i] for i in missing])
+        return self._store(keys, vectors, missing, computed)
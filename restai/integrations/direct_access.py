@@ -128,7 +128,7 @@ def log_direct_usage(
     output_cost: float,
     api_key_id: Optional[int] = None,
 ):
-    entry = OutputDatabase(
+    row = dict(
         user_id=user_id,
         project_id=None,
         team_id=team_id,
@@ -142,8 +142,24 @@ def log_direct_usage(
         input_cost=input_cost,
         output_cost=output_cost,
     )
-    db.db.add(entry)
-    db.db.commit()
+    # Queued rows carry their own token / wallet billing (see log_inference).
+    from restai.observability.inference_writer import inference_writer
+    queued = inference_writer.submit("output", [row])
+    if not queued:
+        db.db.add(OutputDatabase(**row))
+        db.db.commit()
+
+    try:
+        from restai.limits.ledger import ledger
+        ledger.record(
+            cost=(input_cost or 0.0) + (output_cost or 0.0),
+            team_id=team_id, user_id=user_id, api_key_id=api_key_id,
+        )
+    except Exception:
+        pass
+
+    if queued:
+        return
 
     # Count tokens against the API key's monthly quota (parity with the project
     # chat path). No-op for cookie/basic auth or keys without a quota.
@@ -0,0 +1,221 @@
+"""Set-based writes for knowledge-graph extraction.
+
+`extract_and_persist` used to look up each entity, each mention and each
+co-occurrence edge with its own SELECT before writing it. A document naming
+200 entities made about 20,000 round-trips, most of them for the 19,900
+edges, all inside one transaction.
+
+The three upserts here take whole row sets instead:
+
+- With the unique keys in place (`uq_kg_entities_project_norm_type`,
+  `uq_kg_mentions_entity_source`, `uq_kg_rel_project_from_to`), each batch
+  of rows is one executemany of `INSERT … ON CONFLICT DO UPDATE` (SQLite,
+  PostgreSQL) or `INSERT … ON DUPLICATE KEY UPDATE` (MySQL). The statement
+  adds to `mention_count` / `weight`, so concurrent extractions for the
+  same project can't lose increments or create duplicates.
+- Databases created by `create_all` before those keys were declared on
+  the models lack them (migration 062 adds them), and other dialects have
+  no upsert SQLAlchemy can emit. There, existing rows are fetched with one
+  IN-query per batch, and updates and inserts go out as executemany
+  batches.
+
+Entity ids come back from one IN-query. Edges are generated lazily from the
+sorted id list and written `_EDGE_BATCH` pairs at a time, so a large
+document never holds its whole pair list in memory.
+"""
+
+import importlib
+import itertools
+import threading
+from datetime import datetime
+from typing import Iterable, Iterator
+
+import sqlalchemy as sa
+
+from restai.models.databasemodels import (
+    KGEntityDatabase,
+    KGEntityMentionDatabase,
+    KGEntityRelationshipDatabase,
+)
+
+
+_ENTITIES = KGEntityDatabase.__table__
+_MENTIONS = KGEntityMentionDatabase.__table__
+_EDGES = KGEntityRelationshipDatabase.__table__
+
+# Values per IN-list stay under SQLite's historical 999-parameter limit.
+_MAX_PARAMS = 900
+_EDGE_BATCH = 1000
+
+# Dialect name -> the sqlalchemy.dialects module whose `insert` upserts.
+_UPSERT_DIALECTS = {"sqlite": "sqlite", "postgresql": "postgresql", "mysql": "mysql", "mariadb": "mysql"}
+
+_unique_keys_lock = threading.Lock()
+# engine url -> {table name: set of unique column tuples}
+_unique_keys: dict = {}
+
+
+def _batches(rows: Iterable, size: int) -> Iterator[list]:
+    it = iter(rows)
+    while batch := list(itertools.islice(it, size)):
+        yield batch
+
+
+def _has_unique_key(session, table: sa.Table, columns: tuple[str, ...]) -> bool:
+    bind = session.get_bind()
+    url = str(bind.engine.url)
+    with _unique_keys_lock:
+        cached = _unique_keys.get(url, {}).get(table.name)
+    if cached is None:
+        # Through the session's own connection: a pooled one may be the
+        # same connection (StaticPool), and returning it rolls back.
+        insp = sa.inspect(session.connection())
+        cached = {tuple(c["column_names"]) for c in insp.get_unique_constraints(table.name)}
+        cached |= {tuple(i["column_names"]) for i in insp.get_indexes(table.name) if i.get("unique")}
+        with _unique_keys_lock:
+            _unique_keys.setdefault(url, {})[table.name] = cached
+    return any(sorted(key) == sorted(columns) for key in cached)
+
+
+def _native_upsert(session, table: sa.Table, key: tuple[str, ...]) -> bool:
+    """Whether `key` conflicts can be resolved by `_upsert`: the dialect has
+    an upsert and `table` has the unique key. Otherwise callers take the
+    set-based fallback."""
+    return session.get_bind().dialect.name in _UPSERT_DIALECTS and _has_unique_key(session, table, key)
+
+
+def _upsert(session, table: sa.Table, rows: list[dict], key: tuple[str, ...], add: tuple[str, ...], assign: tuple[str, ...] = ()):
+    """Insert `rows`; on a `key` conflict add the `add` columns onto the
+    stored row and overwrite the `assign` ones. One statement, executed
+    with the whole row list: compiled once, and batched into multi-row
+    VALUES by the driver or SQLAlchemy's insertmanyvalues."""
+    dialect = session.get_bind().dialect.name
+    stmt = importlib.import_module(f"sqlalchemy.dialects.{_UPSERT_DIALECTS[dialect]}").insert(table)
+    if dialect in ("mysql", "mariadb"):
+        new = stmt.inserted
+        stmt = stmt.on_duplicate_key_update(
+            {c: table.c[c] + new[c] for c in add} | {c: new[c] for c in assign}
+        )
+    else:
+        new = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key),
+            set_={c: table.c[c] + new[c] for c in add} | {c: new[c] for c in assign},
+        )
+    session.execute(stmt, rows)
+
+
+def _select_in(session, columns, column, values: list, *where) -> list:
+    found = []
+    for batch in _batches(values, _MAX_PARAMS):
+        found.extend(session.execute(sa.select(*columns).where(column.in_(batch), *where)).all())
+    return found
+
+
+def upsert_entities(session, project_id: int, counts: dict, names: dict, now: datetime) -> dict:
+    """Add `counts[(normalized, type)]` to each entity's `mention_count`,
+    creating it with `names[key]` if needed. Returns key → entity id."""
+    if not counts:
+        return {}
+    key = ("project_id", "normalized", "entity_type")
+    if _native_upsert(session, _ENTITIES, key):
+        _upsert(session, _ENTITIES, [
+            {"project_id": project_id, "name": names[k], "normalized": k[0], "entity_type": k[1],
+             "mention_count": n, "created_at": now, "updated_at": now}
+            for k, n in counts.items()
+        ], key, add=("mention_count",), assign=("updated_at",))
+    else:
+        existing = {
+            (norm, etype): eid for eid, norm, etype in _select_in(
+                session, (_ENTITIES.c.id, _ENTITIES.c.normalized, _ENTITIES.c.entity_type),
+                _ENTITIES.c.normalized, sorted({k[0] for k in counts}), _ENTITIES.c.project_id == project_id,
+            ) if (norm, etype) in counts
+        }
+        if existing:
+            session.execute(
+                _ENTITIES.update()
+                .where(_ENTITIES.c.id == sa.bindparam("_id"))
+                .values(mention_count=_ENTITIES.c.mention_count + sa.bindparam("_n"), updated_at=now),
+                [{"_id": eid, "_n": counts[k]} for k, eid in existing.items()],
+            )
+        new = [k for k in counts if k not in existing]
+        if new:
+            session.execute(_ENTITIES.insert(), [
+                {"project_id": project_id, "name": names[k], "normalized": k[0], "entity_type": k[1],
+                 "mention_count": counts[k], "created_at": now, "updated_at": now}
+                for k in new
+            ])
+    return {
+        (norm, etype): eid for eid, norm, etype in _select_in(
+            session, (_ENTITIES.c.id, _ENTITIES.c.normalized, _ENTITIES.c.entity_type),
+            _ENTITIES.c.normalized, sorted({k[0] for k in counts}), _ENTITIES.c.project_id == project_id,
+        ) if (norm, etype) in counts
+    }
+
+
+def upsert_mentions(session, project_id: int, source: str, counts: dict[int, int], now: datetime) -> None:
+    """Add `counts[entity_id]` to each entity's mention count for `source`."""
+    if not counts:
+        return
+    key = ("entity_id", "source")
+    rows = [
+        {"entity_id": eid, "project_id": project_id, "source": source, "mention_count": n, "created_at": now}
+        for eid, n in counts.items()
+    ]
+    if _native_upsert(session, _MENTIONS, key):
+        _upsert(session, _MENTIONS, rows, key, add=("mention_count",))
+        return
+    existing = {
+        eid: mid for mid, eid in _select_in(
+            session, (_MENTIONS.c.id, _MENTIONS.c.entity_id), _MENTIONS.c.entity_id, sorted(counts),
+            _MENTIONS.c.source == source,
+        )
+    }
+    if existing:
+        session.execute(
+            _MENTIONS.update()
+            .where(_MENTIONS.c.id == sa.bindparam("_id"))
+            .values(mention_count=_MENTIONS.c.mention_count + sa.bindparam("_n")),
+            [{"_id": mid, "_n": counts[eid]} for eid, mid in existing.items()],
+        )
+    new = [r for r in rows if r["entity_id"] not in existing]
+    if new:
+        session.execute(_MENTIONS.insert(), new)
+
+
+def upsert_edges(session, project_id: int, entity_ids: Iterable[int], now: datetime) -> None:
+    """Add 1 to the co-occurrence weight of every pair of `entity_ids`
+    (stored as from < to)."""
+    ids = sorted(set(entity_ids))
+    if len(ids) < 2:
+        return
+    key = ("project_id", "from_entity_id", "to_entity_id")
+    pairs = itertools.combinations(ids, 2)
+    if _native_upsert(session, _EDGES, key):
+        for batch in _batches(pairs, _EDGE_BATCH):
+            _upsert(session, _EDGES, [
+                {"project_id": project_id, "from_entity_id": a, "to_entity_id": b, "weight": 1, "created_at": now}
+                for a, b in batch
+            ], key, add=("weight",))
+        return
+    # Every stored edge among these entities, in one pass over the `from` side.
+    id_set = set(ids)
+    existing = {
+        (a, b): eid for eid, a, b in _select_in(
+            session, (_EDGES.c.id, _EDGES.c.from_entity_id, _EDGES.c.to_entity_id),
+            _EDGES.c.from_entity_id, ids, _EDGES.c.project_id == project_id,
+        ) if b in id_set
+    }
+    if existing:
+        for batch in _batches(existing.values(), _EDGE_BATCH):
+            session.execute(
+                _EDGES.update()
+                .where(_EDGES.c.id == sa.bindparam("_id"))
+                .values(weight=_EDGES.c.weight + 1),
+                [{"_id": eid} for eid in batch],
+            )
+    for batch in _batches((p for p in pairs if p not in existing), _EDGE_BATCH):
+        session.execute(_EDGES.insert(), [
+            {"project_id": project_id, "from_entity_id": a, "to_entity_id": b, "weight": 1, "created_at": now}
+            for a, b in batch
+        ])
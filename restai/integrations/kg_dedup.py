@@ -0,0 +1,355 @@
+"""Near-duplicate entity detection for the knowledge graph.
+
+`compute_potential_duplicates` used to run `difflib.SequenceMatcher` on
+every pair of same-type entities on every call of
+`/projects/{id}/kg/duplicates`: n²/2 pure-Python comparisons, which at 100k
+entities never finished.
+
+A `DuplicateIndex` uses MinHash LSH to pick the pairs worth comparing:
+
+- Each normalized name becomes a set of character bigrams. The name is
+  padded with spaces, so word boundaries count.
+- NumPy computes a `_PERMUTATIONS`-value MinHash signature of each set and
+  cuts it into `_BANDS` bands of `_ROWS` values.
+- Two entities of the same type that agree on a whole band are a
+  candidate pair. With 32 bands of 4 rows, a pair becomes a candidate with
+  probability ≈0.87 at bigram Jaccard 0.5 and ≈0.99 at 0.6. Typo-level
+  variants of a name ("Jonathan"/"Jonathon", "Microsoft"/"Microsft") sit
+  above that; the pairs a 0.85 threshold reports almost always have a
+  Jaccard of 0.5 or more.
+- A band value already shared by more than `_BUCKET_LIMIT` entities (made
+  of very common bigrams) yields no candidates.
+- Candidates are grouped, deduplicated and filtered as arrays: by type, by
+  the Jaccard similarity their signatures estimate, and by the length
+  bound on the ratio. Only the survivors get the exact
+  `SequenceMatcher.ratio()`.
+
+Recall is no longer exact. A pair that is textually close but shares few
+bigrams can be missed, mostly below a 0.8 threshold.
+
+The index keeps every pair scoring at least `_MIN_SIMILARITY` (the lowest
+threshold the endpoint accepts) and answers any threshold and limit from
+that ranked list. Each worker keeps one per project (`duplicate_index`),
+outside restai/object_cache.py: project, LLM and settings edits don't
+concern it, and rebuilding one costs seconds at 100k entities. It is brought
+up to date incrementally instead. Each call compares
+`(count, max(updated_at))` of the project's entities with what the index
+last saw. When that has moved, only the rows updated since are read. New
+entities are hashed and matched against the whole index, and renamed ones
+are re-indexed. If the count still disagrees after that, something was
+deleted or merged, and the id list is re-read to drop the missing entities
+and their pairs. Callers in `async` code run it in a thread: the first
+build of a large graph is slow.
+"""
+
+import threading
+import zlib
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Iterable
+
+import numpy as np
+from sqlalchemy import func
+
+from restai.models.databasemodels import KGEntityDatabase
+
+_BANDS = 32
+_ROWS = 4
+_PERMUTATIONS = _BANDS * _ROWS
+_BUCKET_LIMIT = 100
+_MIN_ESTIMATE = 0.4
+_MIN_SIMILARITY = 0.5
+# Projects whose index each worker keeps, least recently used dropped first.
+_MAX_INDEXES = 16
+_PRIME = (1 << 31) - 1
+
+_rng = np.random.default_rng(20240611)
+_A = _rng.integers(1, _PRIME, _PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, _PERMUTATIONS, dtype=np.uint64)
+_BAND_MIX = _rng.integers(1, 1 << 63, _ROWS, dtype=np.uint64) | np.uint64(1)
+_TYPE_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _bigrams(normalized: str) -> list[int]:
+    padded = f" {normalized} "
+    return list({zlib.crc32(padded[i:i + 2].encode()) & _PRIME for i in range(len(padded) - 1)})
+
+
+def _signatures(names: list[str]) -> np.ndarray:
+    """MinHash signatures, one row per name."""
+    grams = [_bigrams(n) for n in names]
+    sizes = np.fromiter((len(g) for g in grams), dtype=np.int64, count=len(grams))
+    flat = np.fromiter((h for g in grams for h in g), dtype=np.uint64, count=int(sizes.sum()))
+    offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    out = np.empty((len(names), _PERMUTATIONS), dtype=np.uint32)
+    # Bounded memory: one (permutations x bigrams) block per chunk.
+    chunk = 2048
+    for start in range(0, len(names), chunk):
+        stop = min(start + chunk, len(names))
+        lo, hi = offsets[start], offsets[stop - 1] + sizes[stop - 1]
+        hashed = (_A[:, None] * flat[None, lo:hi] + _B[:, None]) % _PRIME
+        out[start:stop] = np.minimum.reduceat(hashed, offsets[start:stop] - lo, axis=1).T
+    return out
+
+
+def _group_pairs(keys: np.ndarray, rows: np.ndarray, first_new: int) -> np.ndarray:
+    """Row pairs sharing a value in `keys` (one band of `rows`, sorted by
+    key), limited to pairs with at least one row ≥ `first_new`."""
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    sizes = np.diff(np.append(starts, len(keys)))
+    has_new = np.maximum.reduceat(rows, starts) >= first_new
+    keep = (sizes >= 2) & (sizes <= _BUCKET_LIMIT) & has_new
+    out = []
+    for size in np.unique(sizes[keep]).tolist():
+        members = rows[starts[keep & (sizes == size)][:, None] + np.arange(size)]
+        a, b = np.triu_indices(size, 1)
+        out.append(np.stack((members[:, a].ravel(), members[:, b].ravel()), axis=1))
+    return np.concatenate(out) if out else np.empty((0, 2), dtype=rows.dtype)
+
+
+class DuplicateIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Arrays and lists indexed by row. A renamed or deleted entity's row
+        # is marked dead, and a rename gets a new row.
+        self._sigs = np.empty((0, _PERMUTATIONS), dtype=np.uint32)
+        self._keys = np.empty((0, _BANDS), dtype=np.uint64)
+        self._types = np.empty(0, dtype=np.int64)
+        self._lengths = np.empty(0, dtype=np.int64)
+        self._alive = np.empty(0, dtype=bool)
+        self._rows = 0
+        self._ids: list[int] = []
+        self._normalized: list[str] = []
+        self._etypes: list[str] = []
+        self._type_codes: dict[str, int] = {}
+        # id -> (row, display name)
+        self._entities: dict[int, tuple[int, str]] = {}
+        # (a, b) with a < b -> ratio
+        self._pairs: dict[tuple[int, int], float] = {}
+        self._partners: dict[int, set[int]] = {}
+        # Per band: (band values of the indexed rows, sorted; their rows).
+        # Dead rows stay in until the next full pass.
+        self._bands = None
+        self._ranked = None
+        self._seen = None  # (count, max updated_at) last read
+        self.stats = {"entities": 0, "compared": 0, "refreshes": 0}
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    def _grow(self, extra: int) -> None:
+        need = self._rows + extra
+        if need <= len(self._alive):
+            return
+        size = max(need, 2 * len(self._alive), 1024)
+        for name in ("_sigs", "_keys", "_types", "_lengths", "_alive"):
+            old = getattr(self, name)
+            grown = np.zeros((size,) + old.shape[1:], dtype=old.dtype)
+            grown[:self._rows] = old[:self._rows]
+            setattr(self, name, grown)
+
+    def _remove(self, entity_id: int) -> None:
+        entry = self._entities.pop(entity_id, None)
+        if entry is None:
+            return
+        self._alive[entry[0]] = False
+        for other in self._partners.pop(entity_id, ()):
+            self._pairs.pop((min(entity_id, other), max(entity_id, other)), None)
+            self._partners[other].discard(entity_id)
+        self._ranked = None
+
+    def add(self, rows: Iterable[tuple[int, str, str, str]]) -> None:
+        """Index `(id, normalized, entity_type, name)` rows. Known ids with an
+        unchanged name and type only have their display name refreshed."""
+        fresh = {}
+        for entity_id, normalized, etype, name in rows:
+            entry = self._entities.get(entity_id)
+            if entry is not None and (self._normalized[entry[0]], self._etypes[entry[0]]) == (normalized, etype):
+                if entry[1] != name:
+                    self._entities[entity_id] = (entry[0], name)
+                    self._ranked = None
+                continue
+            self._remove(entity_id)
+            if normalized:
+                fresh[entity_id] = (normalized, etype, name)
+        if not fresh:
+            return
+        start = self._rows
+        self._grow(len(fresh))
+        stop = start + len(fresh)
+        names = [v[0] for v in fresh.values()]
+        self._sigs[start:stop] = _signatures(names)
+        bands = self._sigs[start:stop].reshape(len(fresh), _BANDS, _ROWS).astype(np.uint64)
+        codes = np.array([self._type_codes.setdefault(v[1], len(self._type_codes)) for v in fresh.values()])
+        # Folding the type in keeps different types out of each other's
+        # buckets; `_match` still checks, for hash collisions.
+        self._keys[start:stop] = (bands * _BAND_MIX).sum(axis=2) ^ (codes.astype(np.uint64) * _TYPE_MIX)[:, None]
+        self._types[start:stop] = codes
+        self._lengths[start:stop] = [len(n) for n in names]
+        self._alive[start:stop] = True
+        for row, (entity_id, (normalized, etype, name)) in enumerate(fresh.items(), start):
+            self._ids.append(entity_id)
+            self._normalized.append(normalized)
+            self._etypes.append(etype)
+            self._entities[entity_id] = (row, name)
+        self._rows = stop
+        self._match(start)
+        self._ranked = None
+
+    def _candidate_pairs(self, first_new: int) -> np.ndarray:
+        new = np.arange(first_new, self._rows)
+        if self._bands is None or 8 * len(new) > self._rows:
+            # Full pass: sort every band of the live rows and pair up groups.
+            live = np.flatnonzero(self._alive[:self._rows])
+            self._bands, found = [], []
+            for band in range(_BANDS):
+                keys = self._keys[live, band]
+                order = np.argsort(keys, kind="stable")
+                self._bands.append((keys[order], live[order]))
+                found.append(_group_pairs(keys[order], live[order], first_new))
+            return np.concatenate(found)
+        # A few new rows: merge them into the sorted bands and pair each one
+        # with its group, without re-sorting.
+        found = [np.empty((0, 2), dtype=np.int64)]
+        for band, (keys, rows) in enumerate(self._bands):
+            order = np.argsort(self._keys[new, band], kind="stable")
+            new_rows = new[order]
+            new_keys = self._keys[new_rows, band]
+            at = np.searchsorted(keys, new_keys)
+            keys, rows = np.insert(keys, at, new_keys), np.insert(rows, at, new_rows)
+            self._bands[band] = (keys, rows)
+            left, right = np.searchsorted(keys, new_keys, "left"), np.searchsorted(keys, new_keys, "right")
+            for row, lo, hi in zip(new_rows.tolist(), left.tolist(), right.tolist()):
+                if 2 <= hi - lo <= _BUCKET_LIMIT:
+                    found.append(np.stack((np.full(hi - lo, row), rows[lo:hi]), axis=1))
+        return np.concatenate(found)
+
+    def _match(self, first_new: int) -> None:
+        """Score every candidate pair involving a row ≥ `first_new`."""
+        pairs = self._candidate_pairs(first_new)
+        if not len(pairs):
+            return
+        code = np.sort(pairs.min(axis=1) * self._rows + pairs.max(axis=1))
+        code = code[np.concatenate(([True], code[1:] != code[:-1]))]
+        lo, hi = code // self._rows, code % self._rows
+        keep = (lo != hi) & self._alive[lo] & self._alive[hi]
+        lo, hi = lo[keep], hi[keep]
+        # ratio = 2·matches / (len_a + len_b) ≤ 2·min(len) / (len_a + len_b)
+        la, lb = self._lengths[lo], self._lengths[hi]
+        keep = (self._types[lo] == self._types[hi]) & (2 * np.minimum(la, lb) >= _MIN_SIMILARITY * (la + lb))
+        lo, hi = lo[keep], hi[keep]
+        estimate = np.empty(len(lo))
+        step = 65536
+        for s in range(0, len(lo), step):
+            estimate[s:s + step] = (self._sigs[lo[s:s + step]] == self._sigs[hi[s:s + step]]).mean(axis=1)
+        lo, hi = lo[estimate >= _MIN_ESTIMATE], hi[estimate >= _MIN_ESTIMATE]
+        order = np.lexsort((lo, hi))
+        self._score(lo[order].tolist(), hi[order].tolist())
+
+    def _score(self, lows: list[int], highs: list[int]) -> None:
+        matcher, matcher_row = None, None
+        for lo, hi in zip(lows, highs):
+            a, b = self._normalized[lo], self._normalized[hi]
+            if a == b:
+                continue
+            id_lo, id_hi = self._ids[lo], self._ids[hi]
+            if id_lo < id_hi:
+                # Pairs come sorted by the higher row, which SequenceMatcher
+                # indexes once as the second sequence and reuses.
+                if matcher_row != hi:
+                    matcher, matcher_row = SequenceMatcher(None, "", b), hi
+                matcher.set_seq1(a)
+                pair, m = (id_lo, id_hi), matcher
+            else:
+                # Same argument order as the old all-pairs loop, whose ratio
+                # isn't symmetric: the lower id first.
+                pair, m = (id_hi, id_lo), SequenceMatcher(None, b, a)
+            # The same cheap upper bound as difflib.get_close_matches.
+            if m.quick_ratio() < _MIN_SIMILARITY:
+                continue
+            self.stats["compared"] += 1
+            ratio = m.ratio()
+            if ratio >= _MIN_SIMILARITY:
+                self._pairs[pair] = ratio
+                self._partners.setdefault(pair[0], set()).add(pair[1])
+                self._partners.setdefault(pair[1], set()).add(pair[0])
+
+    def refresh(self, session, project_id: int) -> None:
+        """Catch up with the project's `kg_entities` rows."""
+        with self._lock:
+            seen = tuple(
+                session.query(func.count(KGEntityDatabase.id), func.max(KGEntityDatabase.updated_at))
+                .filter(KGEntityDatabase.project_id == project_id)
+                .one()
+            )
+            if seen == self._seen:
+                return
+            self.stats["refreshes"] += 1
+            columns = (KGEntityDatabase.id, KGEntityDatabase.normalized, KGEntityDatabase.entity_type, KGEntityDatabase.name)
+            q = session.query(*columns).filter(KGEntityDatabase.project_id == project_id)
+            if self._seen is not None and self._seen[1] is not None:
+                q = q.filter(KGEntityDatabase.updated_at >= self._seen[1])
+            self.add(q.order_by(KGEntityDatabase.id).all())
+            if len(self._entities) != seen[0]:
+                live = {
+                    row[0] for row in
+                    session.query(KGEntityDatabase.id).filter(KGEntityDatabase.project_id == project_id)
+                }
+                for entity_id in set(self._entities) - live:
+                    self._remove(entity_id)
+                missing = live - set(self._entities)
+                if missing:
+                    self.add(
+                        session.query(*columns)
+                        .filter(KGEntityDatabase.project_id == project_id, KGEntityDatabase.id.in_(missing))
+                        .order_by(KGEntityDatabase.id)
+                        .all()
+                    )
+            self._seen = seen
+            self.stats["entities"] = len(self._entities)
+
+    def candidates(self, threshold: float, limit: int) -> list[dict]:
+        """The pairs scoring at least `threshold`, most similar first."""
+        with self._lock:
+            if self._ranked is None:
+                pairs = np.array(list(self._pairs), dtype=np.int64).reshape(-1, 2)
+                ratios = np.fromiter(self._pairs.values(), dtype=np.float64, count=len(self._pairs))
+                order = np.lexsort((pairs[:, 1], pairs[:, 0], -ratios))
+                self._ranked = (pairs[order], ratios[order])
+            pairs, ratios = self._ranked
+            # `ratios` is descending: count the ones at or above `threshold`.
+            n = min(limit, len(ratios) - int(np.searchsorted(ratios[::-1], threshold, side="left")))
+            return [
+                {
+                    "entity_a_id": a,
+                    "entity_a_name": self._entities[a][1],
+                    "entity_b_id": b,
+                    "entity_b_name": self._entities[b][1],
+                    "similarity": round(ratio, 3),
+                }
+                for (a, b), ratio in zip(pairs[:n].tolist(), ratios[:n].tolist())
+            ]
+
+
+_indexes: "OrderedDict[int, DuplicateIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def duplicate_index(db, project_id: int) -> DuplicateIndex:
+    """The project's index, caught up with its `kg_entities` rows."""
+    with _indexes_lock:
+        index = _indexes.get(project_id)
+        if index is None:
+            index = _indexes[project_id] = DuplicateIndex()
+        _indexes.move_to_end(project_id)
+        while len(_indexes) > _MAX_INDEXES:
+            _indexes.popitem(last=False)
+    index.refresh(db.db, project_id)
+    return index
+
+
+def invalidate_duplicate_index(project_id: int) -> None:
+    """Drop the project's index, when its whole graph is wiped: cheaper
+    than catching up with the deletions."""
+    with _indexes_lock:
+        _indexes.pop(project_id, None)
@@ -6,11 +6,13 @@ per project), kg_entity_mentions (entity x source), kg_entity_relationships
 """
 import logging
 import re
-from collections import Counter, defaultdict
+from collections import Counter
 from datetime import datetime, timezone
-from difflib import SequenceMatcher
 from typing import Optional
 
+from restai.integrations import kg_bulk
+from restai.integrations.kg_dedup import duplicate_index
+from restai.integrations.kg_matcher import invalidate_entity_matcher
 from restai.models.databasemodels import (
     KGEntityDatabase,
     KGEntityMentionDatabase,
@@ -84,81 +86,14 @@ def extract_and_persist(project_id: int, source: str, text: str, brain, db) -> i
 
     now = datetime.now(timezone.utc)
     session = db.db
-    entity_ids: dict[tuple[str, str], int] = {}
-
-    for (normalized, etype), count in per_source_counts.items():
-        existing = (
-            session.query(KGEntityDatabase)
-            .filter(
-                KGEntityDatabase.project_id == project_id,
-                KGEntityDatabase.normalized == normalized,
-                KGEntityDatabase.entity_type == etype,
-            )
-            .first()
-        )
-        if existing:
-            existing.mention_count = (existing.mention_count or 0) + count
-            existing.updated_at = now
-            entity_ids[(normalized, etype)] = existing.id
-        else:
-            ent = KGEntityDatabase(
-                project_id=project_id,
-                name=canonical_names[(normalized, etype)],
-                normalized=normalized,
-                entity_type=etype,
-                mention_count=count,
-                created_at=now,
-                updated_at=now,
-            )
-            session.add(ent)
-            session.flush()
-            entity_ids[(normalized, etype)] = ent.id
-
-    for (normalized, etype), count in per_source_counts.items():
-        eid = entity_ids[(normalized, etype)]
-        existing_mention = (
-            session.query(KGEntityMentionDatabase)
-            .filter(
-                KGEntityMentionDatabase.entity_id == eid,
-                KGEntityMentionDatabase.source == source,
-            )
-            .first()
-        )
-        if existing_mention:
-            existing_mention.mention_count = (existing_mention.mention_count or 0) + count
-        else:
-            session.add(KGEntityMentionDatabase(
-                entity_id=eid,
-                project_id=project_id,
-                source=source,
-                mention_count=count,
-                created_at=now,
-            ))
-
-    ids_in_source = sorted(entity_ids.values())
-    for i, a in enumerate(ids_in_source):
-        for b in ids_in_source[i + 1:]:
-            existing_edge = (
-                session.query(KGEntityRelationshipDatabase)
-                .filter(
-                    KGEntityRelationshipDatabase.project_id == project_id,
-                    KGEntityRelationshipDatabase.from_entity_id == a,
-                    KGEntityRelationshipDatabase.to_entity_id == b,
-                )
-                .first()
-            )
-            if existing_edge:
-                existing_edge.weight = (existing_edge.weight or 0) + 1
-            else:
-                session.add(KGEntityRelationshipDatabase(
-                    project_id=project_id,
-                    from_entity_id=a,
-                    to_entity_id=b,
-                    weight=1,
-                    created_at=now,
-                ))
-
+    entity_ids = kg_bulk.upsert_entities(session, project_id, per_source_counts, canonical_names, now)
+    kg_bulk.upsert_mentions(
+        session, project_id, source,
+        {entity_ids[key]: count for key, count in per_source_counts.items()}, now,
+    )
+    kg_bulk.upsert_edges(session, project_id, entity_ids.values(), now)
     session.commit()
+    invalidate_entity_matcher(project_id)
     return len(per_source_counts)
 
 
@@ -258,35 +193,11 @@ def merge_entities(db, primary_id: int, secondary_id: int, project_id: int) -> b
     primary.updated_at = now
     session.delete(secondary)
     session.commit()
+    invalidate_entity_matcher(project_id)
     return True
 
 
 def compute_potential_duplicates(db, project_id: int, threshold: float = 0.85, limit: int = 100) -> list[dict]:
-    session = db.db
-    entities = (
-        session.query(KGEntityDatabase)
-        .filter(KGEntityDatabase.project_id == project_id)
-        .all()
-    )
-    by_type: dict[str, list[KGEntityDatabase]] = defaultdict(list)
-    for e in entities:
-        by_type[e.entity_type].append(e)
-
-    candidates: list[dict] = []
-    for etype, ents in by_type.items():
-        for i in range(len(ents)):
-            for j in range(i + 1, len(ents)):
-                a, b = ents[i], ents[j]
-                if a.normalized == b.normalized:
-                    continue
-                ratio = SequenceMatcher(None, a.normalized, b.normalized).ratio()
-                if ratio >= threshold:
-                    candidates.append({
-                        "entity_a_id": a.id,
-                        "entity_a_name": a.name,
-                        "entity_b_id": b.id,
-                        "entity_b_name": b.name,
-                        "similarity": round(ratio, 3),
-                    })
-    candidates.sort(key=lambda c: c["similarity"], reverse=True)
-    return candidates[:limit]
+    """Same-type entity pairs whose names are at least `threshold` similar
+    (`SequenceMatcher` ratio), most similar first. See kg_dedup.py."""
+    return duplicate_index(db, project_id).candidates(threshold, limit)
@@ -1,3 +1,4 @@
+import hashlib
 import json
 import logging
 import os
@@ -32,6 +33,139 @@ def _extract_entities_for_documents(project, documents, db, brain):
         logger.warning(f"Sync entity extraction failed: {e}")
 
 
+def _chunk_hash(chunk) -> str:
+    """Content identity of a chunk: its text plus the metadata stored with it."""
+    payload = json.dumps({"text": chunk.text, "metadata": chunk.metadata}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _manifest_rows(db, project_id, source_name, prefixed=True):
+    """Manifest rows owned by a sync source: `name`, plus `name/...` for
+    sources that fan out into one vector-store source per file/page."""
+    from sqlalchemy import or_
+    from restai.models.databasemodels import ChunkManifestDatabase
+
+    col = ChunkManifestDatabase.source
+    match = or_(col == source_name, col.startswith(f"{source_name}/", autoescape=True)) if prefixed else col == source_name
+    return (
+        db.db.query(ChunkManifestDatabase)
+        .filter(ChunkManifestDatabase.project_id == project_id, match)
+        .all()
+    )
+
+
+def _known_fingerprints(project, source, db) -> dict:
+    """{doc_source: fingerprint} recorded at the last sync with the project's
+    current embedding model. Objects whose upstream version still matches
+    are skipped without downloading."""
+    try:
+        rows = _manifest_rows(db, project.props.id, source.name)
+    except Exception as e:
+        logger.warning(f"Failed to read chunk manifest for '{source.name}': {e}")
+        return {}
+    return {
+        r.source: r.fingerprint
+        for r in rows
+        if r.fingerprint and r.embedding == project.props.embeddings
+    }
+
+
+def _delete_legacy_chunks(project, source, prefixed=True):
+    """First sync of a source with no manifest: drop whatever an earlier,
+    manifest-less sync left in the vector store so it isn't duplicated."""
+    try:
+        if not prefixed:
+            project.vector.delete_source(source.name)
+            return
+        for src in project.vector.list():
+            if src == source.name or src.startswith(f"{source.name}/"):
+                project.vector.delete_source(src)
+    except Exception as e:
+        logger.warning(f"Failed to delete old chunks for source '{source.name}': {e}")
+
+
+def _reindex(project, source, documents, db, skipped=frozenset(), fingerprints=None, prefixed=True):
+    """Bring the vector store in line with `documents` for one sync source,
+    touching only what changed.
+
+    Fresh chunks are diffed against the chunk manifest by content hash:
+    matches are kept as-is, new chunks are embedded and written, and manifest
+    chunks no longer produced are deleted. Sources in `skipped` were not
+    downloaded because their upstream fingerprint didn't move, so their
+    chunks are left alone. Returns (added, kept, removed).
+    """
+    from restai.models.databasemodels import ChunkManifestDatabase
+    from restai.vectordb.tools import insert_nodes_batched, split_documents
+
+    fingerprints = fingerprints or {}
+    embedding = project.props.embeddings
+    rows = _manifest_rows(db, project.props.id, source.name, prefixed)
+    if not rows:
+        _delete_legacy_chunks(project, source, prefixed)
+
+    present = defaultdict(lambda: defaultdict(list))
+    removed_rows = []
+    for row in rows:
+        if row.embedding == embedding:
+            present[row.source][row.content_hash].append(row)
+        else:
+            removed_rows.append(row)
+
+    to_insert = []
+    new_rows = []
+    kept = 0
+    now = datetime.now(timezone.utc)
+    for chunk in split_documents(documents, source.splitter, source.chunks):
+        doc_source = chunk.metadata.get("source", source.name)
+        content_hash = _chunk_hash(chunk)
+        matches = present[doc_source][content_hash]
+        if matches:
+            row = matches.pop()
+            row.fingerprint = fingerprints.get(doc_source)
+            kept += 1
+            continue
+        to_insert.append(chunk)
+        new_rows.append(ChunkManifestDatabase(
+            project_id=project.props.id,
+            source=doc_source,
+            content_hash=content_hash,
+            vector_id=chunk.node_id,
+            embedding=embedding,
+            fingerprint=fingerprints.get(doc_source),
+            created_at=now,
+        ))
+
+    for doc_source, by_hash in present.items():
+        if doc_source in skipped:
+            continue
+        for leftover in by_hash.values():
+            removed_rows.extend(leftover)
+
+    insert_nodes_batched(project, to_insert)
+    if removed_rows:
+        # Rows whose vector survived a failed delete stay in the manifest,
+        # so the next sync finds them stale again and retries.
+        deleted = set(project.vector.delete_ids([r.vector_id for r in removed_rows]))
+        removed_rows = [row for row in removed_rows if row.vector_id in deleted]
+        for row in removed_rows:
+            db.db.delete(row)
+    db.db.add_all(new_rows)
+    db.db.commit()
+    return len(to_insert), kept, len(removed_rows)
+
+
+def forget_chunk_manifest(db, project_id, source=None):
+    """Drop manifest rows after chunks were removed outside a sync (manual
+    source delete, embeddings reset) so the next sync re-embeds them."""
+    from restai.models.databasemodels import ChunkManifestDatabase
+
+    query = db.db.query(ChunkManifestDatabase).filter(ChunkManifestDatabase.project_id == project_id)
+    if source is not None:
+        query = query.filter(ChunkManifestDatabase.source == source)
+    query.delete(synchronize_session=False)
+    db.db.commit()
+
+
 def _sync_source(project, source, db, brain=None):
     if source.type == "url":
         _sync_url(project, source, db, brain)
@@ -51,7 +185,7 @@ def _sync_url(project, source, db, brain=None):
     from urllib.parse import urlparse
     from restai.helper import _is_private_ip
     from restai.loaders.url import SeleniumWebReader
-    from restai.vectordb.tools import index_documents_classic, extract_keywords_for_metadata
+    from restai.vectordb.tools import extract_keywords_for_metadata
 
     logger.info(f"Syncing URL source '{source.name}': {source.url}")
 
@@ -81,20 +215,16 @@ def _sync_url(project, source, db, brain=None):
     for doc in documents:
         doc.metadata["source"] = source.name
 
-    if project.vector:
-        try:
-            deleted = project.vector.delete_source(source.name)
-            logger.info(f"Deleted {len(deleted) if deleted else 0} old chunks for source '{source.name}'")
-        except Exception as e:
-            logger.warning(f"Failed to delete old chunks for source '{source.name}': {e}")
-    n_chunks = index_documents_classic(project, documents, source.splitter, source.chunks)
+    added, kept, removed = _reindex(project, source, documents, db, prefixed=False)
     project.vector.save()
     _extract_entities_for_documents(project, documents, db, brain)
-    logger.info(f"URL source '{source.name}' synced: {len(documents)} documents, {n_chunks} chunks")
+    logger.info(
+        f"URL source '{source.name}' synced: {len(documents)} documents, "
+        f"{added} new chunks, {kept} unchanged, {removed} removed"
+    )
 
 
 def _sync_s3(project, source, db, brain=None):
-    from restai.vectordb.tools import index_documents_classic, extract_keywords_for_metadata
     from restai.vectordb.tools import find_file_loader
 
     try:
@@ -129,6 +259,9 @@ def _sync_s3(project, source, db, brain=None):
     if source.s3_prefix:
         list_kwargs["Prefix"] = source.s3_prefix
 
+    known = _known_fingerprints(project, source, db)
+    fingerprints = {}
+    skipped = set()
     all_documents = []
     paginator = s3.get_paginator("list_objects_v2")
     for page in paginator.paginate(**list_kwargs):
@@ -137,6 +270,13 @@ def _sync_s3(project, source, db, brain=None):
             if key.endswith("/"):
                 continue
 
+            doc_source = f"{source.name}/{os.path.basename(key)}"
+            etag = obj.get("ETag")
+            fingerprints[doc_source] = etag
+            if etag and known.get(doc_source) == etag:
+                skipped.add(doc_source)
+                continue
+
             ext = os.path.splitext(key)[1].lower()
             # find_file_loader returns a ready loader INSTANCE and raises on
             # unsupported extensions — skip those files, don't abort the sync.
@@ -152,7 +292,6 @@ def _sync_s3(project, source, db, brain=None):
 
             try:
                 docs = loader.load_data(file=tmp_path)
-                doc_source = f"{source.name}/{os.path.basename(key)}"
                 for doc in docs:
                     doc.metadata["source"] = doc_source
                 from restai.vectordb.tools import extract_keywords_for_metadata
@@ -161,28 +300,22 @@ def _sync_s3(project, source, db, brain=None):
             finally:
                 os.unlink(tmp_path)
 
-    if not all_documents:
+    if not all_documents and not skipped:
         logger.info(f"S3 source '{source.name}': no documents found")
         return
 
-    if project.vector:
-        try:
-            existing_sources = project.vector.list()
-            for src in existing_sources:
-                if src == source.name or src.startswith(f"{source.name}/"):
-                    project.vector.delete_source(src)
-        except Exception as e:
-            logger.warning(f"Failed to delete old S3 chunks for '{source.name}': {e}")
-
-    n_chunks = index_documents_classic(project, all_documents, source.splitter, source.chunks)
+    added, kept, removed = _reindex(project, source, all_documents, db, skipped, fingerprints)
     project.vector.save()
     _extract_entities_for_documents(project, all_documents, db, brain)
-    logger.info(f"S3 source '{source.name}' synced: {len(all_documents)} documents, {n_chunks} chunks")
+    logger.info(
+        f"S3 source '{source.name}' synced: {len(all_documents)} documents, {len(skipped)} unchanged objects, "
+        f"{added} new chunks, {kept} unchanged, {removed} removed"
+    )
 
 
 def _sync_confluence(project, source, db, brain=None):
     from llama_index.core.schema import Document
-    from restai.vectordb.tools import index_documents_classic, extract_keywords_for_metadata
+    from restai.vectordb.tools import extract_keywords_for_metadata
 
     base_url = (source.confluence_base_url or "").rstrip("/")
     space_key = source.confluence_space_key
@@ -257,24 +390,18 @@ def _sync_confluence(project, source, db, brain=None):
 
     all_documents = extract_keywords_for_metadata(all_documents)
 
-    if project.vector:
-        try:
-            existing_sources = project.vector.list()
-            for src in existing_sources:
-                if src == source.name or src.startswith(f"{source.name}/"):
-                    project.vector.delete_source(src)
-        except Exception as e:
-            logger.warning(f"Failed to delete old Confluence chunks for '{source.name}': {e}")
-
-    n_chunks = index_documents_classic(project, all_documents, source.splitter, source.chunks)
+    added, kept, removed = _reindex(project, source, all_documents, db)
     project.vector.save()
     _extract_entities_for_documents(project, all_documents, db, brain)
-    logger.info(f"Confluence source '{source.name}' synced: {len(all_documents)} pages, {n_chunks} chunks")
+    logger.info(
+        f"Confluence source '{source.name}' synced: {len(all_documents)} pages, "
+        f"{added} new chunks, {kept} unchanged, {removed} removed"
+    )
 
 
 def _sync_sharepoint(project, source, db, brain=None):
     import requests as req
-    from restai.vectordb.tools import index_documents_classic, extract_keywords_for_metadata
+    from restai.vectordb.tools import extract_keywords_for_metadata
     from restai.vectordb.tools import find_file_loader
 
     tenant_id = source.sharepoint_tenant_id
@@ -318,6 +445,9 @@ def _sync_sharepoint(project, source, db, brain=None):
     else:
         list_url = f"{graph}/drives/{drive_id}/root/children"
 
+    known = _known_fingerprints(project, source, db)
+    fingerprints = {}
+    skipped = set()
     all_documents = []
     url = list_url
 
@@ -343,6 +473,13 @@ def _sync_sharepoint(project, source, db, brain=None):
             if not download_url:
                 continue
 
+            doc_source = f"{source.name}/{name}"
+            etag = item.get("eTag")
+            fingerprints[doc_source] = etag
+            if etag and known.get(doc_source) == etag:
+                skipped.add(doc_source)
+                continue
+
             file_resp = req.get(download_url, timeout=60)
             file_resp.raise_for_status()
 
@@ -352,7 +489,6 @@ def _sync_sharepoint(project, source, db, brain=None):
 
             try:
                 docs = loader.load_data(file=tmp_path)
-                doc_source = f"{source.name}/{name}"
                 for doc in docs:
                     doc.metadata["source"] = doc_source
                 docs = extract_keywords_for_metadata(docs)
@@ -362,29 +498,23 @@ def _sync_sharepoint(project, source, db, brain=None):
 
         url = data.get("@odata.nextLink")
 
-    if not all_documents:
+    if not all_documents and not skipped:
         logger.info(f"SharePoint source '{source.name}': no documents found")
         return
 
-    if project.vector:
-        try:
-            existing_sources = project.vector.list()
-            for src in existing_sources:
-                if src == source.name or src.startswith(f"{source.name}/"):
-                    project.vector.delete_source(src)
-        except Exception as e:
-            logger.warning(f"Failed to delete old SharePoint chunks for '{source.name}': {e}")
-
-    n_chunks = index_documents_classic(project, all_documents, source.splitter, source.chunks)
+    added, kept, removed = _reindex(project, source, all_documents, db, skipped, fingerprints)
     project.vector.save()
     _extract_entities_for_documents(project, all_documents, db, brain)
-    logger.info(f"SharePoint source '{source.name}' synced: {len(all_documents)} files, {n_chunks} chunks")
+    logger.info(
+        f"SharePoint source '{source.name}' synced: {len(all_documents)} files, {len(skipped)} unchanged files, "
+        f"{added} new chunks, {kept} unchanged, {removed} removed"
+    )
 
 
 def _sync_gdrive(project, source, db, brain=None):
     import requests as req
     from llama_index.core.schema import Document
-    from restai.vectordb.tools import index_documents_classic, extract_keywords_for_metadata
+    from restai.vectordb.tools import extract_keywords_for_metadata
     from restai.vectordb.tools import find_file_loader
 
     sa_json = source.gdrive_service_account_json
@@ -419,6 +549,9 @@ def _sync_gdrive(project, source, db, brain=None):
 
     headers = {"Authorization": f"Bearer {access_token}"}
 
+    known = _known_fingerprints(project, source, db)
+    fingerprints = {}
+    skipped = set()
     all_documents = []
     page_token = None
     query = f"'{folder_id}' in parents and trashed = false and mimeType != 'application/vnd.google-apps.folder'"
@@ -426,7 +559,7 @@ def _sync_gdrive(project, source, db, brain=None):
     while True:
         params = {
             "q": query,
-            "fields": "nextPageToken, files(id, name, mimeType)",
+            "fields": "nextPageToken, files(id, name, mimeType, modifiedTime)",
             "pageSize": 100,
         }
         if page_token:
@@ -461,6 +594,13 @@ def _sync_gdrive(project, source, db, brain=None):
                     continue
                 export_ext = ext
 
+            doc_source = f"{source.name}/{name}"
+            modified = item.get("modifiedTime")
+            fingerprints[doc_source] = modified
+            if modified and known.get(doc_source) == modified:
+                skipped.add(doc_source)
+                continue
+
             if export_mime:
                 dl_resp = req.get(
                     f"https://www.googleapis.com/drive/v3/files/{file_id}/export",
@@ -476,7 +616,6 @@ def _sync_gdrive(project, source, db, brain=None):
             if export_mime and export_mime.startswith("text/"):
                 text = dl_resp.text.strip()
                 if text:
-                    doc_source = f"{source.name}/{name}"
                     all_documents.append(Document(
                         text=text,
                         metadata={"source": doc_source, "title": name},
@@ -494,7 +633,6 @@ def _sync_gdrive(project, source, db, brain=None):
 
             try:
                 docs = loader.load_data(file=tmp_path)
-                doc_source = f"{source.name}/{name}"
                 for doc in docs:
                     doc.metadata["source"] = doc_source
                 all_documents.extend(docs)
@@ -505,25 +643,19 @@ def _sync_gdrive(project, source, db, brain=None):
         if not page_token:
             break
 
-    if not all_documents:
+    if not all_documents and not skipped:
         logger.info(f"Google Drive source '{source.name}': no documents found")
         return
 
     all_documents = extract_keywords_for_metadata(all_documents)
 
-    if project.vector:
-        try:
-            existing_sources = project.vector.list()
-            for src in existing_sources:
-                if src == source.name or src.startswith(f"{source.name}/"):
-                    project.vector.delete_source(src)
-        except Exception as e:
-            logger.warning(f"Failed to delete old Google Drive chunks for '{source.name}': {e}")
-
-    n_chunks = index_documents_classic(project, all_documents, source.splitter, source.chunks)
+    added, kept, removed = _reindex(project, source, all_documents, db, skipped, fingerprints)
     project.vector.save()
     _extract_entities_for_documents(project, all_documents, db, brain)
-    logger.info(f"Google Drive source '{source.name}' synced: {len(all_documents)} files, {n_chunks} chunks")
+    logger.info(
+        f"Google Drive source '{source.name}' synced: {len(all_documents)} files, {len(skipped)} unchanged files, "
+        f"{added} new chunks, {kept} unchanged, {removed} removed"
+    )
 
 
 def run_sync_now(project_id: int, brain):
@@ -5,10 +5,13 @@ periodic cleanup, previously loose top-level modules:
 
 - `budget` — per-project budget + rate limit + per-API-key monthly quota
   checks (raise 402/429), plus token accounting.
+- `ledger` — in-memory / Redis month-to-date spend and per-minute request
+  counters behind the budget and rate-limit checks.
 - `guard` — input/output guard projects (content moderation via a guard LLM).
 - `retention` — knowledge/inference retention cleanup.
 
-None import each other; this package is organizational. `budget` and `guard`
-sit above `database`/`project`/`brain` (which stay at top level), so there is
-no import cycle back into the core.
+Apart from `budget` reading its counters from `ledger`, none import each
+other; this package is organizational. `budget` and `guard` sit above
+`database`/`project`/`brain` (which stay at top level), so there is no
+import cycle back into the core.
 """
@@ -6,8 +6,24 @@ Everything still funnels into the two canonical sinks — `tools.log_inference`
 helpers just produce honest token counts (preferring provider-reported usage)
 and, for platform System-LLM work, write an attribution-only row that bills no
 team and no API-key quota.
+
+`TokenUsageHandler` (installed on LlamaIndex's `Settings.callback_manager` by
+`install_token_usage_handler`, which `Brain` calls) adds every LLM call's tokens to the `TokenUsage` of the request
+that made it — the one bound by `counting_tokens` / `track_tokens` in the
+calling context — so RAG and NL→SQL answers report exact per-request counts.
 """
+import contextvars
 import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from llama_index.core.callbacks import CBEventType
+from llama_index.core.callbacks.base_handler import BaseCallbackHandler
+from llama_index.core.callbacks.token_counting import get_llm_token_counts
+from llama_index.core.utilities.token_counting import TokenCounter
 
 from restai.database import DBWrapper
 from restai.tools import tokens_from_string
@@ -85,3 +101,104 @@ def log_platform_usage(db: DBWrapper, feature: str, sys_llm, prompt: str, answer
         )
     except Exception:
         logging.exception("Failed to log platform usage for %s", feature)
+
+
+@dataclass
+class TokenUsage:
+    """Tokens spent by the LLM calls of one request."""
+    input: int = 0
+    output: int = 0
+    calls: int = 0
+
+    def as_tokens(self) -> dict:
+        return {"input": self.input, "output": self.output}
+
+
+_current_usage: contextvars.ContextVar[Optional[TokenUsage]] = contextvars.ContextVar(
+    "restai_token_usage", default=None,
+)
+
+
+def counting_tokens(usage: TokenUsage, fn, *args, **kwargs):
+    """Call `fn` with the LLM calls it makes counted into `usage`. Meant for
+    work handed to a thread, where the request's context isn't bound."""
+    token = _current_usage.set(usage)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _current_usage.reset(token)
+
+
+@contextmanager
+def track_tokens():
+    """Count the LLM calls made inside the block: `with track_tokens() as usage:`."""
+    usage = TokenUsage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """LlamaIndex callback handler routing each LLM call's token counts to the
+    `TokenUsage` bound when the call STARTED. A streamed call ends on whatever
+    thread drains the stream, so the usage is looked up by event id rather
+    than from that thread's context. Calls made with no usage bound are
+    ignored — nothing accumulates between requests."""
+
+    # An abandoned stream never sends its end event; forget it after this long.
+    _OPEN_TTL = 600
+
+    def __init__(self, tokenizer=None):
+        super().__init__(event_starts_to_ignore=[], event_ends_to_ignore=[])
+        self._counter = TokenCounter(tokenizer=tokenizer)
+        self._lock = threading.Lock()
+        # event_id -> (usage, started_at)
+        self._open: dict = {}
+
+    def on_event_start(self, event_type: CBEventType, payload: Optional[dict] = None,
+                       event_id: str = "", parent_id: str = "", **kwargs: Any) -> str:
+        if event_type == CBEventType.LLM:
+            usage = _current_usage.get()
+            if usage is not None:
+                now = time.monotonic()
+                with self._lock:
+                    self._open[event_id] = (usage, now)
+                    if len(self._open) > 1024:
+                        for stale in [k for k, (_, at) in self._open.items() if now - at > self._OPEN_TTL]:
+                            del self._open[stale]
+        return event_id
+
+    def on_event_end(self, event_type: CBEventType, payload: Optional[dict] = None,
+                     event_id: str = "", **kwargs: Any) -> None:
+        if event_type != CBEventType.LLM:
+            return
+        with self._lock:
+            entry = self._open.pop(event_id, None)
+        if entry is None or payload is None:
+            return
+        event = get_llm_token_counts(self._counter, payload, event_id)
+        usage = entry[0]
+        with self._lock:
+            usage.input += event.prompt_token_count
+            usage.output += event.completion_token_count
+            usage.calls += 1
+
+    def start_trace(self, trace_id: Optional[str] = None) -> None:
+        pass
+
+    def end_trace(self, trace_id: Optional[str] = None, trace_map: Optional[dict] = None) -> None:
+        pass
+
+
+def install_token_usage_handler(tokenizer=None) -> None:
+    """Make `TokenUsageHandler` LlamaIndex's default callback handler. LLMs
+    built afterwards without their own callback manager pick it up. Idempotent."""
+    from llama_index.core import Settings
+    from llama_index.core.callbacks import CallbackManager
+
+    current = Settings._callback_manager
+    if current is not None and any(isinstance(h, TokenUsageHandler) for h in current.handlers):
+        return
+    Settings.callback_manager = CallbackManager([TokenUsageHandler(tokenizer=tokenizer)])
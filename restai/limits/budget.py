@@ -1,10 +1,11 @@
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 
 from fastapi import HTTPException
-from sqlalchemy import func
 
 from restai.database import DBWrapper
-from restai.models.databasemodels import ApiKeyDatabase, OutputDatabase
+from restai.limits.ledger import ledger
+from restai.models.databasemodels import ApiKeyDatabase
+from restai.observability.inference_writer import inference_writer
 from restai.project import Project
 
 
@@ -46,7 +47,8 @@ def enforce_cost_budgets(db: DBWrapper, *, project=None, user=None, team=None, a
     Caps are skipped when unset (None or < 0). Platform admins bypass all cost
     caps (consistent with prior behavior). `team` may be a TeamModel or a
     TeamDatabase (both expose .id / .budget); when omitted it falls back to the
-    project's team."""
+    project's team. Spend comes from the ledger (restai/limits/ledger.py), not a
+    per-request SUM over the inference log."""
     if user is not None and getattr(user, "is_admin", False):
         return
 
@@ -59,8 +61,11 @@ def enforce_cost_budgets(db: DBWrapper, *, project=None, user=None, team=None, a
     # 0. team balance — the hard prepaid wallet. NULL = no wallet (skip); a
     # depleted wallet (<= 0) stops ALL usage (highest-priority gate). This is a
     # real-money constraint, distinct from the soft `budget` cap below.
+    # Debits still queued in the inference-log writer count against it.
     if team is not None:
         bal = getattr(team, "balance", None)
+        if bal is not None:
+            bal -= inference_writer.pending_team_charge(team.id)
         if bal is not None and bal <= 0:
             _emit_budget_webhook(project, "balance", bal, bal, team_id=team.id)
             raise HTTPException(status_code=402, detail=_BUDGET_DETAIL["balance"])
@@ -69,7 +74,7 @@ def enforce_cost_budgets(db: DBWrapper, *, project=None, user=None, team=None, a
     if project is not None:
         cap = getattr(getattr(project.props, "options", None), "budget", None)
         if cap is not None and cap >= 0:
-            spent = db.spend_for(project_id=project.props.id)
+            spent = ledger.spend(db, ("project", project.props.id))
             if _exhausted(cap, spent):
                 _emit_budget_webhook(project, "project", cap, spent)
                 raise HTTPException(status_code=402, detail=_BUDGET_DETAIL["project"])
@@ -78,7 +83,7 @@ def enforce_cost_budgets(db: DBWrapper, *, project=None, user=None, team=None, a
     if api_key_row is not None:
         cap = getattr(api_key_row, "cost_budget_monthly", None)
         if cap is not None and cap >= 0:
-            spent = db.spend_for(api_key_id=api_key_row.id)
+            spent = ledger.spend(db, ("api_key", api_key_row.id))
             if _exhausted(cap, spent):
                 _emit_budget_webhook(project, "api_key", cap, spent)
                 raise HTTPException(status_code=402, detail=_BUDGET_DETAIL["api_key"])
@@ -87,14 +92,14 @@ def enforce_cost_budgets(db: DBWrapper, *, project=None, user=None, team=None, a
     if team is not None and user is not None:
         cap = db.get_team_user_budget(team.id, user.id)
         if cap is not None:
-            spent = db.get_team_user_spending(team.id, user.id)
+            spent = ledger.spend(db, ("team_user", team.id, user.id))
             if _exhausted(cap, spent):
                 _emit_budget_webhook(project, "user_in_team", cap, spent, team_id=team.id)
                 raise HTTPException(status_code=402, detail=_BUDGET_DETAIL["user_in_team"])
 
     # 4. team
     if team is not None and team.budget is not None and team.budget >= 0:
-        spent = db.get_team_spending(team.id)
+        spent = ledger.spend(db, ("team", team.id))
         if _exhausted(team.budget, spent):
             _emit_budget_webhook(project, "team", team.budget, spent, team_id=team.id)
             raise HTTPException(status_code=402, detail=_BUDGET_DETAIL["team"])
@@ -114,16 +119,7 @@ def check_rate_limit(project: Project, db: DBWrapper):
     rate_limit = project.props.options.rate_limit
     if rate_limit is None:
         return
-    one_minute_ago = datetime.now(timezone.utc) - timedelta(minutes=1)
-    count = (
-        db.db.query(func.count(OutputDatabase.id))
-        .filter(
-            OutputDatabase.project_id == project.props.id,
-            OutputDatabase.date >= one_minute_ago,
-        )
-        .scalar()
-    )
-    if count >= rate_limit:
+    if ledger.requests_last_minute(db, project.props.id) >= rate_limit:
         raise HTTPException(status_code=429, detail="Rate limit exceeded")
 
 
@@ -154,12 +150,14 @@ def check_api_key_quota(user, db: DBWrapper):
         key.quota_reset_at = _first_of_next_month(now)
         db.db.commit()
 
-    if (key.tokens_used_this_month or 0) >= key.token_quota_monthly:
+    # Tokens of inferences still queued in the inference-log writer count too.
+    used = (key.tokens_used_this_month or 0) + inference_writer.pending_api_key_tokens(api_key_id)
+    if used >= key.token_quota_monthly:
         raise HTTPException(
             status_code=429,
             detail=(
                 f"API key monthly token quota reached "
-                f"({key.tokens_used_this_month}/{key.token_quota_monthly}). "
+                f"({used}/{key.token_quota_monthly}). "
                 f"Resets at {key.quota_reset_at.isoformat() if key.quota_reset_at else 'next month'}."
             ),
         )
@@ -175,13 +173,15 @@ def record_api_key_tokens(api_key_id: int, tokens: int, db: DBWrapper) -> None:
     db.db.commit()
 
 
-def charge_team_balance(db: DBWrapper, team_id, amount: float, actor_user_id=None) -> None:
+def charge_team_balance(db: DBWrapper, team_id, amount: float, actor_user_id=None, commit: bool = True) -> None:
     """Decrement a team's prepaid wallet by `amount` (the inference cost), clamped
     at 0, and record the movement in the ledger. No-op when there's no team, a
     non-positive amount, or the team has no wallet (balance is NULL). Called after
     each inference is logged — the request that crosses zero is absorbed; the next
     one is blocked by enforce_cost_budgets. The debit row + balance update commit
-    atomically, so the ledger always reconciles with teams.balance."""
+    atomically, so the ledger always reconciles with teams.balance. The
+    inference-log writer passes commit=False to fold the debit into the
+    transaction that inserts the batch's rows."""
     if team_id is None or amount is None or amount <= 0:
         return
     team = db.get_team_by_id(team_id)
@@ -195,4 +195,5 @@ def charge_team_balance(db: DBWrapper, team_id, amount: float, actor_user_id=Non
     team.balance = after
     db.add_balance_transaction(team_id, amount=-applied, balance_after=after,
                                kind="usage", actor_user_id=actor_user_id)
-    db.db.commit()
+    if commit:
+        db.db.commit()
@@ -6,6 +6,7 @@ from llama_index.core.base.llms.types import ChatMessage, MessageRole
 
 from restai.brain import Brain
 from restai.database import DBWrapper
+from restai.limits import guard_cache
 from restai.llm import LLM
 from restai.project import Project
 
@@ -21,6 +22,8 @@ class GuardResult:
     raw_response: str
     input_tokens: int = 0
     output_tokens: int = 0
+    # Served from restai/limits/guard_cache.py: no LLM call was made.
+    cached: bool = False
 
 
 class Guard:
@@ -71,15 +74,21 @@ class Guard:
             logger.warning("Guard project '%s' has no valid LLM, skipping", self.guard_ref)
             return None
 
+        # Passed as the SYSTEM message below, not set on `model.llm`: the
+        # client is shared through restai/object_cache.py.
         sysTemplate: Optional[str] = self.project.props.system
-        if sysTemplate:
-            model.llm.system_prompt = sysTemplate
 
         if phase == "output":
             prompt = f'Analyze the following response:\n"{text}"'
         else:
             prompt = f'Analyze the following text:\n"{text}"'
 
+        version = guard_cache.prompt_version(sysTemplate, self.project.props.llm, phase)
+        cache_key = guard_cache.verdict_key(self.project.props.id, version, text)
+        hit = guard_cache.guard_verdict_cache.get(cache_key)
+        if hit is not None:
+            return GuardResult(blocked=hit[0], raw_response=hit[1], cached=True)
+
         messages = [
             ChatMessage(role=MessageRole.SYSTEM, content=sysTemplate or ""),
             ChatMessage(role=MessageRole.USER, content=prompt),
@@ -96,6 +105,7 @@ class Guard:
         in_tok, out_tok = count_usage(resp, (sysTemplate or "") + "\n" + prompt, answer)
 
         blocked = self._parse_response(answer)
+        guard_cache.guard_verdict_cache.put(cache_key, blocked, answer)
         return GuardResult(blocked=blocked, raw_response=answer, input_tokens=in_tok, output_tokens=out_tok)
 
     @staticmethod
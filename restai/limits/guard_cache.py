@@ -0,0 +1,137 @@
+"""Cache of guard verdicts, so a repeated text skips the guard LLM.
+
+Every guarded request sends its input to the guard project's LLM, even when
+the text is one the guard judged seconds ago. Widget greetings, "hi" and
+canned follow-up buttons repeat all day. `Guard.verify` looks here first.
+
+A verdict is keyed by the guard project id, a *prompt version* and a hash
+of the normalized text. The prompt version hashes everything else that
+shapes the answer: the guard's system prompt, its LLM name and the phase
+(input and output wrap the text differently). Editing the guard project
+therefore retires its old verdicts without any explicit invalidation. The
+text is normalized before hashing (NFKC, casefolded, whitespace collapsed),
+so "Hi " and "hi" share a verdict. Only the digest is kept, never the text.
+
+Only verdicts the guard LLM actually returned are cached. A failed call
+(which blocks fail-safe) is retried next time. Entries live for
+`GUARD_VERDICT_CACHE_TTL` seconds in a per-worker LRU of at most
+`GUARD_VERDICT_CACHE_SIZE` entries. With Redis configured (Settings → Redis)
+they are also written to `restai:guard:verdict:*` keys, so one worker's
+verdict serves all of them. A Redis error falls back to the per-worker
+cache. `GUARD_VERDICT_CACHE_TTL=0` disables the cache.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+from restai import config
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "restai:guard:verdict:"
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text or "")).strip().casefold()
+
+
+def prompt_version(system: Optional[str], llm: Optional[str], phase: str) -> str:
+    blob = json.dumps([system or "", llm or "", phase])
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+
+def verdict_key(guard_project_id: int, version: str, text: str) -> str:
+    digest = hashlib.sha256(normalize(text).encode()).hexdigest()
+    return f"{guard_project_id}:{version}:{digest}"
+
+
+class GuardVerdictCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (expires_at, blocked, raw_response)
+        self._entries: OrderedDict = OrderedDict()
+        self._redis_client = None
+        self._redis_url = None
+        self.stats = {"hits": 0, "redis_hits": 0, "misses": 0}
+
+    def _redis(self):
+        """Sync Redis client, rebuilt when the Settings URL changes; None
+        when Redis isn't configured (same pattern as the spend ledger)."""
+        url = config.build_redis_url()
+        if not url:
+            self._redis_client = self._redis_url = None
+            return None
+        if self._redis_client is not None and self._redis_url == url:
+            return self._redis_client
+        try:
+            import redis
+            client = redis.Redis.from_url(url)
+        except Exception as e:
+            logger.warning("guard verdict cache: failed to build Redis client (%s); per-worker cache only", e)
+            return None
+        self._redis_client, self._redis_url = client, url
+        return client
+
+    def _remember(self, key: str, blocked: bool, raw_response: str, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, blocked, raw_response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > config.GUARD_VERDICT_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[tuple[bool, str]]:
+        """`(blocked, raw_response)` for a cached verdict, else None."""
+        if config.GUARD_VERDICT_CACHE_TTL <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[1], entry[2]
+                del self._entries[key]
+        client = self._redis()
+        if client is not None:
+            try:
+                raw = client.get(_KEY_PREFIX + key)
+                if raw is not None:
+                    blocked, raw_response = json.loads(raw)
+                    ttl = client.ttl(_KEY_PREFIX + key)
+                    self._remember(key, blocked, raw_response, ttl if ttl and ttl > 0 else config.GUARD_VERDICT_CACHE_TTL)
+                    with self._lock:
+                        self.stats["redis_hits"] += 1
+                    return blocked, raw_response
+            except Exception as e:
+                logger.debug("guard verdict cache: Redis read failed (%s)", e)
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, blocked: bool, raw_response: str) -> None:
+        ttl = config.GUARD_VERDICT_CACHE_TTL
+        if ttl <= 0:
+            return
+        self._remember(key, blocked, raw_response, ttl)
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            client.set(_KEY_PREFIX + key, json.dumps([blocked, raw_response]), ex=max(1, int(ttl)))
+        except Exception as e:
+            logger.debug("guard verdict cache: Redis write failed (%s)", e)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+guard_verdict_cache = GuardVerdictCache()
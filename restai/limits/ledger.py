@@ -0,0 +1,267 @@
+"""Month-to-date spend and per-minute request counters for the budget gates.
+
+`enforce_cost_budgets` and `check_rate_limit` used to run SUM / COUNT scans
+over the inference log on every request. The ledger answers them from
+counters instead:
+
+- **Spend** per scope (`project`, `api_key`, `team`, `team_user`) for the
+  current UTC month. A counter is seeded from `DBWrapper.spend_for` the first
+  time it's read, bumped by `record()` on every logged inference, and reseeded
+  from the table once it's older than `LEDGER_RECONCILE_SECONDS` — so rows
+  written by other workers (without Redis), retention deletes or a project
+  changing teams are picked up within that interval.
+- **Requests** per project over a sliding 60 s window, seeded from the
+  inference log the same way.
+
+With Redis configured (Settings → Redis) the counters live there and are
+shared by every worker: spend in `ledger:spend:*` keys whose TTL is the
+reconcile interval, the request window in a `ledger:rate:*` sorted set.
+Without it they are per-worker dicts. Any Redis error falls back to the
+per-worker counters, so a Redis outage never lets the gates fail open or
+break a request. `LEDGER_RECONCILE_SECONDS=0` reads the table every time.
+
+Seeding from the table also adds this worker's rows still queued in the
+inference-log writer (restai/observability/inference_writer.py).
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+
+from restai import config
+
+logger = logging.getLogger(__name__)
+
+RATE_WINDOW_SECONDS = 60
+_KEY_PREFIX = "ledger:"
+
+# Increment only while the seeded key exists. A plain INCRBYFLOAT on an
+# expired key would recreate it holding just this one increment.
+_INCR_IF_SEEDED = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+  return redis.call('INCRBYFLOAT', KEYS[1], ARGV[1])
+end
+return false
+"""
+
+
+def _month() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m")
+
+
+def _epoch(dt: datetime) -> float:
+    # SQLite hands back naive datetimes; rows are always written in UTC.
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def spend_scopes(*, team_id=None, user_id=None, project_id=None, api_key_id=None) -> list:
+    """The ledger keys a single inference row counts towards."""
+    scopes = []
+    if project_id is not None:
+        scopes.append(("project", project_id))
+    if api_key_id is not None:
+        scopes.append(("api_key", api_key_id))
+    if team_id is not None:
+        scopes.append(("team", team_id))
+        if user_id is not None:
+            scopes.append(("team_user", team_id, user_id))
+    return scopes
+
+
+def _spend_from_db(db, scope: tuple) -> float:
+    kind = scope[0]
+    if kind == "project":
+        spent = db.spend_for(project_id=scope[1])
+    elif kind == "api_key":
+        spent = db.spend_for(api_key_id=scope[1])
+    elif kind == "team":
+        spent = db.spend_for(team_id=scope[1])
+    elif kind == "team_user":
+        spent = db.spend_for(team_id=scope[1], user_id=scope[2])
+    else:
+        raise ValueError(f"Unknown ledger scope {kind!r}")
+    # Rows still queued in the inference-log writer aren't in the table yet.
+    from restai.observability.inference_writer import inference_writer
+    return spent + inference_writer.pending_spend(scope)
+
+
+def _recent_requests_from_db(db, project_id: int, now: float) -> list:
+    from restai.models.databasemodels import OutputDatabase
+
+    since = datetime.fromtimestamp(now - RATE_WINDOW_SECONDS, tz=timezone.utc)
+    rows = (
+        db.db.query(OutputDatabase.date)
+        .filter(OutputDatabase.project_id == project_id, OutputDatabase.date >= since)
+        .all()
+    )
+    from restai.observability.inference_writer import inference_writer
+
+    stamps = [_epoch(r[0]) for r in rows if r[0] is not None]
+    stamps += [ts for ts in inference_writer.pending_requests(project_id) if ts >= now - RATE_WINDOW_SECONDS]
+    return sorted(stamps)
+
+
+class SpendLedger:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (month, *scope) -> [spent, seeded_at]
+        self._spend: dict = {}
+        # project_id -> [deque of request timestamps, seeded_at]
+        self._requests: dict = {}
+        self._redis_client = None
+        self._redis_url = None
+        self._incr_script = None
+
+    # ── Redis ───────────────────────────────────────────────────────────
+
+    def _redis(self):
+        """Sync Redis client, rebuilt when the Settings URL changes; None
+        when Redis isn't configured (same pattern as the image cache)."""
+        url = config.build_redis_url()
+        if not url:
+            self._redis_client = self._redis_url = self._incr_script = None
+            return None
+        if self._redis_client is not None and self._redis_url == url:
+            return self._redis_client
+        try:
+            import redis
+            client = redis.Redis.from_url(url)
+            self._incr_script = client.register_script(_INCR_IF_SEEDED)
+        except Exception as e:
+            logger.warning("ledger: failed to build Redis client (%s); using per-worker counters", e)
+            return None
+        self._redis_client, self._redis_url = client, url
+        return client
+
+    @staticmethod
+    def _spend_key(month: str, scope: tuple) -> str:
+        return _KEY_PREFIX + "spend:" + month + ":" + ":".join(str(p) for p in scope)
+
+    # ── spend ───────────────────────────────────────────────────────────
+
+    def spend(self, db, scope: tuple) -> float:
+        """Month-to-date spend for `scope`, e.g. ("project", 7)."""
+        ttl = config.LEDGER_RECONCILE_SECONDS
+        if ttl <= 0:
+            return _spend_from_db(db, scope)
+        month = _month()
+
+        client = self._redis()
+        if client is not None:
+            key = self._spend_key(month, scope)
+            try:
+                raw = client.get(key)
+                if raw is not None:
+                    return float(raw)
+                spent = _spend_from_db(db, scope)
+                client.set(key, spent, ex=max(1, int(ttl)), nx=True)
+                return spent
+            except Exception as e:
+                logger.warning("ledger: Redis read failed (%s); using per-worker counters", e)
+
+        now = time.monotonic()
+        cache_key = (month, *scope)
+        with self._lock:
+            entry = self._spend.get(cache_key)
+            if entry is not None and now - entry[1] < ttl:
+                return entry[0]
+        spent = _spend_from_db(db, scope)
+        with self._lock:
+            self._spend[cache_key] = [spent, now]
+            # Drop last month's counters.
+            for stale in [k for k in self._spend if k[0] != month]:
+                del self._spend[stale]
+        return spent
+
+    # ── rate ────────────────────────────────────────────────────────────
+
+    def requests_last_minute(self, db, project_id: int) -> int:
+        ttl = config.LEDGER_RECONCILE_SECONDS
+        now = time.time()
+        if ttl <= 0:
+            return len(_recent_requests_from_db(db, project_id, now))
+
+        client = self._redis()
+        if client is not None:
+            key = _KEY_PREFIX + f"rate:{project_id}"
+            seeded = _KEY_PREFIX + f"rate_seeded:{project_id}"
+            try:
+                if not client.exists(seeded):
+                    stamps = _recent_requests_from_db(db, project_id, now)
+                    pipe = client.pipeline()
+                    pipe.delete(key)
+                    if stamps:
+                        pipe.zadd(key, {f"{ts}:{i}": ts for i, ts in enumerate(stamps)})
+                    pipe.expire(key, RATE_WINDOW_SECONDS * 2)
+                    pipe.set(seeded, 1, ex=max(1, int(ttl)))
+                    pipe.execute()
+                pipe = client.pipeline()
+                pipe.zremrangebyscore(key, "-inf", now - RATE_WINDOW_SECONDS)
+                pipe.zcard(key)
+                return int(pipe.execute()[1])
+            except Exception as e:
+                logger.warning("ledger: Redis rate read failed (%s); using per-worker counters", e)
+
+        mono = time.monotonic()
+        with self._lock:
+            entry = self._requests.get(project_id)
+            fresh = entry is not None and mono - entry[1] < ttl
+        if not fresh:
+            stamps = deque(_recent_requests_from_db(db, project_id, now))
+            with self._lock:
+                entry = self._requests[project_id] = [stamps, mono]
+        with self._lock:
+            window = entry[0]
+            while window and window[0] < now - RATE_WINDOW_SECONDS:
+                window.popleft()
+            return len(window)
+
+    # ── writes ──────────────────────────────────────────────────────────
+
+    def record(self, *, cost: float, team_id=None, user_id=None, project_id=None, api_key_id=None) -> None:
+        """Count one logged inference row. Call after the row is committed."""
+        if config.LEDGER_RECONCILE_SECONDS <= 0:
+            return
+        scopes = spend_scopes(team_id=team_id, user_id=user_id, project_id=project_id, api_key_id=api_key_id)
+        month = _month()
+        now = time.time()
+
+        client = self._redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                if cost:
+                    for scope in scopes:
+                        self._incr_script(keys=[self._spend_key(month, scope)], args=[cost], client=pipe)
+                if project_id is not None:
+                    key = _KEY_PREFIX + f"rate:{project_id}"
+                    pipe.zadd(key, {f"{now}:{uuid.uuid4().hex[:8]}": now})
+                    pipe.expire(key, RATE_WINDOW_SECONDS * 2)
+                pipe.execute()
+            except Exception as e:
+                logger.warning("ledger: Redis write failed (%s)", e)
+
+        with self._lock:
+            if cost:
+                for scope in scopes:
+                    entry = self._spend.get((month, *scope))
+                    if entry is not None:
+                        entry[0] += cost
+            if project_id is not None:
+                entry = self._requests.get(project_id)
+                if entry is not None:
+                    entry[0].append(now)
+
+    def reset(self) -> None:
+        """Forget every per-worker counter (next read reseeds from the table)."""
+        with self._lock:
+            self._spend.clear()
+            self._requests.clear()
+
+
+ledger = SpendLedger()
@@ -12,6 +12,7 @@ def moderate_content(text: str, policy: str = "default", **kwargs) -> str:
 
     * ``moderation_blocklist`` — comma-separated terms (case-insensitive
       substring match). Agent configures these in Integrations tab.
+      Compiled once per edit, see ``restai/utils/moderation.py``.
     * ``moderation_redact_pii`` — bool, default ``true``. When true, PII
       matches are replaced with ``[REDACTED:<type>]`` in ``SANITIZED``.
 
@@ -25,137 +26,28 @@ def moderate_content(text: str, policy: str = "default", **kwargs) -> str:
         policy (str): Policy profile name. Currently only "default" is
             implemented — accepted for future extension.
     """
-    import json
-    import re
+    from restai import config
+    from restai.utils import moderation
 
     if not text:
         return "OK: empty input"
 
-    # `/v1/moderations` accepts uncapped input and calls this synchronously, so
-    # truncate very large payloads: the PII regexes + span dedup would otherwise
-    # do O(matches²) pure-Python work on the event loop for a multi-MB body.
-    if len(text) > 100_000:
-        text = text[:100_000]
+    # Bound the SANITIZED copy handed back to the agent.
+    if len(text) > config.MODERATION_MAX_CHARS:
+        text = text[:config.MODERATION_MAX_CHARS]
 
-    brain = kwargs.get("_brain")
-    project_id = kwargs.get("_project_id")
-
-    # Load project options for blocklist + PII toggle. We degrade
+    # Blocklist + PII toggle come from the project's options. We degrade
     # gracefully when project context is missing — the tool still works
     # with default policies.
-    blocklist: list[str] = []
-    redact_pii = True
-    if brain and project_id is not None:
-        try:
-            from restai.database import open_db_wrapper
-            db = open_db_wrapper()
-            try:
-                proj = db.get_project_by_id(int(project_id))
-                if proj and proj.options:
-                    try:
-                        opts = json.loads(proj.options)
-                    except Exception:
-                        opts = {}
-                    raw = (opts.get("moderation_blocklist") or "").strip()
-                    if raw:
-                        blocklist = [
-                            t.strip() for t in raw.replace(";", ",").split(",")
-                            if t.strip()
-                        ]
-                    # Default true, explicit false opts out.
-                    redact_pii = opts.get("moderation_redact_pii") is not False
-            finally:
-                db.db.close()
-        except Exception:
-            # Never fail the tool on a DB hiccup — moderation is
-            # advisory, and raising an error here would mean the agent
-            # proceeds without checking, which is worse than best-effort.
-            pass
-
-    reasons: list[str] = []
-    sanitized = text
-
-    # PII patterns. Kept conservative: only matches that almost
-    # certainly identify PII, so false positives are minimal.
-    # US/UK/generic credit card (with Luhn-ish spacing), email, phone,
-    # US SSN, IPv4. Unicode-aware but not exhaustive — document clearly
-    # that this is "best effort" not compliance-grade.
-    # Ordered most-specific → least-specific. `phone` is a greedy superset of
-    # SSNs, card numbers and IPv4s (all digit/punct runs), so it MUST run last:
-    # a span already claimed by a precise pattern is skipped below, which both
-    # labels the redaction correctly (SSN as us_ssn, not phone) and stops the
-    # same span being double-counted.
-    _PATTERNS = [
-        # OpenAI-style API key shape. Also flags Slack bot tokens, AWS
-        # access keys, GitHub tokens via their telltale prefixes.
-        ("api_key",     re.compile(r"\b(?:sk-[A-Za-z0-9_-]{20,}|xox[baprs]-[A-Za-z0-9-]{10,}|AKIA[0-9A-Z]{16}|gh[pousr]_[A-Za-z0-9_]{20,})\b")),
-        ("email",       re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b")),
-        ("us_ssn",      re.compile(r"\b\d{3}-\d{2}-\d{4}\b")),
-        # 13-19 digit card number with optional spaces/dashes every 4.
-        ("credit_card", re.compile(r"\b(?:\d[ -]?){13,19}\b")),
-        ("ipv4",        re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b")),
-        # E.164 or common international-ish phone: + then 8-15 digits,
-        # with optional spaces/dashes/parens.
-        ("phone",       re.compile(r"\+?\d[\d\s().-]{7,14}\d")),
-    ]
-
-    pii_hits: dict[str, int] = {}
-    redactions: list[tuple[int, int, str]] = []
-    for label, rx in _PATTERNS:
-        count = 0
-        for m in rx.finditer(text):
-            s, e = m.start(), m.end()
-            if any(s < ce and cs < e for cs, ce, _ in redactions):
-                continue  # span already owned by a more-specific pattern
-            redactions.append((s, e, label))
-            count += 1
-        if count:
-            pii_hits[label] = count
-    if redact_pii and redactions:
-        out = []
-        last = 0
-        for s, e, label in sorted(redactions):
-            out.append(text[last:s])
-            out.append(f"[REDACTED:{label}]")
-            last = e
-        out.append(text[last:])
-        sanitized = "".join(out)
-
-    if pii_hits:
-        reasons.append(
-            "pii_detected:" + ",".join(f"{k}={v}" for k, v in sorted(pii_hits.items()))
-        )
-
-    # Blocklist: case-insensitive substring match. Short and literal is
-    # intentional — regex in admin-configurable fields is a footgun.
-    if blocklist:
-        lower = text.lower()
-        hits = [term for term in blocklist if term.lower() in lower]
-        if hits:
-            reasons.append("blocklist:" + ",".join(hits[:10]))
-            if redact_pii:
-                for term in hits:
-                    sanitized = re.sub(
-                        re.escape(term), "[REDACTED:blocked]", sanitized, flags=re.IGNORECASE
-                    )
-
-    # Simple injection-probe signals. Not exhaustive — this is a smoke
-    # test, not a full prompt-injection defense.
-    _INJECTION_PATTERNS = [
-        r"ignore (?:all )?previous",
-        r"disregard (?:the |all )?instructions",
-        r"system prompt",
-        r"you are now",
-    ]
-    for pat in _INJECTION_PATTERNS:
-        if re.search(pat, text, re.IGNORECASE):
-            reasons.append(f"possible_injection:{pat}")
-            break  # one signal is enough
+    policy = moderation.DEFAULT_POLICY
+    if kwargs.get("_brain") and kwargs.get("_project_id") is not None:
+        policy = moderation.policy_for_project(kwargs["_project_id"])
 
-    if not reasons:
+    result = moderation.moderate(text, policy)
+    if not result.flagged:
         return "OK: no issues found"
 
-    parts = ["FLAGGED: " + "; ".join(reasons)]
-    if redact_pii and sanitized != text:
-        parts.append(f"SANITIZED: {sanitized}")
+    parts = ["FLAGGED: " + "; ".join(result.reasons)]
+    if result.sanitized is not None and result.sanitized != text:
+        parts.append(f"SANITIZED: {result.sanitized}")
     return "\n".join(parts)
@@ -97,6 +97,17 @@ async def lifespan(fs_app: FastAPI):
     from restai.limits.retention import run_retention_cleanup
     run_retention_cleanup(settings_db_wrapper)
 
+    # Write-behind inference log; replays rows spilled by the last shutdown.
+    from restai.observability.inference_writer import inference_writer
+    inference_writer.start()
+
+    # Warm terminal-sandbox and browser pools and buffered activity
+    # heartbeats; the pools idle while Docker / the browser is disabled.
+    from restai import docker as _docker_sandbox
+    from restai.browser import runtime as _browser_runtime
+    _docker_sandbox.start()
+    _browser_runtime.start()
+
     import os as _os
     if _os.environ.get("ANONYMIZED_TELEMETRY", "True").lower() == "true":
         print("Anonymized telemetry is enabled. To opt out, set ANONYMIZED_TELEMETRY=false.")
@@ -142,11 +153,25 @@ async def lifespan(fs_app: FastAPI):
 
     yield
 
+    # Drain the inference-log queue; unwritten rows spill to disk.
+    inference_writer.stop()
+
+    # Close the passthrough keep-alive connections.
+    from restai.utils.upstream_pool import upstream_pool
+    await upstream_pool.aclose()
+
+    # Close the agent MCP sessions kept open between turns.
+    from restai.agent2.mcp_connections import mcp_connections
+    await mcp_connections.aclose()
+
     # Docker per-chat / browser containers are no longer process-managed
     # — `crons/docker_cleanup.py` and `crons/browser_cleanup.py` evict
-    # idle containers, so on lifespan shutdown there's nothing for us to
-    # stop. (Old behavior nuked all managed containers; that wiped the
-    # in-flight work of any sibling worker. Bug, not feature.)
+    # idle containers, so on lifespan shutdown the only ones we stop are
+    # this worker's unclaimed warm-pool containers. (Old behavior nuked all
+    # managed containers; that wiped the in-flight work of any sibling
+    # worker. Bug, not feature.)
+    _docker_sandbox.stop()
+    _browser_runtime.stop()
 
 
 logging.basicConfig(level=config.LOG_LEVEL)
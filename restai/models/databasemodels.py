@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Float, Table, Text, UniqueConstraint
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Float, Table, Text, UniqueConstraint
 from sqlalchemy.dialects.mysql import LONGTEXT
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import declarative_base
@@ -261,7 +261,9 @@ class OutputDatabase(Base):
     # Outcome of the inference. "success" is the default for successful
     # Q/A rows; "error" covers LLM/tool crashes; "budget", "rate_limit"
     # cover those pre-inference rejects; "guard_block" for input/output
-    # guard. Indexed so the log viewer can filter by failure kind cheaply.
+    # guard; "guard_discarded" for the generation of a speculative turn the
+    # input guard then blocked. Indexed so the log viewer can filter by
+    # failure kind cheaply.
     status = Column(String(32), nullable=False, default="success", server_default="success", index=True)
     error = Column(Text, nullable=True)
 
@@ -479,6 +481,10 @@ class WidgetDatabase(Base):
 
 class KGEntityDatabase(Base):
     __tablename__ = "kg_entities"
+    # The unique keys below are what restai/integrations/kg_bulk.py upserts on.
+    __table_args__ = (
+        UniqueConstraint("project_id", "normalized", "entity_type", name="uq_kg_entities_project_norm_type"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -494,6 +500,7 @@ class KGEntityDatabase(Base):
 
 class KGEntityMentionDatabase(Base):
     __tablename__ = "kg_entity_mentions"
+    __table_args__ = (UniqueConstraint("entity_id", "source", name="uq_kg_mentions_entity_source"),)
 
     id = Column(Integer, primary_key=True, index=True)
     entity_id = Column(Integer, ForeignKey("kg_entities.id"), nullable=False, index=True)
@@ -505,6 +512,9 @@ class KGEntityMentionDatabase(Base):
 
 class KGEntityRelationshipDatabase(Base):
     __tablename__ = "kg_entity_relationships"
+    __table_args__ = (
+        UniqueConstraint("project_id", "from_entity_id", "to_entity_id", name="uq_kg_rel_project_from_to"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -514,6 +524,60 @@ class KGEntityRelationshipDatabase(Base):
     created_at = Column(DateTime, nullable=False)
 
 
+class ChunkManifestDatabase(Base):
+    """One row per chunk a knowledge sync wrote into a project's vector
+    store. `restai/integrations/sync.py` diffs freshly split chunks against
+    these by `content_hash`, so only changed chunks are re-embedded and only
+    vanished ones are deleted. `fingerprint` is the upstream object version
+    (S3 ETag, Drive modifiedTime, SharePoint eTag) the chunk was built from —
+    an unchanged fingerprint lets the sync skip the download entirely.
+    `embedding` records the model the vector was made with; rows from a
+    previous model never count as present."""
+    __tablename__ = "knowledge_chunk_manifest"
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
+    source = Column(String(500), nullable=False, index=True)
+    content_hash = Column(String(64), nullable=False)
+    vector_id = Column(String(255), nullable=False)
+    embedding = Column(String(255), nullable=True)
+    fingerprint = Column(String(255), nullable=True)
+    created_at = Column(DateTime, nullable=False)
+
+
+class VectorCatalogSourceDatabase(Base):
+    """One row per source in a project's vector store: how many chunks it
+    has and when it was first and last ingested. Maintained by
+    `restai/vectordb/catalog.py` on every insert and delete so source
+    listings never scan the vector store."""
+    __tablename__ = "vector_catalog_sources"
+    __table_args__ = (
+        UniqueConstraint("project_id", "source", name="uq_vector_catalog_sources_project_source"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
+    source = Column(String(500), nullable=False)
+    chunk_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class VectorCatalogChunkDatabase(Base):
+    """The vector id of every chunk in a project's vector store and the
+    source it belongs to — the id half of the source catalog."""
+    __tablename__ = "vector_catalog_chunks"
+    __table_args__ = (
+        UniqueConstraint("project_id", "vector_id", name="uq_vector_catalog_chunks_project_vector"),
+        Index("ix_vector_catalog_chunks_project_source", "project_id", "source"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
+    vector_id = Column(String(255), nullable=False)
+    source = Column(String(500), nullable=False)
+
+
 class AuditLogDatabase(Base):
     __tablename__ = "audit_log"
 
@@ -719,6 +719,7 @@ class ProjectOptions(BaseModel):
     budget: Union[float, None] = Field(default=None, ge=0, description="Monthly cost budget (currency) for this project (None = unlimited). Part of the unified cost-budget model.")
     guard_output: Union[str, None] = Field(default=None, description="Id of the guard project for output checking (stored as the project id, not the name)")
     guard_mode: Union[str, None] = Field(default="block", description="Guard behavior: 'block' or 'warn'")
+    guard_speculative: Union[bool, None] = Field(default=None, description="RAG projects only: run the input guard and the answer generation concurrently and hold the answer back until the guard's verdict. Saves one LLM round-trip per request; a blocked request still spends the discarded generation's tokens upstream. Not applied to NL→SQL projects, whose generated query must not run before the guard passes.")
     eval_llm: Union[str, None] = Field(default=None, max_length=255, description="LLM used to judge evaluation runs. Empty/None = use the project's own LLM.")
     search_knowledge_project: Union[str, None] = Field(default=None, max_length=255, description="Name of the RAG project the search_knowledge builtin queries (agent projects). Empty = disabled.")
     sync_sources: Union[list[SyncSource], None] = Field(default=None, description="External sources for knowledge base auto-sync")
@@ -1185,6 +1186,10 @@ class IngestResponse(BaseModel):
     source: str = Field(description="Source identifier of the ingested content")
     documents: int = Field(description="Number of documents processed")
     chunks: int = Field(description="Number of chunks created from the documents")
+    timings: Optional[dict[str, float]] = Field(
+        default=None,
+        description="Per-stage ingest timings in seconds (split, embed, write, total) plus chunk and batch counts",
+    )
 
 
 class ClassifierModel(BaseModel):
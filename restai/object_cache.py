@@ -0,0 +1,90 @@
+"""Per-worker cache of the heavy objects `Brain` builds from DB rows.
+
+`find_project` used to build a new vector-store wrapper for every request
+(for Chroma: `get_or_create_collection` plus `VectorStoreIndex.from_vector_store`),
+and `get_llm` built a new LlamaIndex client, with its own HTTP connection
+pool, each time. These objects are now kept here, keyed by e.g.
+("vector", project_id) or ("llm", name). Each entry carries a
+fingerprint of the row fields it was built from. An entry whose fingerprint
+no longer matches is rebuilt, so an edit is picked up by the next request
+that reads the row, in any worker.
+
+Some changes aren't visible in a fingerprint: a collection reset or a
+project deleted and its id reused, and vector-store credentials from the
+Settings page. For those, `DBWrapper.bump_object_cache_version` increments an
+`object_cache_version` row. The worker doing the bump drops its cache at
+once. Every other worker checks that row and `settings_version` at most once
+per `OBJECT_CACHE_TTL` seconds and drops its cache when either has moved.
+`OBJECT_CACHE_TTL=0` disables the cache.
+
+The project row itself is still read and validated on every request. Its
+`team` carries the prepaid balance, budget and membership, which change
+with every inference, so caching it would make the budget gates stale.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Hashable
+
+from restai import config
+
+
+class ObjectCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (fingerprint, object)
+        self._entries: dict = {}
+        self._version = None
+        self._checked_at = 0.0
+        self.stats = {"hits": 0, "misses": 0, "version_checks": 0}
+
+    def _check_version(self, db) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < config.OBJECT_CACHE_TTL:
+            return
+        try:
+            version = db.get_object_cache_version()
+        except Exception:
+            # Can't confirm freshness: rebuild rather than serve stale objects.
+            version = object()
+        with self._lock:
+            self.stats["version_checks"] += 1
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            self._checked_at = now
+
+    def get(self, db, key: Hashable, fingerprint: Any, build: Callable[[], Any]):
+        """Cached object for `key`, rebuilt with `build()` when missing or
+        built from a different `fingerprint`. `build` returning None is not
+        cached."""
+        if config.OBJECT_CACHE_TTL <= 0:
+            return build()
+        self._check_version(db)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == fingerprint:
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["misses"] += 1
+        obj = build()
+        if obj is not None:
+            with self._lock:
+                self._entries[key] = (fingerprint, obj)
+        return obj
+
+    def invalidate(self, key: Hashable = None) -> None:
+        """Drop one entry, or everything (and force a version re-check)."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._checked_at = 0.0
+            else:
+                self._entries.pop(key, None)
+
+
+object_cache = ObjectCache()
+
+
+def invalidate_object_cache(key: Hashable = None) -> None:
+    object_cache.invalidate(key)
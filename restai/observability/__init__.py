@@ -9,6 +9,8 @@ Groups the observability concerns that were loose top-level modules:
   every `crons/*.py`).
 - `instance` — stable per-deployment instance id (used to label containers
   and tag telemetry).
+- `inference_writer` — write-behind queue that batches inference-log rows
+  and their token / wallet billing into one transaction per flush.
 
 `telemetry` reads `instance.get_instance_id` (intra-package); the rest are
 independent. All DB/config imports inside these modules are function-local,
@@ -0,0 +1,417 @@
+"""Write-behind queue for inference-log rows and the billing they carry.
+
+`log_inference` / `log_direct_usage` used to commit three times on the
+request path: the `output` row, the API-key token counter, and the team
+wallet debit (plus one INSERT per retrieved source in
+`log_retrieval_events`). With the writer running, those callers only build
+the row and `submit()` it; a daemon thread drains the queue every
+`INFERENCE_LOG_FLUSH_SECONDS` (sooner once `INFERENCE_LOG_BATCH_SIZE` rows
+are waiting) and writes each batch in ONE transaction:
+
+- multi-row INSERTs into `output` / `retrieval_events`,
+- one `tokens_used_this_month` UPDATE per API key in the batch,
+- one wallet debit per (team, user) in the batch via `charge_team_balance`.
+
+Billing stays exact while rows sit in the queue: the spend ledger is bumped
+at submit time, and the amounts not yet committed are exposed through
+`pending_*()`, which the budget / quota / balance gates and the ledger's
+table seeding add on top of what the database says.
+
+Back-pressure: once `INFERENCE_LOG_QUEUE_MAX` rows are queued, the
+submitting request flushes a batch itself before enqueuing (counted in
+`sync_flushes`). A batch that fails is retried row by row; a row that keeps
+failing, and anything still queued at shutdown that can't be written, is
+appended to a JSONL spill file under `INFERENCE_LOG_SPILL_DIR`. The flush
+thread re-queues its own spill file every `INFERENCE_LOG_SPILL_REPLAY_SECONDS`,
+and a start picks up the files of processes that are gone. Spilled rows stay
+in the `pending_*()` totals until they are written, so a database outage
+never lets spend slip past the gates. `stats()` reports queue depth, lag and
+those counters.
+
+The writer only runs inside the API process (started from the lifespan);
+crons, the CLI and `INFERENCE_LOG_FLUSH_SECONDS=0` keep writing inline.
+"""
+
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+
+from restai import config
+
+logger = logging.getLogger(__name__)
+
+# Flushes a row may fail before it's moved to the spill file.
+_MAX_ATTEMPTS = 3
+_DATE_FIELDS = ("date",)
+
+
+def _tables():
+    from restai.models.databasemodels import OutputDatabase, RetrievalEventDatabase
+
+    return {"output": OutputDatabase, "retrieval": RetrievalEventDatabase}
+
+
+def _row_billing(item: dict):
+    """(api_key_id, tokens, team_id, cost, user_id) for an `output` item."""
+    row = item["row"]
+    tokens = int(row.get("input_tokens") or 0) + int(row.get("output_tokens") or 0)
+    cost = float(row.get("input_cost") or 0.0) + float(row.get("output_cost") or 0.0)
+    return row.get("api_key_id"), tokens, row.get("team_id"), cost, row.get("user_id")
+
+
+def _to_json(item: dict) -> str:
+    row = dict(item["row"])
+    for field in _DATE_FIELDS:
+        if isinstance(row.get(field), datetime):
+            row[field] = row[field].isoformat()
+    return json.dumps({"table": item["table"], "row": row})
+
+
+def _from_json(line: str) -> dict:
+    data = json.loads(line)
+    row = data["row"]
+    for field in _DATE_FIELDS:
+        if isinstance(row.get(field), str):
+            row[field] = datetime.fromisoformat(row[field])
+    return {"table": data["table"], "row": row, "attempts": 0}
+
+
+def _spill_pid(path: str):
+    try:
+        return int(os.path.basename(path)[len("spill-"):-len(".jsonl")])
+    except ValueError:
+        return None
+
+
+def _pid_alive(pid) -> bool:
+    # A file under our own pid at start is a previous process's, the pid
+    # recycled (containers reuse low pids).
+    if pid is None or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class InferenceLogWriter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Serializes flushes so a back-pressure flush and the worker never
+        # write the same batch twice.
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._queue: deque = deque()
+        self._thread = None
+        self._stopping = False
+        # Queued, not yet committed.
+        self._pending_tokens: dict = defaultdict(int)
+        self._pending_charges: dict = defaultdict(float)
+        self._pending_spend: dict = defaultdict(float)
+        self._pending_requests: dict = defaultdict(list)
+        self._counters = {
+            "enqueued": 0, "written": 0, "flushes": 0, "sync_flushes": 0,
+            "failures": 0, "spilled": 0, "replayed": 0, "max_depth": 0,
+        }
+        self._last_flush_ms = None
+
+    # ── lifecycle ───────────────────────────────────────────────────────
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stopping
+
+    def start(self) -> None:
+        """Replay the spill files of finished processes and start the flush
+        thread. No-op when `INFERENCE_LOG_FLUSH_SECONDS` is 0 or the writer
+        is already running."""
+        if config.INFERENCE_LOG_FLUSH_SECONDS <= 0 or self.running:
+            return
+        self._stopping = False
+        self._replay_spill(inherited=True)
+        self._thread = threading.Thread(target=self._run, name="inference-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the thread and write out the queue; whatever can't be
+        written is spilled to disk for the next start."""
+        thread = self._thread
+        self._stopping = True
+        self._wake.set()
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+        deadline = time.monotonic() + timeout
+        while self._depth() and time.monotonic() < deadline:
+            if not self.flush():
+                break
+        with self._lock:
+            leftover = list(self._queue)
+            self._queue.clear()
+            # Everything unwritten is now on disk; whichever start replays it
+            # counts it as pending again.
+            for pending in (self._pending_tokens, self._pending_charges, self._pending_spend, self._pending_requests):
+                pending.clear()
+        if leftover:
+            self._spill(leftover)
+
+    def _run(self) -> None:
+        last_replay = time.monotonic()
+        while not self._stopping:
+            self._wake.wait(config.INFERENCE_LOG_FLUSH_SECONDS)
+            self._wake.clear()
+            if time.monotonic() - last_replay >= config.INFERENCE_LOG_SPILL_REPLAY_SECONDS:
+                last_replay = time.monotonic()
+                self._replay_spill()
+            while self._depth() and not self._stopping:
+                if not self.flush():
+                    break
+
+    # ── producers ───────────────────────────────────────────────────────
+
+    def submit(self, table: str, rows: list) -> bool:
+        """Queue `rows` (column dicts) for `table` ("output" or "retrieval").
+        Returns False when the writer isn't running — the caller then writes
+        inline as before."""
+        if not self.running:
+            return False
+        if self._depth() >= config.INFERENCE_LOG_QUEUE_MAX:
+            with self._lock:
+                self._counters["sync_flushes"] += 1
+            self.flush()
+        with self._lock:
+            for row in rows:
+                item = {"table": table, "row": row, "attempts": 0}
+                self._queue.append(item)
+                self._add_pending(item, 1)
+            self._counters["enqueued"] += len(rows)
+            depth = len(self._queue)
+            self._counters["max_depth"] = max(self._counters["max_depth"], depth)
+        if depth >= config.INFERENCE_LOG_BATCH_SIZE:
+            self._wake.set()
+        return True
+
+    def _add_pending(self, item: dict, sign: int) -> None:
+        # Caller holds self._lock.
+        if item["table"] != "output":
+            return
+        from restai.limits.ledger import spend_scopes
+
+        row = item["row"]
+        api_key_id, tokens, team_id, cost, user_id = _row_billing(item)
+        if api_key_id and tokens > 0:
+            self._pending_tokens[api_key_id] += sign * tokens
+        if team_id is not None and cost > 0:
+            self._pending_charges[team_id] += sign * cost
+        if cost:
+            for scope in spend_scopes(team_id=team_id, user_id=user_id,
+                                      project_id=row.get("project_id"), api_key_id=api_key_id):
+                self._pending_spend[scope] += sign * cost
+        project_id = row.get("project_id")
+        if project_id is not None and isinstance(row.get("date"), datetime):
+            from restai.limits.ledger import _epoch
+
+            stamps = self._pending_requests[project_id]
+            ts = _epoch(row["date"])
+            if sign > 0:
+                stamps.append(ts)
+            elif ts in stamps:
+                stamps.remove(ts)
+
+    # ── pending billing ─────────────────────────────────────────────────
+
+    def pending_api_key_tokens(self, api_key_id) -> int:
+        with self._lock:
+            return self._pending_tokens.get(api_key_id, 0)
+
+    def pending_team_charge(self, team_id) -> float:
+        with self._lock:
+            return self._pending_charges.get(team_id, 0.0)
+
+    def pending_spend(self, scope: tuple) -> float:
+        with self._lock:
+            return self._pending_spend.get(tuple(scope), 0.0)
+
+    def pending_requests(self, project_id) -> list:
+        with self._lock:
+            return list(self._pending_requests.get(project_id, ()))
+
+    # ── flushing ────────────────────────────────────────────────────────
+
+    def _depth(self) -> int:
+        with self._lock:
+            return len(self._queue)
+
+    def flush(self) -> bool:
+        """Write one batch. Returns False when nothing could be written
+        (the rows are back in the queue or spilled)."""
+        with self._flush_lock:
+            with self._lock:
+                n = min(len(self._queue), config.INFERENCE_LOG_BATCH_SIZE)
+                batch = [self._queue.popleft() for _ in range(n)]
+            if not batch:
+                return True
+            started = time.monotonic()
+            try:
+                self._write(batch)
+                written, failed = batch, []
+            except Exception as e:
+                logger.warning("inference log: batch of %d failed (%s); retrying row by row", len(batch), e)
+                written, failed = [], []
+                for item in batch:
+                    try:
+                        self._write([item])
+                        written.append(item)
+                    except Exception:
+                        failed.append(item)
+            self._settle(written, failed, started)
+            return bool(written)
+
+    def _settle(self, written: list, failed: list, started: float) -> None:
+        retry, spill = [], []
+        for item in failed:
+            item["attempts"] += 1
+            (spill if item["attempts"] >= _MAX_ATTEMPTS else retry).append(item)
+        with self._lock:
+            # Spilled rows stay pending until a replay writes them.
+            for item in written:
+                self._add_pending(item, -1)
+            # Retries go back to the head so rows keep their order.
+            self._queue.extendleft(reversed(retry))
+            self._counters["written"] += len(written)
+            self._counters["flushes"] += 1
+            self._counters["failures"] += len(failed)
+            self._last_flush_ms = round((time.monotonic() - started) * 1000, 1)
+        if spill:
+            logger.error("inference log: %d row(s) failed %d times; spilling to disk", len(spill), _MAX_ATTEMPTS)
+            if not self._spill(spill):
+                with self._lock:
+                    for item in spill:
+                        self._add_pending(item, -1)
+
+    def _write(self, batch: list) -> None:
+        from sqlalchemy import func, insert, update
+
+        from restai.database import open_db_wrapper
+        from restai.limits.budget import charge_team_balance
+        from restai.models.databasemodels import ApiKeyDatabase
+
+        tables = _tables()
+        # executemany needs one column set per statement; log_inference and
+        # log_direct_usage rows differ, so group by key set.
+        groups = defaultdict(list)
+        tokens = defaultdict(int)
+        charges = defaultdict(float)
+        for item in batch:
+            groups[(item["table"], tuple(sorted(item["row"])))].append(item["row"])
+            if item["table"] == "output":
+                api_key_id, n, team_id, cost, user_id = _row_billing(item)
+                if api_key_id and n > 0:
+                    tokens[api_key_id] += n
+                if team_id is not None and cost > 0:
+                    charges[(team_id, user_id)] += cost
+
+        db = open_db_wrapper()
+        try:
+            for (table, _), rows in groups.items():
+                db.db.execute(insert(tables[table]), rows)
+            for api_key_id, n in tokens.items():
+                db.db.execute(
+                    update(ApiKeyDatabase)
+                    .where(ApiKeyDatabase.id == api_key_id)
+                    .values(tokens_used_this_month=func.coalesce(ApiKeyDatabase.tokens_used_this_month, 0) + n)
+                )
+            for (team_id, user_id), cost in charges.items():
+                charge_team_balance(db, team_id, cost, actor_user_id=user_id, commit=False)
+            db.db.commit()
+        except Exception:
+            db.db.rollback()
+            raise
+        finally:
+            db.close()
+
+    # ── spill ───────────────────────────────────────────────────────────
+
+    def _spill_path(self) -> str:
+        return os.path.join(config.INFERENCE_LOG_SPILL_DIR, f"spill-{os.getpid()}.jsonl")
+
+    def _spill(self, items: list) -> bool:
+        """Append `items` to this process's spill file. False if they could
+        not be written and are lost."""
+        try:
+            os.makedirs(config.INFERENCE_LOG_SPILL_DIR, exist_ok=True)
+            with open(self._spill_path(), "a", encoding="utf-8") as f:
+                for item in items:
+                    f.write(_to_json(item) + "\n")
+        except Exception:
+            logger.exception("inference log: failed to spill %d row(s); they are lost", len(items))
+            return False
+        with self._lock:
+            self._counters["spilled"] += len(items)
+        return True
+
+    def _replay_spill(self, inherited: bool = False) -> None:
+        """Queue spilled rows. From the flush loop, only this writer's own
+        file, whose rows are still counted as pending. At start
+        (`inherited`), also the files of processes that are gone, whose
+        rows are counted again here. A live worker's file is left to that
+        worker. Each file is claimed by renaming it first, so concurrent
+        workers don't replay it twice."""
+        if inherited:
+            paths = [
+                path for path in sorted(glob.glob(os.path.join(config.INFERENCE_LOG_SPILL_DIR, "spill-*.jsonl")))
+                if not _pid_alive(_spill_pid(path))
+            ]
+        else:
+            paths = [self._spill_path()] if os.path.exists(self._spill_path()) else []
+        for path in paths:
+            claimed = f"{path}.{os.getpid()}.replay"
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            items = []
+            try:
+                with open(claimed, encoding="utf-8") as f:
+                    items = [_from_json(line) for line in f if line.strip()]
+            except Exception:
+                logger.exception("inference log: unreadable spill file %s; left in place", claimed)
+                continue
+            with self._lock:
+                for item in items:
+                    self._queue.append(item)
+                    if inherited:
+                        self._add_pending(item, 1)
+                self._counters["replayed"] += len(items)
+            os.remove(claimed)
+            logger.info("inference log: replaying %d spilled row(s) from %s", len(items), path)
+
+    # ── metrics ─────────────────────────────────────────────────────────
+
+    def stats(self) -> dict:
+        with self._lock:
+            oldest = self._queue[0]["row"].get("date") if self._queue else None
+            lag = None
+            if isinstance(oldest, datetime):
+                from restai.limits.ledger import _epoch
+
+                lag = round(max(0.0, time.time() - _epoch(oldest)), 3)
+            return {
+                "running": self.running,
+                "depth": len(self._queue),
+                "queue_max": config.INFERENCE_LOG_QUEUE_MAX,
+                "lag_seconds": lag,
+                "last_flush_ms": self._last_flush_ms,
+                **self._counters,
+            }
+
+
+inference_writer = InferenceLogWriter()
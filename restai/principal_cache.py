@@ -0,0 +1,181 @@
+"""Per-worker cache of resolved Bearer API keys.
+
+`UserMixin.get_user_by_apikey` is deliberately slow. It runs a 100,000-round
+PBKDF2 for each key that shares the token's 8-char prefix. When none of them
+match, it also Fernet-decrypts the legacy `api_key` of every user. Paying
+that on every call made authentication the most expensive step of a cheap
+request, and a client retrying a revoked key paid the full O(users) scan
+each time.
+
+Here a presented token maps to the principal it resolved to: the owning
+user id and the `api_keys` row id (or, for a legacy key, the ciphertext it
+matched). Entries are keyed by an HMAC of the token under
+`RESTAI_AUTH_SECRET`, so the raw key is never held. Entries expire after
+`AUTH_CACHE_TTL` seconds. Tokens that resolved to nothing are remembered
+for `AUTH_NEGATIVE_CACHE_TTL` seconds and refused without a lookup.
+
+A hit does not skip the database. `_resolve_bearer_token` still reads the
+key row by primary key and the user it belongs to, and validates both into
+a fresh `User`. So a deleted key, a suspended user and a changed key scope
+or team membership apply on the very next request. What the cache saves is
+the hashing.
+
+`invalidate` is called on key deletion, user update and user deletion. It
+drops the affected entries in this worker and, when Redis is configured,
+bumps a generation counter that other workers compare against on every
+lookup. `AUTH_CACHE_TTL=0` disables the cache.
+"""
+
+import hashlib
+import hmac
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from restai import config
+
+logger = logging.getLogger(__name__)
+
+_GENERATION_KEY = "restai:auth:generation"
+# Per-worker bounds, so a flood of distinct bad tokens can't grow memory.
+_MAX_ENTRIES = 10000
+_MAX_NEGATIVE = 10000
+
+
+@dataclass(frozen=True)
+class Principal:
+    user_id: int
+    # None for a legacy `users.api_key` match...
+    api_key_id: Optional[int] = None
+    # ...in which case this is the ciphertext it matched; a rotated legacy
+    # key no longer equals it.
+    legacy_secret: Optional[str] = None
+
+
+# Returned by `get` for a token known not to resolve.
+NEGATIVE = object()
+
+
+class PrincipalCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # digest -> (expires_at, Principal)
+        self._entries: OrderedDict = OrderedDict()
+        # digest -> expires_at
+        self._negative: OrderedDict = OrderedDict()
+        self._generation = None
+        self._redis_client = None
+        self._redis_url = None
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hmac.new(
+            (config.RESTAI_AUTH_SECRET or "").encode(), token.encode(), hashlib.sha256
+        ).hexdigest()
+
+    def _redis(self):
+        """Sync Redis client, rebuilt when the Settings URL changes; None
+        when Redis isn't configured (same pattern as the spend ledger)."""
+        url = config.build_redis_url()
+        if not url:
+            self._redis_client = self._redis_url = None
+            return None
+        if self._redis_client is not None and self._redis_url == url:
+            return self._redis_client
+        try:
+            import redis
+            client = redis.Redis.from_url(url)
+        except Exception as e:
+            logger.warning("principal cache: failed to build Redis client (%s); per-worker invalidation only", e)
+            return None
+        self._redis_client, self._redis_url = client, url
+        return client
+
+    def _sync_generation(self) -> None:
+        """Drop everything when another worker invalidated since our last look."""
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            generation = client.get(_GENERATION_KEY)
+        except Exception as e:
+            # Can't see other workers' revocations: don't trust the cache.
+            logger.warning("principal cache: Redis unavailable (%s)", e)
+            generation = object()
+        with self._lock:
+            if generation != self._generation:
+                self._entries.clear()
+                self._negative.clear()
+                self._generation = generation
+
+    def get(self, digest: str):
+        """The cached `Principal`, `NEGATIVE`, or None on a miss."""
+        if config.AUTH_CACHE_TTL <= 0:
+            return None
+        self._sync_generation()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                if entry[0] > now:
+                    self.stats["hits"] += 1
+                    return entry[1]
+                del self._entries[digest]
+            expires_at = self._negative.get(digest)
+            if expires_at is not None:
+                if expires_at > now:
+                    self.stats["negative_hits"] += 1
+                    return NEGATIVE
+                del self._negative[digest]
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, digest: str, principal: Principal) -> None:
+        if config.AUTH_CACHE_TTL <= 0:
+            return
+        with self._lock:
+            self._negative.pop(digest, None)
+            self._entries[digest] = (time.monotonic() + config.AUTH_CACHE_TTL, principal)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > _MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def put_negative(self, digest: str) -> None:
+        if config.AUTH_CACHE_TTL <= 0 or config.AUTH_NEGATIVE_CACHE_TTL <= 0:
+            return
+        with self._lock:
+            self._negative[digest] = time.monotonic() + config.AUTH_NEGATIVE_CACHE_TTL
+            self._negative.move_to_end(digest)
+            while len(self._negative) > _MAX_NEGATIVE:
+                self._negative.popitem(last=False)
+
+    def discard(self, digest: str) -> None:
+        with self._lock:
+            self._entries.pop(digest, None)
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """Drop `user_id`'s principals (all of them when None) here, and tell
+        the other workers through Redis."""
+        with self._lock:
+            self.stats["invalidations"] += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                for digest in [d for d, (_, p) in self._entries.items() if p.user_id == user_id]:
+                    del self._entries[digest]
+            # A token refused a moment ago may be valid now (e.g. legacy key set).
+            self._negative.clear()
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            client.incr(_GENERATION_KEY)
+        except Exception as e:
+            logger.warning("principal cache: failed to publish invalidation (%s)", e)
+
+
+principal_cache = PrincipalCache()
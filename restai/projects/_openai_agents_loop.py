@@ -277,7 +277,7 @@ async def _drive(project, db, agent_self, *, prompt_text: str, system_prompt: st
     mcp_pool = None
     if mcp_servers:
         try:
-            mcp_pool = MCPSessionPool()
+            mcp_pool = MCPSessionPool(project_id=project.props.id)
             await mcp_pool.__aenter__()
             adapted_tools = await mcp_pool.connect_servers(mcp_servers)
             for a in adapted_tools:
@@ -790,7 +790,9 @@ class Agent(ProjectBase):
             async with contextlib.AsyncExitStack() as _mcp_stack:
                 mcp_tools = []
                 if mcp_servers:
-                    mcp_pool = await _mcp_stack.enter_async_context(MCPSessionPool())
+                    mcp_pool = await _mcp_stack.enter_async_context(
+                        MCPSessionPool(project_id=project.props.id)
+                    )
                     try:
                         mcp_tools = await mcp_pool.connect_servers(mcp_servers)
                     except Exception:
@@ -8,8 +8,9 @@ from restai.project import Project
 
 def _account_guard(guard, user: User, text: str, result, db: DBWrapper) -> None:
     """Log the guard LLM call as an accounted OutputDatabase row against the guard
-    project (its own team/LLM pricing). Best-effort — never breaks the turn."""
-    if getattr(guard, "project", None) is None:
+    project (its own team/LLM pricing). Best-effort — never breaks the turn.
+    A cached verdict made no call, so there is nothing to account."""
+    if getattr(guard, "project", None) is None or getattr(result, "cached", False):
         return
     try:
         from restai.tools import log_inference
@@ -1,4 +1,8 @@
+import asyncio
+import functools
 import json
+import logging
+import threading
 from typing import Optional
 
 from fastapi import HTTPException
@@ -7,17 +11,18 @@ from llama_index.core.retrievers import VectorIndexRetriever
 from llama_index.core.postprocessor import SimilarityPostprocessor
 from llama_index.core.chat_engine import ContextChatEngine
 from llama_index.core.postprocessor.llm_rerank import LLMRerank
+from restai import config
 from restai.chat import Chat
-from restai.database import DBWrapper
+from restai.database import DBWrapper, open_db_wrapper
 from restai.eval import eval_rag
 from restai.llm import LLM
 from restai.models.models import ChatModel, User
 from restai.project import Project
-from restai.tools import tokens_from_string
+from restai.limits.accounting import TokenUsage, counting_tokens
 from restai.projects.base import ProjectBase
-from llama_index.core.utilities.sql_wrapper import SQLDatabase
 from llama_index.core.indices.struct_store.sql_query import NLSQLTableQueryEngine
-from sqlalchemy import create_engine
+from restai.sql_engines import get_sql_database
+from restai.utils.offload import Offloader
 
 # SQLite intentionally absent: NL→SQL on SQLite gave a project admin (who
 # controls the connection option) a file-read primitive against anything
@@ -28,6 +33,46 @@ _ALLOWED_DB_SCHEMES = {"postgresql", "postgresql+psycopg2", "mysql", "mysql+pymy
 _ALLOWED_SCHEME_BASES = {s.split("+")[0] for s in _ALLOWED_DB_SCHEMES}
 
 
+# LlamaIndex's async entry points (`achat`, `astream_chat`, `aquery`) still
+# run node postprocessors (LLM rerank, the KG entity boost's DB lookup), SQL
+# execution and most vector-store queries synchronously on the caller's
+# loop. So the sync calls run here instead, one thread per in-flight step.
+_offload = Offloader("rag", config.RAG_EXECUTOR_WORKERS)
+
+
+def _speculative_turn(abandoned, usage, engine_call, question):
+    """The chat-engine call of a turn whose input guard runs concurrently
+    (`guard_speculative`), on a scratch memory (`Chat.scratch_memory`).
+    Skipped, returning None, if the guard already refused it."""
+    if abandoned.is_set():
+        return None
+    return counting_tokens(usage, engine_call, question)
+
+
+def _settle_turn(response, then):
+    """Run `then()` once the turn has written its answer. A streamed answer
+    is written by the engine's own thread after the last token, whether or
+    not anyone reads the stream, so wait for that first."""
+    writer = getattr(response, "write_response_to_history_thread", None)
+    if writer is not None:
+        writer.join()
+    then()
+
+
+def _abandon_turn(turn, abandoned, account):
+    """The guard refused a speculative turn: skip it if it hasn't started,
+    and once it settles `account()` the tokens it spent. Its scratch memory
+    is dropped with it, so the chat never sees the turn."""
+    abandoned.set()
+
+    def settled(fut):
+        if fut.cancelled() or fut.exception() is not None or fut.result() is None:
+            return
+        _offload.submit(_settle_turn, fut.result(), account)
+
+    turn.add_done_callback(settled)
+
+
 def _validate_connection_string(conn: str):
     """Reject schemes outside the allowlist."""
     from urllib.parse import urlparse
@@ -50,6 +95,8 @@ class EntityBoostPostprocessor:
     """Multiplicative score boost for chunks whose source contains query entities; never filters."""
 
     def __init__(self, brain, db, project_id: int, query: str, boost_factor: float = 1.5):
+        """`db=None` opens a session of its own for the lookup, for turns
+        that may outlive the request's."""
         self.brain = brain
         self.db = db
         self.project_id = project_id
@@ -60,54 +107,39 @@ class EntityBoostPostprocessor:
     def _compute_matched_sources(self) -> set:
         if self._matched_sources is not None:
             return self._matched_sources
+        db = self.db
         try:
-            import re as _re
-            from restai.integrations.knowledge_graph import find_entities_in_text, normalize_entity_name
-            from restai.models.databasemodels import KGEntityDatabase, KGEntityMentionDatabase
-
-            # Primary path: word-boundary match query against entities ALREADY
-            # in this project's graph. NER on short queries is unreliable.
-            project_entities = (
-                self.db.db.query(KGEntityDatabase)
-                .filter(KGEntityDatabase.project_id == self.project_id)
-                .all()
-            )
-            if not project_entities:
-                self._matched_sources = set()
-                return self._matched_sources
-
-            query_padded = " " + _re.sub(r"[^\w\s]", " ", (self.query or "").lower()) + " "
-            matched_ids = {
-                e.id for e in project_entities
-                if e.normalized and f" {e.normalized} " in query_padded
-            }
+            if db is None:
+                db = open_db_wrapper()
+            self._matched_sources = self._lookup_sources(db)
+        except Exception:
+            self._matched_sources = set()
+        finally:
+            if db is not None and db is not self.db:
+                db.close()
+        return self._matched_sources
 
-            # Supplement with NER hits for differently-phrased queries.
-            try:
-                ner_hits = find_entities_in_text(self.query, self.brain)
-                if ner_hits:
-                    ner_normalized = [normalize_entity_name(n) for n, _ in ner_hits]
-                    extra_ids = {
-                        e.id for e in project_entities
-                        if e.normalized in ner_normalized
-                    }
-                    matched_ids |= extra_ids
-            except Exception:
-                pass
+    def _lookup_sources(self, db) -> set:
+        from restai.integrations.knowledge_graph import find_entities_in_text, normalize_entity_name
+        from restai.integrations.kg_matcher import entity_matcher, sources_for_entities
 
-            if not matched_ids:
-                self._matched_sources = set()
-                return self._matched_sources
+        # Primary path: word-boundary match query against entities ALREADY
+        # in this project's graph. NER on short queries is unreliable.
+        matcher = entity_matcher(db, self.project_id)
+        if not len(matcher):
+            return set()
 
-            sources = {
-                row.source for row in self.db.db.query(KGEntityMentionDatabase)
-                .filter(KGEntityMentionDatabase.entity_id.in_(list(matched_ids)))
-                .all()
-            }
-            self._matched_sources = sources
+        matched_ids = set(matcher.match(self.query))
+
+        # Supplement with NER hits for differently-phrased queries.
+        try:
+            ner_hits = find_entities_in_text(self.query, self.brain)
+            if ner_hits:
+                matched_ids.update(matcher.lookup(normalize_entity_name(n) for n, _ in ner_hits))
         except Exception:
-            self._matched_sources = set()
-        return self._matched_sources
+            pass
+
+        return set(sources_for_entities(db, list(matched_ids)))
 
     def postprocess_nodes(self, nodes, query_bundle=None, query_str=None):
         matched = self._compute_matched_sources()
@@ -130,6 +162,37 @@ class EntityBoostPostprocessor:
 
 class RAG(ProjectBase):
 
+    def _check_input_guard_own_session(self, project: Project, question: str, user: User, output: dict) -> bool:
+        """`check_input_guard` on a DB session of its own, for a guard that
+        runs in a thread next to the turn (a Session isn't thread-safe)."""
+        db = open_db_wrapper()
+        try:
+            return self.check_input_guard(project, question, user, db, output)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _account_abandoned_turn(project: Project, user: User, question: str, usage: TokenUsage) -> None:
+        """Log and charge the generation of a speculative turn the guard
+        refused: it still ran upstream. Runs after the turn settled, long
+        after the request's session closed."""
+        if not (usage.input or usage.output):
+            return
+        from restai.tools import log_inference
+
+        db = open_db_wrapper()
+        try:
+            log_inference(project, user, {
+                "question": question,
+                "answer": None,
+                "tokens": usage.as_tokens(),
+                "status": "guard_discarded",
+            }, db)
+        except Exception as e:
+            logging.warning("RAG: accounting a discarded speculative turn failed: %s", e)
+        finally:
+            db.close()
+
     async def chat(
         self,
         project: Project,
@@ -168,7 +231,7 @@ class RAG(ProjectBase):
                 "project": project.props.name,
             }
 
-            if self.check_input_guard(project, chatModel.question, user, db, output):
+            if await _offload(self.check_input_guard, project, chatModel.question, user, db, output):
                 if chatModel.stream:
                     yield "data: " + json.dumps({"text": output.get("answer", "")}) + "\n\n"
                     yield "data: " + json.dumps(output) + "\n"
@@ -179,68 +242,62 @@ class RAG(ProjectBase):
 
             conn_str = project.props.options.connection
             _validate_connection_string(conn_str)
-            engine = create_engine(conn_str)
-            try:
-                # The project's `options.tables` is the ADMIN's allowlist. A
-                # caller-supplied `chatModel.tables` used to replace it wholesale,
-                # so any member could name tables the admin had deliberately kept
-                # out of reach and have the LLM query them. Treat the request as
-                # a narrowing filter over the allowlist, never a widening one.
-                project_tables = None
-                if project.props.options.tables:
-                    project_tables = [
-                        t.strip() for t in project.props.options.tables.split(',') if t.strip()
-                    ]
-
-                if chatModel.tables is not None:
-                    requested = [t.strip() for t in chatModel.tables if t and t.strip()]
-                    if project_tables is not None:
-                        allowed = set(project_tables)
-                        outside = sorted(set(requested) - allowed)
-                        if outside:
-                            raise HTTPException(
-                                status_code=400,
-                                detail=(
-                                    "Requested tables are not in this project's allowlist: "
-                                    + ", ".join(outside)
-                                ),
-                            )
-                    tables = requested or project_tables
-                else:
-                    tables = project_tables
+            # The project's `options.tables` is the ADMIN's allowlist. A
+            # caller-supplied `chatModel.tables` used to replace it wholesale,
+            # so any member could name tables the admin had deliberately kept
+            # out of reach and have the LLM query them. Treat the request as
+            # a narrowing filter over the allowlist, never a widening one.
+            project_tables = None
+            if project.props.options.tables:
+                project_tables = [
+                    t.strip() for t in project.props.options.tables.split(',') if t.strip()
+                ]
+
+            if chatModel.tables is not None:
+                requested = [t.strip() for t in chatModel.tables if t and t.strip()]
+                if project_tables is not None:
+                    allowed = set(project_tables)
+                    outside = sorted(set(requested) - allowed)
+                    if outside:
+                        raise HTTPException(
+                            status_code=400,
+                            detail=(
+                                "Requested tables are not in this project's allowlist: "
+                                + ", ".join(outside)
+                            ),
+                        )
+                tables = requested or project_tables
+            else:
+                tables = project_tables
 
-                # Reflect only the allowlisted tables, so the schema the LLM is
-                # shown cannot include anything it is not permitted to query.
-                sql_database = (
-                    SQLDatabase(engine, include_tables=tables) if tables else SQLDatabase(engine)
-                )
+            # Reflect only the allowlisted tables, so the schema the LLM is
+            # shown cannot include anything it is not permitted to query.
+            # Engine and reflected schema are shared per (connection, tables).
+            sql_database = await _offload(get_sql_database, conn_str, tables)
 
-                question = sysTemplate + "\n Question: " + chatModel.question
+            question = sysTemplate + "\n Question: " + chatModel.question
 
-                query_engine = NLSQLTableQueryEngine(
-                    llm=model.llm,
-                    sql_database=sql_database,
-                    tables=tables,
-                )
+            query_engine = NLSQLTableQueryEngine(
+                llm=model.llm,
+                sql_database=sql_database,
+                tables=tables,
+            )
 
-                response = query_engine.query(question)
+            usage = TokenUsage()
+            response = await _offload(counting_tokens, usage, query_engine.query, question)
 
-                output["answer"] = response.response
-                output["sources"] = [response.metadata['sql_query']]
-                output["tokens"] = {
-                    "input": tokens_from_string(output["question"]),
-                    "output": tokens_from_string(output["answer"]),
-                }
+            output["answer"] = response.response
+            output["sources"] = [response.metadata['sql_query']]
+            # Text-to-SQL and answer synthesis calls, exactly.
+            output["tokens"] = usage.as_tokens()
 
-                if chatModel.stream:
-                    yield "data: " + json.dumps({"text": output["answer"]}) + "\n\n"
-                    yield "data: " + json.dumps(output) + "\n"
-                    yield "event: close\n\n"
-                else:
-                    yield output
-                return
-            finally:
-                engine.dispose()
+            if chatModel.stream:
+                yield "data: " + json.dumps({"text": output["answer"]}) + "\n\n"
+                yield "data: " + json.dumps(output) + "\n"
+                yield "event: close\n\n"
+            else:
+                yield output
+            return
 
         # Vector path — used by both stateful chat and ephemeral
         # (shim-routed) one-shot turns. Per-request RAG knobs from
@@ -267,7 +324,16 @@ class RAG(ProjectBase):
             "project": project.props.name,
         }
 
-        if self.check_input_guard(project, chatModel.question, user, db, output):
+        speculative = bool(project.props.guard and getattr(project.props.options, "guard_speculative", False))
+        if speculative:
+            # The verdict is awaited below, once the generation is under way;
+            # nothing reaches the caller before it. The guard runs alongside
+            # this coroutine and the engine thread, so on its own session.
+            guard_output = dict(output)
+            guard_task = asyncio.ensure_future(
+                _offload(self._check_input_guard_own_session, project, chatModel.question, user, guard_output)
+            )
+        elif await _offload(self.check_input_guard, project, chatModel.question, user, db, output):
             yield output
             return
 
@@ -287,7 +353,9 @@ class RAG(ProjectBase):
         if project.props.options.enable_knowledge_graph:
             postprocessors.append(
                 EntityBoostPostprocessor(
-                    brain=self.brain, db=db, project_id=project.props.id, query=chatModel.question,
+                    # A speculative turn may outlive the request (and `db`).
+                    brain=self.brain, db=None if speculative else db,
+                    project_id=project.props.id, query=chatModel.question,
                 )
             )
 
@@ -307,19 +375,44 @@ class RAG(ProjectBase):
 
         postprocessors.append(SimilarityPostprocessor(similarity_cutoff=threshold))
 
+        # A speculative turn writes to a scratch copy of the history, moved
+        # into the chat only once the guard has passed it.
+        memory = await _offload(chat.scratch_memory) if speculative else chat.memory
         chat_engine = ContextChatEngine.from_defaults(
             retriever=retriever,
             system_prompt=sysTemplate,
-            memory=chat.memory,
+            memory=memory,
             node_postprocessors=postprocessors,
             llm=model.llm,
         )
 
         try:
-            if chatModel.stream:
-                response = chat_engine.stream_chat(chatModel.question)
+            # Every LLM call this turn makes (rerank, memory summary, answer)
+            # lands in `usage`, including the streamed one once it finishes.
+            usage = TokenUsage()
+            engine_call = chat_engine.stream_chat if chatModel.stream else chat_engine.chat
+            if speculative:
+                abandoned = threading.Event()
+                turn = asyncio.ensure_future(_offload(
+                    _speculative_turn, abandoned, usage, engine_call, chatModel.question,
+                ))
+                account = functools.partial(self._account_abandoned_turn, project, user, chatModel.question, usage)
+                try:
+                    blocked = await guard_task
+                except BaseException:
+                    _abandon_turn(turn, abandoned, account)
+                    raise
+                output.update(guard_output)
+                if blocked:
+                    _abandon_turn(turn, abandoned, account)
+                    yield output
+                    return
+                # A streamed answer's tokens have queued up in the engine
+                # meanwhile; they go out below.
+                response = await turn
+                _offload.submit(_settle_turn, response, functools.partial(chat.commit, memory))
             else:
-                response = chat_engine.chat(chatModel.question)
+                response = await _offload(counting_tokens, usage, engine_call, chatModel.question)
 
             for node in response.source_nodes:
                 source = {"score": node.score, "id": node.node_id, "text": node.text}
@@ -334,7 +427,7 @@ class RAG(ProjectBase):
             if chatModel.stream:
                 parts = []
                 if hasattr(response, "response_gen"):
-                    for text in response.response_gen:
+                    async for text in _offload.iterate(response.response_gen):
                         parts.append(text)
                         yield "data: " + json.dumps({"text": text}) + "\n\n"
 
@@ -348,7 +441,7 @@ class RAG(ProjectBase):
                     output["answer"] = answer
 
                 self.brain.post_processing_reasoning(output)
-                self.brain.post_processing_counting(output)
+                self.brain.post_processing_counting(output, usage)
 
                 yield "data: " + json.dumps(output) + "\n"
                 yield "event: close\n\n"
@@ -363,7 +456,8 @@ class RAG(ProjectBase):
                 # Eval scoring — non-streaming only, opt-in via chatModel.eval.
                 if chatModel.eval and not chatModel.stream:
                     try:
-                        metric = eval_rag(
+                        metric = await _offload(
+                            eval_rag,
                             chatModel.question,
                             response,
                             self.brain.get_llm("openai_gpt4", db).llm,
@@ -373,7 +467,7 @@ class RAG(ProjectBase):
                         pass
 
                 self.brain.post_processing_reasoning(output)
-                self.brain.post_processing_counting(output)
+                self.brain.post_processing_counting(output, usage)
 
                 yield output
         except Exception as e:
@@ -1,14 +1,16 @@
-import base64
+import asyncio
+import inspect
 import json
 import logging
-import struct
 import time
 import uuid
 from typing import Optional
 
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse, StreamingResponse
+from llama_index.core.llms import CustomLLM
 
+from restai import config
 from restai.auth import get_current_username, check_not_restricted
 from restai.database import get_db_wrapper, DBWrapper
 from restai.limits.budget import check_api_key_quota
@@ -29,16 +31,15 @@ from restai.models.models import (
     OpenAICompletionChoice,
     OpenAIEmbeddingRequest,
     OpenAIEmbeddingResponse,
-    OpenAIEmbeddingData,
-    OpenAIEmbeddingUsage,
     OpenAIModelObject,
     OpenAIModerationRequest,
     OpenAIModerationResponse,
     OpenAIModerationResult,
     User,
 )
-from restai.tools import tokens_from_string
+from restai.tools import tokens_from_string, tokens_from_strings
 from restai.utils import openai_compat as oc
+from restai.utils.offload import Offloader
 
 router = APIRouter()
 
@@ -49,6 +50,39 @@ _SSE_HEADERS = {
 }
 
 
+# Translated-path providers whose async methods only wrap the sync ones
+# (`CustomLLM` runs `chat()` on the loop from `achat()`) are called here
+# instead, so a slow upstream blocks a thread, not the worker.
+_offload = Offloader("direct", config.DIRECT_EXECUTOR_WORKERS)
+
+
+def _native_async(llm, method: str) -> bool:
+    """True when `llm.<method>` is a real async implementation. Compared by
+    qualname: LlamaIndex re-wraps inherited methods per subclass for
+    instrumentation, so identity with `CustomLLM.<method>` never holds."""
+    impl = getattr(type(llm), method, None)
+    if impl is None:
+        return False
+    return inspect.unwrap(impl).__qualname__ != f"{CustomLLM.__name__}.{method}"
+
+
+async def _achat(llm, messages, **kwargs):
+    if _native_async(llm, "achat"):
+        return await llm.achat(messages, **kwargs)
+    return await _offload(llm.chat, messages, **kwargs)
+
+
+async def _astream_chat(llm, messages, **kwargs):
+    """Async-iterate a chat stream without blocking the loop between tokens."""
+    if _native_async(llm, "astream_chat"):
+        async for token_response in await llm.astream_chat(messages, **kwargs):
+            yield token_response
+        return
+    gen = await _offload(llm.stream_chat, messages, **kwargs)
+    async for token_response in _offload.iterate(gen):
+        yield token_response
+
+
 def _sse(obj: dict) -> str:
     return f"data: {json.dumps(obj)}\n\n"
 
@@ -120,8 +154,9 @@ async def chat_completions(
 
     if not body.stream:
         choices, total_in, total_out = [], 0, 0
-        for i in range(n):
-            response = llm.chat(messages, **kwargs)
+        # The n choices are independent samples: request them concurrently.
+        responses = await asyncio.gather(*(_achat(llm, messages, **kwargs) for _ in range(n)))
+        for i, response in enumerate(responses):
             tool_calls = oc.extract_tool_calls(response)
             finish_reason = oc.extract_finish_reason(response)
             content = str(response.message.content) if response.message.content else None
@@ -160,8 +195,7 @@ async def chat_completions(
             # Leading role chunk (OpenAI always sends this first).
             yield _sse({**base, "choices": [{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}]})
 
-            stream_response = llm.stream_chat(messages, **kwargs)
-            for token_response in stream_response:
+            async for token_response in _astream_chat(llm, messages, **kwargs):
                 last_response = token_response
                 delta = token_response.delta
                 if delta:
@@ -293,7 +327,7 @@ async def completions(
         kwargs["max_tokens"] = body.max_tokens
 
     if not body.stream:
-        response = llm.chat(messages, **kwargs)
+        response = await _achat(llm, messages, **kwargs)
         text = str(response.message.content) if response.message.content else ""
         finish_reason = oc.extract_finish_reason(response)
         real = oc.usage_from_response(response)
@@ -318,7 +352,7 @@ async def completions(
         try:
             base = {"id": completion_id, "object": "text_completion",
                     "created": int(time.time()), "model": body.model, "system_fingerprint": fingerprint}
-            for tr in llm.stream_chat(messages, **kwargs):
+            async for tr in _astream_chat(llm, messages, **kwargs):
                 last = tr
                 if tr.delta:
                     full += tr.delta
@@ -371,7 +405,7 @@ async def retrieve_model(
 
 # ── /v1/embeddings ───────────────────────────────────────────────────────────
 
-@router.post("/v1/embeddings")
+@router.post("/v1/embeddings", response_model=OpenAIEmbeddingResponse)
 async def embeddings(
     request: Request,
     body: OpenAIEmbeddingRequest,
@@ -389,33 +423,39 @@ async def embeddings(
         raise HTTPException(status_code=404, detail=f"Embedding model '{body.model}' not found")
 
     texts = [body.input] if isinstance(body.input, str) else body.input
-    results = embedding_obj.embedding.get_text_embedding_batch(texts)
-
-    if body.dimensions:
-        results = [vec[: body.dimensions] for vec in results]
-
-    if body.encoding_format == "base64":
-        data = [
-            OpenAIEmbeddingData(
-                embedding=base64.b64encode(struct.pack(f"<{len(vec)}f", *vec)).decode("ascii"),
-                index=i,
-            )
-            for i, vec in enumerate(results)
-        ]
-    else:
-        data = [OpenAIEmbeddingData(embedding=vec, index=i) for i, vec in enumerate(results)]
+    model = embedding_obj.embedding
+    # The provider's own batch size (LlamaIndex `embed_batch_size`); the
+    # sub-batches run concurrently on the executor instead of back to back
+    # on the loop.
+    size = getattr(model, "embed_batch_size", None) or config.EMBEDDING_SUB_BATCH_SIZE
+    limit = asyncio.Semaphore(config.EMBEDDING_SUB_BATCH_CONCURRENCY)
+
+    async def embed(chunk):
+        async with limit:
+            return await _offload(model.get_text_embedding_batch, chunk)
+
+    chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+    batches, total_tokens = await asyncio.gather(
+        asyncio.gather(*(embed(chunk) for chunk in chunks)),
+        _offload(tokens_from_strings, texts),
+    )
+    data = oc.encode_embeddings(
+        [vec for batch in batches for vec in batch], body.dimensions, body.encoding_format,
+    )
 
-    total_tokens = sum(tokens_from_string(t) for t in texts)
     background_tasks.add_task(
         log_direct_usage, db_wrapper, user.id, team_id, body.model,
         f"(embed {len(texts)} text(s))", "(embeddings generated)",
         total_tokens, 0, 0.0, 0.0, user.api_key_id,
     )
 
-    return OpenAIEmbeddingResponse(
-        model=body.model, data=data,
-        usage=OpenAIEmbeddingUsage(prompt_tokens=total_tokens, total_tokens=total_tokens),
-    )
+    # Same shape as OpenAIEmbeddingResponse, serialized directly: running
+    # thousands of vectors through the model and FastAPI's encoder costs more
+    # than embedding them.
+    return JSONResponse(content={
+        "object": "list", "data": data, "model": body.model,
+        "usage": {"prompt_tokens": total_tokens, "total_tokens": total_tokens},
+    })
 
 
 # ── /v1/moderations ──────────────────────────────────────────────────────────
@@ -432,24 +472,26 @@ async def moderations(
     body: OpenAIModerationRequest,
     user: User = Depends(get_current_username),
 ):
-    """OpenAI-compatible moderation. Backed by RESTai's regex `moderate_content`
-    (PII / secrets / prompt-injection / blocklist) — best-effort; it does NOT
+    """OpenAI-compatible moderation. Backed by RESTai's regex moderation engine
+    (restai/utils/moderation.py: PII / secrets / prompt-injection / blocklist) — best-effort; it does NOT
     classify OpenAI's hate/violence taxonomy, so those categories are always
     False and RESTai-specific signals are added as extra keys."""
-    from restai.llms.tools.moderate_content import moderate_content
+    from restai.utils.moderation import moderate_many
 
     inputs = [body.input] if isinstance(body.input, str) else body.input
+    # One executor hop for the whole batch: a multi-MB input must not stall
+    # the loop.
+    verdicts = await _offload(
+        moderate_many, [(text or "")[:config.MODERATION_MAX_CHARS] for text in inputs],
+    )
     results = []
-    for text in inputs:
-        verdict = moderate_content(text or "")
-        flagged = verdict.startswith("FLAGGED")
-        head = verdict.split("\n", 1)[0]
+    for verdict in verdicts:
         cats = {c: False for c in _OPENAI_MODERATION_CATEGORIES}
-        cats["pii"] = ("pii_detected" in head) or ("api_key" in head)
-        cats["prompt_injection"] = "possible_injection" in head
-        cats["blocklist"] = "blocklist:" in head
+        cats["pii"] = bool(verdict.pii)
+        cats["prompt_injection"] = verdict.injection is not None
+        cats["blocklist"] = bool(verdict.blocklist)
         scores = {k: (1.0 if v else 0.0) for k, v in cats.items()}
-        results.append(OpenAIModerationResult(flagged=flagged, categories=cats, category_scores=scores))
+        results.append(OpenAIModerationResult(flagged=verdict.flagged, categories=cats, category_scores=scores))
 
     return OpenAIModerationResponse(
         id=f"modr-{uuid.uuid4().hex[:24]}", model=body.model or "restai-moderation", results=results,
@@ -41,6 +41,15 @@ def mask_embedding_options(options: Optional[str]) -> Optional[str]:
         return options
 
 
+@router.get("/embeddings/cache/stats")
+async def api_get_embeddings_cache_stats(
+    _: User = Depends(get_current_username_admin),
+):
+    """Hit/miss counters and memory use of this worker's embedding vector cache (admin only)."""
+    from restai.embedding_cache import embedding_cache_stats
+    return embedding_cache_stats()
+
+
 @router.get("/embeddings/{embedding_id}", response_model=EmbeddingModel)
 async def api_get_embedding(
     embedding_id: int = Path(description="Embedding model ID"),
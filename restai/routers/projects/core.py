@@ -4,6 +4,7 @@ import logging
 import os
 import re
 from pathlib import Path
+from typing import Optional
 from fastapi import (
     Depends,
     Form,
@@ -45,6 +46,7 @@ from restai.models.models import (
 from restai.project import Project
 from restai.vectordb import tools
 from restai.integrations.knowledge_graph import extract_and_persist_safe
+from restai.integrations.sync import forget_chunk_manifest
 from restai.vectordb.tools import (
     find_file_loader,
     extract_keywords_for_metadata,
@@ -734,6 +736,9 @@ async def reset_embeddings(
             )
 
         project.vector.reset(request.app.state.brain)
+        # Other workers hold wrappers around the dropped collection.
+        db_wrapper.bump_object_cache_version()
+        forget_chunk_manifest(db_wrapper, project.props.id)
 
         return {"project": project.props.name}
     except Exception as e:
@@ -992,8 +997,9 @@ async def ingest_text(
         else:
             documents = extract_keywords_for_metadata(documents)
 
+        timings: dict = {}
         n_chunks = index_documents_classic(
-            project, documents, ingest.splitter, ingest.chunks
+            project, documents, ingest.splitter, ingest.chunks, timings=timings
         )
         project.vector.save()
 
@@ -1009,6 +1015,7 @@ async def ingest_text(
             "source": ingest.source,
             "documents": len(documents),
             "chunks": n_chunks,
+            "timings": timings,
         }
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -1058,8 +1065,7 @@ async def ingest_url(
                 status_code=400, detail="Only available for RAG projects."
             )
 
-        urls = project.vector.list()
-        if ingest.url in urls:
+        if project.vector.list_source(ingest.url):
             raise HTTPException(status_code=409, detail="URL already ingested. Delete first.")
 
         loader = SeleniumWebReader()
@@ -1069,8 +1075,9 @@ async def ingest_url(
             doc.metadata["source"] = ingest.url
         documents = extract_keywords_for_metadata(documents)
 
+        timings: dict = {}
         n_chunks = index_documents_classic(
-            project, documents, ingest.splitter, ingest.chunks
+            project, documents, ingest.splitter, ingest.chunks, timings=timings
         )
         project.vector.save()
 
@@ -1082,7 +1089,7 @@ async def ingest_url(
                 request.app.state.brain, DBWrapper,
             )
 
-        return {"source": ingest.url, "documents": len(documents), "chunks": n_chunks}
+        return {"source": ingest.url, "documents": len(documents), "chunks": n_chunks, "timings": timings}
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
@@ -1178,10 +1185,11 @@ async def ingest_file(
                 del document.metadata["filename"]
             document.metadata["source"] = source_name
 
+        timings: dict = {}
         if used_method in ("markitdown", "docling"):
-            n_chunks = index_documents_docling(project, documents)
+            n_chunks = index_documents_docling(project, documents, timings=timings)
         else:
-            n_chunks = index_documents_classic(project, documents, splitter, chunks)
+            n_chunks = index_documents_classic(project, documents, splitter, chunks, timings=timings)
 
         project.vector.save()
 
@@ -1198,6 +1206,7 @@ async def ingest_file(
             "documents": len(documents),
             "chunks": n_chunks,
             "method": used_method,
+            "timings": timings,
         }
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -1215,10 +1224,13 @@ async def ingest_file(
 async def get_embeddings(
     request: Request,
     projectID: int = PathParam(description="Project ID"),
+    start: Optional[int] = Query(None, ge=0, description="Pagination start offset"),
+    end: Optional[int] = Query(None, ge=1, description="Pagination end offset"),
     _: User = Depends(get_current_username_project_public),
     db_wrapper: DBWrapper = Depends(get_db_wrapper),
 ):
-    """List all embedding sources for a RAG project."""
+    """List the embedding sources of a RAG project, in ingest order. With
+    `start`/`end` only that slice is returned, plus the `total`."""
     try:
         project = get_project(projectID, db_wrapper, request.app.state.brain)
 
@@ -1227,12 +1239,17 @@ async def get_embeddings(
                 status_code=400, detail="Only available for RAG projects."
             )
 
-        if project.vector is not None:
-            output = project.vector.list()
-        else:
-            output = []
+        if project.vector is None:
+            return {"embeddings": []}
+        if start is None and end is None:
+            return {"embeddings": project.vector.list()}
 
-        return {"embeddings": output}
+        start = start or 0
+        limit = None if end is None else max(0, end - start)
+        return {
+            "embeddings": project.vector.list(offset=start, limit=limit),
+            "total": project.vector.count_sources(),
+        }
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
@@ -1258,7 +1275,9 @@ async def delete_embedding(
                 status_code=400, detail="Only available for RAG projects."
             )
 
-        ids = project.vector.delete_source(base64.b64decode(source).decode("utf-8"))
+        source = base64.b64decode(source).decode("utf-8")
+        ids = project.vector.delete_source(source)
+        forget_chunk_manifest(db_wrapper, project.props.id, source)
 
         return {"deleted": len(ids)}
     except Exception as e:
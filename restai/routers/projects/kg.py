@@ -8,11 +8,14 @@ from fastapi import (
     BackgroundTasks,
     Query,
 )
+from fastapi.concurrency import run_in_threadpool
 from restai.auth import (
     get_current_username_project,
     check_not_restricted,
 )
 from restai.database import get_db_wrapper, DBWrapper
+from restai.integrations.kg_dedup import invalidate_duplicate_index
+from restai.integrations.kg_matcher import invalidate_entity_matcher
 from restai.models.models import (
     User,
 )
@@ -163,6 +166,7 @@ async def kg_update_entity(
     entity.normalized = normalize_entity_name(new_name)[:255]
     entity.updated_at = datetime.datetime.now(datetime.timezone.utc)
     db_wrapper.db.commit()
+    invalidate_entity_matcher(projectID)
     return {"id": entity.id, "name": entity.name, "normalized": entity.normalized}
 
 
@@ -193,6 +197,7 @@ async def kg_delete_entity(
     ).delete(synchronize_session=False)
     db_wrapper.db.delete(entity)
     db_wrapper.db.commit()
+    invalidate_entity_matcher(projectID)
 
 
 @router.post("/projects/{projectID}/kg/entities/{entity_id}/merge", tags=["Knowledge Graph"])
@@ -248,7 +253,11 @@ async def kg_find_duplicates(
 ):
     """List potential duplicate entity pairs based on name similarity."""
     from restai.integrations.knowledge_graph import compute_potential_duplicates
-    return {"candidates": compute_potential_duplicates(db_wrapper, projectID, threshold=threshold, limit=limit)}
+    # Catching the index up (a full build the first time) is CPU work.
+    candidates = await run_in_threadpool(
+        compute_potential_duplicates, db_wrapper, projectID, threshold=threshold, limit=limit,
+    )
+    return {"candidates": candidates}
 
 
 @router.get("/projects/{projectID}/kg/graph", tags=["Knowledge Graph"])
@@ -300,9 +309,8 @@ async def kg_query(
     db_wrapper: DBWrapper = Depends(get_db_wrapper),
 ):
     """Natural language query against the knowledge graph."""
-    import re as _re
     from restai.integrations.knowledge_graph import find_entities_in_text, normalize_entity_name
-    from restai.models.databasemodels import KGEntityDatabase, KGEntityMentionDatabase
+    from restai.integrations.kg_matcher import entity_matcher, sources_for_entities
 
     question = (body.get("question") or "").strip()
     if not question:
@@ -317,13 +325,9 @@ async def kg_query(
     brain = request.app.state.brain
 
     # Match question against entities already in the project graph; NER is supplementary.
-    project_entities = (
-        db_wrapper.db.query(KGEntityDatabase)
-        .filter(KGEntityDatabase.project_id == projectID)
-        .all()
-    )
+    matcher = entity_matcher(db_wrapper, projectID)
 
-    if not project_entities:
+    if not len(matcher):
         return {
             "answer": "This project's knowledge graph is empty. Ingest some documents (with knowledge graph enabled) or click Rebuild Graph first.",
             "entities_matched": [],
@@ -331,60 +335,39 @@ async def kg_query(
             "source_count": 0,
         }
 
-    question_lower = " " + _re.sub(r"[^\w\s]", " ", question.lower()) + " "
-    matched_entities = []
-    for ent in project_entities:
-        norm = ent.normalized or ""
-        if not norm:
-            continue
-        # Word-boundary substring match — avoids "ace" inside "place".
-        if f" {norm} " in question_lower:
-            matched_entities.append(ent)
+    # Word-boundary match — avoids "ace" inside "place".
+    matched_ids = matcher.match(question)
 
     # Supplement with NER hits for near-matches not in the DB by exact form.
     try:
         ner_hits = find_entities_in_text(question, brain)
         if ner_hits:
-            ner_normalized = {normalize_entity_name(name) for name, _ in ner_hits}
-            already_matched_ids = {e.id for e in matched_entities}
-            extra = (
-                db_wrapper.db.query(KGEntityDatabase)
-                .filter(
-                    KGEntityDatabase.project_id == projectID,
-                    KGEntityDatabase.normalized.in_(list(ner_normalized)),
-                )
-                .all()
-            )
-            for e in extra:
-                if e.id not in already_matched_ids:
-                    matched_entities.append(e)
+            already_matched_ids = set(matched_ids)
+            extra = matcher.lookup(normalize_entity_name(name) for name, _ in ner_hits)
+            matched_ids += [i for i in extra if i not in already_matched_ids]
     except Exception as e:
         logging.warning("NER fallback failed in kg/query: %s", e)
 
-    if not matched_entities:
-        sample = [e.name for e in project_entities[:10]]
+    if not matched_ids:
+        sample = matcher.sample(10)
         return {
             "answer": (
                 "I couldn't match any entities from your question against this project's knowledge graph. "
                 f"Try mentioning one of these entities by name: {', '.join(sample)}"
-                + ("..." if len(project_entities) > 10 else "")
+                + ("..." if len(matcher) > 10 else "")
             ),
             "entities_matched": [],
             "sources": [],
             "source_count": 0,
         }
 
-    matched_entity_ids = [e.id for e in matched_entities]
-    matched_sources = list({
-        m.source for m in db_wrapper.db.query(KGEntityMentionDatabase)
-        .filter(KGEntityMentionDatabase.entity_id.in_(matched_entity_ids))
-        .all()
-    })
+    matched_names = [matcher.names[i] for i in matched_ids]
+    matched_sources = sources_for_entities(db_wrapper, matched_ids)
 
     if not matched_sources:
         return {
             "answer": "Found matching entities but no source documents.",
-            "entities_matched": [e.name for e in matched_entities],
+            "entities_matched": matched_names,
             "sources": [],
             "source_count": 0,
         }
@@ -401,7 +384,7 @@ async def kg_query(
     if not context_parts:
         return {
             "answer": "No content could be retrieved for the matched entities.",
-            "entities_matched": [e.name for e in matched_entities],
+            "entities_matched": matched_names,
             "sources": matched_sources,
             "source_count": len(matched_sources),
         }
@@ -438,7 +421,7 @@ async def kg_query(
 
     return {
         "answer": answer,
-        "entities_matched": [e.name for e in matched_entities],
+        "entities_matched": matched_names,
         "sources": matched_sources,
         "source_count": len(matched_sources),
     }
@@ -468,6 +451,8 @@ async def kg_rebuild(
     ).delete()
     db_wrapper.db.query(KGEntityDatabase).filter(KGEntityDatabase.project_id == projectID).delete()
     db_wrapper.db.commit()
+    invalidate_entity_matcher(projectID)
+    invalidate_duplicate_index(projectID)
 
     sources = project.vector.list() if project.vector is not None else []
 
@@ -268,6 +268,48 @@ async def get_top_llms(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@router.get("/statistics/inference-log", tags=["Statistics"])
+async def get_inference_log_writer_stats(
+    _: User = Depends(get_current_username_admin),
+):
+    """Queue depth, lag and flush / back-pressure counters of this worker's
+    write-behind inference-log writer (admin only)."""
+    from restai.observability.inference_writer import inference_writer
+    return inference_writer.stats()
+
+
+@router.get("/statistics/upstreams", tags=["Statistics"])
+async def get_upstream_pool_stats(
+    _: User = Depends(get_current_username_admin),
+):
+    """Per-upstream request latency histogram and error counts of this
+    worker's OpenAI-passthrough client pool (admin only)."""
+    from restai.utils.upstream_pool import upstream_pool
+    return upstream_pool.stats()
+
+
+@router.get("/statistics/mcp", tags=["Statistics"])
+async def get_mcp_pool_stats(
+    _: User = Depends(get_current_username_admin),
+):
+    """Open agent MCP sessions, connect latency and reuse rate, reconnects
+    and health-check failures of this worker's MCP pool (admin only)."""
+    from restai.agent2.mcp_connections import mcp_connections
+    return mcp_connections.stats()
+
+
+@router.get("/statistics/sandboxes", tags=["Statistics"])
+async def get_sandbox_pool_stats(
+    _: User = Depends(get_current_username_admin),
+):
+    """Warm-pool size, claim latency, misses and recycles, plus the buffered
+    activity heartbeats, of this worker's terminal and browser sandboxes
+    (admin only)."""
+    from restai import docker as docker_sandbox
+    from restai.browser import runtime as browser_runtime
+    return {"docker": docker_sandbox.stats(), "browser": browser_runtime.stats()}
+
+
 @router.get("/statistics/users", tags=["Statistics"])
 async def get_top_users(
     limit: int = Query(10, ge=1, le=100, description="Max users to return"),
@@ -0,0 +1,268 @@
+"""Warm container pool and coalesced activity heartbeats for the per-chat
+sandboxes (`restai/docker.py`, `restai/browser/runtime.py`).
+
+`WarmPool` keeps up to `size()` pre-started containers per worker so the
+first sandbox call of a chat claims one instead of waiting for a container
+to boot. A daemon thread refills the pool after claims and recycles ready
+containers that were built for other settings (`spec()` changed) or that
+have sat unclaimed longer than `max_age()` — the cleanup crons stop unclaimed
+containers once they're older than the idle timeout, so the pool retires
+them first. Ready containers are the only thing the pool owns: once claimed,
+a container belongs to its chat, and `stop()` only discards the unclaimed
+ones.
+
+`ActivityBuffer` coalesces the `*_chat_activity` heartbeats the cleanup
+crons read: each call only records (container id, time) in memory and a
+daemon thread writes everything touched since the last flush in one
+transaction every `RUNTIME_ACTIVITY_FLUSH_SECONDS`.
+
+Both only run inside the API process (started from the lifespan). Crons,
+the CLI, `DOCKER_POOL_SIZE=0` / `BROWSER_POOL_SIZE=0` and
+`RUNTIME_ACTIVITY_FLUSH_SECONDS=0` keep the old behaviour: fresh containers
+on demand, heartbeats written inline.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from restai import config
+
+logger = logging.getLogger(__name__)
+
+# Longest the refill thread sleeps between checks when nothing wakes it.
+_REFILL_SECONDS = 5.0
+
+
+class WarmPool:
+    def __init__(self, name: str, create: Callable[[], object], discard: Callable[[object], None],
+                 size: Callable[[], int], spec: Callable[[], str], max_age: Callable[[], float]):
+        """`create()` starts one unclaimed container, `discard(c)` stops one.
+        `size()`, `spec()` and `max_age()` are read on every pass so settings
+        changes apply without a restart; `size() <= 0` drains the pool."""
+        self.name = name
+        self._create = create
+        self._discard = discard
+        self._size = size
+        self._spec = spec
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        # (container, spec it was built for, monotonic creation time)
+        self._ready: deque = deque()
+        self._thread = None
+        self._stopping = False
+        self._counters = {"created": 0, "claimed": 0, "misses": 0, "recycled": 0, "failures": 0}
+        self._claim_ms = deque(maxlen=200)
+
+    # ── lifecycle ───────────────────────────────────────────────────────
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stopping
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the refill thread and discard every unclaimed container."""
+        thread = self._thread
+        self._stopping = True
+        self._wake.set()
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+        with self._lock:
+            leftover = [entry[0] for entry in self._ready]
+            self._ready.clear()
+        for container in leftover:
+            self.discard(container)
+
+    def _run(self) -> None:
+        while not self._stopping:
+            try:
+                self.refill()
+            except Exception as e:
+                logger.warning("%s pool: refill failed: %s", self.name, e)
+            self._wake.wait(_REFILL_SECONDS)
+            self._wake.clear()
+
+    # ── pool ────────────────────────────────────────────────────────────
+
+    def refill(self) -> int:
+        """Recycle stale ready containers, then start new ones until the pool
+        is full. Returns how many were started. Stops at the first creation
+        failure and retries on the next pass."""
+        self._recycle()
+        started = 0
+        while not self._stopping:
+            target = max(0, self._size())
+            with self._lock:
+                missing = target - len(self._ready)
+            if missing <= 0:
+                break
+            spec = self._spec()
+            try:
+                container = self._create()
+            except Exception as e:
+                with self._lock:
+                    self._counters["failures"] += 1
+                logger.warning("%s pool: could not start a warm container: %s", self.name, e)
+                break
+            with self._lock:
+                self._ready.append((container, spec, time.monotonic()))
+                self._counters["created"] += 1
+            started += 1
+        return started
+
+    def _recycle(self) -> None:
+        spec = self._spec()
+        max_age = self._max_age()
+        now = time.monotonic()
+        target = max(0, self._size())
+        with self._lock:
+            keep, stale = deque(), []
+            for entry in self._ready:
+                if entry[1] != spec or (max_age and now - entry[2] > max_age) or len(keep) >= target:
+                    stale.append(entry[0])
+                else:
+                    keep.append(entry)
+            self._ready = keep
+            self._counters["recycled"] += len(stale)
+        for container in stale:
+            self.discard(container)
+
+    def claim(self) -> Optional[object]:
+        """Hand out a ready container built for the current settings, or None
+        when the pool has none (the caller then creates one itself)."""
+        started = time.perf_counter()
+        spec = self._spec()
+        stale = []
+        container = None
+        with self._lock:
+            while self._ready:
+                entry = self._ready.popleft()
+                if entry[1] == spec:
+                    container = entry[0]
+                    break
+                stale.append(entry[0])
+            self._counters["recycled"] += len(stale)
+            self._counters["claimed" if container is not None else "misses"] += 1
+            self._claim_ms.append((time.perf_counter() - started) * 1000)
+        for old in stale:
+            self.discard(old)
+        self._wake.set()
+        return container
+
+    def release(self, container) -> None:
+        """Return a claimed container that turned out not to be needed."""
+        with self._lock:
+            self._ready.appendleft((container, self._spec(), time.monotonic()))
+
+    def discard(self, container) -> None:
+        try:
+            self._discard(container)
+        except Exception as e:
+            logger.debug("%s pool: discarding a warm container failed: %s", self.name, e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            claims = sorted(self._claim_ms)
+            return {
+                "running": self.running,
+                "size": len(self._ready),
+                "target": max(0, self._size()),
+                "claim_ms_p50": round(claims[len(claims) // 2], 3) if claims else None,
+                "claim_ms_max": round(claims[-1], 3) if claims else None,
+                **self._counters,
+            }
+
+
+class ActivityBuffer:
+    def __init__(self, name: str, write_one: Callable[[str, Optional[str]], None],
+                 write_many: Callable[[dict], None]):
+        """`write_one(chat_id, container_id)` is the inline heartbeat used
+        while the buffer isn't running; `write_many({chat_id: (container_id,
+        when)})` writes a flush."""
+        self.name = name
+        self._write_one = write_one
+        self._write_many = write_many
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending: dict = {}
+        self._thread = None
+        self._stopping = False
+        self._counters = {"touches": 0, "flushes": 0, "written": 0, "failures": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stopping
+
+    def start(self) -> None:
+        """No-op when `RUNTIME_ACTIVITY_FLUSH_SECONDS` is 0 or already running."""
+        if config.RUNTIME_ACTIVITY_FLUSH_SECONDS <= 0 or self.running:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-activity", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        thread = self._thread
+        self._stopping = True
+        self._wake.set()
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wake.wait(config.RUNTIME_ACTIVITY_FLUSH_SECONDS)
+            self._wake.clear()
+            self.flush()
+
+    def touch(self, chat_id: str, container_id: Optional[str]) -> None:
+        if not chat_id:
+            return
+        if not self.running:
+            self._write_one(chat_id, container_id)
+            return
+        with self._lock:
+            self._pending[chat_id] = (container_id, datetime.now(timezone.utc))
+            self._counters["touches"] += 1
+
+    def discard(self, chat_id: str) -> None:
+        """Forget a pending heartbeat, so a flush can't resurrect the row of
+        a container that was just removed."""
+        with self._lock:
+            self._pending.pop(chat_id, None)
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        try:
+            self._write_many(batch)
+        except Exception as e:
+            with self._lock:
+                # Newer heartbeats for the same chat win over the failed ones.
+                self._pending = {**batch, **self._pending}
+                self._counters["failures"] += 1
+            logger.warning("%s activity: flush of %d heartbeat(s) failed: %s", self.name, len(batch), e)
+            return
+        with self._lock:
+            self._counters["flushes"] += 1
+            self._counters["written"] += len(batch)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"running": self.running, "pending": len(self._pending), **self._counters}
@@ -0,0 +1,133 @@
+"""Process-wide SQLAlchemy engines for external databases (pgvector, NL→SQL).
+
+Building an engine per call means a fresh TCP + TLS + auth handshake for
+every admin page load and every NL→SQL question. Engines here are shared by
+connection string, with a bounded pool (`SQL_ENGINE_POOL_SIZE` +
+`SQL_ENGINE_MAX_OVERFLOW`), pre-ping on checkout, and disposal once unused
+for `SQL_ENGINE_IDLE_TTL` seconds or when more than `SQL_ENGINE_MAX_ENGINES`
+are open. A connection string that changes (GUI settings, project edit)
+simply maps to a new engine; the old one ages out.
+
+`get_sql_database` additionally keeps the reflected `SQLDatabase` for a
+(connection, table allowlist) pair for `SQL_SCHEMA_CACHE_TTL` seconds;
+`invalidate_sql_schema` drops it when the project's connection or tables
+change.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from restai import config
+
+_lock = threading.Lock()
+# (url, is_async) -> [engine, last_used]; most recently used last.
+_engines: "OrderedDict[tuple, list]" = OrderedDict()
+# (url, tables) -> (SQLDatabase, loaded_at)
+_schemas: dict = {}
+
+
+def _build(url: str, is_async: bool):
+    factory = create_async_engine if is_async else create_engine
+    return factory(
+        url,
+        pool_size=config.SQL_ENGINE_POOL_SIZE,
+        max_overflow=config.SQL_ENGINE_MAX_OVERFLOW,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        pool_use_lifo=True,
+    )
+
+
+def _dispose(engine) -> None:
+    # Checked-out connections are closed when returned, not yanked. Async
+    # pools can't be closed from here (no event loop), so they are just
+    # dropped and their connections left to the driver.
+    if isinstance(engine, AsyncEngine):
+        engine.sync_engine.dispose(close=False)
+    else:
+        engine.dispose()
+
+
+def _evict_locked(now: float) -> list:
+    """Pop idle / excess engines; caller disposes them outside the lock."""
+    idle = [key for key, (_, last_used) in _engines.items() if now - last_used > config.SQL_ENGINE_IDLE_TTL]
+    excess = len(_engines) - len(idle) - config.SQL_ENGINE_MAX_ENGINES
+    # Oldest first, thanks to move_to_end on every use.
+    lru = [key for key in _engines if key not in idle][:max(excess, 0)]
+    evicted = []
+    for key in idle + lru:
+        evicted.append(_engines.pop(key)[0])
+        _drop_schemas_locked(key[0])
+    return evicted
+
+
+def _drop_schemas_locked(url: Optional[str]) -> None:
+    for key in [k for k in _schemas if url is None or k[0] == url]:
+        _schemas.pop(key, None)
+
+
+def _get(url: str, is_async: bool):
+    key = (url, is_async)
+    now = time.monotonic()
+    with _lock:
+        entry = _engines.get(key)
+        if entry is None:
+            entry = [_build(url, is_async), now]
+            _engines[key] = entry
+        entry[1] = now
+        _engines.move_to_end(key)
+        evicted = _evict_locked(now)
+    for engine in evicted:
+        _dispose(engine)
+    return entry[0]
+
+
+def get_engine(url: str) -> Engine:
+    """Shared engine for `url`. Callers must not dispose it."""
+    return _get(url, False)
+
+
+def get_async_engine(url: str) -> AsyncEngine:
+    """Shared async engine for `url`. Callers must not dispose it."""
+    return _get(url, True)
+
+
+def dispose_engine(url: Optional[str] = None) -> None:
+    """Close the engines for one connection string (or all of them)."""
+    with _lock:
+        keys = [k for k in _engines if url is None or k[0] == url]
+        engines = [_engines.pop(k)[0] for k in keys]
+        _drop_schemas_locked(url)
+    for engine in engines:
+        _dispose(engine)
+
+
+def get_sql_database(url: str, tables: Optional[Iterable[str]] = None):
+    """Reflected `SQLDatabase` for `url`, restricted to `tables` when given."""
+    from llama_index.core.utilities.sql_wrapper import SQLDatabase
+
+    tables = list(tables) if tables else None
+    key = (url, tuple(sorted(tables)) if tables else None)
+    engine = get_engine(url)
+    now = time.monotonic()
+    with _lock:
+        cached = _schemas.get(key)
+        if cached is not None and cached[0].engine is engine and now - cached[1] < config.SQL_SCHEMA_CACHE_TTL:
+            return cached[0]
+    sql_database = SQLDatabase(engine, include_tables=tables) if tables else SQLDatabase(engine)
+    with _lock:
+        _schemas[key] = (sql_database, now)
+    return sql_database
+
+
+def invalidate_sql_schema(url: Optional[str] = None) -> None:
+    """Forget reflected schemas for `url` (all connections when None)."""
+    with _lock:
+        _drop_schemas_locked(url)
+
@@ -261,6 +261,12 @@ def tokens_from_string(string: str, encoding_name: str = "cl100k_base") -> int:
     return num_tokens
 
 
+def tokens_from_strings(strings, encoding_name: str = "cl100k_base") -> int:
+    """Total of `tokens_from_string` over `strings`, in one batched encode."""
+    encoding = tiktoken.get_encoding(encoding_name)
+    return sum(len(tokens) for tokens in encoding.encode_batch(list(strings)))
+
+
 def get_logger(name: str, level=logging.INFO):
     handler = logging.FileHandler("./logs/" + name + ".log")
     formatter = logging.Formatter("%(asctime)s %(levelname)s %(message)s")
@@ -368,7 +374,7 @@ def log_inference(project: Project, user: User, output, db: DBWrapper, latency_m
 
     status = output.get("status") or "success"
 
-    output_db_entry = OutputDatabase(
+    row = dict(
         user_id=user.id,
         team_id=project.props.team.id if project.props.team else None,
         api_key_id=getattr(user, "api_key_id", None),
@@ -392,10 +398,28 @@ def log_inference(project: Project, user: User, output, db: DBWrapper, latency_m
     )
 
     if "id" in output:
-        output_db_entry.chat_id = output["id"]
+        row["chat_id"] = output["id"]
 
-    db.db.add(output_db_entry)
-    db.db.commit()
+    # With the write-behind writer running, the row, the API-key token bump
+    # and the wallet debit are written together by its next flush.
+    from restai.observability.inference_writer import inference_writer
+    queued = inference_writer.submit("output", [row])
+    if not queued:
+        db.db.add(OutputDatabase(**row))
+        db.db.commit()
+
+    try:
+        from restai.limits.ledger import ledger
+        ledger.record(
+            cost=input_cost + output_cost,
+            team_id=row["team_id"], user_id=user.id,
+            project_id=project.props.id, api_key_id=row["api_key_id"],
+        )
+    except Exception:
+        logging.debug("ledger record failed", exc_info=True)
+
+    if queued:
+        return
 
     # Bump the per-API-key monthly token counter when the request
     # authenticated with a key. No-op for basic/cookie auth.
@@ -414,8 +438,7 @@ def log_inference(project: Project, user: User, output, db: DBWrapper, latency_m
     # next request once it hits 0.
     try:
         from restai.limits.budget import charge_team_balance
-        team_id = project.props.team.id if project.props.team else None
-        charge_team_balance(db, team_id, input_cost + output_cost, actor_user_id=user.id)
+        charge_team_balance(db, row["team_id"], input_cost + output_cost, actor_user_id=user.id)
     except Exception:
         pass
 
@@ -424,6 +447,7 @@ def log_retrieval_events(project, sources, db):
     from restai.models.databasemodels import RetrievalEventDatabase
 
     now = datetime.now(timezone.utc)
+    rows = []
     for src in sources:
         source_name = src.get("source", "") if isinstance(src, dict) else str(src)
         score = src.get("score") if isinstance(src, dict) else None
@@ -439,7 +463,7 @@ def log_retrieval_events(project, sources, db):
                 pass
 
         if source_name:
-            db.db.add(RetrievalEventDatabase(
+            rows.append(dict(
                 project_id=project.props.id,
                 source=source_name,
                 score=score,
@@ -448,7 +472,11 @@ def log_retrieval_events(project, sources, db):
                 chunk_text_length=chunk_text_length,
                 date=now,
             ))
-    db.db.commit()
+
+    from restai.observability.inference_writer import inference_writer
+    if rows and not inference_writer.submit("retrieval", rows):
+        db.db.add_all(RetrievalEventDatabase(**row) for row in rows)
+        db.db.commit()
 
 
 def log_guard_event(project, guard_project_name, user, phase, action, mode, text_checked, guard_response, db):
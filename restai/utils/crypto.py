@@ -159,7 +159,7 @@ TEMPLATE_COPYABLE_OPTION_KEYS = frozenset({
     "logging", "redact_inference_logs",
     "moderation_blocklist", "moderation_redact_pii",
     # guard BEHAVIOUR (guard_output — the project reference — is deliberately absent)
-    "guard_mode",
+    "guard_mode", "guard_speculative",
     # knowledge graph
     "enable_knowledge_graph", "ner_model",
     # memory
@@ -0,0 +1,281 @@
+"""Compiled moderation engine behind the `moderate_content` tool and
+`/v1/moderations`.
+
+`moderate_content` used to import `re` and compile its patterns on every
+call. It also opened a DB session to re-read the project's
+`moderation_blocklist`, scanned the text once per blocklist term, and
+deduplicated PII spans by comparing each new span against every earlier
+one. Here the work is split between what is built once and what runs per
+text:
+
+- The PII, secret and injection patterns are compiled at import.
+- A blocklist is compiled into one trie-shaped regex, `Blocklist`, cached
+  by its raw text. This is the Aho-Corasick trie (terms sharing a prefix
+  share a branch), walked by the C regex engine at every offset in a
+  single pass. A pure-Python automaton walk would be slower than the
+  per-term C substring scans it replaces. Matching is case-insensitive and
+  finds overlapping occurrences, like the old `term in text.lower()`.
+- A project's policy (compiled blocklist plus the PII-redaction flag) is
+  cached in restai/object_cache.py, which `edit_project` invalidates. So
+  the options row is read once per edit, not once per call.
+- PII spans are claimed one pattern at a time. Each pattern's matches
+  merge with the sorted spans claimed so far in one linear pass, and PII
+  and blocklist spans merge into the sanitized text in one linear sweep.
+
+`moderate_many` moderates a batch in one call and is what /v1/moderations
+runs off the event loop.
+"""
+
+import functools
+import heapq
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Ordered most-specific → least-specific. `phone` is a greedy superset of
+# SSNs, card numbers and IPv4s (all digit/punct runs), so it MUST run last: a
+# span already claimed by a precise pattern is skipped, which both labels the
+# redaction correctly (SSN as us_ssn, not phone) and stops the same span
+# being double-counted. Kept conservative: best effort, not compliance-grade.
+PII_PATTERNS = (
+    # OpenAI-style API key shape. Also flags Slack bot tokens, AWS access
+    # keys, GitHub tokens via their telltale prefixes.
+    ("api_key",     re.compile(r"\b(?:sk-[A-Za-z0-9_-]{20,}|xox[baprs]-[A-Za-z0-9-]{10,}|AKIA[0-9A-Z]{16}|gh[pousr]_[A-Za-z0-9_]{20,})\b")),
+    ("email",       re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b")),
+    ("us_ssn",      re.compile(r"\b\d{3}-\d{2}-\d{4}\b")),
+    # 13-19 digit card number with optional spaces/dashes every 4.
+    ("credit_card", re.compile(r"\b(?:\d[ -]?){13,19}\b")),
+    ("ipv4",        re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b")),
+    # E.164 or common international-ish phone: + then 8-15 digits, with
+    # optional spaces/dashes/parens.
+    ("phone",       re.compile(r"\+?\d[\d\s().-]{7,14}\d")),
+)
+
+# Simple injection-probe signals. Not exhaustive — this is a smoke test, not
+# a full prompt-injection defense. The first that matches is reported.
+INJECTION_PATTERNS = tuple(
+    (pat, re.compile(pat, re.IGNORECASE))
+    for pat in (
+        r"ignore (?:all )?previous",
+        r"disregard (?:the |all )?instructions",
+        r"system prompt",
+        r"you are now",
+    )
+)
+# All of them in one pass, for the common case where none matches.
+_ANY_INJECTION = re.compile("|".join(f"(?:{pat})" for pat, _ in INJECTION_PATTERNS), re.IGNORECASE)
+
+
+def _trie_regex(node: dict) -> str:
+    """Regex for the subtree under `node`; the "" key marks a term end."""
+    branches = [re.escape(ch) + _trie_regex(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        # Greedy: at any offset the longest term wins; the shorter ones
+        # ending inside it are recovered through `Blocklist._prefixes`.
+        return "(?:" + body + ")?"
+    return body
+
+
+class Blocklist:
+    """A compiled set of literal terms, matched case-insensitively. Short and
+    literal is intentional — regex in admin-configurable fields is a footgun."""
+
+    def __init__(self, terms: Iterable[str]):
+        self.terms: list[str] = []
+        seen = set()
+        for term in terms:
+            key = term.lower()
+            if term and key not in seen:
+                seen.add(key)
+                self.terms.append(term)
+        trie: dict = {}
+        for term in self.terms:
+            node = trie
+            for ch in term.lower():
+                node = node.setdefault(ch, {})
+            node[""] = term
+        # Longest matched text (lowered) → every term that is a prefix of it.
+        self._prefixes: dict[str, tuple[str, ...]] = {}
+        for term in self.terms:
+            node, found = trie, []
+            for ch in term.lower():
+                node = node[ch]
+                if "" in node:
+                    found.append(node[""])
+            self._prefixes[term.lower()] = tuple(found)
+        # A zero-width lookahead so every offset is tried: occurrences may
+        # overlap ("abc" and "cd" in "abcd").
+        self._rx = re.compile("(?=(" + _trie_regex(trie) + "))", re.IGNORECASE) if self.terms else None
+
+    def scan(self, text: str) -> tuple[list[str], list[tuple[int, int]]]:
+        """`(terms found, in blocklist order; their spans, by start)`."""
+        if self._rx is None:
+            return [], []
+        found, spans = set(), []
+        for m in self._rx.finditer(text):
+            matched = m.group(1)
+            if not matched:
+                continue
+            spans.append((m.start(), m.start() + len(matched)))
+            found.update(self._prefixes.get(matched.lower(), ()))
+        return [t for t in self.terms if t in found], spans
+
+
+@functools.lru_cache(maxsize=256)
+def compile_blocklist(raw: str) -> Optional[Blocklist]:
+    """The compiled form of a `moderation_blocklist` option value (comma or
+    semicolon separated)."""
+    terms = [t.strip() for t in (raw or "").replace(";", ",").split(",") if t.strip()]
+    return Blocklist(terms) if terms else None
+
+
+@dataclass(frozen=True)
+class ModerationPolicy:
+    blocklist: Optional[Blocklist] = None
+    redact_pii: bool = True
+
+
+DEFAULT_POLICY = ModerationPolicy()
+
+
+def policy_from_options(options: Optional[dict]) -> ModerationPolicy:
+    options = options or {}
+    return ModerationPolicy(
+        blocklist=compile_blocklist((options.get("moderation_blocklist") or "").strip()),
+        # Default true, explicit false opts out.
+        redact_pii=options.get("moderation_redact_pii") is not False,
+    )
+
+
+def policy_for_project(project_id) -> ModerationPolicy:
+    """The project's moderation policy. Degrades to the default policy on any
+    DB problem: moderation is advisory, and failing the check would mean the
+    agent proceeds without one, which is worse than best-effort."""
+    from restai.database import open_db_wrapper
+    from restai.object_cache import object_cache
+
+    try:
+        project_id = int(project_id)
+        db = open_db_wrapper()
+    except Exception:
+        return DEFAULT_POLICY
+    try:
+        def build():
+            proj = db.get_project_by_id(project_id)
+            if proj is None or not proj.options:
+                return DEFAULT_POLICY
+            try:
+                options = json.loads(proj.options)
+            except Exception:
+                options = {}
+            return policy_from_options(options if isinstance(options, dict) else {})
+
+        return object_cache.get(db, ("moderation", project_id), None, build)
+    except Exception as e:
+        logger.debug("moderation policy for project %s unavailable: %s", project_id, e)
+        return DEFAULT_POLICY
+    finally:
+        db.db.close()
+
+
+@dataclass
+class ModerationResult:
+    pii: dict[str, int] = field(default_factory=dict)
+    blocklist: list[str] = field(default_factory=list)
+    # Source of the first injection pattern that matched.
+    injection: Optional[str] = None
+    # The text with PII and blocklist spans replaced; None when the policy
+    # doesn't redact or `sanitize` wasn't asked for.
+    sanitized: Optional[str] = None
+
+    @property
+    def flagged(self) -> bool:
+        return bool(self.pii or self.blocklist or self.injection)
+
+    @property
+    def reasons(self) -> list[str]:
+        reasons = []
+        if self.pii:
+            reasons.append("pii_detected:" + ",".join(f"{k}={v}" for k, v in sorted(self.pii.items())))
+        if self.blocklist:
+            reasons.append("blocklist:" + ",".join(self.blocklist[:10]))
+        if self.injection:
+            reasons.append(f"possible_injection:{self.injection}")
+        return reasons
+
+
+def _pii_spans(text: str) -> tuple[dict[str, int], list[tuple[int, int, str]]]:
+    counts: dict[str, int] = {}
+    spans: list[tuple[int, int, str]] = []
+    for label, rx in PII_PATTERNS:
+        # finditer yields sorted, non-overlapping matches, and the claimed
+        # spans are sorted and non-overlapping too, so one two-pointer pass
+        # merges them.
+        merged: list[tuple[int, int, str]] = []
+        j, count = 0, 0
+        for m in rx.finditer(text):
+            s, e = m.start(), m.end()
+            while j < len(spans) and spans[j][1] <= s:
+                merged.append(spans[j])
+                j += 1
+            if j < len(spans) and spans[j][0] < e:
+                continue  # span already owned by a more-specific pattern
+            merged.append((s, e, label))
+            count += 1
+        if count:
+            merged.extend(spans[j:])
+            spans = merged
+            counts[label] = count
+    return counts, spans
+
+
+def _redact(text: str, pii_spans, block_spans) -> str:
+    """Replace every span in one sweep. Overlapping spans collapse into one
+    redaction labelled by the earliest-starting span (PII on a tie)."""
+    out, last = [], 0
+    cur = None
+    merged = heapq.merge(pii_spans, ((s, e, "blocked") for s, e in block_spans), key=lambda sp: sp[0])
+    for s, e, label in merged:
+        if cur is not None and s < cur[1]:
+            cur[1] = max(cur[1], e)
+            continue
+        if cur is not None:
+            out.append(text[last:cur[0]])
+            out.append(f"[REDACTED:{cur[2]}]")
+            last = cur[1]
+        cur = [s, e, label]
+    if cur is not None:
+        out.append(text[last:cur[0]])
+        out.append(f"[REDACTED:{cur[2]}]")
+        last = cur[1]
+    out.append(text[last:])
+    return "".join(out)
+
+
+def moderate(text: str, policy: ModerationPolicy = DEFAULT_POLICY, sanitize: bool = True) -> ModerationResult:
+    result = ModerationResult()
+    if not text:
+        return result
+    result.pii, pii_spans = _pii_spans(text)
+    block_spans: list[tuple[int, int]] = []
+    if policy.blocklist is not None:
+        result.blocklist, block_spans = policy.blocklist.scan(text)
+    if _ANY_INJECTION.search(text):
+        result.injection = next(pat for pat, rx in INJECTION_PATTERNS if rx.search(text))
+    if sanitize and policy.redact_pii:
+        result.sanitized = _redact(text, pii_spans, block_spans) if pii_spans or block_spans else text
+    return result
+
+
+def moderate_many(
+    texts: Iterable[str], policy: ModerationPolicy = DEFAULT_POLICY, sanitize: bool = False,
+) -> list[ModerationResult]:
+    """Moderate a batch under one policy. Blocking; run it off the loop."""
+    return [moderate(text or "", policy, sanitize) for text in texts]
@@ -0,0 +1,42 @@
+"""Blocking calls run off the event loop on a bounded, named thread pool.
+
+LlamaIndex's sync paths (retrieval, rerank, `CustomLLM.chat`, token streams)
+and other blocking work called from `async def` code go through an
+`Offloader`, so they block a thread instead of the worker. Each subsystem
+owns one sized by its own setting: a burst of RAG chats can't starve the
+/v1 passthrough and vice versa. Calls beyond the pool size wait for a free
+thread.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Sentinel `next(gen, DONE)` returns when a generator is exhausted.
+DONE = object()
+
+
+class Offloader:
+    def __init__(self, name: str, workers: int):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+
+    async def __call__(self, fn, *args, **kwargs):
+        """Await `fn(*args, **kwargs)` run on the pool."""
+        # Carry contextvars (LlamaIndex instrumentation spans, the request's
+        # token usage) into the thread, as asyncio.to_thread does.
+        ctx = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(ctx.run, fn, *args, **kwargs))
+
+    async def iterate(self, gen):
+        """Drain a blocking generator (a token stream) one item per executor
+        hop, so the loop keeps serving other requests between items."""
+        while True:
+            item = await self(next, gen, DONE)
+            if item is DONE:
+                return
+            yield item
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Fire-and-forget `fn` on the pool, from any thread."""
+        return self.executor.submit(fn, *args, **kwargs)
@@ -16,14 +16,19 @@ back arbitrary platform LLMs. Two paths:
 Mirrors the (removed) `anthropic_compat` translate-in / translate-out / native
 passthrough structure.
 """
+import base64
 import json
+import time
 import uuid
 from importlib.metadata import version
 from typing import Optional
 
 import httpx
+import numpy as np
 from llama_index.core.base.llms.types import ChatMessage, MessageRole
 
+from restai.utils.upstream_pool import upstream_pool
+
 _ROLE_MAP = {
     "system": MessageRole.SYSTEM,
     "user": MessageRole.USER,
@@ -191,6 +196,25 @@ def usage_from_response(response):
         return None
 
 
+def encode_embeddings(vectors, dimensions: Optional[int] = None, encoding_format: Optional[str] = "float") -> list[dict]:
+    """Provider vectors → OpenAI `data` entries, via one matrix instead of a
+    per-vector Python loop. `dimensions` truncates by slicing. base64 rows
+    are little-endian float32 (what OpenAI clients decode), encoded straight
+    from the matrix buffer; float output keeps the provider's precision."""
+    if len(vectors) == 0:
+        return []
+    as_base64 = encoding_format == "base64"
+    matrix = np.asarray(vectors, dtype="<f4" if as_base64 else np.float64)
+    if dimensions:
+        matrix = matrix[:, :dimensions]
+    if as_base64:
+        matrix = np.ascontiguousarray(matrix)
+        rows = [base64.b64encode(row.data).decode("ascii") for row in matrix]
+    else:
+        rows = matrix.tolist()
+    return [{"object": "embedding", "embedding": row, "index": i} for i, row in enumerate(rows)]
+
+
 # ── native passthrough ──────────────────────────────────────────────────────
 
 def is_openai_native(class_name: Optional[str]) -> bool:
@@ -232,15 +256,23 @@ def resolve_upstream(llm_model, endpoint: str = "chat/completions"):
 
 
 async def passthrough_json(url: str, headers: dict, body: dict, timeout: float = 300.0):
-    """Forward a non-streaming request upstream; return `(status_code, json)`."""
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        resp = await client.post(url, headers=headers, json=body)
-        try:
-            data = resp.json()
-        except Exception:
-            data = {"error": {"message": resp.text[:500] or "upstream error",
-                              "type": "api_error", "code": None, "param": None}}
-        return resp.status_code, data
+    """Forward a non-streaming request upstream; return `(status_code, json)`.
+    Goes through the shared keep-alive client for the upstream
+    (restai/utils/upstream_pool.py)."""
+    client = await upstream_pool.client(url)
+    started = time.perf_counter()
+    try:
+        resp = await client.post(url, headers=headers, json=body, timeout=timeout)
+    except Exception:
+        upstream_pool.observe(url, time.perf_counter() - started, error=True)
+        raise
+    upstream_pool.observe(url, time.perf_counter() - started, error=resp.status_code >= 400)
+    try:
+        data = resp.json()
+    except Exception:
+        data = {"error": {"message": resp.text[:500] or "upstream error",
+                          "type": "api_error", "code": None, "param": None}}
+    return resp.status_code, data
 
 
 async def passthrough_sse(url: str, headers: dict, body: dict, usage_holder: dict, forward_usage: bool):
@@ -254,8 +286,14 @@ async def passthrough_sse(url: str, headers: dict, body: dict, usage_holder: dic
     body["stream_options"] = so
 
     timeout = httpx.Timeout(connect=15.0, read=None, write=30.0, pool=15.0)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        async with client.stream("POST", url, headers=headers, json=body) as resp:
+    client = await upstream_pool.client(url)
+    started = time.perf_counter()
+    observed = False
+    try:
+        async with client.stream("POST", url, headers=headers, json=body, timeout=timeout) as resp:
+            # Latency is time to response headers — the part the pool shortens.
+            upstream_pool.observe(url, time.perf_counter() - started, error=resp.status_code >= 400)
+            observed = True
             if resp.status_code >= 400:
                 text = (await resp.aread()).decode("utf-8", "replace")
                 try:
@@ -284,3 +322,7 @@ async def passthrough_sse(url: str, headers: dict, body: dict, usage_holder: dic
                 except Exception:
                     pass
                 yield f"data: {payload}\n\n"
+    except Exception:
+        if not observed:
+            upstream_pool.observe(url, time.perf_counter() - started, error=True)
+        raise
@@ -0,0 +1,160 @@
+"""Shared keep-alive `httpx.AsyncClient`s for the /v1 native passthrough.
+
+`passthrough_json` / `passthrough_sse` used to open a new client per request,
+so every call to the same upstream paid DNS + TCP + TLS before the first
+byte. `upstream_pool.client(url)` instead hands out one client per upstream
+origin (scheme://host:port) and event loop, whose connection pool is bounded
+by `UPSTREAM_HTTP_MAX_CONNECTIONS` / `UPSTREAM_HTTP_MAX_KEEPALIVE` and
+recycles idle sockets after `UPSTREAM_HTTP_KEEPALIVE_EXPIRY` seconds. A client
+nobody used for `UPSTREAM_HTTP_IDLE_SECONDS` is closed on the next lookup.
+
+HTTP/2 is negotiated when `UPSTREAM_HTTP2` is on and the optional `h2`
+package is installed (`pip install httpx[http2]`); otherwise HTTP/1.1
+keep-alive. Clients are per event loop because an httpx pool can't be shared
+across loops (a worker has one; tests spin up several). A shared client is
+shared across users, so its cookie jar refuses every cookie: a `Set-Cookie`
+from one caller's upstream response must never ride along on the next
+caller's request.
+
+`observe()` records per-origin latency (to response headers) in a fixed-
+bucket histogram plus error counts; `stats()` is served at
+`GET /statistics/upstreams`.
+"""
+
+import asyncio
+import bisect
+import logging
+import threading
+import time
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from restai import config
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last is +inf.
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+try:
+    import h2  # noqa: F401
+    _H2_AVAILABLE = True
+except ImportError:
+    _H2_AVAILABLE = False
+
+
+def origin_of(url: str) -> str:
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    return f"{parts.scheme}://{parts.hostname}:{port}"
+
+
+class _OriginStats:
+    __slots__ = ("buckets", "requests", "errors", "total_ms", "clients_created")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.requests = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.clients_created = 0
+
+    def as_dict(self) -> dict:
+        labels = [f"le_{b}" for b in LATENCY_BUCKETS_MS] + ["le_inf"]
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.requests, 1) if self.requests else None,
+            "latency_ms": dict(zip(labels, self.buckets)),
+            "clients_created": self.clients_created,
+        }
+
+
+class UpstreamPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (origin, loop) -> [client, last_used]
+        self._clients: dict = {}
+        self._stats: dict[str, _OriginStats] = {}
+
+    def _origin_stats(self, origin: str) -> _OriginStats:
+        stats = self._stats.get(origin)
+        if stats is None:
+            stats = self._stats[origin] = _OriginStats()
+        return stats
+
+    @staticmethod
+    def _build_client() -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=config.UPSTREAM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.UPSTREAM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=config.UPSTREAM_HTTP_KEEPALIVE_EXPIRY,
+        )
+        return httpx.AsyncClient(
+            limits=limits,
+            http2=config.UPSTREAM_HTTP2 and _H2_AVAILABLE,
+            timeout=httpx.Timeout(300.0, connect=15.0),
+            # No domain is allowed, so the jar never stores a cookie.
+            cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+        )
+
+    async def client(self, url: str) -> httpx.AsyncClient:
+        """The shared client for `url`'s origin on the running loop."""
+        loop = asyncio.get_running_loop()
+        origin = origin_of(url)
+        now = time.monotonic()
+        stale = []
+        with self._lock:
+            for key, entry in list(self._clients.items()):
+                if key[1].is_closed():
+                    # Its loop is gone; so are its sockets.
+                    del self._clients[key]
+                elif key[1] is loop and key[0] != origin and now - entry[1] > config.UPSTREAM_HTTP_IDLE_SECONDS:
+                    stale.append(self._clients.pop(key)[0])
+            entry = self._clients.get((origin, loop))
+            if entry is None:
+                entry = self._clients[(origin, loop)] = [self._build_client(), now]
+                self._origin_stats(origin).clients_created += 1
+            entry[1] = now
+        for client in stale:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.debug("upstream pool: closing idle client failed: %s", e)
+        return entry[0]
+
+    def observe(self, url: str, seconds: float, error: bool) -> None:
+        ms = seconds * 1000
+        with self._lock:
+            stats = self._origin_stats(origin_of(url))
+            stats.requests += 1
+            stats.total_ms += ms
+            stats.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+            if error:
+                stats.errors += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "http2": bool(config.UPSTREAM_HTTP2 and _H2_AVAILABLE),
+                "open_clients": len(self._clients),
+                "upstreams": {origin: s.as_dict() for origin, s in self._stats.items()},
+            }
+
+    async def aclose(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """Close the clients bound to `loop` (default: the running one)."""
+        loop = loop or asyncio.get_running_loop()
+        with self._lock:
+            mine = [k for k in self._clients if k[1] is loop]
+            clients = [self._clients.pop(k)[0] for k in mine]
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.debug("upstream pool: close failed: %s", e)
+
+
+upstream_pool = UpstreamPool()
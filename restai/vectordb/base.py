@@ -1,11 +1,19 @@
 from abc import ABC, abstractmethod
+from typing import Iterator, Optional
+
 from llama_index.core.vector_stores.types import BasePydanticVectorStore
 from restai.brain import Brain
 from restai.project import Project
+from restai.vectordb.catalog import SourceCatalog
 
 class VectorBase(ABC):
     index: BasePydanticVectorStore = None
     project: Project = None
+    # Whether `info()` is exact and immediately consistent. Backends whose
+    # count lags behind writes (Pinecone) can't tell drift from lag, so
+    # `catalog_drifted` never reports them; only a scheduled reconcile
+    # heals their catalog.
+    exact_count = True
 
     def __init__(self, brain: Brain, project: Project, embedding):
         """Shared preamble for every backend.
@@ -19,6 +27,7 @@ class VectorBase(ABC):
         self.project = project
         self.embedding = embedding
         self.store_key = project_store_key(project)
+        self.catalog = SourceCatalog(project.props.id)
 
 
     @abstractmethod
@@ -29,16 +38,51 @@ class VectorBase(ABC):
     def load(self, brain: Brain):
         pass
 
-    @abstractmethod
-    def list(self):
-        pass
+    def list(self, offset: int = 0, limit: Optional[int] = None):
+        """Source names in first-ingest order, from the catalog."""
+        return [row["source"] for row in self.list_sources(offset, limit)]
+
+    def list_sources(self, offset: int = 0, limit: Optional[int] = None):
+        """Catalog rows: source, chunk count and ingest times."""
+        self.sync_catalog()
+        return self.catalog.sources(offset, limit)
+
+    def count_sources(self) -> int:
+        self.sync_catalog()
+        return self.catalog.source_count()
 
-    @abstractmethod
     def list_source(self, source):
+        """One entry per chunk of `source` (the historical shape)."""
+        self.sync_catalog()
+        return [source] * self.catalog.chunk_count(source)
+
+    def sync_catalog(self):
+        """Build the catalog from a store scan when it is empty and the store
+        isn't — a store that predates the catalog. A count mismatch is left
+        to `reconcile_catalog`: on the request path it is usually an ingest
+        whose catalog write hasn't landed yet, not drift."""
+        if self.catalog.chunk_count() == 0 and self.info():
+            self.catalog.rebuild(self.scan())
+
+    def catalog_drifted(self) -> bool:
+        """Whether the catalog's chunk total disagrees with the store's.
+        Always False on backends without an exact count."""
+        return self.exact_count and self.catalog.chunk_count() != self.info()
+
+    def reconcile_catalog(self):
+        """Rebuild the catalog from a full store scan, whatever its state.
+        Run by `crons/vector_catalog.py`, off the request path."""
+        self.catalog.rebuild(self.scan())
+
+    @abstractmethod
+    def scan(self) -> Iterator[tuple[str, str]]:
+        """Every chunk in the store as (vector id, source); only used to
+        rebuild the catalog."""
         pass
 
     @abstractmethod
     def info(self):
+        """Number of chunks in the store."""
         pass
 
     @abstractmethod
@@ -61,10 +105,22 @@ class VectorBase(ABC):
     def delete_id(self, id):
         pass
 
+    def delete_ids(self, ids):
+        """Delete many chunks by id and return the ids actually deleted; a
+        caller keeps its bookkeeping for the rest. Backends override with a
+        bulk call."""
+        for id in ids:
+            self.delete_id(id)
+        return list(ids)
+
+    def record_nodes(self, nodes):
+        """Add chunks just written through `self.index` to the catalog."""
+        self.catalog.add(nodes)
+
     @abstractmethod
     def reset(self, brain):
         pass
 
-    def list_all_chunks(self, limit=50000):
+    def list_all_chunks(self, limit=50000, offset=0):
         """Return all chunks as list of {"id": str, "source": str, "text": str}."""
-        return []
\ No newline at end of file
+        return []
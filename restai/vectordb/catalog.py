@@ -0,0 +1,232 @@
+"""Per-project source catalog for the vector stores.
+
+Every backend used to answer "which sources does this project have" by
+pulling the metadata of every chunk out of the store. The catalog keeps that
+answer in two tables instead — `vector_catalog_sources` (source → chunk
+count, first and last ingest time) and `vector_catalog_chunks` (vector id →
+source) — written by `insert_nodes_batched` and by each backend's delete
+methods. Listings are then an indexed, paginated query.
+
+Catalog writes never fail the vector write they follow: an error is logged
+and the catalog is left behind. `VectorBase` builds an empty catalog from
+one store scan on first use; `crons/vector_catalog.py` rebuilds the rest on
+a schedule, so drift heals without a request ever paying for the scan.
+"""
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from restai import config
+from restai.database import open_db_wrapper
+from restai.models.databasemodels import VectorCatalogChunkDatabase, VectorCatalogSourceDatabase
+
+logging.basicConfig(level=config.LOG_LEVEL)
+
+# Keeps IN (...) lists under sqlite's bound-parameter limit.
+_IN_CHUNK = 900
+# Rows per executemany while rebuilding from a store scan.
+_REBUILD_BATCH = 5000
+# A rebuild that collides with a concurrent `add` (same vector id, or the
+# same new source) is retried from scratch this many times in total.
+_REBUILD_ATTEMPTS = 3
+
+_Sources = VectorCatalogSourceDatabase
+_Chunks = VectorCatalogChunkDatabase
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _chunks(items, size=_IN_CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def node_source(node) -> str:
+    """The catalog source of a chunk; chunks without one count under ""."""
+    return (getattr(node, "metadata", None) or {}).get("source") or ""
+
+
+class SourceCatalog:
+    """Source catalog of one project. Each call opens and closes its own
+    session, so a catalog can be held on a vector backend for its lifetime."""
+
+    def __init__(self, project_id: int):
+        self.project_id = project_id
+
+    def _run(self, write, *args, attempts: int = 1):
+        """Run `write(session, *args)` in its own transaction, retrying up to
+        `attempts` times on a unique-key collision. Errors are logged, never
+        raised; see the module docstring."""
+        for attempt in range(1, attempts + 1):
+            wrapper = open_db_wrapper()
+            try:
+                result = write(wrapper.db, *args)
+                wrapper.db.commit()
+                return result
+            except IntegrityError as e:
+                wrapper.db.rollback()
+                if attempt < attempts:
+                    continue
+                logging.warning("Vector catalog update for project %s failed: %s", self.project_id, e)
+                return None
+            except Exception as e:
+                wrapper.db.rollback()
+                logging.warning("Vector catalog update for project %s failed: %s", self.project_id, e)
+                return None
+            finally:
+                wrapper.close()
+
+    def _read(self, query):
+        wrapper = open_db_wrapper()
+        try:
+            return wrapper.db.execute(query).all()
+        finally:
+            wrapper.close()
+
+    # -- writes ------------------------------------------------------------
+
+    def add(self, nodes) -> None:
+        """Record freshly written chunks. Ids the catalog already holds are
+        skipped, so re-writing a chunk (or racing a rebuild) never double
+        counts."""
+        sources = {node.node_id: node_source(node) for node in nodes}
+        if sources:
+            self._run(self._add, sources)
+
+    def _add(self, session, sources):
+        pid = self.project_id
+        for batch in _chunks(sources):
+            known = session.execute(
+                select(_Chunks.vector_id).where(_Chunks.project_id == pid, _Chunks.vector_id.in_(batch))
+            ).scalars().all()
+            for vector_id in known:
+                sources.pop(vector_id)
+        if not sources:
+            return
+        session.execute(insert(_Chunks), [
+            {"project_id": pid, "vector_id": vector_id, "source": source}
+            for vector_id, source in sources.items()
+        ])
+        self._adjust(session, Counter(sources.values()))
+
+    def remove_ids(self, ids: Iterable[str]) -> None:
+        ids = list(ids)
+        if ids:
+            self._run(self._remove_ids, ids)
+
+    def _remove_ids(self, session, ids):
+        pid = self.project_id
+        removed = Counter()
+        for batch in _chunks(ids):
+            where = (_Chunks.project_id == pid, _Chunks.vector_id.in_(batch))
+            removed.update(session.execute(select(_Chunks.source).where(*where)).scalars())
+            session.execute(delete(_Chunks).where(*where))
+        self._adjust(session, {source: -n for source, n in removed.items()})
+
+    def remove_source(self, source: str) -> None:
+        self._run(self._remove_source, source)
+
+    def _remove_source(self, session, source):
+        pid = self.project_id
+        session.execute(delete(_Chunks).where(_Chunks.project_id == pid, _Chunks.source == source))
+        session.execute(delete(_Sources).where(_Sources.project_id == pid, _Sources.source == source))
+
+    def clear(self) -> None:
+        self._run(self._clear)
+
+    def _clear(self, session):
+        session.execute(delete(_Chunks).where(_Chunks.project_id == self.project_id))
+        session.execute(delete(_Sources).where(_Sources.project_id == self.project_id))
+
+    def rebuild(self, chunks: Iterable[tuple[str, str]]) -> None:
+        """Replace the catalog with `chunks`, (vector id, source) pairs from a
+        full scan of the store. An `add` committing mid-rebuild makes the
+        insert collide; the scan is then replayed in a fresh transaction."""
+        self._run(self._rebuild, list(chunks), attempts=_REBUILD_ATTEMPTS)
+
+    def _rebuild(self, session, chunks):
+        self._clear(session)
+        pid = self.project_id
+        counts = Counter()
+        seen = set()
+        batch = []
+        for vector_id, source in chunks:
+            if vector_id in seen:
+                continue
+            seen.add(vector_id)
+            source = source or ""
+            counts[source] += 1
+            batch.append({"project_id": pid, "vector_id": vector_id, "source": source})
+            if len(batch) >= _REBUILD_BATCH:
+                session.execute(insert(_Chunks), batch)
+                batch = []
+        if batch:
+            session.execute(insert(_Chunks), batch)
+        self._adjust(session, counts)
+
+    def _adjust(self, session, deltas):
+        """Apply per-source chunk count changes, creating sources that appear
+        and dropping the ones that reach zero."""
+        pid = self.project_id
+        now = _now()
+        deltas = {source: n for source, n in deltas.items() if n}
+        existing = {}
+        for batch in _chunks(deltas):
+            existing.update(session.execute(
+                select(_Sources.source, _Sources.id).where(_Sources.project_id == pid, _Sources.source.in_(batch))
+            ).all())
+        new = [
+            {"project_id": pid, "source": source, "chunk_count": n, "created_at": now, "updated_at": now}
+            for source, n in deltas.items() if source not in existing and n > 0
+        ]
+        if new:
+            session.execute(insert(_Sources), new)
+        for source, row_id in existing.items():
+            values = {"chunk_count": _Sources.chunk_count + deltas[source]}
+            if deltas[source] > 0:
+                values["updated_at"] = now
+            session.execute(update(_Sources).where(_Sources.id == row_id).values(**values))
+        if any(n < 0 for n in deltas.values()):
+            session.execute(delete(_Sources).where(_Sources.project_id == pid, _Sources.chunk_count <= 0))
+
+    # -- reads -------------------------------------------------------------
+
+    def sources(self, offset: int = 0, limit: Optional[int] = None) -> list[dict]:
+        """Sources in first-ingest order, with their chunk count and ingest
+        times. Chunks written without a source are not listed."""
+        query = (
+            select(_Sources.source, _Sources.chunk_count, _Sources.created_at, _Sources.updated_at)
+            .where(_Sources.project_id == self.project_id, _Sources.source != "")
+            .order_by(_Sources.id)
+            .offset(offset)
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        return [
+            {"source": source, "chunks": chunks, "created_at": created_at, "updated_at": updated_at}
+            for source, chunks, created_at, updated_at in self._read(query)
+        ]
+
+    def source_count(self) -> int:
+        return self._read(
+            select(func.count(_Sources.id)).where(_Sources.project_id == self.project_id, _Sources.source != "")
+        )[0][0]
+
+    def chunk_count(self, source: Optional[str] = None) -> int:
+        """Chunks in the catalog, in total or for one source."""
+        query = select(func.coalesce(func.sum(_Sources.chunk_count), 0)).where(_Sources.project_id == self.project_id)
+        if source is not None:
+            query = query.where(_Sources.source == source)
+        return int(self._read(query)[0][0])
+
+    def ids(self, source: str) -> list[str]:
+        return [row[0] for row in self._read(
+            select(_Chunks.vector_id).where(_Chunks.project_id == self.project_id, _Chunks.source == source)
+        )]
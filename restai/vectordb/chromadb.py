@@ -21,6 +21,9 @@ logging.basicConfig(level=config.LOG_LEVEL)
 # vectordb_* changes so admins can swap Chroma host without restart.
 _client_cache = {}
 
+# Chunks per `collection.get()` when walking a whole collection.
+_SCAN_PAGE = 5000
+
 
 def _get_client(path=None):
     """Get or create a ChromaDB client, reusing PersistentClient per path.
@@ -60,25 +63,27 @@ class ChromaDBVector(VectorBase):
     def load(self, brain: Brain):
         pass
 
-    def list(self):
-        output = []
-        docs = self.chroma_collection.get(include=["metadatas"])
-        for metadata in docs["metadatas"]:
-            if metadata["source"] not in output:
-                output.append(metadata["source"])
-        return output
-
-    def list_source(self, source):
-        output = []
-        docs = self.chroma_collection.get(include=["metadatas"])
-        for metadata in docs["metadatas"]:
-            if metadata["source"] == source:
-                output.append(metadata["source"])
-        return output
-
     def info(self):
-        docs = self.chroma_collection.get(include=["metadatas"])
-        return len(docs["ids"])
+        return self.chroma_collection.count()
+
+    def _pages(self, include, limit=None, offset=0):
+        """`get()` the collection in _SCAN_PAGE slices instead of all at once."""
+        while limit is None or limit > 0:
+            size = _SCAN_PAGE if limit is None else min(_SCAN_PAGE, limit)
+            docs = self.chroma_collection.get(include=include, limit=size, offset=offset)
+            if not docs["ids"]:
+                return
+            yield docs
+            if len(docs["ids"]) < size:
+                return
+            offset += size
+            if limit is not None:
+                limit -= size
+
+    def scan(self):
+        for docs in self._pages(["metadatas"]):
+            for doc_id, metadata in zip(docs["ids"], docs["metadatas"] or []):
+                yield doc_id, (metadata or {}).get("source") or ""
 
     def find_source(self, source: str):
         return self.chroma_collection.get(where={'source': source})
@@ -94,6 +99,7 @@ class ChromaDBVector(VectorBase):
     def delete(self):
         try:
             self.db.delete_collection(name=self.store_key)
+            self.catalog.clear()
             embeddingsPath = os.path.join(EMBEDDINGS_PATH, self.store_key)
             shutil.rmtree(embeddingsPath, ignore_errors=True)
             _client_cache.pop(embeddingsPath, None)
@@ -101,29 +107,39 @@ class ChromaDBVector(VectorBase):
             logging.exception(e)
 
     def delete_source(self, source):
-        ids = self.chroma_collection.get(where={'source': source})['ids']
+        ids = self.chroma_collection.get(where={'source': source}, include=[])['ids']
         if len(ids):
             self.chroma_collection.delete(ids)
+        self.catalog.remove_source(source)
         return ids
 
     def delete_id(self, id):
-        ids = self.chroma_collection.get(ids=[id])['ids']
+        ids = self.chroma_collection.get(ids=[id], include=[])['ids']
         if len(ids):
             self.chroma_collection.delete(ids)
+            self.catalog.remove_ids(ids)
         return id
 
+    def delete_ids(self, ids):
+        ids = list(ids)
+        if ids:
+            self.chroma_collection.delete(ids=ids)
+            self.catalog.remove_ids(ids)
+        return ids
+
     def reset(self, brain):
         self.db.delete_collection(name=self.store_key)
+        self.catalog.clear()
         self.chroma_collection = self.db.get_or_create_collection(self.store_key)
         self.index = self._vector_init(brain)
 
-    def list_all_chunks(self, limit=50000):
+    def list_all_chunks(self, limit=50000, offset=0):
         output = []
-        docs = self.chroma_collection.get(include=["metadatas", "documents"])
-        for i, doc_id in enumerate(docs["ids"][:limit]):
-            output.append({
-                "id": doc_id,
-                "source": docs["metadatas"][i].get("source", "") if docs["metadatas"] else "",
-                "text": docs["documents"][i] if docs["documents"] else "",
-            })
+        for docs in self._pages(["metadatas", "documents"], limit, offset):
+            for i, doc_id in enumerate(docs["ids"]):
+                output.append({
+                    "id": doc_id,
+                    "source": (docs["metadatas"][i] or {}).get("source", "") if docs["metadatas"] else "",
+                    "text": docs["documents"][i] if docs["documents"] else "",
+                })
         return output
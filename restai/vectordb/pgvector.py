@@ -1,6 +1,6 @@
 import logging
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from llama_index.core.indices import VectorStoreIndex
 from llama_index.core.storage import StorageContext
 from llama_index.vector_stores.postgres import PGVectorStore
@@ -9,6 +9,7 @@ from restai import config
 import restai.config as _cfg
 from restai.brain import Brain
 from restai.embedding import Embedding
+from restai.sql_engines import get_async_engine, get_engine
 from restai.vectordb.base import VectorBase
 
 logging.basicConfig(level=config.LOG_LEVEL)
@@ -36,14 +37,15 @@ class PGVectorDB(VectorBase):
         self.index = self._vector_init(brain)
 
     def _vector_init(self, brain: Brain):
-        vector_store = PGVectorStore.from_params(
-            host=_cfg.PGVECTOR_HOST,
-            port=_cfg.PGVECTOR_PORT,
-            user=_cfg.PGVECTOR_USER,
-            password=_cfg.PGVECTOR_PASSWORD,
-            database=_cfg.PGVECTOR_DB,
+        # Same parameters as PGVectorStore.from_params, but on the shared
+        # engines so each project instance doesn't open its own pools.
+        vector_store = PGVectorStore(
+            connection_string=_get_sync_connection_string(),
+            async_connection_string=_get_async_connection_string(),
             table_name=self.table_name,
             embed_dim=self.embedding.props.dimension,
+            engine=get_engine(_get_sync_connection_string()),
+            async_engine=get_async_engine(_get_async_connection_string()),
         )
 
         storage_context = StorageContext.from_defaults(vector_store=vector_store)
@@ -54,7 +56,8 @@ class PGVectorDB(VectorBase):
         )
 
     def _get_engine(self):
-        return create_engine(_get_sync_connection_string())
+        # Shared per connection string; never dispose it here.
+        return get_engine(_get_sync_connection_string())
 
     def save(self):
         pass
@@ -62,48 +65,26 @@ class PGVectorDB(VectorBase):
     def load(self, brain: Brain):
         pass
 
-    def list(self):
-        output = []
+    def info(self):
         engine = self._get_engine()
         with engine.connect() as conn:
-            rows = conn.execute(
-                text(
-                    f'SELECT DISTINCT metadata_->>\'source\' AS source '
-                    f'FROM public."{self.table_name}" '
-                    f'WHERE metadata_->>\'source\' IS NOT NULL'
-                )
+            result = conn.execute(
+                text(f'SELECT COUNT(*) FROM public."{self.table_name}"')
             )
-            for row in rows:
-                output.append(row[0])
-        engine.dispose()
-        return output
+            count = result.scalar()
+        return count or 0
 
-    def list_source(self, source: str):
-        output = []
+    def scan(self):
         engine = self._get_engine()
         with engine.connect() as conn:
             rows = conn.execute(
                 text(
-                    f'SELECT metadata_->>\'source\' AS source '
-                    f'FROM public."{self.table_name}" '
-                    f'WHERE metadata_->>\'source\' = :source'
-                ),
-                {"source": source},
+                    f"SELECT node_id, metadata_->>'source' AS source "
+                    f'FROM public."{self.table_name}"'
+                )
             )
             for row in rows:
-                output.append(row[0])
-        engine.dispose()
-        return output
-
-    def info(self):
-        engine = self._get_engine()
-        with engine.connect() as conn:
-            result = conn.execute(
-                text(f'SELECT COUNT(*) FROM public."{self.table_name}"')
-            )
-            count = result.scalar()
-        engine.dispose()
-        return count or 0
+                yield row[0], row[1] or ""
 
     def find_source(self, source: str):
         ids = []
@@ -123,7 +104,6 @@ class PGVectorDB(VectorBase):
                 ids.append(row[0])
                 metadatas.append(row[1] if isinstance(row[1], dict) else {})
                 documents.append(row[2])
-        engine.dispose()
         return {"ids": ids, "metadatas": metadatas, "documents": documents}
 
     def find_id(self, id: str):
@@ -144,7 +124,6 @@ class PGVectorDB(VectorBase):
                     k: v for k, v in metadata.items() if not k.startswith("_")
                 }
                 output["document"] = row[1]
-        engine.dispose()
         return output
 
     def delete(self):
@@ -155,7 +134,7 @@ class PGVectorDB(VectorBase):
                     text(f'DROP TABLE IF EXISTS public."{self.table_name}"')
                 )
                 conn.commit()
-            engine.dispose()
+            self.catalog.clear()
         except Exception as e:
             logging.exception(e)
 
@@ -180,7 +159,7 @@ class PGVectorDB(VectorBase):
                     {"source": source},
                 )
                 conn.commit()
-        engine.dispose()
+        self.catalog.remove_source(source)
         return ids
 
     def delete_id(self, id: str):
@@ -203,14 +182,32 @@ class PGVectorDB(VectorBase):
                     {"node_id": id},
                 )
                 conn.commit()
-        engine.dispose()
+                self.catalog.remove_ids(found)
         return id
 
+    def delete_ids(self, ids):
+        ids = list(ids)
+        if not ids:
+            return ids
+        engine = self._get_engine()
+        with engine.connect() as conn:
+            for i in range(0, len(ids), 1000):
+                conn.execute(
+                    text(
+                        f'DELETE FROM public."{self.table_name}" '
+                        f'WHERE node_id = ANY(:node_ids)'
+                    ),
+                    {"node_ids": ids[i:i + 1000]},
+                )
+            conn.commit()
+        self.catalog.remove_ids(ids)
+        return ids
+
     def reset(self, brain: Brain):
         self.delete()
         self.index = self._vector_init(brain)
 
-    def list_all_chunks(self, limit=50000):
+    def list_all_chunks(self, limit=50000, offset=0):
         output = []
         engine = self._get_engine()
         with engine.connect() as conn:
@@ -218,10 +215,9 @@ class PGVectorDB(VectorBase):
                 text(
                     f"SELECT node_id, metadata_->>'source' AS source, text "
                     f'FROM public."{self.table_name}" '
-                    f"LIMIT {int(limit)}"
+                    f"ORDER BY id LIMIT {int(limit)} OFFSET {int(offset)}"
                 )
             )
             for row in rows:
                 output.append({"id": row[0], "source": row[1] or "", "text": row[2] or ""})
-        engine.dispose()
         return output
@@ -15,6 +15,9 @@ logging.basicConfig(level=config.LOG_LEVEL)
 
 
 class PineconeDB(VectorBase):
+    # describe_index_stats lags behind upserts and deletes.
+    exact_count = False
+
     def __init__(self, brain: Brain, project, embedding: Embedding):
         super().__init__(brain, project, embedding)
         # `p{id}` already satisfies Pinecone's namespace charset — nothing to sanitize.
@@ -43,35 +46,6 @@ class PineconeDB(VectorBase):
     def load(self, brain: Brain):
         pass
 
-    def list(self):
-        output = []
-        try:
-            for ids_batch in self.pinecone_index.list(namespace=self.namespace):
-                fetched = self.pinecone_index.fetch(
-                    ids=ids_batch, namespace=self.namespace
-                )
-                for vec in fetched.vectors.values():
-                    source = (vec.metadata or {}).get("source")
-                    if source and source not in output:
-                        output.append(source)
-        except Exception:
-            pass
-        return output
-
-    def list_source(self, source: str):
-        output = []
-        try:
-            for ids_batch in self.pinecone_index.list(namespace=self.namespace):
-                fetched = self.pinecone_index.fetch(
-                    ids=ids_batch, namespace=self.namespace
-                )
-                for vec in fetched.vectors.values():
-                    if (vec.metadata or {}).get("source") == source:
-                        output.append(source)
-        except Exception:
-            pass
-        return output
-
     def info(self):
         try:
             stats = self.pinecone_index.describe_index_stats()
@@ -80,6 +54,12 @@ class PineconeDB(VectorBase):
         except Exception:
             return 0
 
+    def scan(self):
+        for ids_batch in self.pinecone_index.list(namespace=self.namespace):
+            fetched = self.pinecone_index.fetch(ids=ids_batch, namespace=self.namespace)
+            for vid, vec in fetched.vectors.items():
+                yield vid, (vec.metadata or {}).get("source") or ""
+
     def find_source(self, source: str):
         ids = []
         metadatas = []
@@ -124,24 +104,25 @@ class PineconeDB(VectorBase):
             self.pinecone_index.delete(
                 delete_all=True, namespace=self.namespace
             )
+            self.catalog.clear()
         except Exception as e:
             logging.exception(e)
 
     def delete_source(self, source: str):
         ids = []
         try:
-            for ids_batch in self.pinecone_index.list(namespace=self.namespace):
-                fetched = self.pinecone_index.fetch(
-                    ids=ids_batch, namespace=self.namespace
-                )
-                for vid, vec in fetched.vectors.items():
-                    if (vec.metadata or {}).get("source") == source:
-                        ids.append(vid)
+            # The namespace scan is the authority: the catalog is best-effort
+            # and may have missed an add, whose vector retrieval would keep
+            # serving. Its ids are unioned in for vectors the scan can't see
+            # yet (Pinecone's listing lags writes).
+            ids = {vid for vid, vec_source in self.scan() if vec_source == source}
+            ids = sorted(ids.union(self.catalog.ids(source)))
             if ids:
                 for i in range(0, len(ids), 1000):
                     self.pinecone_index.delete(
                         ids=ids[i:i + 1000], namespace=self.namespace
                     )
+            self.catalog.remove_source(source)
         except Exception as e:
             logging.exception(e)
         return ids
@@ -151,19 +132,39 @@ class PineconeDB(VectorBase):
             self.pinecone_index.delete(
                 ids=[id], namespace=self.namespace
             )
+            self.catalog.remove_ids([id])
         except Exception as e:
             logging.exception(e)
         return id
 
+    def delete_ids(self, ids):
+        ids = list(ids)
+        deleted = []
+        try:
+            for i in range(0, len(ids), 1000):
+                self.pinecone_index.delete(
+                    ids=ids[i:i + 1000], namespace=self.namespace
+                )
+                deleted.extend(ids[i:i + 1000])
+        except Exception as e:
+            logging.exception(e)
+        self.catalog.remove_ids(deleted)
+        return deleted
+
     def reset(self, brain: Brain):
         self.delete()
         self.index = self._vector_init(brain)
 
-    def list_all_chunks(self, limit=50000):
+    def list_all_chunks(self, limit=50000, offset=0):
         output = []
+        skipped = 0
         try:
             for ids_batch in self.pinecone_index.list(namespace=self.namespace):
-                fetched = self.pinecone_index.fetch(ids=ids_batch, namespace=self.namespace)
+                if skipped + len(ids_batch) <= offset:
+                    skipped += len(ids_batch)
+                    continue
+                fetched = self.pinecone_index.fetch(ids=ids_batch[offset - skipped:], namespace=self.namespace)
+                skipped = offset
                 for vid, vec in fetched.vectors.items():
                     meta = vec.metadata or {}
                     output.append({
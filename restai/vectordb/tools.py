@@ -1,11 +1,15 @@
+import logging
 import os
-from typing import Iterable
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
 
 import yake
-from llama_index.core.schema import Document
+from llama_index.core.schema import BaseNode, Document, MetadataMode
 from llama_index.core.text_splitter import TokenTextSplitter, SentenceSplitter
 
-from restai.config import EMBEDDINGS_PATH
+from restai.config import EMBEDDINGS_PATH, INGEST_BATCH_SIZE, INGEST_EMBED_CONCURRENCY
 
 from modules.loaders import LOADERS
 
@@ -57,8 +61,94 @@ def find_vector_db(project: "Project") -> type["VectorBase"]:
         raise Exception("Invalid vectorDB type.")
 
 
-def index_documents_classic(project: "Project", documents: Iterable[Document], splitter: str = "sentence",
-                    chunks: int = 256) -> int: # TODO: Replace splitter string ID with enum
+# Embedding classes that run in-process — threading them only contends for
+# the same CPU/GPU, so their batches are embedded one at a time.
+_LOCAL_EMBEDDING_CLASSES = {"LangChain.HuggingFace"}
+
+
+def _ingest_embed_model(project: "Project"):
+    """The LlamaIndex embed model behind the project's vector store, or None
+    when the store doesn't expose one (the index then embeds on insert)."""
+    embedding = getattr(project.vector, "embedding", None)
+    if embedding is None or getattr(embedding, "embedding", None) is None:
+        return None
+    from llama_index.core.embeddings.utils import resolve_embed_model
+    return resolve_embed_model(embedding.embedding)
+
+
+def _embed_batch(embed_model, batch: list[BaseNode]) -> list[BaseNode]:
+    vectors = embed_model.get_text_embedding_batch(
+        [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+    )
+    for node, vector in zip(batch, vectors):
+        node.embedding = vector
+    return batch
+
+
+def insert_nodes_batched(project: "Project", nodes: list[BaseNode],
+                         timings: Optional[dict] = None) -> int:
+    """Embed `nodes` in INGEST_BATCH_SIZE batches and write each batch with a
+    single `insert_nodes` call (one bulk add/upsert on every backend).
+
+    Remote embedding providers get up to INGEST_EMBED_CONCURRENCY batches in
+    flight while earlier batches are written; writes stay sequential and in
+    order. `timings` (if given) accumulates `embed` (time spent waiting on
+    embeddings) and `write` (time inside the vector store and its source
+    catalog) in seconds, plus
+    the number of `batches`.
+    """
+    timings = timings if timings is not None else {}
+    for key in ("embed", "write", "batches"):
+        timings.setdefault(key, 0)
+    if not nodes:
+        return 0
+
+    index = project.vector.index
+    # Keeps the backend's source catalog in step (see vectordb/catalog.py).
+    record = getattr(project.vector, "record_nodes", None)
+    batch_size = max(1, INGEST_BATCH_SIZE)
+    batches = [nodes[i:i + batch_size] for i in range(0, len(nodes), batch_size)]
+    embed_model = _ingest_embed_model(project)
+
+    def _write(batch):
+        started = time.perf_counter()
+        index.insert_nodes(batch)
+        if record is not None:
+            record(batch)
+        timings["write"] += time.perf_counter() - started
+        timings["batches"] += 1
+
+    if embed_model is None:
+        # No embed model to drive ourselves — the index embeds inside insert_nodes.
+        for batch in batches:
+            _write(batch)
+        return len(nodes)
+
+    class_name = getattr(getattr(project.vector.embedding, "props", None), "class_name", None)
+    workers = 1 if class_name in _LOCAL_EMBEDDING_CLASSES else max(1, INGEST_EMBED_CONCURRENCY)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.submit(_embed_batch, embed_model, batch))
+            # Keep at most `workers` batches embedded-but-unwritten in memory.
+            if len(pending) >= workers:
+                started = time.perf_counter()
+                ready = pending.popleft().result()
+                timings["embed"] += time.perf_counter() - started
+                _write(ready)
+        while pending:
+            started = time.perf_counter()
+            ready = pending.popleft().result()
+            timings["embed"] += time.perf_counter() - started
+            _write(ready)
+
+    return len(nodes)
+
+
+def split_documents(documents: Iterable[Document], splitter: str = "sentence",
+                    chunks: int = 256) -> list[Document]: # TODO: Replace splitter string ID with enum
+    """Split `documents` into chunk Documents carrying their parent's metadata."""
     splitter_o: MetadataAwareTextSplitter
     match splitter:
         case "sentence":
@@ -70,29 +160,51 @@ def index_documents_classic(project: "Project", documents: Iterable[Document], s
         case _:
             raise ValueError(f"Unknown splitter '{splitter}'.")
 
-    total_chunks: int = 0
-
+    doc_chunks: list[Document] = []
     document: Document
     for document in documents:
         text_chunks = splitter_o.split_text(document.text)
+        doc_chunks.extend(Document(text=t, metadata=document.metadata) for t in text_chunks)
+    return doc_chunks
 
-        doc_chunks: list[Document] = [Document(text=t, metadata=document.metadata)
-                                      for t in text_chunks]
-
-        for doc_chunk in doc_chunks:
-            project.vector.index.insert(doc_chunk)
-            total_chunks += 1
 
+def index_documents_classic(project: "Project", documents: Iterable[Document], splitter: str = "sentence",
+                    chunks: int = 256, timings: Optional[dict] = None) -> int:
+    """Split `documents` into chunks and index them through the batched
+    embed/write pipeline. Fills `timings` (if given) with per-stage seconds:
+    `split`, `embed`, `write`, `total`, plus `chunks` and `batches`."""
+    timings = timings if timings is not None else {}
+    started = time.perf_counter()
+
+    doc_chunks = split_documents(documents, splitter, chunks)
+    timings["split"] = time.perf_counter() - started
+
+    total_chunks = insert_nodes_batched(project, doc_chunks, timings)
+
+    timings["chunks"] = total_chunks
+    timings["total"] = time.perf_counter() - started
+    logging.info(
+        "Indexed %d chunks in %d batches: split=%.3fs embed=%.3fs write=%.3fs total=%.3fs",
+        total_chunks, timings["batches"], timings["split"], timings["embed"],
+        timings["write"], timings["total"],
+    )
     return total_chunks
-  
-def index_documents_docling(project: "Project", documents: Iterable[Document]) -> int:
+
+
+def index_documents_docling(project: "Project", documents: Iterable[Document],
+                            timings: Optional[dict] = None) -> int:
     parser = MarkdownNodeParser()
-    
+
+    timings = timings if timings is not None else {}
+    started = time.perf_counter()
     nodes = parser.get_nodes_from_documents(documents)
+    timings["split"] = time.perf_counter() - started
 
-    project.vector.index.insert_nodes(nodes)
-    
-    return len(nodes)
+    total_chunks = insert_nodes_batched(project, nodes, timings)
+
+    timings["chunks"] = total_chunks
+    timings["total"] = time.perf_counter() - started
+    return total_chunks
 
 
 def extract_keywords_for_metadata(documents):
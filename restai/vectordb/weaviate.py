@@ -1,4 +1,5 @@
 import logging
+from itertools import islice
 
 import weaviate
 from weaviate.auth import AuthApiKey
@@ -69,32 +70,6 @@ class WeaviateDB(VectorBase):
     def load(self, brain: Brain):
         pass
 
-    def list(self):
-        output = []
-        try:
-            collection = self._get_collection()
-            for obj in collection.iterator(return_properties=["source"]):
-                source = obj.properties.get("source")
-                if source and source not in output:
-                    output.append(source)
-        except Exception:
-            pass
-        return output
-
-    def list_source(self, source: str):
-        output = []
-        try:
-            collection = self._get_collection()
-            response = collection.query.fetch_objects(
-                filters=Filter.by_property("source").equal(source),
-                return_properties=["source"],
-            )
-            for obj in response.objects:
-                output.append(obj.properties.get("source"))
-        except Exception:
-            pass
-        return output
-
     def info(self):
         try:
             collection = self._get_collection()
@@ -103,6 +78,11 @@ class WeaviateDB(VectorBase):
         except Exception:
             return 0
 
+    def scan(self):
+        collection = self._get_collection()
+        for obj in collection.iterator(return_properties=["source"]):
+            yield str(obj.uuid), obj.properties.get("source") or ""
+
     def find_source(self, source: str):
         ids = []
         metadatas = []
@@ -142,6 +122,7 @@ class WeaviateDB(VectorBase):
     def delete(self):
         try:
             self.client.collections.delete(self.collection_name)
+            self.catalog.clear()
         except Exception as e:
             logging.exception(e)
 
@@ -157,6 +138,7 @@ class WeaviateDB(VectorBase):
                 collection.data.delete_many(
                     where=Filter.by_property("source").equal(source)
                 )
+            self.catalog.remove_source(source)
         except Exception as e:
             logging.exception(e)
         return ids
@@ -165,26 +147,41 @@ class WeaviateDB(VectorBase):
         try:
             collection = self._get_collection()
             collection.data.delete_by_id(uuid=id)
+            self.catalog.remove_ids([id])
         except Exception as e:
             logging.exception(e)
         return id
 
+    def delete_ids(self, ids):
+        ids = list(ids)
+        deleted = []
+        try:
+            collection = self._get_collection()
+            for i in range(0, len(ids), 1000):
+                collection.data.delete_many(
+                    where=Filter.by_id().contains_any(ids[i:i + 1000])
+                )
+                deleted.extend(ids[i:i + 1000])
+        except Exception as e:
+            logging.exception(e)
+        self.catalog.remove_ids(deleted)
+        return deleted
+
     def reset(self, brain: Brain):
         self.delete()
         self.index = self._vector_init(brain)
 
-    def list_all_chunks(self, limit=50000):
+    def list_all_chunks(self, limit=50000, offset=0):
         output = []
         try:
             collection = self._get_collection()
-            for obj in collection.iterator(return_properties=["source", "text"]):
+            objects = collection.iterator(return_properties=["source", "text"])
+            for obj in islice(objects, offset, offset + limit):
                 output.append({
                     "id": str(obj.uuid),
                     "source": obj.properties.get("source", ""),
                     "text": obj.properties.get("text", ""),
                 })
-                if len(output) >= limit:
-                    break
         except Exception:
             pass
         return output
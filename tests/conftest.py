@@ -6,6 +6,16 @@ sys.setrecursionlimit(50000)
 # schedules network reports and slows/flakes offline CI runners). Must be
 # set before `restai.main` is imported below.
 os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
+# Tests read inference-log rows and billing counters right after a request,
+# so log inline instead of through the write-behind queue
+# (tests/test_inference_writer.py covers the queue itself).
+os.environ.setdefault("INFERENCE_LOG_FLUSH_SECONDS", "0")
+# Same for the sandbox activity heartbeats, and no warm-pool thread starting
+# containers behind the fake Docker clients (tests/test_sandbox_pool.py
+# drives the pool directly).
+os.environ.setdefault("RUNTIME_ACTIVITY_FLUSH_SECONDS", "0")
+os.environ.setdefault("DOCKER_POOL_SIZE", "0")
+os.environ.setdefault("BROWSER_POOL_SIZE", "0")
 
 # Force ALL Pydantic models to fully resolve their schemas in the main thread
 # under the raised recursion limit. Without this, TestClient triggers schema
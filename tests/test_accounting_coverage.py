@@ -179,3 +179,60 @@ def test_agent_count_tokens_includes_tool_trace():
                   "tool_trace": [{"tool": "x", "args": {"a": "b" * 200}, "status": "ok"}]}
     Agent._count_tokens(with_trace)
     assert with_trace["tokens"]["input"] > without  # tool_trace added, never dropped
+
+
+# ─── per-request token usage ────────────────────────────────────────────
+
+def _mock_llm():
+    from llama_index.core.llms import MockLLM
+    from restai.limits.accounting import install_token_usage_handler
+
+    install_token_usage_handler()
+    return MockLLM(max_tokens=8)
+
+
+def test_track_tokens_counts_only_calls_inside_the_block():
+    from restai.limits.accounting import track_tokens
+
+    llm = _mock_llm()
+    llm.complete("outside any request")  # nothing bound: not counted anywhere
+    with track_tokens() as usage:
+        llm.complete("count me in please")
+        llm.complete("and me too")
+    assert usage.calls == 2
+    assert usage.input > 0 and usage.output == 16
+
+
+def test_concurrent_requests_with_the_same_question_are_not_cross_attributed():
+    import threading
+    from restai.limits.accounting import TokenUsage, counting_tokens
+
+    llm = _mock_llm()
+    usages = [TokenUsage() for _ in range(4)]
+    barrier = threading.Barrier(len(usages))
+
+    def request(usage, n):
+        barrier.wait()
+        for _ in range(n):
+            llm.complete("what is the capital of France?")
+
+    threads = [threading.Thread(target=counting_tokens, args=(u, request, u, i + 1)) for i, u in enumerate(usages)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [u.calls for u in usages] == [1, 2, 3, 4]
+    assert [u.output for u in usages] == [8, 16, 24, 32]
+
+
+def test_stream_drained_on_another_thread_is_billed_to_its_request():
+    import threading
+    from restai.limits.accounting import TokenUsage, counting_tokens
+
+    llm = _mock_llm()
+    usage = TokenUsage()
+    gen = counting_tokens(usage, llm.stream_complete, "stream this")
+    drained = threading.Thread(target=lambda: list(gen))
+    drained.start()
+    drained.join()
+    assert usage.calls == 1 and usage.input > 0 and usage.output > 0
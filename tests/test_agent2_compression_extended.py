@@ -1,8 +1,16 @@
 """Extended tests for restai/agent2/compression.py — token counting details,
 summary extraction/rendering, the summarizer call, and the full
-compress_session paths with a faked provider. No network."""
+compress_session paths with a faked provider. No network.
+
+The benchmark of the memoized token counts against re-tokenizing the whole
+session on every budget check takes seconds on the legacy side, so it only
+runs with `RESTAI_BENCHMARKS=1` (add `-s` for the timings)."""
 import asyncio
+import dataclasses
+import os
+import time
 
+import pytest
 
 from restai.agent2 import compression as comp
 from restai.agent2.compression import (
@@ -30,9 +38,13 @@ from restai.agent2.types import (
     TextBlock,
     ToolResultBlock,
     ToolUseBlock,
+    message_from_dict,
+    message_to_dict,
     user_text_message,
 )
 
+BENCHMARK_MESSAGES = 200
+
 
 def _user(text):
     return user_text_message(text)
@@ -124,6 +136,18 @@ def test_count_session_tokens_sums():
     assert count_session_tokens(msgs) == sum(_count_message_tokens(m) for m in msgs)
 
 
+def test_message_tokens_are_memoized_and_serialized(monkeypatch):
+    msg = _assistant("some reply text")
+    assert msg.tokens is None
+    tokens = _count_message_tokens(msg)
+    assert msg.tokens == tokens
+
+    monkeypatch.setattr(comp, "_encode_len", lambda text: 1 / 0)  # would fail if re-tokenized
+    assert _count_message_tokens(msg) == tokens
+    restored = message_from_dict(message_to_dict(msg))
+    assert restored == msg and _count_message_tokens(restored) == tokens
+
+
 # ─── find_safe_split_points ─────────────────────────────────────────────
 
 def test_find_safe_split_points_skips_tool_results():
@@ -346,3 +370,53 @@ def test_compress_session_recursive_prior_summary_forwarded():
     prompt = provider.calls[0]["messages"][0].content[0].text
     assert "previous summary" in prompt  # prior summary forwarded
     assert SUMMARY_MARKER in session.messages[0].content[0].text
+
+
+# ─── benchmark ──────────────────────────────────────────────────────────
+
+def _tool_loop_session(n):
+    msgs = [_user("Audit the repository and fix the failing build " * 5)]
+    while len(msgs) < n:
+        i = len(msgs)
+        msgs.append(Message(role="assistant", content=[
+            TextBlock(text=f"Step {i}: checking the next file."),
+            ToolUseBlock(id=f"t{i}", name="read_file", input={"path": f"src/module_{i}.py", "lines": [1, 400]}),
+        ]))
+        msgs.append(_tool_result(f"def handler_{i}(request):\n    return process(request, retries={i})\n" * 15))
+    return msgs[:n]
+
+
+def _legacy_count(messages):
+    """The old count_session_tokens: every message re-tokenized."""
+    return sum(_count_message_tokens(dataclasses.replace(m, tokens=None)) for m in messages)
+
+
+def test_memoized_counts_match_recounting_a_growing_session():
+    msgs = _tool_loop_session(20)
+    assert [count_session_tokens(msgs[:n]) for n in range(1, 21)] == [_legacy_count(msgs[:n]) for n in range(1, 21)]
+
+
+@pytest.mark.skipif(os.environ.get("RESTAI_BENCHMARKS") != "1", reason="set RESTAI_BENCHMARKS=1 to run")
+def test_benchmark_against_recounting_the_session():
+    msgs = _tool_loop_session(BENCHMARK_MESSAGES)
+
+    # One pre-turn budget check per message appended, as in a tool loop.
+    started = time.perf_counter()
+    legacy = [_legacy_count(msgs[:n]) for n in range(1, len(msgs) + 1)]
+    before = time.perf_counter() - started
+
+    started = time.perf_counter()
+    memoized = [count_session_tokens(msgs[:n]) for n in range(1, len(msgs) + 1)]
+    after = time.perf_counter() - started
+
+    started = time.perf_counter()
+    count_session_tokens(msgs)
+    warm = time.perf_counter() - started
+
+    print(
+        f"\n{BENCHMARK_MESSAGES}-message tool loop, one budget check per message: "
+        f"re-tokenizing {before * 1000:.0f} ms, memoized {after * 1000:.1f} ms; "
+        f"one warm check of the full session {warm * 1000:.3f} ms"
+    )
+    assert memoized == legacy
+    assert after < before
@@ -0,0 +1,224 @@
+"""Unit tests for restai/agent2/mcp_connections.py — MCP sessions shared
+across agent turns — driven through MCPSessionPool(project_id=...) with a
+fake `open_session`. No subprocesses, no network."""
+import asyncio
+import types
+
+import pytest
+
+import restai.agent2.mcp_client as mc
+import restai.agent2.mcp_connections as mconn
+import restai.config as cfg
+from restai.agent2.mcp_client import MCPSessionPool
+from restai.agent2.mcp_connections import MCPBackoff, MCPConnectionManager
+
+
+def _srv(host="npx", args=("-y", "server"), env=None, tools=None):
+    return types.SimpleNamespace(host=host, args=list(args), env=env, headers=None, tools=tools)
+
+
+def _listing(*names):
+    return types.SimpleNamespace(tools=[
+        types.SimpleNamespace(name=n, description=n, inputSchema={"type": "object"}) for n in names
+    ])
+
+
+class FakeServer:
+    """Stands in for one spawned MCP server process."""
+
+    def __init__(self, log, names):
+        self.log = log
+        self.names = names
+        self.listings = 0
+        self.ping_ok = True
+        self.handler = None
+
+    async def __aenter__(self):
+        self.log.append("open")
+        return self
+
+    async def __aexit__(self, *a):
+        self.log.append("close")
+
+    async def list_tools(self):
+        self.listings += 1
+        return _listing(*self.names)
+
+    async def call_tool(self, name, args):
+        return types.SimpleNamespace(content=[types.SimpleNamespace(text=f"{name} ran")], isError=False)
+
+    async def send_ping(self):
+        if not self.ping_ok:
+            raise RuntimeError("broken pipe")
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    monkeypatch.setattr(mconn, "mcp_connections", MCPConnectionManager())
+    monkeypatch.setattr(cfg, "MCP_POOL_MAX_SESSIONS", 8)
+    monkeypatch.setattr(cfg, "MCP_SESSION_IDLE_TTL", 600)
+    monkeypatch.setattr(cfg, "MCP_HEALTH_CHECK_SECONDS", 30)
+    env = types.SimpleNamespace(log=[], opened=[], fail=False, names=["search"])
+
+    async def fake_open(stack, spec, message_handler=None):
+        if env.fail:
+            raise RuntimeError("spawn failed")
+        server = await stack.enter_async_context(FakeServer(env.log, env.names))
+        server.handler = message_handler
+        env.opened.append(server)
+        return server
+
+    monkeypatch.setattr(mc, "open_session", fake_open)
+    return env
+
+
+async def _turn(servers_cfg, project_id=1):
+    async with MCPSessionPool(project_id=project_id) as pool:
+        tools = await pool.connect_servers(servers_cfg)
+        results = [await t.call({}) for t in tools]
+    return [t.name for t in tools], results
+
+
+def test_session_is_shared_across_turns(servers):
+    async def scenario():
+        first = await _turn([_srv()])
+        second = await _turn([_srv()])
+        assert servers.log == ["open"]  # still open after both turns
+        await mconn.mcp_connections.aclose()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second == (["search"], ["search ran"])
+    assert servers.log == ["open", "close"]
+    assert servers.opened[0].listings == 1  # tool listing cached
+    stats = mconn.mcp_connections.stats()
+    assert (stats["connects"], stats["reuses"], stats["reuse_rate"]) == (1, 1, 0.5)
+    assert stats["connect_ms_p50"] is not None
+
+
+def test_sessions_are_per_project_and_config(servers):
+    async def scenario():
+        await _turn([_srv()], project_id=1)
+        await _turn([_srv()], project_id=2)
+        await _turn([_srv(env={"TOKEN": "b"})], project_id=1)
+        await _turn([_srv()], project_id=1)
+
+    asyncio.run(scenario())
+    assert len(servers.opened) == 3
+
+
+def test_allowed_tools_filter_applies_to_the_shared_listing(servers):
+    servers.names = ["search", "delete"]
+
+    async def scenario():
+        return (await _turn([_srv(tools="search")]))[0], (await _turn([_srv()]))[0]
+
+    assert asyncio.run(scenario()) == (["search"], ["search", "delete"])
+    assert len(servers.opened) == 1
+
+
+def test_tools_list_changed_refreshes_the_listing(servers):
+    async def scenario():
+        await _turn([_srv()])
+        servers.opened[0].names = ["search", "fetch"]
+        note = types.SimpleNamespace(root=types.SimpleNamespace(method="notifications/tools/list_changed"))
+        await servers.opened[0].handler(note)
+        return await _turn([_srv()])
+
+    assert asyncio.run(scenario())[0] == ["search", "fetch"]
+    assert servers.opened[0].listings == 2
+    assert mconn.mcp_connections.stats()["tool_list_refreshes"] == 1
+
+
+def test_failed_health_check_reconnects(servers, monkeypatch):
+    monkeypatch.setattr(cfg, "MCP_HEALTH_CHECK_SECONDS", 0)
+
+    async def scenario():
+        await _turn([_srv()])
+        servers.opened[0].ping_ok = False
+        return await _turn([_srv()])
+
+    assert asyncio.run(scenario())[1] == ["search ran"]
+    assert len(servers.opened) == 2 and servers.log[:3] == ["open", "close", "open"]
+    stats = mconn.mcp_connections.stats()
+    assert (stats["health_failures"], stats["reconnects"]) == (1, 1)
+
+
+def test_failing_server_backs_off(servers):
+    servers.fail = True
+    manager = mconn.mcp_connections
+
+    async def scenario():
+        assert await _turn([_srv()]) == ([], [])
+        with pytest.raises(MCPBackoff):
+            await manager.lease(mconn.server_spec(_srv()), 1)
+        # Backoff over and the server is back.
+        key = mconn.config_key(mconn.server_spec(_srv()), 1)
+        manager._backoff[key] = (1, 0.0)
+        servers.fail = False
+        return await _turn([_srv()])
+
+    assert asyncio.run(scenario())[0] == ["search"]
+    stats = manager.stats()
+    assert (stats["connect_failures"], stats["backoff_skips"], stats["reconnects"]) == (1, 1, 1)
+
+
+def test_full_pool_evicts_idle_then_falls_back_per_turn(servers, monkeypatch):
+    monkeypatch.setattr(cfg, "MCP_POOL_MAX_SESSIONS", 1)
+    per_turn = []
+
+    async def fake_stdio(self, command, args, env):
+        per_turn.append(command)
+        return FakeServer([], ["local"])
+
+    monkeypatch.setattr(MCPSessionPool, "_open_stdio_session", fake_stdio)
+
+    async def scenario():
+        await _turn([_srv("a")])
+        await _turn([_srv("b")])  # "a" is idle: evicted
+        async with MCPSessionPool(project_id=1) as held:
+            await held.connect_servers([_srv("b")])
+            # "b" is in use, so "c" can't be pooled this turn.
+            return await _turn([_srv("c")])
+
+    assert asyncio.run(scenario())[0] == ["local"]
+    assert per_turn == ["c"]
+    stats = mconn.mcp_connections.stats()
+    assert (stats["evicted"], stats["overflow"], stats["open_sessions"]) == (1, 1, 1)
+
+
+def test_idle_sessions_close_after_ttl(servers, monkeypatch):
+    async def scenario():
+        await _turn([_srv("a")])
+        monkeypatch.setattr(cfg, "MCP_SESSION_IDLE_TTL", 0)
+        await _turn([_srv("b")])
+
+    asyncio.run(scenario())
+    assert servers.log[:3] == ["open", "close", "open"]
+    assert mconn.mcp_connections.stats()["idle_closed"] == 1
+
+
+def test_sessions_close_with_their_event_loop(servers):
+    asyncio.run(_turn([_srv()]))
+    assert servers.log == ["open", "close"]
+    asyncio.run(_turn([_srv()]))  # a new loop opens its own
+    assert len(servers.opened) == 2
+    assert mconn.mcp_connections.stats()["open_sessions"] == 1
+
+
+def test_pooling_disabled_opens_per_turn(servers, monkeypatch):
+    monkeypatch.setattr(cfg, "MCP_POOL_MAX_SESSIONS", 0)
+    per_turn = []
+
+    async def fake_stdio(self, command, args, env):
+        per_turn.append(command)
+        return FakeServer([], ["local"])
+
+    monkeypatch.setattr(MCPSessionPool, "_open_stdio_session", fake_stdio)
+
+    async def scenario():
+        await _turn([_srv()])
+        await _turn([_srv()])
+
+    asyncio.run(scenario())
+    assert per_turn == ["npx", "npx"] and servers.opened == []
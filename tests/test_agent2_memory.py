@@ -1,22 +1,34 @@
-"""Tests for agent2 session memory (in-memory backend)."""
+"""Tests for agent2 session memory: the in-memory backend, and the
+append-only Redis layout against `fakeredis.aioredis`."""
 import asyncio
+import json
 from collections import OrderedDict
 from types import SimpleNamespace
 from unittest.mock import patch
 
+import pytest
+
+import restai.agent2.memory as memory
 from restai.agent2.memory import (
     LOCAL_SESSION_CAP,
+    clear_session,
     get_session,
     save_session,
 )
 from restai.agent2.types import (
     AgentSession,
+    ImageBlock,
     Message,
     TextBlock,
     ToolUseBlock,
+    message_to_dict,
 )
 
 
+def _text(role, text):
+    return Message(role=role, content=[TextBlock(text=text)])
+
+
 def _make_brain():
     brain = SimpleNamespace(_agent2_sessions=OrderedDict(), _agent2_redis=None, _agent2_redis_url=None)
     return brain
@@ -103,3 +115,162 @@ def test_message_serialization_round_trip(_mock):
     assert isinstance(m1.content[1], ToolUseBlock)
     assert m1.content[1].name == "calculator"
     assert m1.content[1].input == {"expr": "2+2"}
+
+
+@patch("restai.agent2.memory.config.build_redis_url", return_value=None)
+def test_local_save_appends_only_new_messages(_mock):
+    brain = _make_brain()
+
+    async def scenario():
+        await save_session(brain, "chat-1", AgentSession(messages=[_text("user", "a")]))
+        first = brain._agent2_sessions["chat-1"][0]
+        session = await get_session(brain, "chat-1")
+        session.messages.append(_text("assistant", "b"))
+        await save_session(brain, "chat-1", session)
+        return first
+
+    first = asyncio.run(scenario())
+    stored = brain._agent2_sessions["chat-1"]
+    assert stored[0] is first and [m["content"][0]["text"] for m in stored] == ["a", "b"]
+
+
+# ── Redis backend (fakeredis) ──────────────────────────────────────────────
+
+@pytest.fixture
+def redis_brain(monkeypatch):
+    aioredis = pytest.importorskip("fakeredis.aioredis")
+    client = aioredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(memory, "_get_redis_client", lambda brain: client)
+    brain = _make_brain()
+    brain.client = client
+    return brain
+
+
+def _log(brain, chat_id):
+    async def read():
+        gen = await brain.client.get(memory._gen_key(chat_id))
+        return gen, await brain.client.lrange(memory._log_key(chat_id, gen), 0, -1)
+    return asyncio.run(read())
+
+
+def test_redis_save_appends_only_new_messages(redis_brain):
+    async def scenario():
+        session = AgentSession(messages=[_text("user", "hi"), _text("assistant", "hello")])
+        await save_session(redis_brain, "c", session)
+        first = session.persisted.generation
+        session.messages.append(_text("user", "more"))
+        await save_session(redis_brain, "c", session)
+        await save_session(redis_brain, "c", session)  # nothing new
+        return first
+
+    first = asyncio.run(scenario())
+    gen, entries = _log(redis_brain, "c")
+    assert gen == first
+    assert [json.loads(e)["content"][0]["text"] for e in entries] == ["hi", "hello", "more"]
+
+    redis_brain._agent2_decoded.clear()  # a worker that never saw the chat
+    loaded = asyncio.run(get_session(redis_brain, "c"))
+    assert [m.text_content() for m in loaded.messages] == ["hi", "hello", "more"]
+
+
+def test_compression_rewrites_under_a_new_generation(redis_brain):
+    async def scenario():
+        session = AgentSession(messages=[_text("user", f"m{i}") for i in range(4)])
+        await save_session(redis_brain, "c", session)
+        old = session.persisted.generation
+        session.messages = [_text("user", "summary"), session.messages[-1]]
+        await save_session(redis_brain, "c", session)
+        ttl = await redis_brain.client.ttl(memory._log_key("c", old))
+        return old, ttl
+
+    old, ttl = asyncio.run(scenario())
+    gen, entries = _log(redis_brain, "c")
+    assert gen != old and len(entries) == 2
+    assert 0 < ttl <= memory._OLD_LOG_GRACE_SECONDS
+
+
+def test_get_fetches_only_the_tail_past_the_cached_prefix(redis_brain, monkeypatch):
+    async def scenario():
+        session = AgentSession(messages=[_text("user", "a"), _text("assistant", "b")])
+        await save_session(redis_brain, "c", session)
+        # Another worker appends a turn.
+        other = AgentSession(messages=list(session.messages), persisted=session.persisted)
+        other.messages.append(_text("user", "c"))
+        await memory._redis_append(redis_brain.client, "c", session.persisted, other.messages)
+
+        ranges = []
+        real = redis_brain.client.lrange
+
+        async def lrange(key, start, end):
+            ranges.append(start)
+            return await real(key, start, end)
+
+        monkeypatch.setattr(redis_brain.client, "lrange", lrange)
+        loaded = await get_session(redis_brain, "c")
+        cached = await get_session(redis_brain, "c")
+        return session, loaded, cached, ranges
+
+    session, loaded, cached, ranges = asyncio.run(scenario())
+    assert ranges == [2]  # only the new entry was read, then nothing
+    assert [m.text_content() for m in loaded.messages] == ["a", "b", "c"]
+    assert loaded.messages[0] is session.messages[0]
+    assert cached.messages == loaded.messages
+
+
+def test_images_are_stored_once_by_content_hash(redis_brain):
+    data = "QUJD" * 5000
+    shot = ImageBlock(data=data, mime_type="image/png")
+
+    async def scenario():
+        session = AgentSession(messages=[Message(role="user", content=[TextBlock(text="look"), shot])])
+        await save_session(redis_brain, "c", session)
+        session.messages.append(Message(role="user", content=[shot]))
+        await save_session(redis_brain, "c", session)
+        redis_brain._agent2_decoded.clear()
+        return await get_session(redis_brain, "c")
+
+    loaded = asyncio.run(scenario())
+    _, entries = _log(redis_brain, "c")
+    assert all(data not in e for e in entries)
+    images = asyncio.run(redis_brain.client.keys(memory.REDIS_IMAGE_PREFIX + "*"))
+    assert len(images) == 1
+    assert loaded.messages[0].content[1] == shot and loaded.messages[1].content[0] == shot
+
+
+def test_concurrent_writer_forces_a_rewrite(redis_brain):
+    async def scenario():
+        base = AgentSession(messages=[_text("user", "a")])
+        await save_session(redis_brain, "c", base)
+        one = AgentSession(messages=base.messages + [_text("assistant", "one")], persisted=base.persisted)
+        two = AgentSession(messages=base.messages + [_text("assistant", "two")], persisted=base.persisted)
+        await save_session(redis_brain, "c", one)
+        await save_session(redis_brain, "c", two)
+
+    asyncio.run(scenario())
+    _, entries = _log(redis_brain, "c")
+    assert [json.loads(e)["content"][0]["text"] for e in entries] == ["a", "two"]
+
+
+def test_legacy_blob_is_read_then_migrated(redis_brain):
+    legacy = [message_to_dict(_text("user", "old"))]
+
+    async def scenario():
+        await redis_brain.client.set(memory._redis_key("c"), json.dumps(legacy))
+        session = await get_session(redis_brain, "c")
+        session.messages.append(_text("assistant", "new"))
+        await save_session(redis_brain, "c", session)
+        return await redis_brain.client.exists(memory._redis_key("c"))
+
+    assert asyncio.run(scenario()) == 0
+    _, entries = _log(redis_brain, "c")
+    assert [json.loads(e)["content"][0]["text"] for e in entries] == ["old", "new"]
+
+
+def test_clear_session_drops_log_and_cache(redis_brain):
+    async def scenario():
+        await save_session(redis_brain, "c", AgentSession(messages=[_text("user", "a")]))
+        await clear_session(redis_brain, "c")
+        return await get_session(redis_brain, "c")
+
+    assert asyncio.run(scenario()).messages == []
+    assert asyncio.run(redis_brain.client.keys("agent2_session:*")) == []
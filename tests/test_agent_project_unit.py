@@ -830,6 +830,9 @@ def test_chat_mcp_tools_passed_to_runtime(chat_env, monkeypatch):
         entered = 0
         exited = 0
 
+        def __init__(self, project_id=None):
+            FakePool.project_id = project_id
+
         async def __aenter__(self):
             FakePool.entered += 1
             return self
@@ -848,6 +851,7 @@ def test_chat_mcp_tools_passed_to_runtime(chat_env, monkeypatch):
     assert out["answer"] == "ok"
     assert built["extra_tools"] == fake_tools
     assert FakePool.entered == 1 and FakePool.exited == 1
+    assert FakePool.project_id == project.props.id  # sessions shared per project
 
 
 def test_chat_mcp_connect_failure_degrades_to_no_tools(chat_env, monkeypatch):
@@ -855,6 +859,9 @@ def test_chat_mcp_connect_failure_degrades_to_no_tools(chat_env, monkeypatch):
     built = _wire_runtime(monkeypatch, runtime)
 
     class FakePool:
+        def __init__(self, project_id=None):
+            pass
+
         async def __aenter__(self):
             return self
 
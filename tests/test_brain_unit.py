@@ -1,4 +1,4 @@
-"""Unit tests for restai/brain.py — LLM/embedding caches, system-LLM read-through,
+"""Unit tests for restai/brain.py — LLM/embedding/vector object caches, system-LLM read-through,
 image cache (Redis + in-process fallback), chat-store reinit, tool/generator
 listing and post-processing helpers. Pure fakes; no network or real LLMs."""
 import json
@@ -11,10 +11,27 @@ import restai.config as config
 from restai.brain import Brain
 
 
+@pytest.fixture(autouse=True)
+def fresh_object_cache(monkeypatch):
+    """A private restai/object_cache.py cache per test."""
+    from restai.object_cache import ObjectCache
+
+    cache = ObjectCache()
+    monkeypatch.setattr("restai.brain.object_cache", cache)
+    return cache
+
+
+class VersionedDB(types.SimpleNamespace):
+    """Fake DBWrapper exposing the object-cache version row."""
+    version = ("1", "1")
+
+    def get_object_cache_version(self):
+        return self.version
+
+
 def bare_brain() -> Brain:
     """A Brain without running __init__ (skips tokenizer / tool loading)."""
     b = object.__new__(Brain)
-    b.embeddings_cache = {}
     b._classifier_cache = {}
     b._ner_cache = {}
     b._agent2_sessions = {}
@@ -366,6 +383,54 @@ def test_get_llm_resets_system_prompt(monkeypatch):
     assert llm.llm.system_prompt is None
 
 
+def test_get_llm_shares_client_until_options_change(monkeypatch, fresh_object_cache):
+    import restai.tools as tools_mod
+
+    monkeypatch.setattr(tools_mod, "get_llm_class", lambda cn: (FakeInnerLLM, {}))
+    row = _llm_row()
+    db = VersionedDB(get_llm_by_name=lambda name: row)
+    b = bare_brain()
+    first = b.get_llm("fake-llm", db)
+    second = b.get_llm("fake-llm", db)
+    assert second.llm is first.llm
+    assert second is not first
+
+    # Costs are read from the row on every call, without a rebuild.
+    row.input_cost = 5.0
+    assert b.get_llm("fake-llm", db).props.input_cost == 5.0
+    assert b.get_llm("fake-llm", db).llm is first.llm
+
+    row.options = '{"model": "m2"}'
+    rebuilt = b.get_llm("fake-llm", db)
+    assert rebuilt.llm is not first.llm
+    assert rebuilt.llm.kwargs == {"model": "m2"}
+    assert fresh_object_cache.stats["misses"] == 2
+
+
+def test_object_cache_version_bump_drops_entries(monkeypatch, fresh_object_cache):
+    import restai.tools as tools_mod
+
+    monkeypatch.setattr(config, "OBJECT_CACHE_TTL", 0.01)
+    monkeypatch.setattr(tools_mod, "get_llm_class", lambda cn: (FakeInnerLLM, {}))
+    db = VersionedDB(get_llm_by_name=lambda name: _llm_row())
+    b = bare_brain()
+    first = b.get_llm("fake-llm", db).llm
+    # Another worker bumped the version (e.g. a collection reset).
+    db.version = ("2", "1")
+    time.sleep(0.02)
+    assert b.get_llm("fake-llm", db).llm is not first
+
+
+def test_object_cache_ttl_zero_disables_caching(monkeypatch):
+    import restai.tools as tools_mod
+
+    monkeypatch.setattr(config, "OBJECT_CACHE_TTL", 0)
+    monkeypatch.setattr(tools_mod, "get_llm_class", lambda cn: (FakeInnerLLM, {}))
+    db = VersionedDB(get_llm_by_name=lambda name: _llm_row())
+    b = bare_brain()
+    assert b.get_llm("fake-llm", db).llm is not b.get_llm("fake-llm", db).llm
+
+
 def test_get_llm_unknown_returns_none():
     b = bare_brain()
     db = types.SimpleNamespace(get_llm_by_name=lambda name: None)
@@ -421,15 +486,15 @@ def test_get_embedding_builds_and_caches(monkeypatch):
         lambda cn: (FakeEmbeddingImpl, {"base_url": "http://x"}),
     )
     b = bare_brain()
-    db = types.SimpleNamespace(get_embedding_by_name=lambda name: _embedding_row())
+    db = VersionedDB(get_embedding_by_name=lambda name: _embedding_row())
     first = b.get_embedding("fake-emb", db)
     assert first is not None
     assert first.embedding.kwargs == {"model_name": "e1", "base_url": "http://x"}
-    assert b.embeddings_cache["fake-emb"] is first
+    assert b.get_embedding("fake-emb", db) is first
 
-    # Second call is served from the cache even if the DB row vanished.
-    db_gone = types.SimpleNamespace(get_embedding_by_name=lambda name: None)
-    assert b.get_embedding("fake-emb", db_gone) is first
+    # A deleted row is not served from the cache.
+    db_gone = VersionedDB(get_embedding_by_name=lambda name: None)
+    assert b.get_embedding("fake-emb", db_gone) is None
 
 
 def test_get_embedding_unknown_returns_none():
@@ -556,23 +621,17 @@ def test_post_processing_reasoning_empty_think_ignored():
     assert result["answer"] == "<think>   </think>real"
 
 
-def test_post_processing_counting_matches_event():
+def test_post_processing_counting_uses_request_usage():
+    from restai.limits.accounting import TokenUsage
+
     b = bare_brain()
-    ev_other = types.SimpleNamespace(
-        prompt="unrelated", prompt_token_count=1, completion_token_count=1)
-    ev = types.SimpleNamespace(
-        prompt="system stuff…my question", prompt_token_count=42,
-        completion_token_count=7)
-    b.token_counter = types.SimpleNamespace(llm_token_counts=[ev_other, ev])
     out = {"question": "my question", "answer": "the answer"}
-    b.post_processing_counting(out)
-    assert out["tokens"] == {"input": 42, "output": 7, "accuracy": "medium"}
-    assert b.token_counter.llm_token_counts == []  # consumed
+    b.post_processing_counting(out, TokenUsage(input=42, output=7, calls=2))
+    assert out["tokens"] == {"input": 42, "output": 7, "accuracy": "high"}
 
 
 def test_post_processing_counting_fallback_estimates():
     b = bare_brain()
-    b.token_counter = types.SimpleNamespace(llm_token_counts=[])
     out = {"question": "what is love", "answer": "baby don't hurt me"}
     b.post_processing_counting(out)
     assert out["tokens"]["accuracy"] == "low"
@@ -580,6 +639,17 @@ def test_post_processing_counting_fallback_estimates():
     assert out["tokens"]["output"] > 0
 
 
+def test_post_processing_counting_estimates_when_no_call_was_counted():
+    from restai.limits.accounting import TokenUsage
+
+    b = bare_brain()
+    out = {"question": "what is love", "answer": "baby don't hurt me"}
+    b.post_processing_counting(out, TokenUsage())
+    assert out["tokens"]["accuracy"] == "low"
+    assert out["tokens"]["input"] > 0
+    assert out["tokens"]["output"] > 0
+
+
 # ─── find_project ───────────────────────────────────────────────────────
 
 def test_find_project_missing_returns_none():
@@ -611,6 +681,53 @@ def test_find_project_rag_vector_failure_degrades(monkeypatch):
     assert project.props.name == "unit_rag_proj_x"
 
 
+def test_find_project_reuses_vector_wrapper(monkeypatch):
+    from restai.vectordb import tools as vector_tools
+    import restai.tools as tools_mod
+
+    built = []
+
+    class FakeVector:
+        def __init__(self, brain, project, embedding):
+            built.append(project)
+            self.project = project
+            self.embedding = embedding
+
+    monkeypatch.setattr(vector_tools, "find_vector_db", lambda project: FakeVector)
+    monkeypatch.setattr(tools_mod, "get_embedding_class", lambda cn: (FakeEmbeddingImpl, None))
+    row = types.SimpleNamespace(
+        id=778, name="unit_rag_proj_y", embeddings="fake-emb", type="rag",
+        llm="l", system=None, censorship=None, vectorstore="chroma",
+        guard=None, human_name=None, human_description=None, creator=None,
+        public=False, default_prompt=None, options="{}", team_id=None,
+        users=[], team=None, creator_user=None,
+    )
+    emb_row = _embedding_row()
+    db = VersionedDB(
+        get_project_by_id=lambda pid: row,
+        get_embedding_by_name=lambda name: emb_row,
+    )
+    b = bare_brain()
+    first = b.find_project(778, db)
+    row.system = "edited"
+    second = b.find_project(778, db)
+    assert second.vector is first.vector
+    assert len(built) == 1
+    # The shared wrapper points at the latest, freshly-read project.
+    assert second.vector.project is second
+    assert second.props.system == "edited"
+
+    # A rebuilt embedding model gets a new wrapper around it.
+    emb_row.options = '{"model_name": "e2"}'
+    rebuilt = b.find_project(778, db).vector
+    assert rebuilt is not first.vector
+    assert rebuilt.embedding.embedding.kwargs == {"model_name": "e2"}
+
+    row.vectorstore = "pgvector"
+    assert b.find_project(778, db).vector is not rebuilt
+    assert len(built) == 3
+
+
 def test_agent2_session_store_is_plain_dict():
     b = bare_brain()
     b._agent2_sessions["chat1"] = [{"role": "user", "content": "hi"}]
@@ -6,7 +6,9 @@ import io
 import json
 import tarfile
 import types
+from collections import OrderedDict
 
+import docker.errors as derrors
 import pytest
 import requests as real_requests
 
@@ -95,6 +97,8 @@ def browser_env(monkeypatch):
     client = FakeClient(FakeContainers())
     monkeypatch.setattr(rt, "_client", client)
     monkeypatch.setattr(rt, "_client_url", "tcp://fake:2375")
+    monkeypatch.setattr(rt, "_handles", OrderedDict())
+    monkeypatch.setattr(rt, "_sessions", OrderedDict())
     # storage-state: force in-process fallback + fresh dict
     monkeypatch.setattr(cfg, "build_redis_url", lambda: None)
     monkeypatch.setattr(rt, "_storage_local", {})
@@ -422,6 +426,15 @@ def _wire_call(monkeypatch, container=None, port=9999):
     return created
 
 
+def _patch_post(monkeypatch, post):
+    """Route the per-container session's POSTs to `post`, passing the
+    session headers along."""
+    monkeypatch.setattr(
+        rt.requests.Session, "post",
+        lambda self, url, **kw: post(url, headers=dict(self.headers), **kw),
+    )
+
+
 def test_call_posts_json_and_returns_dict(browser_env, monkeypatch):
     created = _wire_call(monkeypatch, port=4321)
     posts = []
@@ -430,7 +443,7 @@ def test_call_posts_json_and_returns_dict(browser_env, monkeypatch):
         posts.append((url, json, timeout))
         return FakeResp(payload={"url": "https://x", "title": "T"})
 
-    monkeypatch.setattr(rt.requests, "post", fake_post)
+    _patch_post(monkeypatch, fake_post)
     out = rt.call("chat1", "/goto", {"url": "https://x"})
     assert out == {"url": "https://x", "title": "T"}
     assert posts[0][0] == "http://127.0.0.1:4321/goto"
@@ -440,20 +453,15 @@ def test_call_posts_json_and_returns_dict(browser_env, monkeypatch):
 
 def test_call_defaults_ephemeral_and_empty_payload(browser_env, monkeypatch):
     created = _wire_call(monkeypatch)
-    monkeypatch.setattr(
-        rt.requests, "post", lambda url, json=None, timeout=None, headers=None: FakeResp()
-    )
+    _patch_post(monkeypatch, lambda url, json=None, timeout=None, headers=None: FakeResp())
     rt.call("", "/health")
     assert created == ["ephemeral"]
 
 
 def test_call_error_status_raises_with_detail(browser_env, monkeypatch):
     _wire_call(monkeypatch)
-    monkeypatch.setattr(
-        rt.requests, "post",
-        lambda url, json=None, timeout=None, headers=None: FakeResp(
-            status_code=500, payload={"error": "no such element"}),
-    )
+    _patch_post(monkeypatch, lambda url, json=None, timeout=None, headers=None: FakeResp(
+        status_code=500, payload={"error": "no such element"}))
     with pytest.raises(RuntimeError, match="no such element"):
         rt.call("chat1", "/click", {"selector": "#x"})
 
@@ -461,7 +469,7 @@ def test_call_error_status_raises_with_detail(browser_env, monkeypatch):
 def test_call_error_status_non_json_uses_text(browser_env, monkeypatch):
     _wire_call(monkeypatch)
     resp = FakeResp(status_code=502, payload=ValueError("not json"), text="bad gateway")
-    monkeypatch.setattr(rt.requests, "post", lambda *a, **k: resp)
+    _patch_post(monkeypatch, lambda *a, **k: resp)
     with pytest.raises(RuntimeError, match="bad gateway"):
         rt.call("chat1", "/content")
 
@@ -478,7 +486,7 @@ def test_call_retries_once_after_connection_error(browser_env, monkeypatch):
             raise real_requests.exceptions.ConnectionError("died")
         return FakeResp(payload={"recovered": True})
 
-    monkeypatch.setattr(rt.requests, "post", flaky_post)
+    _patch_post(monkeypatch, flaky_post)
     out = rt.call("chat1", "/goto", {"url": "https://x"})
     assert out == {"recovered": True}
     assert removed == ["chat1"]
@@ -618,6 +626,152 @@ def test_db_activity_noop_without_chat_id_and_swallows_errors(monkeypatch):
     rt._drop_db_activity("c1")
 
 
+# ─── warm pool, cached handles, keep-alive sessions ─────────────────────
+
+class PoolContainers(FakeContainers):
+    """FakeContainers that also knows container names, like the daemon."""
+
+    def __init__(self):
+        super().__init__()
+        self.by_name = {}
+        self.lookups = []
+
+    def run(self, image, name=None, **kw):
+        self.run_calls.append((image, kw))
+        container = FakeContainer(host_port=7000 + len(self.run_calls), cid=f"c{len(self.run_calls)}")
+        container.labels = dict(kw["labels"])
+        container.name = name
+
+        def rename(new_name):
+            if new_name in self.by_name:
+                raise derrors.APIError("Conflict", response=types.SimpleNamespace(status_code=409))
+            self.by_name[new_name] = self.by_name.pop(container.name)
+            container.name = new_name
+
+        container.rename = rename
+        self.by_name[name] = container
+        return container
+
+    def get(self, name):
+        self.lookups.append(name)
+        if name not in self.by_name:
+            raise derrors.NotFound("No such container")
+        return self.by_name[name]
+
+    def list(self, filters=None, limit=None):
+        self.lookups.append("list")
+        return []
+
+
+@pytest.fixture
+def pool_env(browser_env, monkeypatch):
+    from restai.sandbox_pool import ActivityBuffer, WarmPool
+
+    containers = PoolContainers()
+    browser_env.containers = containers
+    for step in ("_install_micro_server", "_start_micro_server"):
+        monkeypatch.setattr(rt, step, lambda c: None)
+    monkeypatch.setattr(rt, "_ensure_playwright_pkg", lambda c, i: None)
+    monkeypatch.setattr(rt, "_wait_healthy", lambda p: None)
+    monkeypatch.setattr(rt, "_touch_db_activity", lambda *a: None)
+    monkeypatch.setattr("restai.observability.instance._cached_id", "install-1")
+    monkeypatch.setattr(rt, "_pool", WarmPool(
+        "browser", create=rt._create_warm_container, discard=rt._discard_container,
+        size=lambda: 2, spec=rt._browser_spec, max_age=lambda: 450,
+    ))
+    monkeypatch.setattr(rt, "_activity", ActivityBuffer("browser", rt._touch_db_activity, rt._write_db_activity))
+    health = {"ok": True}
+    monkeypatch.setattr(
+        rt.requests.Session, "get",
+        lambda self, url, **kw: FakeResp(status_code=200 if health["ok"] else 503),
+    )
+    posts = []
+    _patch_post(monkeypatch, lambda url, **kw: posts.append((url, kw["headers"])) or FakeResp())
+    return types.SimpleNamespace(containers=containers, health=health, posts=posts)
+
+
+def test_first_call_claims_a_warm_container(pool_env):
+    rt._pool.refill()
+    assert len(pool_env.containers.run_calls) == 2
+    rt.call("chat1", "/goto", {"url": "https://x"})
+    container, port = rt._handles["chat1"][1:]
+    assert container.name == rt._container_name("chat1")
+    assert "restai.browser_chat_id" not in container.labels  # fixed at creation
+    url, headers = pool_env.posts[0]
+    assert url == f"http://127.0.0.1:{port}/goto"
+    assert headers["Authorization"] == f"Bearer {container.labels['restai.browser_token']}"
+    assert len(pool_env.containers.run_calls) == 2  # nothing started for the chat
+    assert rt.stats()["pool"]["claimed"] == 1
+
+
+def test_later_calls_reuse_the_handle_and_session(pool_env):
+    rt.call("chat1", "/goto", {"url": "https://x"})
+    session = rt._sessions[rt._handles["chat1"][1].id]
+    pool_env.containers.lookups.clear()
+    rt.call("chat1", "/content")
+    rt.call("chat1", "/content")
+    assert pool_env.containers.lookups == []
+    assert list(rt._sessions.values()) == [session]
+    assert rt.stats()["pool"]["misses"] == 1
+
+
+def test_other_worker_finds_the_claimed_container_by_name(pool_env):
+    rt._pool.refill()
+    rt.call("chat1", "/goto", {"url": "https://x"})
+    mine = rt._handles["chat1"][1]
+    rt._handles.clear()  # a sibling worker with an empty cache
+    assert rt._get_or_create("chat1")[0] is mine
+
+
+def test_unhealthy_warm_container_is_discarded_at_claim(pool_env):
+    rt._pool.refill()
+    pool_env.health["ok"] = False
+    container, _ = rt._get_or_create("chat1")
+    assert container.labels["restai.browser_chat_id"] == "chat1"  # created on demand
+    assert rt._pool.stats()["size"] == 0
+    assert sum(1 for c in pool_env.containers.by_name.values() if c.stopped) == 2
+
+
+def test_remove_container_closes_the_session(pool_env):
+    rt.call("chat1", "/goto", {"url": "https://x"})
+    container = rt._handles["chat1"][1]
+    rt.remove_container("chat1")
+    assert container.stopped and rt._handles == {} and rt._sessions == {}
+
+
+def test_least_recently_used_handles_are_evicted_with_their_sessions(pool_env, monkeypatch):
+    monkeypatch.setattr(rt, "_MAX_HANDLES", 2)
+    for chat_id in ("chat1", "chat2"):
+        rt.call(chat_id, "/content")
+    idle = rt._handles["chat2"][1]
+    closed = []
+    monkeypatch.setattr(rt._sessions[idle.id], "close", lambda: closed.append(idle.id))
+    rt.call("chat1", "/content")
+    rt.call("chat3", "/content")  # chat2 is now the least recently used
+    assert list(rt._handles) == ["chat1", "chat3"]
+    assert idle.id not in rt._sessions and len(rt._sessions) == 2
+    assert closed == [idle.id]
+
+
+def test_buffered_heartbeats_flush_in_one_transaction(pool_env, monkeypatch):
+    import restai.database as rdb
+    writes = []
+    fake_db = types.SimpleNamespace(
+        db=types.SimpleNamespace(commit=lambda: writes.append("commit"), rollback=lambda: None,
+                                 close=lambda: None),
+        upsert_browser_activity=lambda chat_id, container_id, when=None, commit=True: writes.append(
+            (chat_id, container_id, commit)),
+    )
+    monkeypatch.setattr(rdb, "open_db_wrapper", lambda: fake_db)
+    monkeypatch.setattr(cfg, "RUNTIME_ACTIVITY_FLUSH_SECONDS", 3600)
+    rt._activity.start()
+    for _ in range(5):
+        rt.call("chat1", "/content")
+    assert writes == []
+    rt._activity.stop()
+    assert writes == [("chat1", rt._handles["chat1"][1].id, False), "commit"]
+
+
 # ─── browser tool gating: domain allowlist + eval opt-in ────────────────
 
 def _project(options: dict):
@@ -736,7 +890,7 @@ def test_call_sends_the_container_token(browser_env, monkeypatch):
         seen.update(headers or {})
         return FakeResp()
 
-    monkeypatch.setattr(rt.requests, "post", fake_post)
+    _patch_post(monkeypatch, fake_post)
     rt.call("chat1", "/goto", {"url": "https://x"})
     assert seen.get("Authorization") == "Bearer tok-abc"
 
@@ -752,7 +906,7 @@ def test_call_replaces_a_container_that_rejects_the_token(browser_env, monkeypat
         calls.append(url)
         return FakeResp(status_code=401) if len(calls) == 1 else FakeResp()
 
-    monkeypatch.setattr(rt.requests, "post", post)
+    _patch_post(monkeypatch, post)
     rt.call("chat1", "/content")
     assert removed == ["chat1"]
     assert len(calls) == 2
@@ -15,6 +15,7 @@ import crons.browser_cleanup as cbc
 class FakeContainer:
     def __init__(self, labels, exec_ids=None):
         self.labels = labels
+        self.id = "id-" + labels.get("restai.browser_chat_id", "x")
         self.short_id = "beef" + labels.get("restai.browser_chat_id", "x")[:6]
         self.attrs = {"ExecIDs": exec_ids or []}
         self.stopped = False
@@ -40,6 +41,8 @@ def _run(monkeypatch, containers, activity_rows, enabled=True,
     client.containers.list.return_value = containers
     client.api.exec_inspect.return_value = {"Running": exec_running}
 
+    for row in activity_rows:
+        row.__dict__.setdefault("container_id", None)
     db = MagicMock()
     db.db.query.return_value.all.return_value = activity_rows
 
@@ -135,3 +138,16 @@ def test_stop_failure_swallowed_and_others_continue(monkeypatch):
     ]
     _run(monkeypatch, [bad, good], rows)  # must not raise
     assert good.stopped is True
+
+
+def test_claimed_pool_container_matched_by_container_id(monkeypatch):
+    # A warm-pool container claimed for a chat keeps its creation-time
+    # labels (no chat id, old created_at); its activity row names it by id.
+    old = str(int(time.time()) - 7200)
+    claimed = FakeContainer({"restai.browser_pool": "warm", "restai.created_at": old})
+    unclaimed = FakeContainer({"restai.browser_pool": "warm", "restai.created_at": old})
+    unclaimed.id = "id-unclaimed"
+    rows = [SimpleNamespace(chat_id="chat1", container_id=claimed.id, last_activity=datetime.now(timezone.utc))]
+    _run(monkeypatch, [claimed, unclaimed], rows)
+    assert claimed.stopped is False
+    assert unclaimed.stopped is True
@@ -0,0 +1,67 @@
+"""Unit tests for crons/vector_catalog.py — slot scheduling, the drift check
+per backend kind, and the explicit per-project reconcile."""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import crons.vector_catalog as cvc
+
+
+def _brain(exact_count=True, drifted=False):
+    vector = MagicMock(exact_count=exact_count)
+    vector.catalog_drifted.return_value = drifted
+    brain = MagicMock()
+    brain.find_project.return_value = SimpleNamespace(vector=vector)
+    return brain, vector
+
+
+def test_each_project_is_due_once_per_interval():
+    interval = cvc.RECONCILE_INTERVAL_MINUTES
+    due = [minute for minute in range(interval) if cvc._is_due(7, minute * 60.0)]
+    assert due == [7]
+    assert cvc._is_due(7 + interval, 7 * 60.0)
+
+
+def test_exact_backend_is_only_rebuilt_when_drifted():
+    brain, vector = _brain(drifted=False)
+    with patch.object(cvc, "open_db_wrapper"):
+        assert cvc._reconcile_project(brain, 1, force=False) is False
+    vector.reconcile_catalog.assert_not_called()
+
+    brain, vector = _brain(drifted=True)
+    with patch.object(cvc, "open_db_wrapper"):
+        assert cvc._reconcile_project(brain, 1, force=False) is True
+    vector.reconcile_catalog.assert_called_once()
+
+
+def test_inexact_backend_is_always_rebuilt_when_due():
+    brain, vector = _brain(exact_count=False)
+    with patch.object(cvc, "open_db_wrapper"):
+        assert cvc._reconcile_project(brain, 1, force=False) is True
+    vector.catalog_drifted.assert_not_called()
+    vector.reconcile_catalog.assert_called_once()
+
+
+def test_forced_reconcile_skips_the_drift_check():
+    brain, vector = _brain(drifted=False)
+    with patch.object(cvc, "open_db_wrapper"):
+        assert cvc._reconcile_project(brain, 1, force=True) is True
+    vector.reconcile_catalog.assert_called_once()
+
+
+def test_project_without_a_vector_store_is_skipped():
+    brain = MagicMock()
+    brain.find_project.return_value = SimpleNamespace(vector=None)
+    with patch.object(cvc, "open_db_wrapper"):
+        assert cvc._reconcile_project(brain, 1, force=True) is False
+
+
+def test_run_isolates_a_crashing_project():
+    brain = MagicMock()
+    with patch.object(cvc, "ensure_settings_table"), \
+         patch.object(cvc, "CronLogger") as cron_cls, \
+         patch.object(cvc, "Brain", return_value=brain), \
+         patch.object(cvc, "_reconcile_project", side_effect=[RuntimeError("store down"), True]) as rp:
+        cvc._run([3, 4])
+    assert [call.args[1] for call in rp.call_args_list] == [3, 4]
+    cron_cls.return_value.finish.assert_called_once_with(items_processed=1)
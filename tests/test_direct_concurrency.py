@@ -0,0 +1,239 @@
+"""Load benchmarks for restai/routers/direct.py. The translated path of
+/v1/chat/completions: R concurrent requests with n choices each against a
+slow, sync-only LLM on ONE event loop. The "before" numbers replay the old
+handler body (sync `llm.chat()` on the loop, choices one after another);
+"after" goes through `chat_completions`. /v1/embeddings: a large input split into the provider's
+batch size and embedded concurrently. By default the tests assert that
+the provider calls overlap; the wall-clock comparisons run with
+`RESTAI_BENCHMARKS=1` (`-s` to see the timings)."""
+import asyncio
+import os
+import threading
+import time
+import types
+from typing import Any
+
+from fastapi import BackgroundTasks
+from llama_index.core.llms import ChatMessage, ChatResponse, CompletionResponse, CustomLLM, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+from pydantic import PrivateAttr
+
+from restai.models.models import OpenAIChatCompletionRequest
+from restai.routers import direct
+
+REQUESTS = 6
+N = 3
+DELAY = 0.05
+BENCHMARK = os.environ.get("RESTAI_BENCHMARKS") == "1"
+
+
+class _Overlap:
+    """Counts the provider calls in flight and the most seen at once."""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def sleep(self, seconds):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(seconds)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+class _SlowLLM(CustomLLM):
+    """Blocks like a sync HTTP client; only `complete` is implemented, so
+    `achat` is CustomLLM's sync-on-the-loop fallback."""
+
+    _calls: _Overlap = PrivateAttr(default_factory=_Overlap)
+
+    @property
+    def calls(self) -> _Overlap:
+        return self._calls
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(context_window=4096, num_output=64, is_chat_model=False)
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        self._calls.sleep(DELAY)
+        return CompletionResponse(text="pong")
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        for tok in ("po", "ng"):
+            self._calls.sleep(DELAY / 2)
+            yield CompletionResponse(text=tok, delta=tok)
+
+
+class _AsyncLLM:
+    """A provider with a real async client: must be awaited, never offloaded."""
+
+    def __init__(self):
+        self.sync_calls = 0
+        self.active = 0
+        self.peak = 0
+
+    def chat(self, messages, **kwargs):
+        self.sync_calls += 1
+        raise AssertionError("sync chat called")
+
+    async def achat(self, messages, **kwargs):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(DELAY)
+        self.active -= 1
+        return ChatResponse(message=ChatMessage(role="assistant", content="pong"))
+
+
+def _setup(monkeypatch, llm):
+    props = types.SimpleNamespace(class_name="Ollama", input_cost=0.0, output_cost=0.0, options={})
+    brain = types.SimpleNamespace(get_llm=lambda name, db: types.SimpleNamespace(llm=llm, props=props))
+    request = types.SimpleNamespace(app=types.SimpleNamespace(state=types.SimpleNamespace(brain=brain)))
+    monkeypatch.setattr(direct, "check_api_key_quota", lambda user, db: None)
+    monkeypatch.setattr(direct, "resolve_team_for_llm", lambda user, model, db: None)
+    monkeypatch.setattr(direct, "log_direct_usage", lambda *a, **kw: None)
+    user = types.SimpleNamespace(id=1, api_key_id=None, is_restricted=False)
+    return request, user
+
+
+def _body(stream=False):
+    return OpenAIChatCompletionRequest(
+        model="slow", messages=[{"role": "user", "content": "ping"}], n=N, stream=stream,
+    )
+
+
+async def _before(llm):
+    """The pre-change handler body: sync calls on the loop, one choice at a time."""
+    messages = direct.oc.convert_messages([{"role": "user", "content": "ping"}])
+    return [llm.chat(messages) for _ in range(N)]
+
+
+async def _timed(coros):
+    started = time.perf_counter()
+    results = await asyncio.gather(*coros)
+    return results, time.perf_counter() - started
+
+
+def test_translated_path_throughput(monkeypatch):
+    llm = _SlowLLM()
+    request, user = _setup(monkeypatch, llm)
+
+    results, after = asyncio.run(_timed([
+        direct.chat_completions(request, _body(), BackgroundTasks(), user, None)
+        for _ in range(REQUESTS)
+    ]))
+    for resp in results:
+        assert [c.index for c in resp.choices] == list(range(N))
+        assert all(c.message.content == "pong" for c in resp.choices)
+    # Offloaded: the sync calls of concurrent requests run side by side.
+    assert llm.calls.peak > 1
+
+    if BENCHMARK:
+        _, before = asyncio.run(_timed([_before(llm) for _ in range(REQUESTS)]))
+        print(
+            f"\n{REQUESTS} requests x n={N}: before {before * 1000:.0f} ms "
+            f"({REQUESTS / before:.1f} req/s), after {after * 1000:.0f} ms ({REQUESTS / after:.1f} req/s)"
+        )
+        # Serial on the loop: every choice of every request back to back.
+        assert before >= REQUESTS * N * DELAY
+        assert after < before / 4
+
+
+def test_native_async_llm_is_awaited(monkeypatch):
+    llm = _AsyncLLM()
+    request, user = _setup(monkeypatch, llm)
+    resp, elapsed = asyncio.run(_timed([
+        direct.chat_completions(request, _body(), BackgroundTasks(), user, None)
+    ]))
+    assert llm.sync_calls == 0
+    assert len(resp[0].choices) == N
+    # The n awaits overlap.
+    assert llm.peak == N
+    if BENCHMARK:
+        assert elapsed < N * DELAY
+
+
+def test_stream_does_not_block_the_loop(monkeypatch):
+    llm = _SlowLLM()
+    request, user = _setup(monkeypatch, llm)
+
+    async def drain(resp):
+        return [chunk async for chunk in resp.body_iterator]
+
+    async def run():
+        gaps, stop = [], asyncio.Event()
+        beats_during_calls = 0
+
+        async def heartbeat():
+            nonlocal beats_during_calls
+            last = time.perf_counter()
+            while not stop.is_set():
+                await asyncio.sleep(0.005)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+                beats_during_calls += llm.calls.active > 0
+
+        beat = asyncio.create_task(heartbeat())
+        responses = [
+            await direct.chat_completions(request, _body(stream=True), BackgroundTasks(), user, None)
+            for _ in range(REQUESTS)
+        ]
+        chunks = await asyncio.gather(*(drain(r) for r in responses))
+        stop.set()
+        await beat
+        return chunks, max(gaps), beats_during_calls
+
+    chunks, worst_gap, beats_during_calls = asyncio.run(run())
+    for stream in chunks:
+        assert stream[-1] == "data: [DONE]\n\n"
+        assert sum('"content": "po"' in c for c in stream) == 1
+    # The loop keeps ticking while the blocking token reads are in flight.
+    assert beats_during_calls > 0
+    assert llm.calls.peak > 1
+    if BENCHMARK:
+        assert worst_gap < DELAY / 2
+
+
+class _SlowEmbedding:
+    embed_batch_size = 10
+
+    def __init__(self):
+        self.batches = []
+        self.calls = _Overlap()
+
+    def get_text_embedding_batch(self, texts):
+        self.batches.append(len(texts))
+        self.calls.sleep(DELAY)
+        return [[float(len(t)), 0.5, 0.25] for t in texts]
+
+
+def test_embeddings_sub_batches_run_concurrently(monkeypatch):
+    import json
+
+    model = _SlowEmbedding()
+    request, user = _setup(monkeypatch, None)
+    request.app.state.brain.get_embedding = lambda name, db: types.SimpleNamespace(embedding=model)
+    monkeypatch.setattr(direct, "resolve_team_for_embedding", lambda user, model, db: None)
+    monkeypatch.setattr(direct.config, "EMBEDDING_SUB_BATCH_CONCURRENCY", 4)
+    texts = [f"text {i}" * (i % 3 + 1) for i in range(40)]
+    body = direct.OpenAIEmbeddingRequest(model="slow-emb", input=texts, dimensions=2)
+
+    resp, elapsed = asyncio.run(_timed([direct.embeddings(request, body, BackgroundTasks(), user, None)]))
+    if BENCHMARK:
+        print(f"\n40 inputs in 4 sub-batches: {elapsed * 1000:.0f} ms (serial ~{4 * DELAY * 1000:.0f} ms)")
+    out = json.loads(resp[0].body)
+    assert model.batches == [10, 10, 10, 10]
+    assert [d["index"] for d in out["data"]] == list(range(40))
+    assert out["data"][7]["embedding"] == [float(len(texts[7])), 0.5]
+    assert out["usage"]["prompt_tokens"] == sum(direct.tokens_from_string(t) for t in texts)
+    assert model.calls.peak > 1
+    if BENCHMARK:
+        assert elapsed < 3 * DELAY
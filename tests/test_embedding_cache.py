@@ -0,0 +1,135 @@
+"""Unit tests for restai/embedding_cache.py — the vector cache wrapped around
+every embedding model by Brain.get_embedding. Pure fakes; no provider."""
+import asyncio
+from types import SimpleNamespace
+
+from llama_index.core.embeddings import MockEmbedding
+from pydantic import PrivateAttr
+
+from restai.embedding_cache import (
+    CachedEmbedding,
+    EmbeddingVectorCache,
+    _LRU,
+    options_hash,
+)
+
+
+class _CountingEmbedding(MockEmbedding):
+    """Distinct vector per text; records what actually reached the model."""
+
+    _seen: list = PrivateAttr(default_factory=list)
+
+    def __init__(self, **kwargs):
+        super().__init__(embed_dim=3, **kwargs)
+
+    @property
+    def seen(self):
+        return self._seen
+
+    def _vec(self, text):
+        self._seen.append(text)
+        return [float(len(text)), 1.0, 0.5]
+
+    def _get_query_embedding(self, query):
+        return self._vec(query)
+
+    def _get_text_embedding(self, text):
+        return self._vec(text)
+
+    def _get_text_embeddings(self, texts):
+        return [self._vec(t) for t in texts]
+
+    async def _aget_query_embedding(self, query):
+        return self._vec(query)
+
+    async def _aget_text_embeddings(self, texts):
+        return [self._vec(t) for t in texts]
+
+
+def _cached(cache=None, namespace="emb:abc"):
+    inner = _CountingEmbedding()
+    return CachedEmbedding(inner, namespace, cache=cache or EmbeddingVectorCache(1 << 20)), inner
+
+
+def test_repeated_query_hits_cache():
+    emb, inner = _cached()
+    first = emb.get_query_embedding("what is restai?")
+    second = emb.get_query_embedding("  what is restai?\n")
+    assert first == second == [15.0, 1.0, 0.5]
+    assert inner.seen == ["what is restai?"]
+    stats = emb._cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_batch_only_sends_misses_to_model():
+    emb, inner = _cached()
+    emb.get_text_embedding_batch(["a", "bb"])
+    out = emb.get_text_embedding_batch(["bb", "ccc", "a"])
+    assert [v[0] for v in out] == [2.0, 3.0, 1.0]
+    assert inner.seen == ["a", "bb", "ccc"]
+
+
+def test_query_and_text_embeddings_are_kept_apart():
+    emb, inner = _cached()
+    emb.get_query_embedding("same")
+    emb.get_text_embedding("same")
+    assert inner.seen == ["same", "same"]
+
+
+def test_namespace_separates_models_and_options():
+    cache = EmbeddingVectorCache(1 << 20)
+    a, inner_a = _cached(cache, "emb:" + options_hash("Ollama", '{"model": "a"}'))
+    b, inner_b = _cached(cache, "emb:" + options_hash("Ollama", '{"model": "b"}'))
+    a.get_text_embedding("x")
+    b.get_text_embedding("x")
+    assert inner_a.seen == inner_b.seen == ["x"]
+    # Key order in the options JSON doesn't matter.
+    assert options_hash("Ollama", '{"a": 1, "b": 2}') == options_hash("Ollama", '{"b": 2, "a": 1}')
+
+
+def test_async_paths_share_the_cache():
+    emb, inner = _cached()
+    emb.get_query_embedding("q")
+    assert asyncio.run(emb.aget_query_embedding("q")) == [1.0, 1.0, 0.5]
+    asyncio.run(emb.aget_text_embedding_batch(["t1", "t2"]))
+    emb.get_text_embedding_batch(["t2", "t1"])
+    assert inner.seen == ["q", "t1", "t2"]
+
+
+def test_lru_evicts_by_byte_budget():
+    lru = _LRU(max_bytes=24)
+    lru.put("a", b"x" * 12)
+    lru.put("b", b"x" * 12)
+    lru.get("a")
+    lru.put("c", b"x" * 12)
+    assert lru.get("b") is None
+    assert lru.get("a") is not None and lru.get("c") is not None
+    assert lru.bytes == 24
+    lru.put("huge", b"x" * 100)
+    assert lru.get("huge") is None
+
+
+def test_disk_tier_shared_between_caches(tmp_path):
+    first = EmbeddingVectorCache(1 << 20, backend="disk", root=str(tmp_path))
+    second = EmbeddingVectorCache(1 << 20, backend="disk", root=str(tmp_path))
+    emb1, inner1 = _cached(first)
+    emb2, inner2 = _cached(second)
+    emb1.get_text_embedding("shared text")
+    assert emb2.get_text_embedding("shared text") == [11.0, 1.0, 0.5]
+    assert inner2.seen == []
+    assert second.stats()["shared_hits"] == 1
+
+
+def test_shared_tier_errors_are_misses_not_failures():
+    cache = EmbeddingVectorCache(1 << 20)
+    cache.shared = SimpleNamespace(
+        name="redis",
+        get_many=lambda keys: (_ for _ in ()).throw(ConnectionError("down")),
+        put_many=lambda items: (_ for _ in ()).throw(ConnectionError("down")),
+    )
+    emb, inner = _cached(cache)
+    assert emb.get_text_embedding("t") == [1.0, 1.0, 0.5]
+    assert emb.get_text_embedding("t") == [1.0, 1.0, 0.5]
+    assert inner.seen == ["t"]
+    assert cache.stats()["errors"] == 2
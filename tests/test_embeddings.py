@@ -116,3 +116,11 @@ def test_delete_embedding_not_found(client):
         auth=("admin", RESTAI_DEFAULT_PASSWORD),
     )
     assert response.status_code == 404
+
+
+def test_embeddings_cache_stats(client):
+    response = client.get("/embeddings/cache/stats", auth=("admin", RESTAI_DEFAULT_PASSWORD))
+    assert response.status_code == 200
+    data = response.json()
+    for key in ("hits", "shared_hits", "misses", "hit_rate", "entries", "bytes", "backend"):
+        assert key in data
@@ -0,0 +1,117 @@
+"""Unit tests for restai/limits/guard_cache.py through `Guard.verify`."""
+import types
+from unittest.mock import patch
+
+import pytest
+from llama_index.core.base.llms.types import ChatMessage, ChatResponse, MessageRole
+
+from restai import config
+from restai.limits import guard_cache
+from restai.limits.guard import Guard
+from restai.projects.base import _account_guard
+
+
+class _GuardLLM:
+    def __init__(self, answer="SAFE"):
+        self.answer = answer
+        self.calls = 0
+
+    def chat(self, messages):
+        self.calls += 1
+        if isinstance(self.answer, Exception):
+            raise self.answer
+        return ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=self.answer))
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch):
+    c = guard_cache.GuardVerdictCache()
+    monkeypatch.setattr(guard_cache, "guard_verdict_cache", c)
+    with patch("restai.limits.guard_cache.config.build_redis_url", return_value=None):
+        yield c
+
+
+def _guard(llm, system="Answer SAFE or UNSAFE.", project_id=7):
+    props = types.SimpleNamespace(id=project_id, llm="guard-llm", system=system, team_id=1)
+    guard = Guard.__new__(Guard)
+    guard.brain = types.SimpleNamespace(get_llm=lambda name, db: types.SimpleNamespace(llm=llm))
+    guard.db = None
+    guard.guard_ref = str(project_id)
+    guard.project = types.SimpleNamespace(props=props)
+    return guard
+
+
+def test_repeated_text_skips_the_llm(cache):
+    llm = _GuardLLM("UNSAFE")
+    guard = _guard(llm)
+    first = guard.verify("Hello  there", phase="input")
+    second = guard.verify(" hello there\n", phase="input")
+    assert llm.calls == 1
+    assert first.blocked and second.blocked
+    assert not first.cached and second.cached
+    assert second.raw_response == "UNSAFE"
+    assert (second.input_tokens, second.output_tokens) == (0, 0)
+
+
+def test_prompt_phase_and_project_are_part_of_the_key():
+    llm = _GuardLLM()
+    _guard(llm).verify("hi")
+    _guard(llm).verify("hi", phase="output")
+    _guard(llm, system="Be stricter.").verify("hi")
+    _guard(llm, project_id=8).verify("hi")
+    assert llm.calls == 4
+    _guard(llm).verify("hi")
+    assert llm.calls == 4
+
+
+def test_failed_guard_call_is_not_cached():
+    llm = _GuardLLM(RuntimeError("upstream down"))
+    guard = _guard(llm)
+    assert guard.verify("hi").blocked
+    llm.answer = "SAFE"
+    assert not guard.verify("hi").blocked
+    assert llm.calls == 2
+
+
+def test_ttl_zero_disables(monkeypatch):
+    monkeypatch.setattr(config, "GUARD_VERDICT_CACHE_TTL", 0)
+    llm = _GuardLLM()
+    guard = _guard(llm)
+    guard.verify("hi")
+    guard.verify("hi")
+    assert llm.calls == 2
+
+
+def test_cached_verdict_is_not_accounted():
+    guard = _guard(_GuardLLM())
+    guard.verify("hi")
+    cached = guard.verify("hi")
+    with patch("restai.tools.log_inference") as log:
+        _account_guard(guard, None, "hi", cached, None)
+    log.assert_not_called()
+
+
+def test_verdicts_are_shared_through_redis(cache):
+    class _Redis:
+        def __init__(self):
+            self.data = {}
+
+        def get(self, key):
+            return self.data.get(key)
+
+        def set(self, key, value, ex=None):
+            self.data[key] = value.encode()
+
+        def ttl(self, key):
+            return 60
+
+    shared = _Redis()
+    other = guard_cache.GuardVerdictCache()
+    cache._redis = other._redis = lambda: shared
+    llm = _GuardLLM("UNSAFE")
+    _guard(llm).verify("hi")
+    with patch.object(guard_cache, "guard_verdict_cache", other):
+        result = _guard(llm).verify("hi")
+    assert llm.calls == 1
+    assert result.cached and result.blocked
+    assert other.stats["redis_hits"] == 1
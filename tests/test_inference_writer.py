@@ -0,0 +1,289 @@
+"""Unit tests for restai/observability/inference_writer.py — the write-behind
+queue for inference-log rows and their token / wallet billing. Runs against
+the real sqlite test database; the flush thread is parked on a long interval
+so every test drives `flush()` itself."""
+import os
+import random
+import time
+import types
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from restai import config
+import restai.observability.inference_writer as iw
+from restai.database import open_db_wrapper
+from restai.models.databasemodels import (
+    ApiKeyDatabase,
+    OutputDatabase,
+    TeamBalanceTransactionDatabase,
+    TeamDatabase,
+    UserDatabase,
+)
+
+suffix = str(random.randint(0, 1000000))
+
+
+@pytest.fixture()
+def db():
+    wrapper = open_db_wrapper()
+    yield wrapper
+    wrapper.db.close()
+
+
+@pytest.fixture()
+def admin_id(db):
+    return db.db.query(UserDatabase).order_by(UserDatabase.id).first().id
+
+
+@pytest.fixture()
+def writer(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "INFERENCE_LOG_FLUSH_SECONDS", 3600)
+    monkeypatch.setattr(config, "INFERENCE_LOG_SPILL_DIR", str(tmp_path))
+    w = iw.InferenceLogWriter()
+    # Stand in for the process-wide writer the gates and loggers consult.
+    monkeypatch.setattr(iw, "inference_writer", w)
+    monkeypatch.setattr("restai.limits.budget.inference_writer", w)
+    w.start()
+    yield w
+    w.stop()
+
+
+@pytest.fixture()
+def api_key(db, admin_id):
+    key = ApiKeyDatabase(
+        user_id=admin_id,
+        key_hash=f"iw-hash-{suffix}-{random.randint(0, 10**9)}",
+        encrypted_key="iw-enc",
+        key_prefix="restai-i",
+        description="inference writer test key",
+        created_at=datetime.now(timezone.utc),
+        tokens_used_this_month=0,
+        token_quota_monthly=150,
+    )
+    db.db.add(key)
+    db.db.commit()
+    yield key
+    db.db.query(OutputDatabase).filter(OutputDatabase.api_key_id == key.id).delete()
+    db.db.delete(key)
+    db.db.commit()
+
+
+@pytest.fixture()
+def team(db):
+    row = TeamDatabase(name=f"iw_team_{suffix}_{random.randint(0, 10**9)}", balance=10.0)
+    db.db.add(row)
+    db.db.commit()
+    yield row
+    db.db.query(OutputDatabase).filter(OutputDatabase.team_id == row.id).delete()
+    db.db.query(TeamBalanceTransactionDatabase).filter(TeamBalanceTransactionDatabase.team_id == row.id).delete()
+    db.db.delete(row)
+    db.db.commit()
+
+
+def _row(user_id, marker, **kw):
+    row = dict(
+        user_id=user_id, project_id=None, llm="iw-llm", question=marker, answer="a",
+        date=datetime.now(timezone.utc), input_tokens=40, output_tokens=20,
+        input_cost=0.0, output_cost=0.0,
+    )
+    row.update(kw)
+    return row
+
+
+def _count(db, marker):
+    db.db.expire_all()
+    return db.db.query(OutputDatabase).filter(OutputDatabase.question == marker).count()
+
+
+def test_submit_is_refused_when_not_running(admin_id):
+    w = iw.InferenceLogWriter()
+    assert w.submit("output", [_row(admin_id, "never")]) is False
+    assert w.stats()["depth"] == 0
+
+
+def test_batch_writes_rows_and_aggregates_token_billing(writer, db, admin_id, api_key):
+    from restai.limits.budget import check_api_key_quota
+
+    marker = f"iw_tokens_{suffix}"
+    writer.submit("output", [_row(admin_id, marker, api_key_id=api_key.id)])
+    writer.submit("output", [_row(admin_id, marker, api_key_id=api_key.id, date=None)])
+    assert _count(db, marker) == 0
+    assert writer.pending_api_key_tokens(api_key.id) == 120
+
+    # The quota gate counts queued tokens: 0 committed + 120 queued < 150...
+    user = types.SimpleNamespace(api_key_id=api_key.id)
+    check_api_key_quota(user, db)
+    writer.submit("output", [_row(admin_id, marker, api_key_id=api_key.id)])
+    # ...and 180 queued is over it, before anything reached the table.
+    with pytest.raises(HTTPException) as exc:
+        check_api_key_quota(user, db)
+    assert exc.value.status_code == 429
+
+    assert writer.flush() is True
+    assert _count(db, marker) == 3
+    db.db.refresh(api_key)
+    assert api_key.tokens_used_this_month == 180
+    assert writer.pending_api_key_tokens(api_key.id) == 0
+    stats = writer.stats()
+    assert stats["written"] == 3 and stats["flushes"] == 1 and stats["depth"] == 0
+
+
+def test_wallet_is_debited_once_per_team_user_per_batch(writer, db, admin_id, team):
+    from restai.limits.budget import enforce_cost_budgets
+
+    marker = f"iw_wallet_{suffix}"
+    for _ in range(3):
+        writer.submit("output", [_row(admin_id, marker, team_id=team.id, input_cost=2.0, output_cost=1.0)])
+    assert writer.pending_team_charge(team.id) == pytest.approx(9.0)
+    assert writer.pending_spend(("team", team.id)) == pytest.approx(9.0)
+
+    writer.submit("output", [_row(admin_id, marker, team_id=team.id, input_cost=1.0)])
+    # 10.0 balance - 10.0 queued: depleted before the flush.
+    member = types.SimpleNamespace(is_admin=False, id=admin_id)
+    with pytest.raises(HTTPException) as exc:
+        enforce_cost_budgets(db, user=member, team=db.get_team_by_id(team.id))
+    assert exc.value.detail == "Team balance depleted"
+
+    writer.flush()
+    db.db.expire_all()
+    assert db.get_team_by_id(team.id).balance == pytest.approx(0.0)
+    txs = db.db.query(TeamBalanceTransactionDatabase).filter(TeamBalanceTransactionDatabase.team_id == team.id).all()
+    assert [round(t.amount, 2) for t in txs] == [-10.0]
+    assert writer.pending_team_charge(team.id) == 0
+
+
+def test_full_queue_flushes_on_the_request_path(writer, db, admin_id, monkeypatch):
+    monkeypatch.setattr(config, "INFERENCE_LOG_QUEUE_MAX", 2)
+    marker = f"iw_pressure_{suffix}"
+    for _ in range(3):
+        writer.submit("output", [_row(admin_id, marker)])
+    stats = writer.stats()
+    assert stats["sync_flushes"] == 1
+    assert stats["depth"] == 1 and stats["max_depth"] == 2
+    assert _count(db, marker) == 2
+    writer.flush()
+    db.db.query(OutputDatabase).filter(OutputDatabase.question == marker).delete()
+    db.db.commit()
+
+
+def test_poison_row_is_retried_alone_then_spilled(writer, db, admin_id, monkeypatch):
+    marker = f"iw_poison_{suffix}"
+    real_write = iw.InferenceLogWriter._write
+
+    def fake_write(self, batch):
+        if any(item["row"].get("answer") == "poison" for item in batch):
+            raise RuntimeError("bad row")
+        real_write(self, batch)
+
+    monkeypatch.setattr(iw.InferenceLogWriter, "_write", fake_write)
+    writer.submit("output", [_row(admin_id, marker), _row(admin_id, marker, answer="poison")])
+    assert writer.flush() is True
+    assert _count(db, marker) == 1
+    for _ in range(iw._MAX_ATTEMPTS - 1):
+        writer.flush()
+    stats = writer.stats()
+    assert stats["depth"] == 0 and stats["spilled"] == 1 and stats["failures"] == iw._MAX_ATTEMPTS
+    db.db.query(OutputDatabase).filter(OutputDatabase.question == marker).delete()
+    db.db.commit()
+
+
+def test_spilled_rows_stay_pending_until_a_replay_writes_them(writer, db, admin_id, api_key, monkeypatch):
+    marker = f"iw_outage_{suffix}"
+    real_write = iw.InferenceLogWriter._write
+    monkeypatch.setattr(iw.InferenceLogWriter, "_write", lambda self, batch: (_ for _ in ()).throw(RuntimeError("db down")))
+    writer.submit("output", [_row(admin_id, marker, api_key_id=api_key.id)])
+    for _ in range(iw._MAX_ATTEMPTS):
+        writer.flush()
+    assert writer.stats()["spilled"] == 1 and writer.stats()["depth"] == 0
+    # Still on the books for the quota gate while it sits on disk.
+    assert writer.pending_api_key_tokens(api_key.id) == 60
+
+    monkeypatch.setattr(iw.InferenceLogWriter, "_write", real_write)
+    writer._replay_spill()
+    assert writer.pending_api_key_tokens(api_key.id) == 60  # re-queued, not counted twice
+    writer.flush()
+    assert _count(db, marker) == 1
+    assert writer.pending_api_key_tokens(api_key.id) == 0
+    db.db.expire_all()
+    assert db.db.get(ApiKeyDatabase, api_key.id).tokens_used_this_month == 60
+
+
+def test_flush_loop_replays_its_own_spill(tmp_path, monkeypatch, db, admin_id):
+    monkeypatch.setattr(config, "INFERENCE_LOG_FLUSH_SECONDS", 0.01)
+    monkeypatch.setattr(config, "INFERENCE_LOG_SPILL_REPLAY_SECONDS", 0.05)
+    monkeypatch.setattr(config, "INFERENCE_LOG_SPILL_DIR", str(tmp_path))
+    marker = f"iw_loop_{suffix}"
+    w = iw.InferenceLogWriter()
+    w.start()
+    try:
+        # Spilled after start: only the flush loop's periodic replay sees it.
+        w._spill([{"table": "output", "row": _row(admin_id, marker), "attempts": 0}])
+        deadline = time.monotonic() + 5
+        while _count(db, marker) == 0 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert _count(db, marker) == 1 and list(tmp_path.iterdir()) == []
+    finally:
+        w.stop()
+        db.db.query(OutputDatabase).filter(OutputDatabase.question == marker).delete()
+        db.db.commit()
+
+
+def test_start_leaves_a_live_workers_spill_alone(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "INFERENCE_LOG_FLUSH_SECONDS", 3600)
+    monkeypatch.setattr(config, "INFERENCE_LOG_SPILL_DIR", str(tmp_path))
+    live = tmp_path / f"spill-{os.getppid()}.jsonl"
+    live.write_text("")
+    w = iw.InferenceLogWriter()
+    w.start()
+    try:
+        assert live.exists()
+    finally:
+        w.stop()
+
+
+def test_shutdown_spills_and_next_start_replays(tmp_path, monkeypatch, db, admin_id):
+    monkeypatch.setattr(config, "INFERENCE_LOG_FLUSH_SECONDS", 3600)
+    monkeypatch.setattr(config, "INFERENCE_LOG_SPILL_DIR", str(tmp_path))
+    marker = f"iw_spill_{suffix}"
+
+    down = iw.InferenceLogWriter()
+    down.start()
+    monkeypatch.setattr(down, "_write", lambda batch: (_ for _ in ()).throw(RuntimeError("db down")))
+    down.submit("output", [_row(admin_id, marker), _row(admin_id, marker)])
+    down.stop(timeout=1)
+    assert down.stats()["spilled"] == 2
+    assert len(list(tmp_path.glob("spill-*.jsonl"))) == 1
+    assert _count(db, marker) == 0
+
+    up = iw.InferenceLogWriter()
+    up.start()
+    try:
+        assert up.stats()["replayed"] == 2
+        assert list(tmp_path.iterdir()) == []
+        up.flush()
+        assert _count(db, marker) == 2
+    finally:
+        up.stop()
+        db.db.query(OutputDatabase).filter(OutputDatabase.question == marker).delete()
+        db.db.commit()
+
+
+def test_log_inference_queues_through_the_running_writer(writer, db, admin_id):
+    from restai import tools as tools_mod
+
+    marker = f"iw_log_{suffix}"
+    project = types.SimpleNamespace(props=types.SimpleNamespace(
+        id=None, llm=None, team=None,
+        options=types.SimpleNamespace(logging=True, redact_inference_logs=False),
+    ))
+    user = types.SimpleNamespace(id=admin_id, api_key_id=None)
+    tools_mod.log_inference(project, user, {"question": marker, "answer": "x", "id": marker}, db)
+    assert _count(db, marker) == 0
+    writer.flush()
+    db.db.expire_all()
+    row = db.db.query(OutputDatabase).filter(OutputDatabase.chat_id == marker).one()
+    assert row.question == marker and row.status == "success"
+    db.db.delete(row)
+    db.db.commit()
@@ -0,0 +1,208 @@
+"""Unit tests for restai/integrations/kg_bulk.py on a private in-memory
+sqlite database, through both the upsert path (unique keys present) and the
+set-based fallback, plus a micro-benchmark against the old per-row
+persistence. The benchmark is opt-in, as its per-row baseline alone takes
+about ten seconds: run with `RESTAI_BENCHMARKS=1` and `-s` to see the
+timings."""
+import os
+import time
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from restai.integrations import kg_bulk
+from restai.models.databasemodels import (
+    Base,
+    KGEntityDatabase,
+    KGEntityMentionDatabase,
+    KGEntityRelationshipDatabase,
+)
+
+PROJECT_ID = 1
+ENTITIES = 200
+# The per-row baseline spends ~35 s on 200 entities (19,900 edges); half
+# the entities is a quarter of the pairs and keeps the suite fast.
+BENCHMARK_ENTITIES = 100
+BENCHMARK_SOURCES = ["a.pdf", "a.pdf"]  # the repeat exercises the update side
+
+
+def _open_session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[
+        KGEntityDatabase.__table__, KGEntityMentionDatabase.__table__, KGEntityRelationshipDatabase.__table__,
+    ])
+    s = sessionmaker(bind=engine)()
+    s.statements = []
+    event.listen(engine, "before_cursor_execute", lambda *a: s.statements.append(a[2]))
+    return s
+
+
+def _close_session(s):
+    engine = s.get_bind()
+    s.close()
+    engine.dispose()
+
+
+@pytest.fixture(params=["upsert", "fallback", "no-upsert-dialect"])
+def session(request, monkeypatch):
+    if request.param == "fallback":
+        monkeypatch.setattr(kg_bulk, "_has_unique_key", lambda *a: False)
+    elif request.param == "no-upsert-dialect":
+        # A dialect without an upsert takes the fallback even with the keys.
+        monkeypatch.setattr(kg_bulk, "_UPSERT_DIALECTS", {})
+    s = _open_session()
+    yield s
+    _close_session(s)
+
+
+def _persist(session, counts, source, now=None):
+    """The body of `extract_and_persist` after NER."""
+    now = now or datetime.now(timezone.utc)
+    names = {k: k[0].title() for k in counts}
+    ids = kg_bulk.upsert_entities(session, PROJECT_ID, counts, names, now)
+    kg_bulk.upsert_mentions(session, PROJECT_ID, source, {ids[k]: n for k, n in counts.items()}, now)
+    kg_bulk.upsert_edges(session, PROJECT_ID, ids.values(), now)
+    session.commit()
+    return ids
+
+
+def _legacy_persist(session, counts, source):
+    """The per-row implementation this replaced, kept for the benchmark."""
+    now = datetime.now(timezone.utc)
+    entity_ids = {}
+    for (normalized, etype), count in counts.items():
+        existing = session.query(KGEntityDatabase).filter(
+            KGEntityDatabase.project_id == PROJECT_ID,
+            KGEntityDatabase.normalized == normalized,
+            KGEntityDatabase.entity_type == etype,
+        ).first()
+        if existing:
+            existing.mention_count += count
+            existing.updated_at = now
+            entity_ids[(normalized, etype)] = existing.id
+        else:
+            ent = KGEntityDatabase(
+                project_id=PROJECT_ID, name=normalized.title(), normalized=normalized, entity_type=etype,
+                mention_count=count, created_at=now, updated_at=now,
+            )
+            session.add(ent)
+            session.flush()
+            entity_ids[(normalized, etype)] = ent.id
+    for key, count in counts.items():
+        eid = entity_ids[key]
+        existing = session.query(KGEntityMentionDatabase).filter(
+            KGEntityMentionDatabase.entity_id == eid, KGEntityMentionDatabase.source == source,
+        ).first()
+        if existing:
+            existing.mention_count += count
+        else:
+            session.add(KGEntityMentionDatabase(
+                entity_id=eid, project_id=PROJECT_ID, source=source, mention_count=count, created_at=now,
+            ))
+    ids = sorted(entity_ids.values())
+    for i, a in enumerate(ids):
+        for b in ids[i + 1:]:
+            existing = session.query(KGEntityRelationshipDatabase).filter(
+                KGEntityRelationshipDatabase.project_id == PROJECT_ID,
+                KGEntityRelationshipDatabase.from_entity_id == a,
+                KGEntityRelationshipDatabase.to_entity_id == b,
+            ).first()
+            if existing:
+                existing.weight += 1
+            else:
+                session.add(KGEntityRelationshipDatabase(
+                    project_id=PROJECT_ID, from_entity_id=a, to_entity_id=b, weight=1, created_at=now,
+                ))
+    session.commit()
+
+
+def _graph(session):
+    entities = {
+        (e.normalized, e.entity_type): (e.id, e.name, e.mention_count)
+        for e in session.query(KGEntityDatabase)
+    }
+    mentions = sorted(
+        (m.entity_id, m.source, m.mention_count) for m in session.query(KGEntityMentionDatabase)
+    )
+    edges = sorted(
+        (r.from_entity_id, r.to_entity_id, r.weight) for r in session.query(KGEntityRelationshipDatabase)
+    )
+    return entities, mentions, edges
+
+
+def test_repeated_sources_accumulate(session):
+    first = _persist(session, {("acme", "ORG"): 2, ("ada", "PERSON"): 1}, "a.pdf")
+    second = _persist(session, {("acme", "ORG"): 1, ("london", "LOC"): 3}, "b.pdf")
+    _persist(session, {("acme", "ORG"): 4, ("london", "LOC"): 1}, "b.pdf")
+    assert second[("acme", "ORG")] == first[("acme", "ORG")]
+
+    entities, mentions, edges = _graph(session)
+    acme, ada, london = (entities[k][0] for k in [("acme", "ORG"), ("ada", "PERSON"), ("london", "LOC")])
+    assert {k: v[2] for k, v in entities.items()} == {("acme", "ORG"): 7, ("ada", "PERSON"): 1, ("london", "LOC"): 4}
+    assert entities[("acme", "ORG")][1] == "Acme"
+    assert mentions == sorted([(acme, "a.pdf", 2), (ada, "a.pdf", 1), (acme, "b.pdf", 5), (london, "b.pdf", 4)])
+    assert edges == sorted([(min(acme, ada), max(acme, ada), 1), (min(acme, london), max(acme, london), 2)])
+
+
+def test_same_name_different_type_is_a_different_entity(session):
+    ids = _persist(session, {("jordan", "PERSON"): 1, ("jordan", "LOC"): 1}, "a.pdf")
+    assert len(set(ids.values())) == 2
+    assert len(_graph(session)[2]) == 1
+
+
+def test_large_document_is_written_in_batches(session, monkeypatch):
+    monkeypatch.setattr(kg_bulk, "_EDGE_BATCH", 50)
+    counts = {(f"entity {i}", "ORG"): 1 for i in range(ENTITIES)}
+    _persist(session, counts, "big.pdf")
+    _persist(session, counts, "big.pdf")
+    entities, mentions, edges = _graph(session)
+    assert len(entities) == ENTITIES
+    assert {m[2] for m in mentions} == {2}
+    assert len(edges) == ENTITIES * (ENTITIES - 1) // 2
+    assert {e[2] for e in edges} == {2}
+
+
+def _benchmark_counts():
+    return {(f"entity {i}", "ORG"): 1 + i % 3 for i in range(BENCHMARK_ENTITIES)}
+
+
+@pytest.fixture(scope="module")
+def legacy_baseline():
+    """The per-row baseline, run once for every parametrization of the
+    benchmark: (seconds, statements, resulting graph)."""
+    s = _open_session()
+    counts = _benchmark_counts()
+    started = time.perf_counter()
+    for source in BENCHMARK_SOURCES:
+        _legacy_persist(s, counts, source)
+    baseline = time.perf_counter() - started, len(s.statements), _graph(s)
+    _close_session(s)
+    return baseline
+
+
+@pytest.mark.skipif(os.environ.get("RESTAI_BENCHMARKS") != "1", reason="set RESTAI_BENCHMARKS=1 to run")
+def test_benchmark_against_per_row_persistence(session, legacy_baseline):
+    counts = _benchmark_counts()
+    before, before_statements, expected = legacy_baseline
+
+    started = time.perf_counter()
+    for source in BENCHMARK_SOURCES:
+        _persist(session, counts, source)
+    after = time.perf_counter() - started
+    after_statements = len(session.statements)
+
+    print(
+        f"\n{BENCHMARK_ENTITIES} entities x {len(BENCHMARK_SOURCES)} sources: per-row {before_statements} "
+        f"statements {before * 1000:.0f} ms, bulk {after_statements} statements {after * 1000:.0f} ms"
+    )
+    # Same graph, built on separate databases, so compare by name.
+    new = _graph(session)
+    assert sorted(v[1:] for v in new[0].values()) == sorted(v[1:] for v in expected[0].values())
+    assert len(new[1]) == len(expected[1]) and len(new[2]) == len(expected[2])
+    assert sorted(m[2] for m in new[1]) == sorted(m[2] for m in expected[1])
+    assert sorted(e[2] for e in new[2]) == sorted(e[2] for e in expected[2])
+    assert after_statements * 50 < before_statements
+    assert after < before / 5
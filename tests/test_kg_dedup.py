@@ -0,0 +1,189 @@
+"""Unit tests for restai/integrations/kg_dedup.py, against the real sqlite
+test database. The benchmark against the old all-pairs SequenceMatcher scan
+times an index over tens of thousands of names, so it only runs with
+`RESTAI_BENCHMARKS=1` (add `-s` for the timings)."""
+import os
+import random
+import string
+import time
+from datetime import datetime, timezone
+from difflib import SequenceMatcher
+
+import pytest
+
+from restai.database import open_db_wrapper
+from restai.integrations import kg_dedup
+from restai.integrations.kg_dedup import DuplicateIndex, duplicate_index
+from restai.models.databasemodels import KGEntityDatabase
+
+ENTITIES = 20000
+SCANNED = 500
+
+
+@pytest.fixture(autouse=True)
+def fresh_indexes(monkeypatch):
+    monkeypatch.setattr(kg_dedup, "_indexes", type(kg_dedup._indexes)())
+
+
+@pytest.fixture()
+def db():
+    wrapper = open_db_wrapper()
+    yield wrapper
+    wrapper.db.close()
+
+
+@pytest.fixture()
+def project_id(db):
+    pid = random.randint(10**8, 10**9)
+    yield pid
+    db.db.query(KGEntityDatabase).filter(KGEntityDatabase.project_id == pid).delete()
+    db.db.commit()
+
+
+def _add(db, project_id, name, entity_type="PERSON"):
+    now = datetime.now(timezone.utc)
+    ent = KGEntityDatabase(
+        project_id=project_id, name=name, normalized=name.lower(),
+        entity_type=entity_type, mention_count=1, created_at=now, updated_at=now,
+    )
+    db.db.add(ent)
+    db.db.commit()
+    return ent
+
+
+def _names(n, rng):
+    """Made-up multi-word names, about one in twenty a one-typo variant of
+    another."""
+    syllables = sorted({rng.choice("bcdfghjklmnprstvz") + rng.choice("aeiou") + rng.choice(["", "n", "r", "l"]) for _ in range(400)})
+    names = set()
+    while len(names) < n * 0.95:
+        names.add(" ".join(
+            "".join(rng.choice(syllables) for _ in range(rng.randint(2, 3))) for _ in range(rng.randint(1, 3))
+        ))
+    base = sorted(names)
+    while len(names) < n:
+        s = rng.choice(base)
+        i = rng.randrange(len(s))
+        names.add(s[:i] + rng.choice(string.ascii_lowercase) + s[i + 1:])
+    return sorted(names)
+
+
+def _all_pairs(rows, threshold):
+    """The old compute_potential_duplicates loop."""
+    found = {}
+    for i in range(len(rows)):
+        for j in range(i + 1, len(rows)):
+            a, b = rows[i], rows[j]
+            if a[2] != b[2] or a[1] == b[1]:
+                continue
+            ratio = SequenceMatcher(None, a[1], b[1]).ratio()
+            if ratio >= threshold:
+                found[(a[0], b[0])] = ratio
+    return found
+
+
+def test_finds_typo_variants_only_within_a_type():
+    index = DuplicateIndex()
+    index.add([
+        (1, "jonathan smith", "PERSON", "Jonathan Smith"),
+        (2, "jonathon smith", "PERSON", "Jonathon Smith"),
+        (3, "jonathan smith", "ORG", "Jonathan Smith"),
+        (4, "microsoft", "ORG", "Microsoft"),
+        (5, "microsft", "ORG", "Microsft"),
+        (6, "acme", "ORG", "Acme"),
+    ])
+    found = index.candidates(0.85, 100)
+    assert [(c["entity_a_id"], c["entity_b_id"]) for c in found] == [(4, 5), (1, 2)]
+    assert found[1]["similarity"] == round(SequenceMatcher(None, "jonathan smith", "jonathon smith").ratio(), 3)
+    assert index.candidates(0.85, 1) == found[:1]
+    assert index.candidates(0.99, 100) == []
+
+
+def test_index_follows_the_graph(db, project_id):
+    ada = _add(db, project_id, "Ada Lovelace")
+    first = duplicate_index(db, project_id)
+    assert first.candidates(0.85, 10) == []
+
+    # Written by "another worker": the index catches up on its own.
+    adah = _add(db, project_id, "Adah Lovelace")
+    index = duplicate_index(db, project_id)
+    assert index is first
+    assert [(c["entity_a_id"], c["entity_b_id"]) for c in index.candidates(0.85, 10)] == [(ada.id, adah.id)]
+
+    adah.name, adah.normalized = "Grace Hopper", "grace hopper"
+    adah.updated_at = datetime.now(timezone.utc)
+    db.db.commit()
+    assert duplicate_index(db, project_id).candidates(0.5, 10) == []
+
+    ada2 = _add(db, project_id, "Ada Lovelase")
+    assert len(duplicate_index(db, project_id).candidates(0.85, 10)) == 1
+    db.db.delete(ada2)
+    db.db.commit()
+    assert duplicate_index(db, project_id).candidates(0.5, 10) == []
+    assert index.stats["refreshes"] == 5
+
+    # Unrelated edits (settings, projects, LLMs) bump the object cache; the
+    # index survives them. A wiped graph drops it.
+    from restai.object_cache import invalidate_object_cache
+    invalidate_object_cache()
+    assert duplicate_index(db, project_id) is index
+    kg_dedup.invalidate_duplicate_index(project_id)
+    assert duplicate_index(db, project_id) is not index
+
+
+def test_incremental_adds_find_what_a_full_build_finds():
+    rows = [(i, n, "ORG", n) for i, n in enumerate(_names(4000, random.Random(3)), 1)]
+    full = DuplicateIndex()
+    full.add(rows)
+    incremental = DuplicateIndex()
+    incremental.add(rows[:2000])
+    for i in range(2000, len(rows), 50):
+        incremental.add(rows[i:i + 50])
+    # Buckets only stop yielding once they're full, so adding entities in
+    # small batches can find more pairs, never fewer.
+    assert full.candidates(0.5, 10**6)
+    assert set(full._pairs) <= set(incremental._pairs)
+
+
+def test_candidates_agree_with_all_pairs_scan():
+    rng = random.Random(11)
+    names = _names(SCANNED // 2, rng)
+    sample = [(i, n, "ORG" if i % 2 else "PERSON", n) for i, n in enumerate(names, 1)]
+    exact = _all_pairs(sample, 0.85)
+    index = DuplicateIndex()
+    index.add(sample)
+    found = {(c["entity_a_id"], c["entity_b_id"]): c["similarity"] for c in index.candidates(0.85, 10**6)}
+    assert found == {pair: round(ratio, 3) for pair, ratio in exact.items() if pair in found}
+    assert len(found) >= 0.9 * len(exact)
+
+
+@pytest.mark.skipif(os.environ.get("RESTAI_BENCHMARKS") != "1", reason="set RESTAI_BENCHMARKS=1 to run")
+def test_benchmark_against_all_pairs_scan():
+    rng = random.Random(11)
+    names = _names(ENTITIES, rng)
+    rows = [(i, n, "ORG" if i % 2 else "PERSON", n) for i, n in enumerate(names, 1)]
+
+    sample = rows[:SCANNED // 2] + rows[-SCANNED // 2:]
+    started = time.perf_counter()
+    _all_pairs(sample, 0.85)
+    before = time.perf_counter() - started
+
+    index = DuplicateIndex()
+    started = time.perf_counter()
+    index.add(rows)
+    build = time.perf_counter() - started
+    started = time.perf_counter()
+    index.candidates(0.85, 100)
+    first_query = time.perf_counter() - started
+    started = time.perf_counter()
+    index.add([(ENTITIES + i, n + "x", "ORG", n) for i, n in enumerate(names[:100], 1)])
+    top = index.candidates(0.85, 100)
+    incremental = time.perf_counter() - started
+    print(
+        f"\nall-pairs scan of {SCANNED} entities {before * 1000:.0f} ms "
+        f"(extrapolated to {ENTITIES}: {before * (ENTITIES / SCANNED) ** 2:.0f} s); "
+        f"index of {ENTITIES}: build {build * 1000:.0f} ms, query {first_query * 1000:.1f} ms, "
+        f"+100 entities and query {incremental * 1000:.0f} ms"
+    )
+    assert len(top) == 100
+    assert incremental < 1.0
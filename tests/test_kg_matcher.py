@@ -0,0 +1,123 @@
+"""Tests for the per-project entity matcher in restai/integrations/kg_matcher.py
+on the real sqlite test database: word-boundary matching of queries against
+the graph's entity names, the object_cache lifetime of a built matcher, and
+the entity-id to source lookup the RAG entity boost uses.
+
+`test_benchmark_against_full_scan` loads 20,000 entities and compares one
+match against the per-request table scan the matcher replaced. It only runs
+with `RESTAI_BENCHMARKS=1` (add `-s` for the timings)."""
+import os
+import random
+import re
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from restai.database import open_db_wrapper
+from restai.integrations import kg_matcher
+from restai.integrations.kg_matcher import EntityMatcher, entity_matcher, sources_for_entities
+from restai.models.databasemodels import KGEntityDatabase, KGEntityMentionDatabase
+from restai.object_cache import ObjectCache
+
+ENTITIES = 20000
+
+
+@pytest.fixture(autouse=True)
+def fresh_object_cache(monkeypatch):
+    cache = ObjectCache()
+    monkeypatch.setattr(kg_matcher, "object_cache", cache)
+    return cache
+
+
+@pytest.fixture()
+def db():
+    wrapper = open_db_wrapper()
+    yield wrapper
+    wrapper.db.close()
+
+
+@pytest.fixture()
+def project_id(db):
+    # No project row needed: the KG tables are only ever filtered by it.
+    pid = random.randint(10**8, 10**9)
+    yield pid
+    db.db.query(KGEntityMentionDatabase).filter(KGEntityMentionDatabase.project_id == pid).delete()
+    db.db.query(KGEntityDatabase).filter(KGEntityDatabase.project_id == pid).delete()
+    db.db.commit()
+
+
+def _add(db, project_id, normalized, sources=()):
+    now = datetime.now(timezone.utc)
+    ent = KGEntityDatabase(
+        project_id=project_id, name=normalized.title(), normalized=normalized,
+        entity_type="ORG", mention_count=1, created_at=now, updated_at=now,
+    )
+    db.db.add(ent)
+    db.db.flush()
+    for src in sources:
+        db.db.add(KGEntityMentionDatabase(
+            entity_id=ent.id, project_id=project_id, source=src, mention_count=1, created_at=now,
+        ))
+    return ent
+
+
+def test_match_is_whole_words_only():
+    m = EntityMatcher([(1, "acme", "Acme"), (2, "acme corp", "Acme Corp"), (3, "ace", "Ace"), (4, "at&t", "AT&T")])
+    assert m.match("Who founded Acme Corp's place?") == [1, 2]
+    assert m.match("acme\ncorp") == []
+    assert m.match("the AT&T network") == []
+    assert m.lookup(["at&t", "ace", "nope"]) == [3, 4]
+    assert m.sample(2) == ["Acme", "Acme Corp"]
+
+
+def test_matches_old_scan_semantics():
+    names = ["new york", "york", "john smith", "smith", "a", "b c", "x_y"]
+    m = EntityMatcher([(i, n, n) for i, n in enumerate(names)])
+    for query in ["New York, John Smith!", "smith-york", "a b c  d", "x_y's x y", "  spaced   b c "]:
+        padded = " " + re.sub(r"[^\w\s]", " ", query.lower()) + " "
+        old = [i for i, n in enumerate(names) if f" {n} " in padded]
+        assert m.match(query) == old, query
+
+
+def test_matcher_is_cached_until_the_graph_changes(db, project_id, fresh_object_cache):
+    acme = _add(db, project_id, "acme", ["a.pdf", "b.pdf"])
+    db.db.commit()
+    first = entity_matcher(db, project_id)
+    assert entity_matcher(db, project_id) is first
+    assert first.match("tell me about acme and globex") == [acme.id]
+
+    # Written by "another worker": no invalidate call, the fingerprint moves.
+    globex = _add(db, project_id, "globex", ["b.pdf", "c.pdf"])
+    db.db.commit()
+    second = entity_matcher(db, project_id)
+    assert second is not first
+    assert second.match("tell me about acme and globex") == [acme.id, globex.id]
+    assert sorted(sources_for_entities(db, [acme.id, globex.id])) == ["a.pdf", "b.pdf", "c.pdf"]
+
+
+@pytest.mark.skipif(os.environ.get("RESTAI_BENCHMARKS") != "1", reason="set RESTAI_BENCHMARKS=1 to run")
+def test_benchmark_against_full_scan(db, project_id):
+    now = datetime.now(timezone.utc)
+    db.db.bulk_insert_mappings(KGEntityDatabase, [
+        {"project_id": project_id, "name": f"Entity {i}", "normalized": f"entity {i}",
+         "entity_type": "ORG", "mention_count": 1, "created_at": now, "updated_at": now}
+        for i in range(ENTITIES)
+    ])
+    db.db.commit()
+    query = "How are entity 42 and entity 19999 related?"
+
+    started = time.perf_counter()
+    rows = db.db.query(KGEntityDatabase).filter(KGEntityDatabase.project_id == project_id).all()
+    padded = " " + re.sub(r"[^\w\s]", " ", query.lower()) + " "
+    old = sorted(e.id for e in rows if e.normalized and f" {e.normalized} " in padded)
+    db.db.expunge_all()
+    before = time.perf_counter() - started
+
+    entity_matcher(db, project_id)  # first request builds it
+    started = time.perf_counter()
+    new = entity_matcher(db, project_id).match(query)
+    after = time.perf_counter() - started
+    print(f"\n{ENTITIES} entities: full scan {before * 1000:.0f} ms, cached matcher {after * 1000:.1f} ms")
+    assert new == old and len(new) == 2
+    assert after < before / 5
@@ -0,0 +1,103 @@
+"""Unit tests for restai/limits/ledger.py — the spend / request counters that
+back enforce_cost_budgets and check_rate_limit. Per-worker mode only (Redis
+unset); the table is replaced by a counting fake."""
+import time
+from unittest.mock import patch
+
+import pytest
+
+from restai import config
+import restai.limits.ledger as ledger_mod
+from restai.limits.ledger import SpendLedger
+
+
+class _FakeDB:
+    def __init__(self, spent=5.0):
+        self.spent = spent
+        self.calls = []
+
+    def spend_for(self, **scope):
+        self.calls.append(scope)
+        return self.spent
+
+
+@pytest.fixture(autouse=True)
+def _no_redis(monkeypatch):
+    monkeypatch.setattr(config, "LEDGER_RECONCILE_SECONDS", 60)
+    with patch("restai.limits.ledger.config.build_redis_url", return_value=None):
+        yield
+
+
+def test_spend_is_seeded_once_then_incremented():
+    db, led = _FakeDB(), SpendLedger()
+    assert led.spend(db, ("team", 3)) == 5.0
+    led.record(cost=1.5, team_id=3, user_id=9, project_id=4)
+    assert led.spend(db, ("team", 3)) == 6.5
+    assert db.calls == [{"team_id": 3}]
+
+
+def test_record_skips_unseeded_scopes():
+    db, led = _FakeDB(), SpendLedger()
+    led.record(cost=2.0, project_id=4, api_key_id=8)
+    # First read seeds from the table, which already holds the committed row.
+    assert led.spend(db, ("api_key", 8)) == 5.0
+    assert db.calls == [{"api_key_id": 8}]
+
+
+def test_scopes_map_to_spend_for_filters():
+    db, led = _FakeDB(), SpendLedger()
+    led.spend(db, ("project", 1))
+    led.spend(db, ("api_key", 2))
+    led.spend(db, ("team", 3))
+    led.spend(db, ("team_user", 3, 4))
+    assert db.calls == [
+        {"project_id": 1}, {"api_key_id": 2}, {"team_id": 3}, {"team_id": 3, "user_id": 4},
+    ]
+
+
+def test_spend_reconciles_after_interval(monkeypatch):
+    db, led = _FakeDB(), SpendLedger()
+    led.spend(db, ("project", 1))
+    db.spent = 42.0
+    assert led.spend(db, ("project", 1)) == 5.0
+    monkeypatch.setattr(config, "LEDGER_RECONCILE_SECONDS", 0.01)
+    time.sleep(0.02)
+    assert led.spend(db, ("project", 1)) == 42.0
+
+
+def test_reconcile_zero_reads_table_every_time(monkeypatch):
+    monkeypatch.setattr(config, "LEDGER_RECONCILE_SECONDS", 0)
+    db, led = _FakeDB(), SpendLedger()
+    led.spend(db, ("team", 1))
+    led.spend(db, ("team", 1))
+    assert len(db.calls) == 2
+
+
+def test_request_window_counts_recent_requests(monkeypatch):
+    now = time.time()
+    seeded = []
+
+    def fake_recent(db, project_id, at):
+        seeded.append(project_id)
+        return [now - 90, now - 30, now - 5]
+
+    monkeypatch.setattr(ledger_mod, "_recent_requests_from_db", fake_recent)
+    led = SpendLedger()
+    # The 90 s-old request is outside the window.
+    assert led.requests_last_minute(None, 7) == 2
+    led.record(cost=0.0, project_id=7)
+    led.record(cost=0.0, project_id=7)
+    assert led.requests_last_minute(None, 7) == 4
+    assert seeded == [7]
+
+
+def test_redis_failure_falls_back_to_local_counters(monkeypatch):
+    class _Broken:
+        def get(self, key):
+            raise ConnectionError("redis down")
+
+    db, led = _FakeDB(), SpendLedger()
+    monkeypatch.setattr(led, "_redis", lambda: _Broken())
+    assert led.spend(db, ("project", 1)) == 5.0
+    assert led.spend(db, ("project", 1)) == 5.0
+    assert len(db.calls) == 1
@@ -276,11 +276,14 @@ class _FakeClient:
     async def __aexit__(self, *a):
         return False
 
-    async def post(self, url, headers=None, json=None):
+    async def post(self, url, headers=None, json=None, timeout=None):
         _FakeClient.last_body = json
         return _FakeClient.response
 
-    def stream(self, method, url, headers=None, json=None):
+    async def aclose(self):
+        pass
+
+    def stream(self, method, url, headers=None, json=None, timeout=None):
         _FakeClient.last_body = json
         resp = _FakeClient.response
 
@@ -377,3 +380,27 @@ def test_passthrough_sse_upstream_error_non_json_body(monkeypatch):
     err = json.loads(chunks[0][len("data: "):])
     assert err["error"]["message"] == "<html>boom</html>"
     assert err["error"]["type"] == "api_error"
+
+
+# ─── encode_embeddings ──────────────────────────────────────────────────
+
+def test_encode_embeddings_float_keeps_precision_and_truncates():
+    data = oc.encode_embeddings([[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]], dimensions=2)
+    assert data == [
+        {"object": "embedding", "embedding": [0.1, 0.2], "index": 0},
+        {"object": "embedding", "embedding": [0.4, 0.5], "index": 1},
+    ]
+
+
+def test_encode_embeddings_base64_matches_struct_packing():
+    import base64
+    import struct
+
+    vecs = [[0.1, -2.5, 3.0, 7.25], [1.0, 2.0, 3.0, 4.0]]
+    data = oc.encode_embeddings(vecs, dimensions=3, encoding_format="base64")
+    for vec, entry in zip(vecs, data):
+        assert entry["embedding"] == base64.b64encode(struct.pack("<3f", *vec[:3])).decode("ascii")
+
+
+def test_encode_embeddings_empty():
+    assert oc.encode_embeddings([]) == []
@@ -0,0 +1,155 @@
+"""Unit tests for restai/principal_cache.py and the Bearer lookup in
+restai/auth.py that uses it. Per-worker mode only (Redis unset); runs against
+the real sqlite test database."""
+import random
+import secrets
+import types
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+from restai import auth, config
+from restai.database import open_db_wrapper
+from restai.models.databasemodels import ApiKeyDatabase, UserDatabase
+from restai.principal_cache import NEGATIVE, Principal, PrincipalCache
+from restai.utils.crypto import encrypt_api_key, hash_api_key
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch):
+    c = PrincipalCache()
+    monkeypatch.setattr(auth, "principal_cache", c)
+    monkeypatch.setattr("restai.db.users.principal_cache", c)
+    with patch("restai.principal_cache.config.build_redis_url", return_value=None):
+        yield c
+
+
+@pytest.fixture()
+def db():
+    wrapper = open_db_wrapper()
+    yield wrapper
+    wrapper.db.close()
+
+
+@pytest.fixture()
+def user(db):
+    row = UserDatabase(username=f"pc_user_{random.randint(0, 10**9)}", hashed_password="x")
+    db.db.add(row)
+    db.db.commit()
+    yield row
+    db.db.query(ApiKeyDatabase).filter(ApiKeyDatabase.user_id == row.id).delete()
+    db.db.query(UserDatabase).filter(UserDatabase.id == row.id).delete()
+    db.db.commit()
+
+
+def _mint(db, user, **kw):
+    token = "restai_" + secrets.token_hex(16)
+    db.create_api_key(
+        user.id, encrypt_api_key(token), hash_api_key(token), token[:8], "pc test key", **kw
+    )
+    return token
+
+
+def _resolve(token, db):
+    return auth._resolve_bearer_token(types.SimpleNamespace(state=types.SimpleNamespace()), token, db)
+
+
+def _counting(monkeypatch, db):
+    calls = []
+    cls = type(db)
+    real = cls.get_user_by_apikey
+    monkeypatch.setattr(cls, "get_user_by_apikey", lambda self, token: calls.append(token) or real(self, token))
+    return calls
+
+
+def test_known_key_is_hashed_once(monkeypatch, db, user, cache):
+    token = _mint(db, user, read_only=True)
+    calls = _counting(monkeypatch, db)
+    first = _resolve(token, db)
+    second = _resolve(token, db)
+    assert len(calls) == 1
+    assert first.id == second.id == user.id
+    assert second.api_key_read_only is True
+    assert cache.stats["hits"] == 1
+
+
+def test_deleted_key_is_refused_on_the_next_request(db, user, cache):
+    token = _mint(db, user)
+    user_obj = _resolve(token, db)
+    # Deleted behind the cache's back (no invalidate): the PK re-read catches it.
+    db.db.query(ApiKeyDatabase).filter(ApiKeyDatabase.id == user_obj.api_key_id).delete()
+    db.db.commit()
+    with pytest.raises(HTTPException) as exc:
+        _resolve(token, db)
+    assert exc.value.status_code == 401
+
+
+def test_scope_and_suspension_are_read_fresh(db, user):
+    token = _mint(db, user)
+    assert _resolve(token, db).api_key_read_only is False
+    key = db.db.query(ApiKeyDatabase).filter(ApiKeyDatabase.user_id == user.id).one()
+    key.read_only = True
+    db.db.commit()
+    assert _resolve(token, db).api_key_read_only is True
+
+    user.is_suspended = True
+    db.db.commit()
+    with pytest.raises(HTTPException) as exc:
+        _resolve(token, db)
+    assert exc.value.status_code == 403
+
+
+def test_bad_token_is_negatively_cached(monkeypatch, db, cache):
+    calls = _counting(monkeypatch, db)
+    for _ in range(3):
+        with pytest.raises(HTTPException):
+            _resolve("restai_not-a-real-key", db)
+    assert len(calls) == 1
+    assert cache.get(cache.digest("restai_not-a-real-key")) is NEGATIVE
+
+    monkeypatch.setattr(config, "AUTH_NEGATIVE_CACHE_TTL", 0)
+    cache.invalidate()
+    with pytest.raises(HTTPException):
+        _resolve("restai_not-a-real-key", db)
+    with pytest.raises(HTTPException):
+        _resolve("restai_not-a-real-key", db)
+    assert len(calls) == 3
+
+
+def test_delete_api_key_invalidates(db, user, cache):
+    token = _mint(db, user)
+    key_id = _resolve(token, db).api_key_id
+    assert cache.get(cache.digest(token)) == Principal(user.id, api_key_id=key_id)
+    assert db.delete_api_key(key_id, user.id) is True
+    assert cache.get(cache.digest(token)) is None
+
+
+def test_ttl_zero_disables_the_cache(monkeypatch, db, user):
+    monkeypatch.setattr(config, "AUTH_CACHE_TTL", 0)
+    token = _mint(db, user)
+    calls = _counting(monkeypatch, db)
+    _resolve(token, db)
+    _resolve(token, db)
+    assert len(calls) == 2
+
+
+def test_redis_generation_bump_clears_other_workers(cache):
+    class _Redis:
+        value = b"1"
+
+        def get(self, key):
+            return self.value
+
+        def incr(self, key):
+            self.value = str(int(self.value) + 1).encode()
+
+    shared = _Redis()
+    other = PrincipalCache()
+    for c in (cache, other):
+        c._redis = lambda: shared
+    assert other.get("d") is None  # first look records generation 1
+    other.put("d", Principal(1, api_key_id=2))
+    assert other.get("d") == Principal(1, api_key_id=2)
+    cache.invalidate(1)
+    assert other.get("d") is None
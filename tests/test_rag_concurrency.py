@@ -0,0 +1,232 @@
+"""Concurrency benchmark for RAG.chat: N parallel streaming chats against a
+slow LLM on ONE event loop. Before the executor offload the sync LlamaIndex
+calls ran on the loop, so the streams finished one after another and a
+heartbeat task starved for the whole run. Also the speculative input guard
+(`guard_speculative`), which overlaps the guard's LLM call with the answer's.
+Run with `-s` to see the timings."""
+import asyncio
+import json
+import time
+import types
+from typing import Any
+
+from llama_index.core import Document, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import CompletionResponse, CustomLLM, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+from llama_index.core.storage.chat_store import SimpleChatStore
+
+from restai.limits.accounting import install_token_usage_handler
+from restai.models.models import ChatModel
+from restai.projects.rag import RAG
+
+STREAMS = 8
+TOKENS = 4
+TOKEN_DELAY = 0.05
+
+
+class _SlowLLM(CustomLLM):
+    """Emits TOKENS tokens, sleeping (blocking, like a sync HTTP client) before each."""
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(context_window=4096, num_output=64)
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        time.sleep(TOKEN_DELAY * TOKENS)
+        return CompletionResponse(text="tok " * TOKENS)
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        text = ""
+        for _ in range(TOKENS):
+            time.sleep(TOKEN_DELAY)
+            text += "tok "
+            yield CompletionResponse(text=text, delta="tok ")
+
+
+def _setup():
+    install_token_usage_handler()
+    llm = _SlowLLM()
+    index = VectorStoreIndex.from_documents(
+        [Document(text="RESTai serves RAG projects.", metadata={"source": "doc.txt"})],
+        embed_model=MockEmbedding(embed_dim=8),
+    )
+    brain = types.SimpleNamespace(
+        get_llm=lambda name, db: types.SimpleNamespace(llm=llm, props=types.SimpleNamespace(context_window=4096)),
+        chat_store=SimpleChatStore(),
+        defaultSystem="You are a helpful assistant.",
+        defaultCensorship="I don't know.",
+        post_processing_reasoning=lambda output: None,
+        post_processing_counting=lambda output, usage=None: output.update(tokens=usage.as_tokens()),
+    )
+    options = types.SimpleNamespace(
+        connection=None, k=1, score=0.0, llm_rerank=False, enable_knowledge_graph=False,
+    )
+    props = types.SimpleNamespace(
+        id=1, name="bench", llm="slow", system=None, censorship=None, guard=None, options=options,
+    )
+    project = types.SimpleNamespace(vector=types.SimpleNamespace(index=index), props=props)
+    return RAG(brain), project
+
+
+async def _stream(rag, project, i):
+    chunks = []
+    model = ChatModel(question=f"what does RESTai serve? ({i})", stream=True)
+    async for line in rag.chat(project, model, types.SimpleNamespace(id=i), None):
+        chunks.append(line)
+    return chunks
+
+
+async def _run(rag, project, n):
+    gaps, stop = [], asyncio.Event()
+
+    async def heartbeat():
+        last = time.perf_counter()
+        while not stop.is_set():
+            await asyncio.sleep(0.01)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    beat = asyncio.create_task(heartbeat())
+    started = time.perf_counter()
+    results = await asyncio.gather(*(_stream(rag, project, i) for i in range(n)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await beat
+    return results, elapsed, max(gaps)
+
+
+def test_parallel_rag_streams_share_one_loop():
+    rag, project = _setup()
+    _, single, _ = asyncio.run(_run(rag, project, 1))
+    results, elapsed, worst_gap = asyncio.run(_run(rag, project, STREAMS))
+    print(
+        f"\nRAG streams: 1 in {single * 1000:.0f} ms, {STREAMS} parallel in {elapsed * 1000:.0f} ms "
+        f"(serial would be ~{single * STREAMS * 1000:.0f} ms); worst loop stall {worst_gap * 1000:.0f} ms"
+    )
+
+    billed = []
+    for chunks in results:
+        assert chunks[-1] == "event: close\n\n"
+        assert sum('"text": "tok "' in c for c in chunks) == TOKENS
+        billed.append(json.loads(chunks[-2][len("data: "):])["tokens"]["output"])
+    # Each stream is billed for its own LLM call only: same answer, same count.
+    assert billed[0] > 0 and len(set(billed)) == 1
+    # Streams overlap instead of queueing behind each other...
+    assert elapsed < single * STREAMS / 2
+    # ...and the loop stays free for other work (health checks, other users)
+    # while tokens are being generated.
+    assert worst_gap < TOKEN_DELAY * TOKENS
+
+
+GUARD_DELAY = 0.2
+
+
+def _guarded(rag, project, *, speculative, block):
+    project.props.guard = "7"
+    project.props.options.guard_speculative = speculative
+
+    def check_input_guard(project, text, user, db, output):
+        rag.guard_sessions.append(db)
+        time.sleep(GUARD_DELAY)
+        if block:
+            output.update(answer="blocked", guard=True, status="guard_block")
+        return block
+
+    rag.guard_sessions = []
+    rag.check_input_guard = check_input_guard
+
+
+async def _ask(rag, project, stream=False, chat_id=None):
+    model = ChatModel(question="what does RESTai serve?", stream=stream, id=chat_id)
+    started = time.perf_counter()
+    out = [line async for line in rag.chat(project, model, types.SimpleNamespace(id=1), None)]
+    return out, time.perf_counter() - started
+
+
+def test_speculative_guard_overlaps_generation():
+    rag, project = _setup()
+    _guarded(rag, project, speculative=False, block=False)
+    _, sequential = asyncio.run(_ask(rag, project))
+    _guarded(rag, project, speculative=True, block=False)
+    out, speculative = asyncio.run(_ask(rag, project))
+    print(f"\nguarded turn: sequential {sequential * 1000:.0f} ms, speculative {speculative * 1000:.0f} ms")
+    assert out[0]["answer"] == "tok " * TOKENS
+    assert sequential >= GUARD_DELAY + TOKEN_DELAY * TOKENS
+    assert speculative < sequential - TOKEN_DELAY * TOKENS / 2
+
+
+def _history(store):
+    return [(m.role.value, m.content.strip()) for k in store.get_keys() for m in store.get_messages(k)]
+
+
+def test_speculative_guard_block_discards_the_turn():
+    rag, project = _setup()
+    _guarded(rag, project, speculative=True, block=True)
+    out, elapsed = asyncio.run(_ask(rag, project, stream=True, chat_id="spec"))
+    # Only the block reply; none of the answer's tokens went out.
+    assert out == [out[0]] and out[0]["answer"] == "blocked" and out[0]["status"] == "guard_block"
+    assert elapsed < GUARD_DELAY + TOKEN_DELAY * TOKENS
+    # The engine still finishes its stream in the background, on a scratch
+    # memory: the chat never sees the blocked question or its answer.
+    store = rag.brain.chat_store
+    assert _history(store) == []
+    time.sleep(TOKEN_DELAY * TOKENS * 2)
+    assert _history(store) == []
+
+
+def test_speculative_turn_reaches_the_chat_only_once_passed():
+    rag, project = _setup()
+    store = rag.brain.chat_store
+    _guarded(rag, project, speculative=False, block=False)
+    asyncio.run(_ask(rag, project, chat_id="spec3"))
+    earlier = _history(store)
+    assert [role for role, _ in earlier] == ["user", "assistant"]
+
+    _guarded(rag, project, speculative=True, block=False)
+    out, _ = asyncio.run(_ask(rag, project, stream=True, chat_id="spec3"))
+    assert out[-1] == "event: close\n\n"
+    deadline = time.monotonic() + 5
+    while len(_history(store)) < 4 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    # Appended after the existing history, not written over it.
+    assert _history(store) == earlier + [("user", "what does RESTai serve?"), ("assistant", ("tok " * TOKENS).strip())]
+
+
+def test_speculative_guard_has_its_own_session_and_discarded_turn_is_charged(monkeypatch):
+    import restai.projects.rag as rag_module
+    import restai.tools
+
+    sessions, logged = [], []
+
+    class FakeSession:
+        def __init__(self):
+            self.closed = False
+            sessions.append(self)
+
+        def close(self):
+            self.closed = True
+
+    monkeypatch.setattr(rag_module, "open_db_wrapper", FakeSession)
+    monkeypatch.setattr(restai.tools, "log_inference", lambda project, user, output, db: logged.append((output, db)))
+    rag, project = _setup()
+    _guarded(rag, project, speculative=True, block=True)
+    request_db = object()
+    model = ChatModel(question="what does RESTai serve?", stream=True, id="spec2")
+
+    async def ask():
+        return [line async for line in rag.chat(project, model, types.SimpleNamespace(id=1), request_db)]
+
+    out = asyncio.run(ask())
+    assert out[0]["status"] == "guard_block"
+    assert rag.guard_sessions[0] is sessions[0] and rag.guard_sessions[0] is not request_db
+
+    deadline = time.monotonic() + 5
+    while not (logged and sessions[-1].closed) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    (row, db), = logged
+    assert row["status"] == "guard_discarded" and row["tokens"]["output"] > 0
+    assert db is sessions[-1] and all(s.closed for s in sessions)
@@ -0,0 +1,315 @@
+"""Unit tests for restai/sandbox_pool.py and the warm-pool / handle-cache /
+buffered-heartbeat paths of restai/docker.py, against an in-memory fake of
+the Docker client that knows container names. No daemon, no real DB."""
+import types
+from collections import OrderedDict
+
+import docker.errors as derrors
+import pytest
+
+import restai.config as cfg
+import restai.docker as rd
+from restai.sandbox_pool import ActivityBuffer, WarmPool
+
+
+# ─── fakes ──────────────────────────────────────────────────────────────
+
+class ExecResult:
+    def __init__(self, exit_code=0, output=(b"ok", b"")):
+        self.exit_code = exit_code
+        self.output = output
+
+
+def _conflict():
+    return derrors.APIError("Conflict", response=types.SimpleNamespace(status_code=409))
+
+
+class FakeContainer:
+    def __init__(self, daemon, name, labels):
+        self.daemon = daemon
+        self.name = name
+        self.labels = labels
+        self.id = f"id-{len(daemon.by_id)}"
+        self.short_id = self.id
+        self.status = "running"
+        self.execs = 0
+
+    def rename(self, name):
+        if self.id not in self.daemon.by_id:
+            raise derrors.NotFound("No such container")
+        if name in self.daemon.names():
+            raise _conflict()
+        self.name = name
+
+    def exec_run(self, cmd, **kw):
+        if self.id not in self.daemon.by_id:
+            raise derrors.NotFound("No such container")
+        self.execs += 1
+        return ExecResult()
+
+    def stop(self, timeout=None):
+        # remove=True: a stopped sandbox disappears.
+        self.daemon.by_id.pop(self.id, None)
+
+
+class FakeDaemon:
+    def __init__(self):
+        self.by_id = {}
+        self.calls = []
+
+    def names(self):
+        return {c.name for c in self.by_id.values()}
+
+    def run(self, image, name=None, labels=None, **kw):
+        self.calls.append("run")
+        if name in self.names():
+            raise _conflict()
+        container = FakeContainer(self, name, labels)
+        self.by_id[container.id] = container
+        return container
+
+    def get(self, name):
+        self.calls.append("get")
+        for container in self.by_id.values():
+            if container.name == name:
+                return container
+        raise derrors.NotFound("No such container")
+
+    def list(self, filters=None, limit=None):
+        self.calls.append("list")
+        chat = [f for f in filters["label"] if f.startswith("restai.chat_id=")][0].split("=", 1)[1]
+        return [c for c in self.by_id.values() if c.labels.get("restai.chat_id") == chat]
+
+
+class FakeDB:
+    upserts = []
+
+    def __init__(self):
+        self.db = types.SimpleNamespace(close=lambda: None, commit=lambda: FakeDB.upserts.append("commit"),
+                                        rollback=lambda: None)
+
+    def upsert_docker_activity(self, chat_id, container_id, when=None, commit=True):
+        FakeDB.upserts.append((chat_id, container_id))
+
+    def delete_docker_activity(self, chat_id):
+        pass
+
+
+@pytest.fixture
+def daemon(monkeypatch, tmp_path):
+    monkeypatch.setattr(cfg, "DOCKER_ENABLED", True, raising=False)
+    monkeypatch.setattr(cfg, "DOCKER_URL", "tcp://fake:2375", raising=False)
+    monkeypatch.setattr(cfg, "DOCKER_IMAGE", "python:3.12-slim", raising=False)
+    monkeypatch.setattr(cfg, "DOCKER_NETWORK", "none", raising=False)
+    monkeypatch.setattr(cfg, "DOCKER_READ_ONLY", True, raising=False)
+    monkeypatch.setenv("RESTAI_AGENT_WORKSPACE_ROOT", str(tmp_path))
+    monkeypatch.setattr("restai.observability.instance._cached_id", "install-1")
+
+    fake = FakeDaemon()
+    monkeypatch.setattr(rd, "_client", types.SimpleNamespace(containers=fake))
+    monkeypatch.setattr(rd, "_client_url", "tcp://fake:2375")
+    monkeypatch.setattr(rd, "_handles", OrderedDict())
+    monkeypatch.setattr(rd, "_pool", WarmPool(
+        "docker", create=rd._create_warm_container, discard=rd._discard_container,
+        size=lambda: 2, spec=rd._sandbox_spec, max_age=lambda: 450,
+    ))
+    monkeypatch.setattr(rd, "_activity", ActivityBuffer("docker", rd._touch_db_activity, rd._write_db_activity))
+
+    import restai.database as rdb
+    FakeDB.upserts = []
+    monkeypatch.setattr(rdb, "open_db_wrapper", lambda: FakeDB())
+    return fake
+
+
+# ─── WarmPool ───────────────────────────────────────────────────────────
+
+def _pool(spec="a", size=2, max_age=0):
+    made, dropped = [], []
+    state = {"spec": spec, "size": size, "max_age": max_age}
+
+    def create():
+        made.append(len(made))
+        return made[-1]
+
+    pool = WarmPool("test", create, dropped.append, lambda: state["size"], lambda: state["spec"],
+                    lambda: state["max_age"])
+    return pool, state, made, dropped
+
+
+def test_pool_refills_hands_out_and_counts():
+    pool, _, made, _ = _pool(size=2)
+    assert pool.refill() == 2 and pool.refill() == 0
+    assert [pool.claim(), pool.claim(), pool.claim()] == [0, 1, None]
+    assert pool.refill() == 2
+    stats = pool.stats()
+    assert (stats["size"], stats["created"], stats["claimed"], stats["misses"]) == (2, 4, 2, 1)
+    assert stats["claim_ms_p50"] is not None
+
+
+def test_pool_recycles_on_settings_change_age_and_shrink():
+    pool, state, _, dropped = _pool(size=3)
+    pool.refill()
+    state["spec"] = "b"
+    assert pool.claim() is None  # nothing built for the new settings
+    assert dropped == [0, 1, 2]
+    pool.refill()
+    state["size"] = 1
+    pool.refill()
+    assert dropped == [0, 1, 2, 4, 5]
+    state["max_age"] = 1e-9
+    pool.refill()
+    assert dropped[-1] == 3 and pool.stats()["recycled"] == 6
+
+
+def test_pool_stop_discards_only_unclaimed():
+    pool, _, _, dropped = _pool(size=2)
+    pool.start()
+    pool.refill()
+    claimed = pool.claim()
+    pool.stop()
+    assert claimed not in dropped and dropped
+    assert pool.stats()["size"] == 0
+
+
+def test_pool_creation_failure_is_counted_not_raised():
+    def create():
+        raise RuntimeError("daemon busy")
+
+    pool = WarmPool("test", create, lambda c: None, lambda: 2, lambda: "a", lambda: 0)
+    assert pool.refill() == 0
+    assert pool.stats()["failures"] == 1
+
+
+# ─── ActivityBuffer ─────────────────────────────────────────────────────
+
+def test_activity_inline_until_started(monkeypatch):
+    one, many = [], []
+    buf = ActivityBuffer("test", lambda c, i: one.append((c, i)), many.append)
+    buf.touch("chat1", "c1")
+    assert one == [("chat1", "c1")] and many == []
+
+
+def test_activity_coalesces_and_flushes_on_stop(monkeypatch):
+    monkeypatch.setattr(cfg, "RUNTIME_ACTIVITY_FLUSH_SECONDS", 3600)
+    one, many = [], []
+    buf = ActivityBuffer("test", lambda c, i: one.append((c, i)), many.append)
+    buf.start()
+    for _ in range(50):
+        buf.touch("chat1", "c1")
+        buf.touch("chat2", "c2")
+    buf.touch("gone", "c3")
+    buf.discard("gone")
+    buf.stop()
+    assert one == [] and len(many) == 1
+    assert {k: v[0] for k, v in many[0].items()} == {"chat1": "c1", "chat2": "c2"}
+    assert buf.stats()["touches"] == 101
+
+
+def test_activity_failed_flush_is_retried(monkeypatch):
+    monkeypatch.setattr(cfg, "RUNTIME_ACTIVITY_FLUSH_SECONDS", 3600)
+    writes = []
+
+    def write(batch):
+        writes.append(dict(batch))
+        if len(writes) == 1:
+            raise RuntimeError("db down")
+
+    buf = ActivityBuffer("test", lambda c, i: None, write)
+    buf.start()
+    buf.touch("chat1", "c1")
+    buf.flush()
+    buf.stop()
+    assert [list(w) for w in writes] == [["chat1"], ["chat1"]]
+    assert buf.stats()["failures"] == 1 and buf.stats()["pending"] == 0
+
+
+# ─── docker.py on the pool ──────────────────────────────────────────────
+
+def test_first_call_claims_a_warm_container(daemon):
+    rd._pool.refill()
+    assert daemon.calls == ["run", "run"]
+    warm = set(daemon.by_id)
+
+    assert rd.exec_command("chat1", "true") == "ok"
+    container = rd._handles["chat1"][1]
+    assert container.id in warm
+    assert container.name == rd._container_name("chat1")
+    # Claim row written straight away; the exec heartbeats go inline here
+    # because the buffer isn't running.
+    assert FakeDB.upserts[0] == ("chat1", container.id)
+
+    daemon.calls.clear()
+    rd.exec_command("chat1", "true")
+    assert daemon.calls == []  # cached handle: no lookups
+    assert container.execs == 2
+
+
+def test_other_worker_finds_the_claimed_container_by_name(daemon):
+    rd._pool.refill()
+    rd.exec_command("chat1", "true")
+    mine = rd._handles["chat1"][1]
+    rd._handles.clear()  # a sibling worker with an empty cache
+    daemon.calls.clear()
+    rd.exec_command("chat1", "true")
+    assert daemon.calls == ["get"]
+    assert rd._handles["chat1"][1] is mine
+
+
+def test_empty_pool_creates_a_named_container(daemon):
+    rd.exec_command("chat1", "true")
+    container = rd._handles["chat1"][1]
+    assert container.labels["restai.chat_id"] == "chat1"
+    assert container.name == rd._container_name("chat1")
+    assert rd._pool.stats()["misses"] == 1
+
+
+def test_gone_container_is_replaced_transparently(daemon):
+    rd.exec_command("chat1", "true")
+    first = rd._handles["chat1"][1]
+    first.stop()  # evicted by the cleanup cron
+    assert rd.exec_command("chat1", "true") == "ok"
+    second = rd._handles["chat1"][1]
+    assert second is not first and second.execs == 1
+
+
+def test_least_recently_used_handle_is_evicted(daemon, monkeypatch):
+    monkeypatch.setattr(rd, "_MAX_HANDLES", 2)
+    for chat_id in ("chat1", "chat2", "chat1", "chat3"):
+        rd.exec_command(chat_id, "true")
+    assert list(rd._handles) == ["chat1", "chat3"]
+    assert rd.exec_command("chat2", "true") == "ok"  # found again by name
+
+
+def test_claim_race_uses_the_winners_container(daemon):
+    rd._pool.refill()
+    winner = daemon.run("img", name=rd._container_name("chat1"), labels={"restai.chat_id": ""})
+    assert rd._claim_warm("chat1") is winner
+    assert rd._pool.stats()["size"] == 2  # ours went back to the pool
+
+
+def test_heartbeats_are_buffered_while_running(daemon, monkeypatch):
+    monkeypatch.setattr(cfg, "RUNTIME_ACTIVITY_FLUSH_SECONDS", 3600)
+    rd._activity.start()
+    for _ in range(10):
+        rd.exec_command("chat1", "true")
+    container = rd._handles["chat1"][1]
+    assert FakeDB.upserts == []
+    rd._activity.stop()
+    assert FakeDB.upserts == [("chat1", container.id), "commit"]
+
+
+def test_settings_change_invalidates_handles_and_pool(daemon, monkeypatch):
+    rd._pool.refill()
+    rd.exec_command("chat1", "true")
+    monkeypatch.setattr(cfg, "DOCKER_IMAGE", "python:3.13-slim", raising=False)
+    monkeypatch.setattr(rd, "_client", types.SimpleNamespace(containers=daemon))
+    assert rd._pool.claim() is None
+    daemon.calls.clear()
+    rd.exec_command("chat1", "true")
+    assert daemon.calls[0] == "get"  # the old handle wasn't trusted
+
+
+def test_remove_container_forgets_the_handle(daemon):
+    rd.exec_command("chat1", "true")
+    rd.remove_container("chat1")
+    assert "chat1" not in rd._handles and daemon.by_id == {}
@@ -173,3 +173,53 @@ def test_update_sso_auto_team_id(client):
         f"/teams/{team_id}",
         auth=("admin", RESTAI_DEFAULT_PASSWORD),
     )
+
+
+def test_settings_snapshot_serves_from_memory(client, monkeypatch):
+    """Repeat reads inside the TTL never touch the DB."""
+    monkeypatch.setattr(config, "SETTINGS_CACHE_TTL", 60.0)
+    config.invalidate_settings_cache()
+    config._read_setting("app_name")
+    before = config.settings_cache_stats()
+    for _ in range(20):
+        config._read_setting("app_name")
+        config._read_setting("docker_image")
+    after = config.settings_cache_stats()
+    assert after["misses"] == before["misses"]
+    assert after["version_checks"] == before["version_checks"]
+    assert after["hits"] - before["hits"] >= 40
+
+
+def test_settings_snapshot_picks_up_other_worker_write(client, monkeypatch):
+    """A write that lands in another worker (row change + version bump, but no
+    local invalidation) is seen once the TTL window has elapsed."""
+    from sqlalchemy import update
+
+    from restai.database import open_db_wrapper
+    from restai.db.settings import SETTINGS_VERSION_KEY
+    from restai.models.databasemodels import SettingDatabase
+
+    monkeypatch.setattr(config, "SETTINGS_CACHE_TTL", 60.0)
+    config.invalidate_settings_cache()
+    original = config.CURRENCY
+
+    db = open_db_wrapper()
+    try:
+        version = int(db.get_settings_version() or 0)
+        db.db.execute(update(SettingDatabase).where(SettingDatabase.key == "currency").values(value="JPY"))
+        db.db.execute(
+            update(SettingDatabase)
+            .where(SettingDatabase.key == SETTINGS_VERSION_KEY)
+            .values(value=str(version + 1))
+        )
+        db.db.commit()
+
+        # Still inside the staleness window: the old snapshot is served.
+        assert config.CURRENCY == original
+
+        monkeypatch.setattr(config, "_settings_checked_at", 0.0)
+        assert config.CURRENCY == "JPY"
+    finally:
+        db.upsert_setting("currency", original)
+        db.db.close()
+    assert config.CURRENCY == original
@@ -343,6 +343,7 @@ def test_cleanup(client):
             if row is not None:
                 row.value = value
         db.db.commit()
+        db.bump_settings_version()
     finally:
         db.db.close()
     client.delete(f"/users/{plain_user}", auth=ADMIN)
@@ -0,0 +1,73 @@
+"""Unit tests for restai/sql_engines.py — the shared engine registry used by
+PGVectorDB and NL→SQL. Uses throwaway SQLite files as stand-in databases."""
+import sqlite3
+
+import pytest
+
+from restai import config
+import restai.sql_engines as se
+
+
+@pytest.fixture(autouse=True)
+def _clean_registry():
+    se.dispose_engine()
+    yield
+    se.dispose_engine()
+
+
+def _db(tmp_path, name="a.db", tables=("customers", "orders")):
+    path = tmp_path / name
+    conn = sqlite3.connect(path)
+    for t in tables:
+        conn.execute(f"CREATE TABLE {t} (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.commit()
+    conn.close()
+    return f"sqlite:///{path}"
+
+
+def test_engine_is_shared_per_connection_string(tmp_path):
+    a, b = _db(tmp_path, "a.db"), _db(tmp_path, "b.db")
+    assert se.get_engine(a) is se.get_engine(a)
+    assert se.get_engine(a) is not se.get_engine(b)
+
+
+def test_idle_engines_are_disposed(tmp_path, monkeypatch):
+    a, b = _db(tmp_path, "a.db"), _db(tmp_path, "b.db")
+    first = se.get_engine(a)
+    monkeypatch.setattr(config, "SQL_ENGINE_IDLE_TTL", -1)
+    se.get_engine(b)
+    monkeypatch.setattr(config, "SQL_ENGINE_IDLE_TTL", 600)
+    assert se.get_engine(a) is not first
+
+
+def test_engine_count_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SQL_ENGINE_MAX_ENGINES", 2)
+    urls = [_db(tmp_path, f"{i}.db") for i in range(3)]
+    engines = [se.get_engine(u) for u in urls]
+    # Oldest one was evicted; the two most recent survive.
+    assert se.get_engine(urls[2]) is engines[2]
+    assert se.get_engine(urls[1]) is engines[1]
+    assert se.get_engine(urls[0]) is not engines[0]
+
+
+def test_schema_reflection_is_cached_per_allowlist(tmp_path):
+    url = _db(tmp_path)
+    full = se.get_sql_database(url)
+    assert se.get_sql_database(url) is full
+    assert sorted(full.get_usable_table_names()) == ["customers", "orders"]
+
+    narrowed = se.get_sql_database(url, ["orders"])
+    assert narrowed is not full
+    assert list(narrowed.get_usable_table_names()) == ["orders"]
+    assert se.get_sql_database(url, ["orders"]) is narrowed
+
+
+def test_invalidate_and_ttl_force_a_fresh_reflection(tmp_path, monkeypatch):
+    url = _db(tmp_path)
+    first = se.get_sql_database(url)
+    se.invalidate_sql_schema(url)
+    second = se.get_sql_database(url)
+    assert second is not first
+
+    monkeypatch.setattr(config, "SQL_SCHEMA_CACHE_TTL", 0)
+    assert se.get_sql_database(url) is not second
@@ -1,7 +1,7 @@
 """Unit tests for restai/integrations/sync.py — the knowledge-sync
 engine. All HTTP / S3 / vendor SDK calls are mocked; per-source dispatch,
-SSRF guard, pagination, delete-then-reindex, and entity-extraction
-error-swallowing are exercised."""
+SSRF guard, pagination, fingerprint skipping, manifest-driven incremental
+reindex, and entity-extraction error-swallowing are exercised."""
 
 import json
 from types import SimpleNamespace
@@ -102,33 +102,26 @@ def test_sync_url_happy_path_reindexes():
     docs = [_doc("page text")]
     reader = MagicMock()
     reader.load_data.return_value = docs
+    db = MagicMock()
     with patch("restai.helper._is_private_ip", return_value=False), \
          patch("restai.loaders.url.SeleniumWebReader", return_value=reader), \
          patch("restai.vectordb.tools.extract_keywords_for_metadata", side_effect=lambda d: d), \
-         patch("restai.vectordb.tools.index_documents_classic", return_value=3) as idx:
-        sync_mod._sync_url(project, source, MagicMock())
+         patch.object(sync_mod, "_reindex", return_value=(3, 0, 0)) as idx:
+        sync_mod._sync_url(project, source, db)
 
     reader.load_data.assert_called_once_with(urls=["http://public.example/page"])
-    # Old chunks removed before reindex, metadata stamped, index saved.
-    project.vector.delete_source.assert_called_once_with("docs")
+    # Metadata stamped, single-source reindex, index saved.
     assert docs[0].metadata["source"] == "docs"
-    idx.assert_called_once_with(project, docs, source.splitter, source.chunks)
+    idx.assert_called_once_with(project, source, docs, db, prefixed=False)
     project.vector.save.assert_called_once()
 
 
-def test_sync_url_delete_failure_does_not_abort():
+def test_legacy_chunk_delete_failure_does_not_abort():
     source = SyncSource(type="url", name="docs", url="http://public.example/page")
     project = _project()
     project.vector.delete_source.side_effect = RuntimeError("chroma sad")
-    reader = MagicMock()
-    reader.load_data.return_value = [_doc()]
-    with patch("restai.helper._is_private_ip", return_value=False), \
-         patch("restai.loaders.url.SeleniumWebReader", return_value=reader), \
-         patch("restai.vectordb.tools.extract_keywords_for_metadata", side_effect=lambda d: d), \
-         patch("restai.vectordb.tools.index_documents_classic", return_value=1) as idx:
-        sync_mod._sync_url(project, source, MagicMock())
-    idx.assert_called_once()
-    project.vector.save.assert_called_once()
+    sync_mod._delete_legacy_chunks(project, source, prefixed=False)
+    project.vector.delete_source.assert_called_once_with("docs")
 
 
 # ─── Confluence source ──────────────────────────────────────────────────
@@ -166,13 +159,13 @@ def test_sync_confluence_paginates_and_strips_html():
 
     captured = {}
 
-    def fake_index(project_, documents, splitter, chunks):
+    def fake_reindex(project_, source_, documents, db, *args, **kwargs):
         captured["docs"] = documents
-        return 2
+        return 2, 0, 0
 
     with patch("restai.helper._safe_get", side_effect=[_resp(page1), _resp(page2)]) as rg, \
          patch("restai.vectordb.tools.extract_keywords_for_metadata", side_effect=lambda d: d), \
-         patch("restai.vectordb.tools.index_documents_classic", side_effect=fake_index):
+         patch.object(sync_mod, "_reindex", side_effect=fake_reindex):
         sync_mod._sync_confluence(project, source, MagicMock())
 
     docs = captured["docs"]
@@ -194,7 +187,7 @@ def test_sync_confluence_no_pages_is_noop():
     )
     project = _project()
     with patch("restai.helper._safe_get", return_value=_resp({"results": [], "_links": {}})), \
-         patch("restai.vectordb.tools.index_documents_classic") as idx:
+         patch.object(sync_mod, "_reindex") as idx:
         sync_mod._sync_confluence(project, source, MagicMock())
     idx.assert_not_called()
     project.vector.save.assert_not_called()
@@ -208,13 +201,12 @@ def test_sync_s3_lists_downloads_and_indexes(tmp_path):
         s3_region="eu-west-1", s3_access_key="AK", s3_secret_key="SK",
     )
     project = _project()
-    project.vector.list.return_value = ["bucketsrc/old.txt", "unrelated"]
 
     paginator = MagicMock()
     paginator.paginate.return_value = [
         {"Contents": [
             {"Key": "docs/"},              # folder marker — skipped
-            {"Key": "docs/a.txt"},
+            {"Key": "docs/a.txt", "ETag": '"e1"'},
         ]},
     ]
     s3 = MagicMock()
@@ -227,7 +219,8 @@ def test_sync_s3_lists_downloads_and_indexes(tmp_path):
     with patch("boto3.client", return_value=s3) as bc, \
          patch("restai.vectordb.tools.find_file_loader", return_value=loader), \
          patch("restai.vectordb.tools.extract_keywords_for_metadata", side_effect=lambda d: d), \
-         patch("restai.vectordb.tools.index_documents_classic", return_value=5) as idx:
+         patch.object(sync_mod, "_known_fingerprints", return_value={}), \
+         patch.object(sync_mod, "_reindex", return_value=(5, 0, 0)) as idx:
         sync_mod._sync_s3(project, source, MagicMock())
 
     # Credentials and region forwarded to boto3.
@@ -236,9 +229,31 @@ def test_sync_s3_lists_downloads_and_indexes(tmp_path):
     assert kwargs["aws_access_key_id"] == "AK"
     s3.download_fileobj.assert_called_once()
     assert docs[0].metadata["source"] == "bucketsrc/a.txt"
-    # Stale chunks for this source's namespace removed; unrelated kept.
-    project.vector.delete_source.assert_called_once_with("bucketsrc/old.txt")
-    idx.assert_called_once()
+    # Object fingerprints handed to the reindex for the manifest.
+    args = idx.call_args.args
+    assert args[2] == docs
+    assert args[4] == set()
+    assert args[5] == {"bucketsrc/a.txt": '"e1"'}
+    project.vector.save.assert_called_once()
+
+
+def test_sync_s3_skips_objects_with_unchanged_etag():
+    source = SyncSource(type="s3", name="bucketsrc", s3_bucket="mybucket",
+                        s3_access_key="AK", s3_secret_key="SK")
+    project = _project()
+    paginator = MagicMock()
+    paginator.paginate.return_value = [{"Contents": [{"Key": "a.txt", "ETag": '"e1"'}]}]
+    s3 = MagicMock()
+    s3.get_paginator.return_value = paginator
+    with patch("boto3.client", return_value=s3), \
+         patch.object(sync_mod, "_known_fingerprints", return_value={"bucketsrc/a.txt": '"e1"'}), \
+         patch.object(sync_mod, "_reindex", return_value=(0, 0, 0)) as idx:
+        sync_mod._sync_s3(project, source, MagicMock())
+    s3.download_fileobj.assert_not_called()
+    # Still reconciled so objects deleted upstream are dropped.
+    args = idx.call_args.args
+    assert args[2] == []
+    assert args[4] == {"bucketsrc/a.txt"}
     project.vector.save.assert_called_once()
 
 
@@ -251,7 +266,8 @@ def test_sync_s3_no_documents_is_noop():
     s3 = MagicMock()
     s3.get_paginator.return_value = paginator
     with patch("boto3.client", return_value=s3), \
-         patch("restai.vectordb.tools.index_documents_classic") as idx:
+         patch.object(sync_mod, "_known_fingerprints", return_value={}), \
+         patch.object(sync_mod, "_reindex") as idx:
         sync_mod._sync_s3(project, source, MagicMock())
     idx.assert_not_called()
     project.vector.save.assert_not_called()
@@ -328,7 +344,8 @@ def test_sync_sharepoint_downloads_folder_files():
          patch("requests.get", side_effect=get_responses) as rg, \
          patch("restai.vectordb.tools.find_file_loader", return_value=loader), \
          patch("restai.vectordb.tools.extract_keywords_for_metadata", side_effect=lambda d: d), \
-         patch("restai.vectordb.tools.index_documents_classic", return_value=2) as idx:
+         patch.object(sync_mod, "_known_fingerprints", return_value={}), \
+         patch.object(sync_mod, "_reindex", return_value=(2, 0, 0)) as idx:
         sync_mod._sync_sharepoint(project, source, MagicMock())
 
     # Client-credentials grant against the tenant.
@@ -370,9 +387,9 @@ def test_sync_gdrive_exports_google_docs_as_text():
 
     captured = {}
 
-    def fake_index(project_, documents, splitter, chunks):
+    def fake_reindex(project_, source_, documents, db, *args, **kwargs):
         captured["docs"] = documents
-        return 1
+        return 1, 0, 0
 
     def fake_find_loader(ext, eargs=None):
         raise Exception("Invalid file type.")  # unsupported binary — skipped
@@ -382,7 +399,8 @@ def test_sync_gdrive_exports_google_docs_as_text():
          patch("requests.get", side_effect=get_responses), \
          patch("restai.vectordb.tools.find_file_loader", side_effect=fake_find_loader), \
          patch("restai.vectordb.tools.extract_keywords_for_metadata", side_effect=lambda d: d), \
-         patch("restai.vectordb.tools.index_documents_classic", side_effect=fake_index):
+         patch.object(sync_mod, "_known_fingerprints", return_value={}), \
+         patch.object(sync_mod, "_reindex", side_effect=fake_reindex):
         sync_mod._sync_gdrive(project, source, MagicMock())
 
     je.assert_called_once()
@@ -404,7 +422,8 @@ def test_sync_gdrive_no_documents_is_noop():
     with patch("jwt.encode", return_value="signed-jwt"), \
          patch("requests.post", return_value=_resp({"access_token": "at"})), \
          patch("requests.get", return_value=_resp({"files": []})), \
-         patch("restai.vectordb.tools.index_documents_classic") as idx:
+         patch.object(sync_mod, "_known_fingerprints", return_value={}), \
+         patch.object(sync_mod, "_reindex") as idx:
         sync_mod._sync_gdrive(project, source, MagicMock())
     idx.assert_not_called()
 
@@ -544,3 +563,113 @@ def test_run_sync_now_non_rag_project_is_noop():
         sync_mod.run_sync_now(1, brain)
     ss.assert_not_called()
     db.db.close.assert_called_once()
+
+
+# ─── incremental reindex (chunk manifest) ───────────────────────────────
+
+class _ManifestVector:
+    """Vector store stand-in that records inserts and deletes by node id."""
+
+    def __init__(self):
+        self.ids = {}
+        self.deleted = []
+        self.failing = False
+        self.list_calls = 0
+        self.index = SimpleNamespace(insert_nodes=self._insert)
+
+    def _insert(self, nodes):
+        for node in nodes:
+            self.ids[node.node_id] = node.text
+
+    def delete_ids(self, ids):
+        if self.failing:
+            return []
+        self.deleted.extend(ids)
+        for i in ids:
+            self.ids.pop(i, None)
+        return list(ids)
+
+    def list(self):
+        self.list_calls += 1
+        return []
+
+    def delete_source(self, source):
+        return []
+
+
+@pytest.fixture
+def manifest_env():
+    from restai.database import open_db_wrapper
+    from llama_index.core.schema import Document
+
+    db = open_db_wrapper()
+    project = SimpleNamespace(
+        props=SimpleNamespace(id=987650, embeddings="emb-a"),
+        vector=_ManifestVector(),
+    )
+    source = SyncSource(type="s3", name="incsrc", s3_bucket="b", chunks=64)
+    sync_mod.forget_chunk_manifest(db, project.props.id)
+
+    def docs(**texts):
+        return [Document(text=t, metadata={"source": f"incsrc/{name}"}) for name, t in texts.items()]
+
+    try:
+        yield db, project, source, docs
+    finally:
+        sync_mod.forget_chunk_manifest(db, project.props.id)
+        db.db.close()
+
+
+def test_reindex_only_embeds_changed_chunks(manifest_env):
+    db, project, source, docs = manifest_env
+
+    added, kept, removed = sync_mod._reindex(project, source, docs(a="alpha text", b="beta text"), db)
+    assert (added, kept, removed) == (2, 0, 0)
+    assert project.vector.list_calls == 1  # legacy cleanup on first sync only
+    first_ids = set(project.vector.ids)
+
+    added, kept, removed = sync_mod._reindex(project, source, docs(a="alpha text", b="beta v2"), db)
+    assert (added, kept, removed) == (1, 1, 1)
+    assert project.vector.list_calls == 1
+    assert sorted(project.vector.ids.values()) == ["alpha text", "beta v2"]
+    assert len(first_ids & set(project.vector.ids)) == 1
+
+
+def test_reindex_drops_sources_gone_upstream_but_keeps_skipped(manifest_env):
+    db, project, source, docs = manifest_env
+    sync_mod._reindex(project, source, docs(a="alpha", b="beta"), db,
+                      fingerprints={"incsrc/a": "e1", "incsrc/b": "e2"})
+    assert sync_mod._known_fingerprints(project, source, db) == {"incsrc/a": "e1", "incsrc/b": "e2"}
+
+    # a unchanged upstream (skipped), b deleted upstream.
+    added, kept, removed = sync_mod._reindex(project, source, [], db, skipped={"incsrc/a"},
+                                             fingerprints={"incsrc/a": "e1"})
+    assert (added, kept, removed) == (0, 0, 1)
+    assert list(project.vector.ids.values()) == ["alpha"]
+
+
+def test_reindex_reembeds_after_embedding_model_change(manifest_env):
+    db, project, source, docs = manifest_env
+    sync_mod._reindex(project, source, docs(a="alpha"), db, fingerprints={"incsrc/a": "e1"})
+
+    project.props.embeddings = "emb-b"
+    assert sync_mod._known_fingerprints(project, source, db) == {}
+    added, kept, removed = sync_mod._reindex(project, source, docs(a="alpha"), db)
+    assert (added, kept, removed) == (1, 0, 1)
+    assert list(project.vector.ids.values()) == ["alpha"]
+
+
+def test_reindex_keeps_manifest_rows_whose_vector_delete_failed(manifest_env):
+    db, project, source, docs = manifest_env
+    sync_mod._reindex(project, source, docs(a="alpha", b="beta"), db)
+
+    project.vector.failing = True
+    added, kept, removed = sync_mod._reindex(project, source, docs(a="alpha"), db)
+    assert (added, kept, removed) == (0, 1, 0)
+    assert sorted(project.vector.ids.values()) == ["alpha", "beta"]
+
+    # The stale chunk is still in the manifest, so the next sync retries it.
+    project.vector.failing = False
+    added, kept, removed = sync_mod._reindex(project, source, docs(a="alpha"), db)
+    assert (added, kept, removed) == (0, 1, 1)
+    assert list(project.vector.ids.values()) == ["alpha"]
@@ -0,0 +1,154 @@
+"""Tests for restai/utils/upstream_pool.py — the shared keep-alive clients
+behind the /v1 native passthrough. Runs a tiny local HTTP/1.1 upstream that
+counts TCP connections, so reuse is measured rather than assumed. Run with
+`-s` to see the timings."""
+import asyncio
+import json
+import time
+
+import pytest
+
+from restai import config
+from restai.utils import openai_compat as oc
+from restai.utils.upstream_pool import UpstreamPool, origin_of
+
+REQUESTS = 20
+
+
+class _Upstream:
+    """Minimal keep-alive JSON server; `status` is returned for every request."""
+
+    def __init__(self, status=200, set_cookie=None):
+        self.status = status
+        self.set_cookie = set_cookie
+        self.cookies_seen = []
+        self.connections = 0
+        self.server = None
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                cookie = None
+                for line in head.decode().split("\r\n"):
+                    if line.lower().startswith("content-length:"):
+                        length = int(line.split(":", 1)[1])
+                    elif line.lower().startswith("cookie:"):
+                        cookie = line.split(":", 1)[1].strip()
+                self.cookies_seen.append(cookie)
+                await reader.readexactly(length)
+                body = json.dumps({"id": "cmpl-1"}).encode()
+                extra = f"Set-Cookie: {self.set_cookie}\r\n" if self.set_cookie else ""
+                writer.write(
+                    f"HTTP/1.1 {self.status} X\r\nContent-Type: application/json\r\n{extra}"
+                    f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/v1/chat/completions"
+        return self
+
+    async def __aexit__(self, *a):
+        self.server.close()
+
+
+@pytest.fixture()
+def pool(monkeypatch):
+    p = UpstreamPool()
+    monkeypatch.setattr(oc, "upstream_pool", p)
+    return p
+
+
+def test_origin_of_normalizes_default_ports():
+    assert origin_of("https://api.openai.com/v1/chat/completions") == "https://api.openai.com:443"
+    assert origin_of("http://vllm:8000/v1/completions") == "http://vllm:8000"
+
+
+def test_passthrough_reuses_one_connection(pool):
+    async def run():
+        async with _Upstream() as up:
+            started = time.perf_counter()
+            for _ in range(REQUESTS):
+                status, data = await oc.passthrough_json(up.url, {}, {"model": "m"})
+                assert (status, data) == (200, {"id": "cmpl-1"})
+            elapsed = time.perf_counter() - started
+            await pool.aclose()
+            return up.connections, elapsed
+
+    connections, elapsed = asyncio.run(run())
+    print(f"\n{REQUESTS} passthrough calls over {connections} connection(s) in {elapsed * 1000:.0f} ms")
+    assert connections == 1
+    stats = pool.stats()["upstreams"]
+    (entry,) = stats.values()
+    assert entry["requests"] == REQUESTS and entry["errors"] == 0
+    assert entry["clients_created"] == 1
+    assert sum(entry["latency_ms"].values()) == REQUESTS
+
+
+def test_shared_client_never_replays_upstream_cookies(pool):
+    async def run():
+        async with _Upstream(set_cookie="session=alice; Path=/") as up:
+            for _ in range(3):
+                await oc.passthrough_json(up.url, {}, {})
+            client = await pool.client(up.url)
+            await pool.aclose()
+            return up.cookies_seen, len(client.cookies.jar)
+
+    seen, stored = asyncio.run(run())
+    assert seen == [None, None, None] and stored == 0
+
+
+def test_upstream_errors_are_counted(pool):
+    async def run():
+        async with _Upstream(status=503) as up:
+            status, _ = await oc.passthrough_json(up.url, {}, {})
+            await pool.aclose()
+            return status
+
+    assert asyncio.run(run()) == 503
+    (entry,) = pool.stats()["upstreams"].values()
+    assert entry["errors"] == 1
+
+
+def test_connection_failure_is_counted_and_raised(pool):
+    async def run():
+        async with _Upstream() as up:
+            url = up.url
+        # Server closed: nothing listens on that port any more.
+        await oc.passthrough_json(url, {}, {})
+
+    with pytest.raises(Exception):
+        asyncio.run(run())
+    (entry,) = pool.stats()["upstreams"].values()
+    assert entry["errors"] == 1
+
+
+def test_clients_are_per_loop_and_idle_ones_are_closed(pool, monkeypatch):
+    async def get(url):
+        return await pool.client(url)
+
+    a = asyncio.run(get("http://a:1/x"))
+    b = asyncio.run(get("http://a:1/x"))
+    assert a is not b  # new loop, new client; the closed loop's entry is dropped
+    assert pool.stats()["open_clients"] == 1
+
+    monkeypatch.setattr(config, "UPSTREAM_HTTP_IDLE_SECONDS", 0)
+
+    async def two_origins():
+        first = await pool.client("http://a:1/x")
+        assert await pool.client("http://a:1/y") is first
+        await asyncio.sleep(0.01)
+        await pool.client("http://b:2/x")  # evicts the idle http://a:1 client
+        return first
+
+    first = asyncio.run(two_origins())
+    assert first.is_closed
@@ -0,0 +1,237 @@
+"""Unit tests for restai/vectordb/catalog.py against the real sqlite test
+database, and for the catalog-backed listings of ChromaDBVector on an
+in-memory Chroma client. The benchmark against the old full-scan listing
+loads 20,000 chunks and only runs with `RESTAI_BENCHMARKS=1` (add `-s` for
+the timings)."""
+import os
+import random
+import time
+from types import SimpleNamespace
+
+import chromadb
+import pytest
+from sqlalchemy.exc import IntegrityError
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.schema import TextNode
+
+import restai.vectordb.chromadb as chroma_module
+import restai.vectordb.tools as vt
+from restai.database import open_db_wrapper
+from restai.models.databasemodels import VectorCatalogChunkDatabase, VectorCatalogSourceDatabase
+from restai.vectordb.catalog import SourceCatalog
+from restai.vectordb.chromadb import ChromaDBVector
+
+BENCHMARK_CHUNKS = 20000
+BENCHMARK_SOURCES = 1000
+
+
+@pytest.fixture()
+def project_id():
+    pid = random.randint(10**8, 10**9)
+    yield pid
+    wrapper = open_db_wrapper()
+    for table in (VectorCatalogChunkDatabase, VectorCatalogSourceDatabase):
+        wrapper.db.query(table).filter(table.project_id == pid).delete()
+    wrapper.db.commit()
+    wrapper.close()
+
+
+@pytest.fixture()
+def vector(project_id, monkeypatch, tmp_path):
+    client = chromadb.EphemeralClient()
+    monkeypatch.setattr(chroma_module, "_get_client", lambda path=None: client)
+    monkeypatch.setattr(chroma_module, "find_embeddings_path", lambda key: str(tmp_path))
+    embedding = SimpleNamespace(embedding=MockEmbedding(embed_dim=8), props=SimpleNamespace(class_name="OpenAI"))
+    vec = ChromaDBVector(None, SimpleNamespace(props=SimpleNamespace(id=project_id)), embedding)
+    yield vec
+    client.delete_collection(vec.store_key)
+
+
+def _nodes(source, n, start=0):
+    return [
+        TextNode(id_=f"{source}-{i}", text=f"chunk {i} of {source}", metadata={"source": source})
+        for i in range(start, start + n)
+    ]
+
+
+def _ingest(vec, nodes):
+    vt.insert_nodes_batched(SimpleNamespace(vector=vec), nodes)
+
+
+def test_catalog_counts_follow_adds_and_deletes(project_id):
+    catalog = SourceCatalog(project_id)
+    catalog.add(_nodes("a.pdf", 3) + _nodes("b.pdf", 2))
+    catalog.add(_nodes("a.pdf", 2, start=2))  # a-2 again: not counted twice
+    catalog.add([TextNode(id_="orphan", text="no source")])
+
+    assert [(r["source"], r["chunks"]) for r in catalog.sources()] == [("a.pdf", 4), ("b.pdf", 2)]
+    assert catalog.chunk_count() == 7
+    assert catalog.source_count() == 2
+    assert sorted(catalog.ids("b.pdf")) == ["b.pdf-0", "b.pdf-1"]
+
+    catalog.remove_ids(["a.pdf-0", "b.pdf-0", "b.pdf-1", "unknown"])
+    assert [(r["source"], r["chunks"]) for r in catalog.sources()] == [("a.pdf", 3)]
+    catalog.remove_source("a.pdf")
+    assert catalog.sources() == [] and catalog.chunk_count() == 1
+    catalog.clear()
+    assert catalog.chunk_count() == 0
+
+
+def test_catalog_pages_in_ingest_order(project_id):
+    catalog = SourceCatalog(project_id)
+    for name in ["z.txt", "m.txt", "a.txt", "q.txt"]:
+        catalog.add(_nodes(name, 1))
+    assert [r["source"] for r in catalog.sources(1, 2)] == ["m.txt", "a.txt"]
+    assert [r["source"] for r in catalog.sources(3)] == ["q.txt"]
+    first = catalog.sources(0, 1)[0]
+    catalog.add(_nodes("z.txt", 1, start=1))
+    again = catalog.sources(0, 1)[0]
+    assert again["chunks"] == 2 and again["created_at"] == first["created_at"]
+    assert again["updated_at"] >= first["updated_at"]
+
+
+def test_chroma_listings_come_from_the_catalog(vector):
+    _ingest(vector, _nodes("a.pdf", 3) + _nodes("b.pdf", 2) + _nodes("c.pdf", 1))
+    assert vector.info() == 6
+    assert vector.list() == ["a.pdf", "b.pdf", "c.pdf"]
+    assert vector.list(offset=1, limit=1) == ["b.pdf"]
+    assert vector.count_sources() == 3
+    assert vector.list_source("a.pdf") == ["a.pdf"] * 3
+
+    assert sorted(vector.delete_source("a.pdf")) == ["a.pdf-0", "a.pdf-1", "a.pdf-2"]
+    vector.delete_ids(["b.pdf-0"])
+    vector.delete_id("c.pdf-0")
+    assert [(r["source"], r["chunks"]) for r in vector.list_sources()] == [("b.pdf", 1)]
+    assert vector.info() == vector.catalog.chunk_count() == 1
+
+    vector.reset(None)
+    assert vector.list() == [] and vector.catalog.chunk_count() == 0
+
+
+def test_empty_catalog_is_built_from_the_store(vector):
+    # Written behind the catalog's back, e.g. before the catalog existed.
+    vector.index.insert_nodes(_nodes("old.pdf", 4) + _nodes("older.pdf", 1))
+    assert vector.catalog.chunk_count() == 0
+    assert sorted(vector.list()) == ["old.pdf", "older.pdf"]
+    assert vector.catalog.chunk_count() == 5
+
+
+def test_drift_waits_for_an_explicit_reconcile(vector, monkeypatch):
+    _ingest(vector, _nodes("old.pdf", 4))
+    vector.chroma_collection.delete(ids=["old.pdf-0"])
+    # A listing never rescans on a mismatch: mid-ingest it isn't drift.
+    scans = []
+    monkeypatch.setattr(vector, "scan", lambda: scans.append(1) or ChromaDBVector.scan(vector))
+    assert vector.list_source("old.pdf") == ["old.pdf"] * 4 and not scans
+    assert vector.catalog_drifted()
+
+    vector.reconcile_catalog()
+    assert vector.list_source("old.pdf") == ["old.pdf"] * 3
+    assert not vector.catalog_drifted()
+
+
+def test_catalog_drift_is_not_reported_without_an_exact_count(vector, monkeypatch):
+    _ingest(vector, _nodes("a.pdf", 2))
+    vector.chroma_collection.delete(ids=["a.pdf-0"])
+    monkeypatch.setattr(vector, "exact_count", False)
+    assert not vector.catalog_drifted()
+
+
+def test_rebuild_retries_when_an_add_lands_mid_rebuild(project_id, monkeypatch):
+    catalog = SourceCatalog(project_id)
+    rebuild = catalog._rebuild
+    attempts = []
+
+    def _rebuild(session, chunks):
+        attempts.append(1)
+        rebuild(session, chunks)
+        if len(attempts) == 1:
+            # What a concurrent add committing the same vector id raises.
+            raise IntegrityError("INSERT", {}, Exception("UNIQUE constraint failed"))
+
+    monkeypatch.setattr(catalog, "_rebuild", _rebuild)
+    catalog.rebuild(iter([("a.pdf-0", "a.pdf"), ("a.pdf-1", "a.pdf")]))
+    assert len(attempts) == 2
+    assert [(r["source"], r["chunks"]) for r in catalog.sources()] == [("a.pdf", 2)]
+
+
+class _FakePineconeIndex:
+    def __init__(self, vectors):
+        self.vectors = dict(vectors)  # id -> source
+
+    def list(self, namespace):
+        yield sorted(self.vectors)
+
+    def fetch(self, ids, namespace):
+        return SimpleNamespace(vectors={
+            vid: SimpleNamespace(metadata={"source": self.vectors[vid]}) for vid in ids if vid in self.vectors
+        })
+
+    def delete(self, ids, namespace):
+        for vid in ids:
+            self.vectors.pop(vid, None)
+
+
+def test_pinecone_delete_source_removes_vectors_the_catalog_missed(project_id):
+    from restai.vectordb.pinecone import PineconeDB
+
+    vec = object.__new__(PineconeDB)
+    vec.namespace, vec.catalog = "p1", SourceCatalog(project_id)
+    vec.pinecone_index = _FakePineconeIndex({"a-0": "a.pdf", "a-1": "a.pdf", "b-0": "b.pdf"})
+    # The add for a-1 never reached the catalog.
+    vec.catalog.add([TextNode(id_="a-0", text="x", metadata={"source": "a.pdf"})])
+    assert vec.delete_source("a.pdf") == ["a-0", "a-1"]
+    assert vec.pinecone_index.vectors == {"b-0": "b.pdf"}
+    assert vec.catalog.chunk_count("a.pdf") == 0
+
+
+def test_list_all_chunks_pages_the_collection(vector, monkeypatch):
+    monkeypatch.setattr(chroma_module, "_SCAN_PAGE", 4)
+    _ingest(vector, _nodes("a.pdf", 10))
+    chunks = vector.list_all_chunks()
+    assert len(chunks) == 10 and {c["source"] for c in chunks} == {"a.pdf"}
+    assert [c["id"] for c in vector.list_all_chunks(limit=5, offset=3)] == [c["id"] for c in chunks[3:8]]
+
+
+def _legacy_list(collection):
+    """The old ChromaDBVector.list()."""
+    output = []
+    docs = collection.get(include=["metadatas"])
+    for metadata in docs["metadatas"]:
+        if metadata["source"] not in output:
+            output.append(metadata["source"])
+    return output
+
+
+@pytest.mark.skipif(os.environ.get("RESTAI_BENCHMARKS") != "1", reason="set RESTAI_BENCHMARKS=1 to run")
+def test_benchmark_against_full_scan_listing(vector):
+    per_source = BENCHMARK_CHUNKS // BENCHMARK_SOURCES
+    nodes = [n for s in range(BENCHMARK_SOURCES) for n in _nodes(f"doc{s}.pdf", per_source)]
+    for node in nodes:
+        node.embedding = [0.1] * 8
+    for i in range(0, len(nodes), 5000):
+        vector.chroma_collection.add(
+            ids=[n.node_id for n in nodes[i:i + 5000]],
+            embeddings=[n.embedding for n in nodes[i:i + 5000]],
+            metadatas=[n.metadata for n in nodes[i:i + 5000]],
+        )
+
+    started = time.perf_counter()
+    expected = _legacy_list(vector.chroma_collection)
+    before = time.perf_counter() - started
+
+    started = time.perf_counter()
+    assert vector.list() == expected  # first call backfills the catalog
+    backfill = time.perf_counter() - started
+
+    started = time.perf_counter()
+    page = vector.list(offset=0, limit=50)
+    total = vector.count_sources()
+    after = time.perf_counter() - started
+
+    print(
+        f"\n{BENCHMARK_CHUNKS} chunks, {BENCHMARK_SOURCES} sources: full scan {before * 1000:.0f} ms, "
+        f"one-off backfill {backfill * 1000:.0f} ms, catalog page of 50 + total {after * 1000:.1f} ms"
+    )
+    assert page == expected[:50] and total == BENCHMARK_SOURCES
+    assert after < before
@@ -0,0 +1,124 @@
+"""Unit tests for the batched ingest path in restai/vectordb/tools.py —
+split → embed in batches → one insert_nodes per batch. Pure fakes; no vector
+store or embedding server."""
+import threading
+import time
+from types import SimpleNamespace
+
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.schema import Document
+from pydantic import PrivateAttr
+
+import restai.vectordb.tools as vt
+
+
+class _RecordingIndex:
+    def __init__(self):
+        self.calls = []
+
+    def insert_nodes(self, nodes):
+        self.calls.append(list(nodes))
+
+
+class _CountingEmbedding(MockEmbedding):
+    """MockEmbedding that records how many batches ran concurrently."""
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _active: int = PrivateAttr(default=0)
+    _peak: int = PrivateAttr(default=0)
+
+    def __init__(self, **kwargs):
+        super().__init__(embed_dim=4, **kwargs)
+
+    @property
+    def peak(self):
+        return self._peak
+
+    def _get_text_embeddings(self, texts):
+        with self._lock:
+            self._active += 1
+            self._peak = max(self._peak, self._active)
+        time.sleep(0.02)
+        with self._lock:
+            self._active -= 1
+        return [[0.5] * 4 for _ in texts]
+
+
+def _project(embed_model, class_name="OpenAI"):
+    index = _RecordingIndex()
+    embedding = SimpleNamespace(embedding=embed_model, props=SimpleNamespace(class_name=class_name))
+    return SimpleNamespace(vector=SimpleNamespace(index=index, embedding=embedding)), index
+
+
+def _docs(n_words=400, n_docs=3):
+    text = " ".join(f"word{i}" for i in range(n_words))
+    return [Document(text=text, metadata={"source": f"doc{d}"}) for d in range(n_docs)]
+
+
+def test_chunks_are_written_in_bulk_batches(monkeypatch):
+    monkeypatch.setattr(vt, "INGEST_BATCH_SIZE", 5)
+    project, index = _project(MockEmbedding(embed_dim=4))
+
+    timings = {}
+    n = vt.index_documents_classic(project, _docs(), "sentence", 64, timings=timings)
+
+    assert n == sum(len(c) for c in index.calls)
+    assert all(len(c) <= 5 for c in index.calls)
+    assert len(index.calls) == timings["batches"] == -(-n // 5)
+    # Embedded before the write, so the vector store never calls the model.
+    assert all(node.embedding is not None for batch in index.calls for node in batch)
+    for key in ("split", "embed", "write", "total"):
+        assert timings[key] >= 0
+    assert timings["chunks"] == n
+
+
+def test_batches_keep_document_order_and_metadata(monkeypatch):
+    monkeypatch.setattr(vt, "INGEST_BATCH_SIZE", 3)
+    project, index = _project(_CountingEmbedding())
+
+    vt.index_documents_classic(project, _docs(n_docs=2), "sentence", 64)
+
+    sources = [node.metadata["source"] for batch in index.calls for node in batch]
+    assert sources == sorted(sources)
+    assert set(sources) == {"doc0", "doc1"}
+
+
+def test_remote_provider_embeds_batches_concurrently(monkeypatch):
+    monkeypatch.setattr(vt, "INGEST_BATCH_SIZE", 2)
+    monkeypatch.setattr(vt, "INGEST_EMBED_CONCURRENCY", 3)
+    model = _CountingEmbedding()
+    project, _ = _project(model, class_name="OpenAI")
+
+    vt.index_documents_classic(project, _docs(), "sentence", 64)
+
+    assert 1 < model.peak <= 3
+
+
+def test_local_provider_embeds_one_batch_at_a_time(monkeypatch):
+    monkeypatch.setattr(vt, "INGEST_BATCH_SIZE", 2)
+    monkeypatch.setattr(vt, "INGEST_EMBED_CONCURRENCY", 3)
+    model = _CountingEmbedding()
+    project, _ = _project(model, class_name="LangChain.HuggingFace")
+
+    vt.index_documents_classic(project, _docs(), "sentence", 64)
+
+    assert model.peak == 1
+
+
+def test_store_without_embed_model_embeds_inside_insert_nodes(monkeypatch):
+    monkeypatch.setattr(vt, "INGEST_BATCH_SIZE", 4)
+    index = _RecordingIndex()
+    project = SimpleNamespace(vector=SimpleNamespace(index=index))
+
+    n = vt.index_documents_classic(project, _docs(), "sentence", 64)
+
+    assert n == sum(len(c) for c in index.calls)
+    assert all(node.embedding is None for batch in index.calls for node in batch)
+
+
+def test_empty_input_writes_nothing():
+    project, index = _project(MockEmbedding(embed_dim=4))
+    timings = {}
+    assert vt.index_documents_classic(project, [], timings=timings) == 0
+    assert index.calls == []
+    assert timings["batches"] == 0